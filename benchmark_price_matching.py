@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+単価マッチング 並列化ベンチマーク
+
+既存KBから合成した見積項目（6工事区分、数百〜数千件）で enrich_with_prices_unified を
+逐次（workers=1）と並列（プロセスプール）で実行し、所要時間・速度向上率と
+結果の一致（単価・金額・参照KB）を表示します。速度向上が得られた項目数を
+price_matching.parallel_min_items に設定してください（並列実行はCLI・バッチ実行のみ）。
+
+ベクトル検索は使わず、全項目を文字列マッチング（並列化の対象）で処理します。
+
+使い方:
+    python benchmark_price_matching.py
+    python benchmark_price_matching.py --sizes 1000 5000 --workers 2 4 8
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import os
+import random
+import time
+
+from pipelines.estimate_generator_ai import AIEstimateGenerator
+from pipelines.price_matcher import load_price_matching_config
+from pipelines.schemas import DisciplineType, EstimateItem
+
+UNITS = ["m", "式", "個", "台", "箇所", "ヶ所", "本", "面"]
+
+
+def make_items(kb_items, n_items: int, seed: int = 0):
+    """KBの項目名・仕様を崩した見積項目（親項目なし、全工事区分）"""
+    rng = random.Random(seed)
+    disciplines = list(DisciplineType)
+    items = []
+    for i in range(n_items):
+        kb_item = rng.choice(kb_items)
+        name = kb_item.get("description", "")
+        if len(name) > 2 and rng.random() < 0.5:
+            name = name[:-1]
+        items.append(EstimateItem(
+            item_no=str(i + 1),
+            name=name,
+            specification=kb_item.get("features", {}).get("specification", "") or "",
+            quantity=rng.choice([1, 2, 5, 10]),
+            unit=kb_item.get("unit") if rng.random() < 0.7 else rng.choice(UNITS),
+            level=1,
+            discipline=rng.choice(disciplines),
+        ))
+    return items
+
+
+def run_once(generator, kb_items, n_items: int, workers: int):
+    """1回実行して (所要時間, 結果のキー) を返す"""
+    items = make_items(kb_items, n_items)
+    start = time.perf_counter()
+    enriched = generator.enrich_with_prices_unified(items, workers=workers)
+    elapsed = time.perf_counter() - start
+    results = [(item.unit_price, item.amount, tuple(item.price_references or ()), item.source_reference) for item in enriched]
+    return elapsed, results
+
+
+def run_benchmark(kb_path: str, sizes, worker_counts):
+    print("=" * 80)
+    print("単価マッチング 並列化ベンチマーク（enrich_with_prices_unified）")
+    print("=" * 80)
+
+    # 結果キャッシュは使わない（毎回マッチングを実行して計測）
+    generator = AIEstimateGenerator(kb_path=kb_path, use_vector_search=False, use_cache=False)
+    # ベンチマークでは項目数にかかわらず並列化する
+    generator._price_matching_config = dict(load_price_matching_config(), parallel_min_items=0)
+    kb_items = generator.price_kb
+    usable_cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    print(f"KB: {len(kb_items)}件 / CPU: {usable_cpus}")
+    if usable_cpus < 2:
+        print("⚠️ 使えるCPUが1つのため並列実行は行われず、速度向上は計測できません（複数CPUの環境で実行してください）")
+
+    # インデックス等の構築を計測から除外
+    run_once(generator, kb_items, 50, workers=1)
+
+    print(f"\n{'項目数':>8} {'workers':>8} {'時間(s)':>10} {'速度向上':>10} {'結果一致':>8}")
+    print("-" * 50)
+    all_identical = True
+    for n_items in sizes:
+        baseline, expected = run_once(generator, kb_items, n_items, workers=1)
+        print(f"{n_items:>8} {1:>8} {baseline:>10.2f} {1.0:>9.2f}x {'-':>8}")
+        for workers in worker_counts:
+            elapsed, results = run_once(generator, kb_items, n_items, workers=workers)
+            identical = results == expected
+            all_identical = all_identical and identical
+            print(f"{n_items:>8} {workers:>8} {elapsed:>10.2f} {baseline / elapsed:>9.2f}x {'✅' if identical else '❌':>8}")
+
+    print("\n" + ("✅ 並列実行の結果は逐次実行と一致" if all_identical else "❌ 並列実行の結果が逐次実行と異なります"))
+    return 0 if all_identical else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="単価マッチング 並列化ベンチマーク")
+    parser.add_argument("--kb", default="kb/price_kb.json")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4])
+    args = parser.parse_args()
+
+    return run_benchmark(args.kb, args.sizes, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+ベクトルインデックス ベンチマーク
+
+合成KB（10k / 100k / 1M行）で総当たり（IndexFlatIP）と近似最近傍インデックス
+（HNSW / IVF / IVFPQ）を比較し、recall@5・クエリレイテンシ・常駐メモリを表示します。
+インデックスは VectorKBSearch.create_search_index（本番と同じ構築処理）で作成します。
+
+常駐メモリは、保存したインデックスを本番と同じ方法で読み込んだときのプロセスのRSS増分です。
+本番では検索用のパーティションが常駐し、全体インデックス（総当たりのID付きインデックス）は
+メモリマップで読み込むため、その増分も別に表示します（Linuxのみ）。
+
+使い方:
+    python benchmark_vector_index.py
+    python benchmark_vector_index.py --sizes 10000 100000 --index-types HNSW IVFPQ
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import faiss
+
+from pipelines.estimate_generator_ai import VectorKBSearch, load_vectordb_config
+
+
+def make_synthetic_kb(n_rows: int, dimension: int, seed: int = 0) -> np.ndarray:
+    """クラスタ構造を持つ正規化済みの合成embeddingを生成（類似項目の多いKBを模擬）"""
+    rng = np.random.default_rng(seed)
+    n_clusters = max(1, n_rows // 50)
+    centers = rng.standard_normal((n_clusters, dimension)).astype('float32')
+    vectors = np.empty((n_rows, dimension), dtype='float32')
+    chunk = 100000
+    for start in range(0, n_rows, chunk):
+        end = min(start + chunk, n_rows)
+        labels = rng.integers(0, n_clusters, end - start)
+        vectors[start:end] = centers[labels] + 0.6 * rng.standard_normal((end - start, dimension)).astype('float32')
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n_queries: int, seed: int = 1) -> np.ndarray:
+    """KB行にノイズを加えたクエリを生成"""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), n_queries, replace=False)
+    queries = vectors[rows] + 0.3 * rng.standard_normal((n_queries, vectors.shape[1])).astype('float32') / np.sqrt(vectors.shape[1])
+    queries = queries.astype('float32')
+    faiss.normalize_L2(queries)
+    return queries
+
+
+# 読み込み前後の常駐メモリを新しいプロセスで計測（解放済みメモリの再利用で増分が隠れないように）
+_RSS_SCRIPT = """
+import os, sys, faiss
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+before = rss()
+index = faiss.read_index(sys.argv[1], int(sys.argv[2]))
+print((rss() - before) / (1024 * 1024))
+"""
+
+
+def loaded_rss_mb(index, mmap: bool = False) -> float:
+    """
+    インデックスを保存し、本番と同じ方法で読み込んだときの常駐メモリの増分（MB）
+
+    mmap=Trueは VectorKBSearch が全体インデックスを読み込むときと同じメモリマップ。
+    /proc/self/statm がない環境ではNaN。
+    """
+    if not os.path.exists("/proc/self/statm"):
+        return float("nan")
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if mmap else 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "index.faiss"
+        faiss.write_index(index, str(path))
+        result = subprocess.run(
+            [sys.executable, "-c", _RSS_SCRIPT, str(path), str(flags)],
+            capture_output=True, text=True, check=True
+        )
+    return float(result.stdout.strip())
+
+
+def measure(index, queries: np.ndarray, top_k: int):
+    """単発クエリのレイテンシ（p50/p95, ms）とバッチ検索結果を返す"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[np.newaxis, :], top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    _, indices = index.search(queries, top_k)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    return np.percentile(latencies, 50), np.percentile(latencies, 95), batch_ms, indices
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """総当たりの上位k件に対する再現率"""
+    hits = sum(len(set(f.tolist()) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def run_benchmark(sizes, index_types, dimension: int, n_queries: int, top_k: int):
+    base_config = load_vectordb_config()
+    # ベンチマークでは件数によらず指定のインデックスを使う
+    base_config["ann_min_rows"] = 0
+
+    print("=" * 80)
+    print("ベクトルインデックス ベンチマーク")
+    print(f"次元={dimension}, クエリ数={n_queries}, recall@{top_k}, faiss threads={faiss.omp_get_max_threads()}")
+    print("=" * 80)
+
+    for n_rows in sizes:
+        print(f"\n【KB {n_rows:,}行】")
+        print("-" * 80)
+        vectors = make_synthetic_kb(n_rows, dimension)
+        vector_ids = np.arange(n_rows, dtype='int64')
+        queries = make_queries(vectors, n_queries)
+
+        store = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        store.add_with_ids(vectors, vector_ids)
+        print(f"  全体インデックス（メモリマップ）: RSS {loaded_rss_mb(store, mmap=True):.1f}MB "
+              f"/ 常駐させた場合 {loaded_rss_mb(store):.1f}MB")
+        del store
+
+        print(f"  {'index_type':<12} {'build(s)':>9} {'recall@' + str(top_k):>9} "
+              f"{'p50(ms)':>8} {'p95(ms)':>8} {'batch(ms)':>10} {'RSS(MB)':>9}")
+
+        truth = None
+        for index_type in ["IndexFlatIP"] + [t for t in index_types if t != "IndexFlatIP"]:
+            config = dict(base_config, index_type=index_type)
+            start = time.perf_counter()
+            index = VectorKBSearch.create_search_index(vectors, vector_ids, config)
+            build_s = time.perf_counter() - start
+
+            p50, p95, batch_ms, found = measure(index, queries, top_k)
+            if truth is None:
+                truth = found
+            recall = recall_at_k(found, truth)
+
+            print(f"  {index_type:<12} {build_s:>9.2f} {recall:>9.3f} "
+                  f"{p50:>8.3f} {p95:>8.3f} {batch_ms:>10.1f} {loaded_rss_mb(index):>9.1f}")
+            del index
+
+        del vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ベクトルインデックス ベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--index-types", nargs="+", default=["HNSW", "IVF", "IVFPQ"])
+    parser.add_argument("--dimension", type=int, default=384, help="multilingual-e5-smallの次元")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.index_types, args.dimension, args.queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
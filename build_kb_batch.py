@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+見積書PDFから単価KBを一括構築（Message Batches API、無人実行向け）
+
+全PDFの抽出リクエストをバッチとして送信し、完了までポーリングして単価KBにマージします。
+ジョブの状態は --job のマニフェストに保存されるため、中断しても同じ --job で再実行すると
+送信済みのバッチから再開します。
+
+使い方:
+    python build_kb_batch.py estimates/*.pdf --job cache/kb_batches/backfill.json --save
+    python build_kb_batch.py --job cache/kb_batches/backfill.json --save   # 中断したジョブを再開
+    python build_kb_batch.py estimates/ --job ... --submit-only            # 送信のみ（後で再開して取得）
+    python build_kb_batch.py estimates/ --local                            # ローカル代替サーバで逐次API実行
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from pipelines.kb_batch import KBBatchJob, load_kb_batch_config
+from pipelines.kb_builder import PriceKBBuilder
+from pipelines.llm_client import create_llm_client
+from pipelines.llm_stub import LocalBatchServer
+from pipelines.model_registry import refresh_kb_index
+
+
+def collect_pdfs(paths):
+    """ファイル・ディレクトリの指定からPDFの一覧を作成"""
+    pdfs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            pdfs.extend(sorted(path.glob("**/*.pdf")))
+        elif path.suffix.lower() == ".pdf":
+            pdfs.append(path)
+    return [str(pdf) for pdf in pdfs]
+
+
+def main():
+    config = load_kb_batch_config()
+    parser = argparse.ArgumentParser(description="見積書PDFから単価KBを一括構築（バッチ処理）")
+    parser.add_argument("paths", nargs="*", help="見積書PDF、またはPDFを含むディレクトリ")
+    parser.add_argument("--job", help="ジョブマニフェストのパス（省略時は新規ジョブ）")
+    parser.add_argument("--kb", default="kb/price_kb.json")
+    parser.add_argument("--poll-interval", type=float, default=config.get("poll_interval", 30))
+    parser.add_argument("--timeout", type=float, default=None, help="待機の上限（秒）")
+    parser.add_argument("--submit-only", action="store_true", help="送信のみ行い、結果は再開時に取得")
+    parser.add_argument("--local", action="store_true",
+                        help="Batches API の代わりにローカル代替サーバ（通常のAPIを逐次呼び出し）を使う")
+    parser.add_argument("--save", action="store_true", help="抽出結果を既存KBにマージして保存")
+    parser.add_argument("--merge-strategy", default="keep_new", choices=["keep_new", "keep_old", "average"])
+    args = parser.parse_args()
+
+    load_dotenv()
+    job_path = args.job or str(Path(config.get("job_dir", "cache/kb_batches")) / f"kb_{datetime.now():%Y%m%d_%H%M%S}.json")
+    builder = PriceKBBuilder(kb_path=args.kb)
+    job = KBBatchJob(job_path, builder=builder)
+
+    pdfs = collect_pdfs(args.paths)
+    if pdfs:
+        added = job.add_files(pdfs)
+        print(f"ジョブに {added} リクエストを追加: {len(pdfs)}ファイル")
+    if not job.manifest["requests"]:
+        print("処理するPDFがありません")
+        return 1
+    print(f"ジョブ: {job_path}")
+
+    api_client = create_llm_client()
+    client = LocalBatchServer(api_client, "cache/local_batches") if args.local else api_client
+
+    if args.submit_only:
+        job.poll(client)
+        batch_ids = job.submit(client)
+        print(f"送信したバッチ: {', '.join(batch_ids) or 'なし'} / {job.progress()}")
+        print(f"結果の取得: python build_kb_batch.py --job {job_path}" + (" --local" if args.local else ""))
+        return 0
+
+    try:
+        price_refs = job.run(
+            client,
+            poll_interval=args.poll_interval,
+            timeout=args.timeout,
+            on_progress=lambda counts: print(f"  {datetime.now():%H:%M:%S} {counts}")
+        )
+    except TimeoutError as e:
+        print(f"⚠️ {e}\n再開: python build_kb_batch.py --job {job_path}")
+        return 2
+
+    print(f"\n抽出結果: {len(price_refs)}項目（単価あり） / {job.progress()}")
+    if args.save and price_refs:
+        merged = builder.merge_with_existing_kb(price_refs, merge_strategy=args.merge_strategy)
+        builder.save_kb_to_json(merged, builder.kb_path)
+        refresh_kb_index(builder.kb_path, [ref.model_dump(mode='json') for ref in merged])
+        print(f"KBを保存しました: {builder.kb_path}（{len(merged)}項目）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
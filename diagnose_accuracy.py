@@ -55,6 +55,8 @@ def test_1_spec_extraction():
     except Exception as e:
         print(f"ERROR: {e}")
         return None
+    finally:
+        generator.close()
 
 
 def test_2_building_info_extraction(spec_text):
@@ -95,6 +97,8 @@ def test_2_building_info_extraction(spec_text):
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        generator.close()
 
 
 def test_3_llm_item_generation(spec_text, building_info):
@@ -142,6 +146,8 @@ def test_3_llm_item_generation(spec_text, building_info):
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        generator.close()
 
 
 def test_4_kb_matching(items):
@@ -154,18 +160,18 @@ def test_4_kb_matching(items):
 
     generator = AIEstimateGenerator()
 
-    # KB統計
-    print(f"\n[KB統計]")
-    print(f"  KB項目数: {len(generator.price_kb)}")
+    try:
+        # KB統計
+        print(f"\n[KB統計]")
+        print(f"  KB項目数: {len(generator.price_kb)}")
 
-    # 単価分布
-    prices = [item.get("unit_price", 0) for item in generator.price_kb if item.get("unit_price")]
-    if prices:
-        print(f"  単価範囲: ¥{min(prices):,.0f} - ¥{max(prices):,.0f}")
-        print(f"  単価中央値: ¥{sorted(prices)[len(prices)//2]:,.0f}")
+        # 単価分布
+        prices = [item.get("unit_price", 0) for item in generator.price_kb if item.get("unit_price")]
+        if prices:
+            print(f"  単価範囲: ¥{min(prices):,.0f} - ¥{max(prices):,.0f}")
+            print(f"  単価中央値: ¥{sorted(prices)[len(prices)//2]:,.0f}")
 
-    # マッチングテスト
-    try:
+        # マッチングテスト
         print(f"\n[マッチングテスト]")
         enriched = generator.enrich_with_prices(items[:10])
 
@@ -192,6 +198,8 @@ def test_4_kb_matching(items):
         import traceback
         traceback.print_exc()
         return None
+    finally:
+        generator.close()
 
 
 def test_5_amount_calculation(items):
@@ -7,6 +7,7 @@
 import streamlit as st
 from pathlib import Path
 import tempfile
+import hashlib
 import json
 from datetime import datetime
 from loguru import logger
@@ -28,6 +29,7 @@ from pipelines.estimate_generator_ai import AIEstimateGenerator
 from pipelines.export import EstimateExporter
 from pipelines.cost_tracker import start_session, end_session, get_tracker
 from pipelines.inquiry_extractor import InquiryExtractor
+from pipelines.preflight import preflight_spec
 
 
 # カスタムCSS（ページ固有）
@@ -87,6 +89,7 @@ def init_session_state():
         'pending_files': None,  # 処理待ちファイル
         'pending_include_legal': None,
         'pending_legal_standards': None,
+        'preflight_estimates': {},  # ファイルのMD5 -> PreflightEstimate
     }
     for key, value in defaults.items():
         if key not in st.session_state:
@@ -106,6 +109,51 @@ def extract_email_info_auto(uploaded_email):
     return email_info
 
 
+def display_preflight(uploaded_files):
+    """アップロードされた仕様書ごとに、生成前のAPI料金・処理時間の見積を表示（ボタンで実行）"""
+    estimates = st.session_state.preflight_estimates
+    keys = {f.name: hashlib.md5(f.getvalue()).hexdigest() for f in uploaded_files}
+    pending = [f for f in uploaded_files if keys[f.name] not in estimates]
+    if pending and st.button("API料金・処理時間を見積もる", key="run_preflight",
+                             disabled=st.session_state.is_processing):
+        with st.spinner("仕様書を解析中..."):
+            for uploaded_file in pending:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
+                    tmp_file.write(uploaded_file.getvalue())
+                    tmp_path = tmp_file.name
+                try:
+                    estimates[keys[uploaded_file.name]] = preflight_spec(tmp_path)
+                except Exception as e:
+                    logger.warning(f"Preflight failed for {uploaded_file.name}: {e}")
+                    estimates[keys[uploaded_file.name]] = None
+                finally:
+                    Path(tmp_path).unlink(missing_ok=True)
+
+    for uploaded_file in uploaded_files:
+        estimate = estimates.get(keys[uploaded_file.name])
+        if estimate is None:
+            continue
+        with st.expander(f"事前見積: {uploaded_file.name}", expanded=len(uploaded_files) == 1):
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("API料金（予測）", f"¥{estimate.total_cost_jpy:,.0f}")
+            col2.metric("処理時間（予測）", f"約{max(1, round(estimate.wall_seconds / 60))}分")
+            col3.metric("API呼び出し", f"{estimate.api_calls}回")
+            col4.metric("Vision送信ページ", f"{estimate.vision_pages}ページ", f"全{estimate.pages}ページ", delta_color="off")
+            st.dataframe([
+                {
+                    "処理": stage.operation,
+                    "呼び出し": "キャッシュ" if stage.cached else f"{stage.calls}回",
+                    "入力トークン": stage.input_tokens + stage.cache_creation_tokens + stage.cache_read_tokens,
+                    "出力トークン": stage.output_tokens,
+                    "料金（円）": round(stage.cost_jpy, 1),
+                    "時間（秒）": round(stage.seconds),
+                    "根拠": f"履歴{stage.history_records}件" if stage.history_records else "既定値",
+                }
+                for stage in estimate.stages
+            ], use_container_width=True, hide_index=True)
+            st.caption("トークン数はローカルでの概算、出力トークン数・時間は過去のAPI呼び出し履歴の比率から予測しています")
+
+
 def main():
     init_session_state()
 
@@ -178,6 +226,7 @@ def main():
         if uploaded_files:
             file_names = ", ".join([f.name for f in uploaded_files])
             st.caption(f"📄 {len(uploaded_files)}ファイル選択済み: {file_names}")
+            display_preflight(uploaded_files)
 
         st.divider()
 
@@ -758,19 +807,19 @@ def generate_estimate_unified(
             # ===== ステップ1: 仕様書解析 =====
             show_status(1, 6, "仕様書を解析中", f"ファイル: {file_name}", "processing")
 
-            ai_generator = AIEstimateGenerator(kb_path="kb/price_kb.json")
+            # withブロックを抜けると共有KBインデックスの参照を返却（生成が失敗した場合も）
+            with AIEstimateGenerator(kb_path="kb/price_kb.json") as ai_generator:
+                # ===== ステップ2: 建物情報抽出 =====
+                show_status(2, 6, "建物情報を抽出中", "面積・階数・部屋数を特定しています", "processing")
+                time.sleep(0.3)
 
-            # ===== ステップ2: 建物情報抽出 =====
-            show_status(2, 6, "建物情報を抽出中", "面積・階数・部屋数を特定しています", "processing")
-            time.sleep(0.3)
+                # ===== ステップ3: 設備項目生成 =====
+                show_status(3, 6, "設備項目を生成中", "AIが見積項目を分析・生成しています", "processing")
 
-            # ===== ステップ3: 設備項目生成 =====
-            show_status(3, 6, "設備項目を生成中", "AIが見積項目を分析・生成しています", "processing")
-
-            fmt_doc = ai_generator.generate_estimate_unified(
-                tmp_path,
-                legal_standards=legal_standards if include_legal else []
-            )
+                fmt_doc = ai_generator.generate_estimate_unified(
+                    tmp_path,
+                    legal_standards=legal_standards if include_legal else []
+                )
 
             items = fmt_doc.estimates if hasattr(fmt_doc, 'estimates') else fmt_doc.estimate_items
 
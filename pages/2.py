@@ -18,6 +18,8 @@ sys.path.insert(0, '.')
 from pipelines.kb_builder import PriceKBBuilder
 from pipelines.schemas import PriceReference
 from pipelines.cost_tracker import start_session, end_session
+from pipelines.model_registry import refresh_kb_index
+from pipelines.kb_batch import KBBatchJob, load_kb_batch_config
 
 
 # カスタムCSS（ページ固有）
@@ -263,6 +265,72 @@ def extract_from_files(uploaded_files, project_name_prefix="uploaded", disciplin
     return all_extracted
 
 
+def submit_batch_job(uploaded_files, project_name_prefix="uploaded"):
+    """アップロードされたPDFを一括処理（Batch API）のジョブとして送信"""
+    config = load_kb_batch_config()
+    job_path = Path(config.get("job_dir", "cache/kb_batches")) / f"kb_{datetime.now():%Y%m%d_%H%M%S}.json"
+    job = KBBatchJob(str(job_path), builder=st.session_state.kb_builder)
+
+    # 再開時にも参照できるよう、ジョブのディレクトリに保存
+    job.files_dir.mkdir(parents=True, exist_ok=True)
+    pdf_paths, project_names = [], []
+    for uploaded_file in uploaded_files:
+        if not uploaded_file.name.endswith('.pdf'):
+            st.warning(f"一括処理はPDFのみ対応しています: {uploaded_file.name}")
+            continue
+        pdf_path = job.files_dir / uploaded_file.name
+        pdf_path.write_bytes(uploaded_file.getbuffer())
+        pdf_paths.append(str(pdf_path))
+        project_names.append(f"{project_name_prefix}_{Path(uploaded_file.name).stem}")
+
+    if not pdf_paths:
+        return None
+    job.add_files(pdf_paths, project_names)
+    job.submit(st.session_state.kb_builder.client)
+    st.session_state.kb_batch_job = str(job_path)
+    return job
+
+
+def display_batch_job():
+    """送信済みの一括処理ジョブの状況を表示し、完了していれば抽出結果を取り込む"""
+    job_path = st.session_state.get("kb_batch_job")
+    if not job_path:
+        return
+
+    st.markdown("---")
+    st.subheader("一括処理（Batch API）")
+    st.caption(f"ジョブ: {job_path}")
+    job = KBBatchJob(job_path, builder=st.session_state.kb_builder)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        refresh = st.button("状況を更新", use_container_width=True)
+    with col2:
+        if st.button("ジョブを閉じる", use_container_width=True):
+            st.session_state.kb_batch_job = None
+            st.rerun()
+
+    if refresh:
+        with st.spinner("バッチの状況を確認中..."):
+            client = st.session_state.kb_builder.client
+            job.poll(client)
+            job.submit(client)  # エラーになったリクエストを再送信
+
+    progress = job.progress()
+    total = sum(progress.values())
+    done = progress["succeeded"] + progress["failed"]
+    st.progress(done / total if total else 1.0)
+    st.text(f"完了: {done}/{total}リクエスト（成功 {progress['succeeded']} / 失敗 {progress['failed']}）")
+
+    if job.is_complete():
+        extracted_items = job.collect()
+        st.session_state.extracted_items = extracted_items
+        st.session_state.kb_batch_job = None
+        st.success(f"合計 {len(extracted_items)}項目を抽出しました（「価格統合」「KBに保存」で取り込めます）")
+    else:
+        st.info("バッチ処理は通常数分〜数時間で完了します。ページを閉じても、後で「状況を更新」で結果を取得できます")
+
+
 def main():
     init_session_state()
 
@@ -405,6 +473,12 @@ def main():
                 )
                 merge_strategy = merge_options[merge_label]
 
+                use_batch = st.checkbox(
+                    "一括処理（Batch API）",
+                    value=False,
+                    help="大量のPDFをバッチとして送信し、完了後に結果を取得します（料金半額・工事区分は自動判定）"
+                )
+
         st.divider()
 
         # 処理ボタン
@@ -421,7 +495,12 @@ def main():
             col1, col2, col3 = st.columns(3)
 
             with col1:
-                if st.button("KB抽出開始", type="primary", use_container_width=True):
+                if use_batch and st.button("KB抽出開始", type="primary", use_container_width=True):
+                    with st.spinner("バッチを送信中..."):
+                        job = submit_batch_job(uploaded_files, project_prefix)
+                    if job:
+                        st.success(f"{len(job.manifest['requests'])}リクエストをバッチとして送信しました")
+                elif not use_batch and st.button("KB抽出開始", type="primary", use_container_width=True):
                     st.markdown("---")
                     st.subheader("処理状況")
 
@@ -549,6 +628,9 @@ def main():
                         # セッション状態を更新
                         kb_builder.kb_items = [ref.model_dump(mode='json') for ref in merged]
 
+                        # ベクトルインデックスを差分更新（変更項目のみエンコード）
+                        refresh_kb_index(kb_builder.kb_path, kb_builder.kb_items)
+
                         st.success(f"KBを保存しました: {len(merged)}項目")
                         st.info(f"保存先: {kb_builder.kb_path}")
 
@@ -559,6 +641,9 @@ def main():
         else:
             st.info("Excel (.xlsx, .xls) または PDF 形式のファイルをアップロードしてください")
 
+        # 送信済みの一括処理ジョブ
+        display_batch_job()
+
     # ===== タブ2: KB管理 =====
     with tab2:
         # 統計情報表示
@@ -663,6 +748,7 @@ def main():
                         if st.button("はい、クリアする", use_container_width=True, type="primary"):
                             st.session_state.kb_builder.kb_items = []
                             st.session_state.kb_builder.save_kb_to_json([], st.session_state.kb_builder.kb_path)
+                            refresh_kb_index(st.session_state.kb_builder.kb_path, [])
                             st.session_state.confirm_clear_kb = False
                             st.success("KBをクリアしました")
                             st.rerun()
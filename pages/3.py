@@ -54,10 +54,10 @@ class LegalKBBuilder:
 
     def __init__(self, kb_path: str = "kb/legal_kb.json"):
         from dotenv import load_dotenv
-        from anthropic import Anthropic
+        from pipelines.llm_client import create_llm_client
 
         load_dotenv()
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
         self.kb_path = kb_path
         self.kb_items = []
@@ -180,7 +180,8 @@ JSON配列形式で出力してください：
                 model=self.model_name,
                 max_tokens=16000,
                 temperature=0,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                operation="法令KB抽出"
             )
 
             # コスト記録
@@ -76,6 +76,8 @@ def main():
         st.markdown('<p class="sidebar-section-header">トークン使用量</p>', unsafe_allow_html=True)
         st.text(f"入力: {summary['total_input_tokens']:,}")
         st.text(f"出力: {summary['total_output_tokens']:,}")
+        st.text(f"キャッシュ書込: {summary['total_cache_creation_tokens']:,}")
+        st.text(f"キャッシュ読込: {summary['total_cache_read_tokens']:,}")
         st.text(f"合計: {summary['total_tokens']:,}")
 
         st.markdown("---")
@@ -87,6 +89,8 @@ def main():
         |------|------|
         | 入力 | $3/1Mトークン |
         | 出力 | $15/1Mトークン |
+        | キャッシュ書込 | 入力の1.25倍 |
+        | キャッシュ読込 | 入力の0.1倍 |
         | レート | ¥150/$1 |
         """)
 
@@ -0,0 +1,41 @@
+"""
+configs/config.yaml の読み込み
+
+各モジュールが必要なセクションだけをデフォルト値とマージして取得します。
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+from loguru import logger
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / "configs" / "config.yaml"
+
+
+def load_config_section(
+    section: str,
+    defaults: Dict[str, Any],
+    config_path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    設定ファイルの1セクションを読み込み
+
+    Args:
+        section: セクション名（例: "vectordb", "embedding"）
+        defaults: デフォルト値（未設定の項目に使用）
+        config_path: 設定ファイルのパス（Noneの場合はconfigs/config.yaml）
+
+    Returns:
+        デフォルト値に設定ファイルの値を上書きした辞書
+    """
+    config = dict(defaults)
+    path = Path(config_path) if config_path else CONFIG_PATH
+    if not path.exists():
+        return config
+    try:
+        import yaml
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        config.update(data.get(section) or {})
+    except Exception as e:
+        logger.warning(f"Failed to load '{section}' config: {e}")
+    return config
@@ -7,6 +7,7 @@ API呼び出しごとのトークン使用量と料金を記録・集計しま
 import os
 import json
 import uuid
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any, List
@@ -16,6 +17,28 @@ from loguru import logger
 _current_session_id: Optional[str] = None
 _current_session_name: Optional[str] = None
 
+# 複数スレッドからの同時記録（工事区分ごとのLLM呼び出しの並行実行など）を直列化
+_tracker_lock = threading.RLock()
+
+# 直前のAPI呼び出しの計測値（pipelines.llm_client が呼び出したスレッドに設定）
+_call_metrics = threading.local()
+
+
+def set_call_metrics(metrics: Optional[Dict[str, Any]]):
+    """
+    直前のAPI呼び出しの計測値（latency_ms・attempts・hedged）を設定
+
+    同じスレッドで次に記録するコストに含めます（呼び出し元は応答の usage を
+    record_cost するだけで、レイテンシ・試行回数も記録されます）。
+    """
+    _call_metrics.value = metrics
+
+
+def _pop_call_metrics() -> Dict[str, Any]:
+    metrics = getattr(_call_metrics, "value", None)
+    _call_metrics.value = None
+    return metrics or {}
+
 
 def start_session(session_name: str = "見積作成") -> str:
     """新しいコスト追跡セッションを開始"""
@@ -95,6 +118,13 @@ class CostTracker:
     # USD/JPY レート（概算）
     USD_JPY_RATE = 150.0
 
+    # プロンプトキャッシュの料金（入力単価に対する倍率）
+    CACHE_WRITE_MULTIPLIER = 1.25  # キャッシュ書き込み（5分TTL）
+    CACHE_READ_MULTIPLIER = 0.10   # キャッシュ読み込み
+
+    # Message Batches API の料金（入力・出力とも通常料金に対する倍率）
+    BATCH_MULTIPLIER = 0.50
+
     def __init__(self, log_path: str = "logs/api_costs.json"):
         self.log_path = Path(log_path)
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -122,18 +152,30 @@ class CostTracker:
         self,
         model_name: str,
         input_tokens: int,
-        output_tokens: int
+        output_tokens: int,
+        cache_creation_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        batch: bool = False
     ) -> Dict[str, float]:
-        """コストを計算"""
+        """コストを計算（input_tokens はキャッシュ対象外の入力トークン数、batch はバッチ料金）"""
         pricing = self.get_pricing(model_name)
 
         input_cost_usd = (input_tokens / 1_000_000) * pricing["input"]
+        cache_cost_usd = (
+            cache_creation_tokens * self.CACHE_WRITE_MULTIPLIER
+            + cache_read_tokens * self.CACHE_READ_MULTIPLIER
+        ) / 1_000_000 * pricing["input"]
         output_cost_usd = (output_tokens / 1_000_000) * pricing["output"]
-        total_cost_usd = input_cost_usd + output_cost_usd
+        if batch:
+            input_cost_usd *= self.BATCH_MULTIPLIER
+            cache_cost_usd *= self.BATCH_MULTIPLIER
+            output_cost_usd *= self.BATCH_MULTIPLIER
+        total_cost_usd = input_cost_usd + cache_cost_usd + output_cost_usd
         total_cost_jpy = total_cost_usd * self.USD_JPY_RATE
 
         return {
             "input_cost_usd": input_cost_usd,
+            "cache_cost_usd": cache_cost_usd,
             "output_cost_usd": output_cost_usd,
             "total_cost_usd": total_cost_usd,
             "total_cost_jpy": total_cost_jpy
@@ -145,7 +187,11 @@ class CostTracker:
         model_name: str,
         input_tokens: int,
         output_tokens: int,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        cache_creation_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        batch: bool = False,
+        call_metrics: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         API呼び出しを記録
@@ -153,14 +199,20 @@ class CostTracker:
         Args:
             operation: 操作種別（"見積生成", "KB抽出", "法令抽出" など）
             model_name: 使用モデル名
-            input_tokens: 入力トークン数
+            input_tokens: 入力トークン数（キャッシュ対象外）
             output_tokens: 出力トークン数
             metadata: 追加情報（ファイル名など）
+            cache_creation_tokens: プロンプトキャッシュに書き込んだ入力トークン数
+            cache_read_tokens: プロンプトキャッシュから読み込んだ入力トークン数
+            batch: Message Batches API 経由の呼び出し（バッチ料金で計算）
+            call_metrics: 呼び出しの計測値（Noneは set_call_metrics で設定された値）
 
         Returns:
             記録されたレコード
         """
-        cost = self.calculate_cost(model_name, input_tokens, output_tokens)
+        cost = self.calculate_cost(
+            model_name, input_tokens, output_tokens, cache_creation_tokens, cache_read_tokens, batch=batch
+        )
 
         record = {
             "timestamp": datetime.now().isoformat(),
@@ -168,19 +220,31 @@ class CostTracker:
             "model": model_name,
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
-            "total_tokens": input_tokens + output_tokens,
+            "cache_creation_tokens": cache_creation_tokens,
+            "cache_read_tokens": cache_read_tokens,
+            "batch": batch,
+            "total_tokens": input_tokens + cache_creation_tokens + cache_read_tokens + output_tokens,
             "cost_usd": cost["total_cost_usd"],
             "cost_jpy": cost["total_cost_jpy"],
             "metadata": metadata or {},
             "session_id": get_current_session_id()  # セッションIDを記録
         }
-
-        self.records.append(record)
-        self._save()
-
+        # レイテンシ・試行回数・ヘッジの有無（LLMClient 経由の呼び出しのみ）
+        record.update(call_metrics if call_metrics is not None else _pop_call_metrics())
+
+        with _tracker_lock:
+            self.records.append(record)
+            self._save()
+
+        cache_info = (
+            f" (cache write {cache_creation_tokens:,} / read {cache_read_tokens:,})"
+            if cache_creation_tokens or cache_read_tokens else ""
+        ) + (" [batch]" if batch else "") + (
+            f" {record['latency_ms'] / 1000:.1f}s" if record.get("latency_ms") is not None else ""
+        ) + (f" attempts={record['attempts']}" if record.get("attempts", 1) > 1 else "")
         logger.info(
             f"Cost recorded: {operation} - "
-            f"{input_tokens:,} in / {output_tokens:,} out = "
+            f"{input_tokens:,} in{cache_info} / {output_tokens:,} out = "
             f"${cost['total_cost_usd']:.4f} (¥{cost['total_cost_jpy']:.2f})"
         )
 
@@ -188,11 +252,12 @@ class CostTracker:
 
     def _save(self):
         """ログをファイルに保存"""
-        try:
-            with open(self.log_path, 'w', encoding='utf-8') as f:
-                json.dump(self.records, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"Failed to save cost log: {e}")
+        with _tracker_lock:
+            try:
+                with open(self.log_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.records, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                logger.error(f"Failed to save cost log: {e}")
 
     def get_summary(
         self,
@@ -229,6 +294,8 @@ class CostTracker:
                 "total_tokens": 0,
                 "total_input_tokens": 0,
                 "total_output_tokens": 0,
+                "total_cache_creation_tokens": 0,
+                "total_cache_read_tokens": 0,
                 "total_cost_usd": 0,
                 "total_cost_jpy": 0,
                 "by_operation": {},
@@ -272,6 +339,8 @@ class CostTracker:
             "total_tokens": sum(r["total_tokens"] for r in records),
             "total_input_tokens": sum(r["input_tokens"] for r in records),
             "total_output_tokens": sum(r["output_tokens"] for r in records),
+            "total_cache_creation_tokens": sum(r.get("cache_creation_tokens", 0) for r in records),
+            "total_cache_read_tokens": sum(r.get("cache_read_tokens", 0) for r in records),
             "total_cost_usd": sum(r["cost_usd"] for r in records),
             "total_cost_jpy": sum(r["cost_jpy"] for r in records),
             "by_operation": by_operation,
@@ -284,8 +353,9 @@ class CostTracker:
 
     def clear_records(self):
         """全レコードをクリア"""
-        self.records = []
-        self._save()
+        with _tracker_lock:
+            self.records = []
+            self._save()
         logger.info("Cost records cleared")
 
     def get_session_summary(self, session_id: str) -> Dict[str, Any]:
@@ -345,8 +415,9 @@ class CostTracker:
                 "operations": summary.get("operations", [])
             }
         }
-        self.records.append(record)
-        self._save()
+        with _tracker_lock:
+            self.records.append(record)
+            self._save()
 
     def get_session_history(self, limit: int = 20) -> List[Dict[str, Any]]:
         """セッション完了履歴を取得"""
@@ -365,7 +436,9 @@ def get_tracker() -> CostTracker:
     """グローバルトラッカーを取得"""
     global _tracker_instance
     if _tracker_instance is None:
-        _tracker_instance = CostTracker()
+        with _tracker_lock:
+            if _tracker_instance is None:
+                _tracker_instance = CostTracker()
     return _tracker_instance
 
 
@@ -374,10 +447,18 @@ def record_cost(
     model_name: str,
     input_tokens: int,
     output_tokens: int,
-    metadata: Optional[Dict[str, Any]] = None
+    metadata: Optional[Dict[str, Any]] = None,
+    cache_creation_tokens: int = 0,
+    cache_read_tokens: int = 0,
+    batch: bool = False,
+    call_metrics: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """コストを記録（簡易関数）"""
-    return get_tracker().record(operation, model_name, input_tokens, output_tokens, metadata)
+    return get_tracker().record(
+        operation, model_name, input_tokens, output_tokens, metadata,
+        cache_creation_tokens=cache_creation_tokens, cache_read_tokens=cache_read_tokens, batch=batch,
+        call_metrics=call_metrics
+    )
 
 
 if __name__ == "__main__":
@@ -13,16 +13,17 @@
 
 import json
 import logging
-import os
 from datetime import date
 from pathlib import Path
 from typing import Optional, Dict, Any
 
 from PyPDF2 import PdfReader
 from pydantic import BaseModel, Field
-import anthropic
 from dotenv import load_dotenv
 
+from pipelines.cost_tracker import record_cost
+from pipelines.llm_client import create_llm_client
+
 logger = logging.getLogger(__name__)
 
 
@@ -66,7 +67,7 @@ class EmailExtractor:
             api_key: Anthropic API key（Noneの場合は環境変数から取得）
         """
         load_dotenv()
-        self.client = anthropic.Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client(api_key=api_key)
 
     def extract_text_from_pdf(self, pdf_path: str) -> str:
         """PDFからテキストを抽出"""
@@ -144,7 +145,17 @@ JSON形式のみを出力してください。説明文は不要です。"""
             messages=[{
                 "role": "user",
                 "content": prompt
-            }]
+            }],
+            operation="メール抽出"
+        )
+
+        # コスト記録
+        record_cost(
+            operation="メール抽出",
+            model_name="claude-sonnet-4-20250514",
+            input_tokens=response.usage.input_tokens,
+            output_tokens=response.usage.output_tokens,
+            metadata={"source": "extract_email_info"}
         )
 
         # レスポンスからJSONを抽出
@@ -0,0 +1,158 @@
+"""
+クエリembeddingのLRUキャッシュ
+
+見積のたびに同じ項目名（白ガス管 15A、LED照明、VVFケーブル等）が繰り返し
+ベクトル化されるのを避けるため、同義語展開後のクエリ文字列をキーに
+正規化済みembeddingを保持します。任意でディスクに保存し、プロセス再起動後も再利用します。
+
+ディスクへの保存は検索のたびには行わず、未保存の件数・経過時間が閾値を超えたとき（maybe_save）、
+flush() の呼び出し時（見積1回分の終了時等）、プロセス終了時に行います。
+"""
+
+import atexit
+import os
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# プロセス終了時に未保存分を書き出すキャッシュ
+_open_caches: "weakref.WeakSet[QueryEmbeddingCache]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_open_caches():
+    for cache in list(_open_caches):
+        cache.flush()
+
+
+class QueryEmbeddingCache:
+    """
+    クエリ文字列 -> 正規化済みembedding の上限付きLRUキャッシュ（スレッドセーフ）
+    """
+
+    def __init__(self, max_size: int = 10000, path: Optional[str] = None,
+                 model_name: str = "", dimension: int = 0,
+                 save_every: int = 256, save_interval: float = 300.0):
+        """
+        Args:
+            max_size: 保持する最大件数
+            path: 永続化ファイル（.npz）のパス（Noneの場合は永続化しない）
+            model_name: 埋め込みモデル名（永続化ファイルの整合性チェック用）
+            dimension: embedding次元（同上）
+            save_every: maybe_save で保存する未保存件数
+            save_interval: maybe_save で保存する前回保存からの経過時間（秒）
+        """
+        self.max_size = max_size
+        self.path = Path(path) if path else None
+        self.model_name = model_name
+        self.dimension = dimension
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.save_every = save_every
+        self.save_interval = save_interval
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+        if self.path:
+            self._load()
+            _open_caches.add(self)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """キャッシュ済みのembeddingを取得（ヒットしたキーのみ）"""
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = vector
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        """embeddingを登録（上限を超えた分は最も古いものから削除）"""
+        if not items or self.max_size <= 0:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._entries[key] = vector
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._unsaved += len(items)
+
+    def stats(self) -> Dict[str, float]:
+        """ヒット・ミス件数とヒット率"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _load(self):
+        """永続化ファイルを読み込み（モデル・次元が一致する場合のみ）"""
+        if not self.path.exists():
+            return
+        try:
+            with np.load(str(self.path), allow_pickle=False) as data:
+                if str(data["model_name"]) != self.model_name or data["vectors"].shape[1:] != (self.dimension,):
+                    logger.info(f"Query embedding cache is for another model, ignoring: {self.path.name}")
+                    return
+                keys = data["keys"].tolist()
+                vectors = data["vectors"]
+            for key, vector in zip(keys[-self.max_size:], vectors[-self.max_size:]):
+                self._entries[key] = vector
+            logger.info(f"Query embedding cache loaded: {len(self._entries)} entries")
+        except Exception as e:
+            logger.warning(f"Failed to load query embedding cache: {e}")
+
+    def maybe_save(self):
+        """未保存の件数・経過時間が閾値を超えていれば保存（検索のたびに呼んでよい）"""
+        if not self.path or not self._unsaved:
+            return
+        if self._unsaved >= self.save_every or time.monotonic() - self._last_save >= self.save_interval:
+            self.flush()
+
+    def flush(self):
+        """変更があればディスクに保存（LRU順を保持）"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._unsaved:
+                return
+            keys = list(self._entries.keys())
+            vectors = (np.stack(list(self._entries.values())) if keys
+                       else np.zeros((0, self.dimension), dtype='float32'))
+            unsaved, self._unsaved = self._unsaved, 0
+            self._last_save = time.monotonic()
+        tmp_path = None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 書き込み途中のファイルを読まないよう、プロセスごとに一意な一時ファイル経由で置換
+            with tempfile.NamedTemporaryFile(dir=self.path.parent, prefix=self.path.stem + ".",
+                                             suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                np.savez(f, keys=np.array(keys, dtype=str), vectors=vectors,
+                         model_name=np.array(self.model_name))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Failed to save query embedding cache: {e}")
+            with self._lock:
+                self._unsaved += unsaved
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
@@ -11,11 +11,13 @@ import re
 import io
 import base64
 import hashlib
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Callable, Iterator, List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from dotenv import load_dotenv
-from anthropic import Anthropic
 from loguru import logger
 import PyPDF2
 
@@ -49,7 +51,19 @@ from pipelines.schemas import (
     CostType
 )
 from pipelines.cost_tracker import record_cost
+from pipelines.llm_client import create_llm_client
 from pipelines.estimation_rules import EstimationChecker, get_checklist_summary
+from pipelines.model_registry import get_embedding_model, acquire_kb_index
+from pipelines.embedding_cache import QueryEmbeddingCache
+from pipelines.config_loader import load_config_section
+from pipelines.synonym_matcher import SynonymMatcher, normalize_text
+from pipelines.lexical_index import NgramIndex, reciprocal_rank_fusion
+from pipelines.kb_scorer import KBRowFeatures, KBMatchScorer
+from pipelines.unit_classes import unit_class, units_compatible, is_high_value_lump_sum
+from pipelines.price_matcher import PriceMatcher, PricePrefetcher, PRESETS, load_price_matching_config
+from pipelines.match_cache import MatchResultCache, policy_cache_key
+from pipelines.stage_dag import Stage, StageCache, StageDAG
+from pipelines.json_stream import IncrementalJSONArrayParser
 
 
 def repair_json_array(json_str: str) -> str:
@@ -312,6 +326,9 @@ SYNONYM_DICT = {
     "多機能便所": ["多目的トイレ", "バリアフリートイレ", "車椅子トイレ", "多機能トイレ"],
 }
 
+# 類義語辞書をAho-Corasickオートマトンにコンパイル（インポート時に1回）
+SYNONYM_MATCHER = SynonymMatcher(SYNONYM_DICT)
+
 # 高額機器リスト（単価妥当性チェック用）
 # 高額機器の最低価格（本体・一式の場合のみ適用）
 # 注意：「点検」「保守」「配管」「配線」等を含む項目には適用しない
@@ -373,6 +390,95 @@ MAX_PRICE_EXCLUDE_KEYWORDS = [
     "キュービクル", "受変電", "発電機",  # 高額機器は除外
 ]
 
+# 文字列マッチング（フォールバック）の候補数
+# BM25（文字n-gram）上位とベクトル検索上位をRRFで統合し、上位のみをスコアリングする
+LEXICAL_CANDIDATES = 100
+FALLBACK_CANDIDATES = 100
+
+
+# ベクトルインデックス設定（configs/config.yaml の vectordb セクション）
+DEFAULT_VECTORDB_CONFIG = {
+    "index_type": "IndexFlatIP",  # IndexFlatIP | HNSW | IVF | IVFPQ | faissのindex_factory文字列
+    "ann_min_rows": 10000,        # これ未満のパーティションは総当たり（IndexFlatIP）
+    "hnsw_m": 32,
+    "hnsw_ef_search": 64,
+    "ivf_nlist": 0,               # 0 = 自動（4√N）
+    "ivf_nprobe": 16,
+    "pq_m": 0,                    # 0 = 自動（次元/8）
+    "query_cache_size": 10000,    # クエリembeddingのLRUキャッシュ件数（0で無効）
+    "query_cache_persist": True,  # クエリembeddingキャッシュをインデックスと同じディレクトリに保存
+    "query_cache_save_every": 256,  # 未保存のクエリがこの件数に達したら保存
+    "query_cache_save_interval": 300,  # 前回保存からこの秒数が経過したら保存（その他は見積終了時・プロセス終了時）
+}
+
+
+def load_vectordb_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    configs/config.yamlからベクトルインデックス設定を読み込み
+
+    Args:
+        config_path: 設定ファイルのパス（Noneの場合はconfigs/config.yaml）
+
+    Returns:
+        vectordb設定（未設定の項目はデフォルト値）
+    """
+    return load_config_section("vectordb", DEFAULT_VECTORDB_CONFIG, config_path)
+
+
+# LLM呼び出し設定（configs/config.yaml の llm セクション）
+DEFAULT_LLM_CONFIG = {
+    "max_concurrency": 6,  # 統合見積で工事区分ごとの項目生成を同時に実行する数（1 = 逐次）
+    "vision_max_concurrency": 4,  # 諸元表・図面のページごとのVision API呼び出しを同時に実行する数
+    "stage_max_concurrency": 4,  # 仕様書解析パイプラインで同時に実行するステージ数
+    "prompt_cache": True,  # 工事区分ごとの項目生成で共通の仕様書・建物情報をプロンプトキャッシュする
+    "shared_spec_chars": 30000,  # 共通プレフィックスに含める仕様書テキストの最大文字数
+    "stream_items": True,  # 項目生成の応答をストリーミングで受信し、完成した項目から順に処理する
+    "prefetch_prices": True,  # 統合見積で、生成中の項目の単価マッチングを先行実行する（結果キャッシュ使用時）
+}
+
+
+def load_llm_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """configs/config.yaml の llm セクションを読み込み"""
+    return load_config_section("llm", DEFAULT_LLM_CONFIG, config_path)
+
+
+# 仕様書解析ステージのキャッシュバージョン（プロンプト・抽出処理を変更したら更新）
+SPEC_STAGE_VERSIONS = {
+    "spec_text": "1",
+    "extracted_info": "1",
+    "spec_table": "1",
+    "spec_table_vision": "1",
+    "drawing_info": "1",
+}
+
+# 生成項目・仕様書解析ステージ出力のキャッシュ
+ESTIMATE_CACHE_DIR = "cache/estimates"
+
+# Vision APIで解析するページ（1-indexed）と描画解像度
+SPEC_TABLE_VISION_PAGES = [39, 40]  # 諸元表
+SPEC_TABLE_VISION_DPI = 200
+DRAWING_PAGE_RANGE = (41, 49)  # 図面（先頭から最大 DRAWING_MAX_PAGES ページ）
+DRAWING_MAX_PAGES = 5
+DRAWING_DPI = 150
+
+
+def pdf_cache_hash(pdf_path: str) -> str:
+    """PDFファイルのハッシュ（キャッシュキー用）"""
+    with open(pdf_path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()[:12]
+
+
+def items_cache_path(pdf_path: str, cache_dir: str = ESTIMATE_CACHE_DIR) -> Path:
+    """生成項目のキャッシュファイルのパス"""
+    pdf_name = Path(pdf_path).stem[:30]  # ファイル名の先頭30文字
+    return Path(cache_dir) / f"{pdf_name}_{pdf_cache_hash(pdf_path)}_items.json"
+
+
+def spec_stage_cache(pdf_path: str, model_name: str, cache_dir: str = ESTIMATE_CACHE_DIR) -> StageCache:
+    """仕様書解析ステージの出力キャッシュ（PDFハッシュ・モデル名がキー）"""
+    pdf_hash = pdf_cache_hash(pdf_path)
+    return StageCache(cache_dir, f"{Path(pdf_path).stem[:30]}_{pdf_hash}", {"pdf_hash": pdf_hash, "model": model_name})
+
 
 # ===== ベクトル検索クラス =====
 class VectorKBSearch:
@@ -381,15 +487,49 @@ class VectorKBSearch:
 
     sentence-transformersで日本語テキストをベクトル化し、
     FAISSで高速な類似度検索を行います。
+
+    検索は工事区分ごとのパーティションで行います。index_dirを指定した場合、
+    全体インデックス（差分更新の元データ）はメモリマップで読み込み、パーティションは
+    内容のダイジェスト名で保存・再利用するため、常駐するのはパーティションのみです。
     """
 
-    def __init__(self, model_name: str = "intfloat/multilingual-e5-small"):
+    # パーティションの構築に使う設定（変わるとパーティションを作り直す）
+    BUILD_CONFIG_KEYS = ("index_type", "ann_min_rows", "hnsw_m", "ivf_nlist", "pq_m")
+    # 検索結果（候補）に影響する設定
+    SEARCH_CONFIG_KEYS = BUILD_CONFIG_KEYS + ("hnsw_ef_search", "ivf_nprobe")
+
+    def __init__(
+        self,
+        model_name: str = "intfloat/multilingual-e5-small",
+        index_dir: Optional[str] = None,
+        model: Any = None,
+        index_config: Optional[Dict[str, Any]] = None
+    ):
         """
         Args:
             model_name: 使用するembeddingモデル名
                 推奨: "intfloat/multilingual-e5-small" (高速・日本語対応)
                 高精度: "intfloat/multilingual-e5-base"
+            index_dir: インデックス永続化ディレクトリ（Noneの場合は永続化しない）
+            model: ロード済みモデル（Noneの場合は共有レジストリから取得）
+            index_config: 検索インデックス設定（Noneの場合はconfigs/config.yamlのvectordb）
         """
+        self.model_name = model_name
+        self.index_config = dict(DEFAULT_VECTORDB_CONFIG)
+        self.index_config.update(index_config if index_config is not None else load_vectordb_config())
+        self.query_cache: Optional[QueryEmbeddingCache] = None
+        self.index_dir = Path(index_dir) if index_dir else None
+        self.kb_hash = None
+        # FAISS ID -> テキストハッシュ（差分更新用）、FAISS ID -> kb_items上の位置
+        self._entries: Optional[Dict[int, str]] = None
+        self._id_to_pos: Dict[int, int] = {}
+        # 工事区分（KBのdiscipline文字列）ごとのサブインデックス
+        self._partitions: Dict[str, Any] = {}
+        self._partition_meta: Dict[str, Dict[str, Any]] = {}  # 工事区分 -> {digest, kind, rows}（永続化用）
+        self._partition_cache: Dict[str, List[str]] = {}
+        # 全体インデックスがメモリマップか（index_dirに保存した場合。常駐するのはパーティションのみ）
+        self._store_mapped = False
+
         if not HAS_VECTOR_SEARCH:
             logger.warning("Vector search not available - using fallback string matching")
             self.model = None
@@ -399,7 +539,7 @@ class VectorKBSearch:
 
         logger.info(f"Initializing vector search with model: {model_name}")
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = model if model is not None else get_embedding_model(model_name)
             self.index = None
             self.kb_items = []
             self.dimension = self.model.get_sentence_embedding_dimension()
@@ -409,11 +549,198 @@ class VectorKBSearch:
             self.model = None
             self.index = None
             self.kb_items = []
+            return
+
+        cache_path = None
+        if self.index_dir and self.index_config.get("query_cache_persist"):
+            model_slug = re.sub(r'[^0-9A-Za-z._-]', '_', self.model_name)
+            cache_path = self.index_dir / f"{model_slug}.query_cache.npz"
+        self.query_cache = QueryEmbeddingCache(
+            max_size=int(self.index_config.get("query_cache_size", 0)),
+            path=cache_path,
+            model_name=self.model_name,
+            dimension=self.dimension,
+            save_every=int(self.index_config.get("query_cache_save_every", 256)),
+            save_interval=float(self.index_config.get("query_cache_save_interval", 300))
+        )
+
+    @staticmethod
+    def _build_passage_texts(kb_items: List[Dict]) -> List[str]:
+        """KB項目からembedding用テキストを生成（項目名 + 仕様 + 工事区分）"""
+        texts = []
+        for item in kb_items:
+            desc = item.get("description", "")
+            spec = item.get("features", {}).get("specification", "")
+            discipline = item.get("discipline", "")
+            # E5モデル用のプレフィックス
+            texts.append(f"passage: {desc} {spec} {discipline}")
+        return texts
+
+    @staticmethod
+    def _hash_passage_texts(texts: List[str], model_name: str) -> str:
+        """KB内容とモデル名からインデックスのキーとなるハッシュを計算"""
+        hasher = hashlib.sha256(model_name.encode("utf-8"))
+        for text in texts:
+            hasher.update(b"\x00")
+            hasher.update(text.encode("utf-8"))
+        return hasher.hexdigest()[:16]
+
+    @classmethod
+    def compute_kb_version(cls, kb_items: List[Dict], model_name: str) -> str:
+        """KB項目リストのインデックスバージョン（build_indexと同じハッシュ）"""
+        return cls._hash_passage_texts(cls._build_passage_texts(kb_items), model_name)
+
+    @staticmethod
+    def _vector_id(key: str) -> int:
+        """項目キーから安定したFAISS ID（非負int64）を生成"""
+        digest = hashlib.sha256(key.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big") & 0x7FFFFFFFFFFFFFFF
+
+    @classmethod
+    def _build_vector_ids(cls, kb_items: List[Dict], texts: List[str]) -> List[int]:
+        """
+        KB項目ごとの安定IDを生成
+
+        item_idがあればそれを、なければembedding用テキストをキーにします。
+        同一キーが重複する場合は出現順の連番で区別します。
+        """
+        ids = []
+        seen: Dict[str, int] = {}
+        for item, text in zip(kb_items, texts):
+            key = str(item.get("item_id") or f"text:{text}")
+            count = seen.get(key, 0)
+            seen[key] = count + 1
+            ids.append(cls._vector_id(key if count == 0 else f"{key}#{count}"))
+        return ids
+
+    def _model_slug(self) -> str:
+        return re.sub(r'[^0-9A-Za-z._-]', '_', self.model_name)
+
+    def _store_paths(self):
+        """永続化ファイルのパス（ID付きFAISSインデックス, マニフェスト）"""
+        model_slug = self._model_slug()
+        return (
+            self.index_dir / f"{model_slug}.faiss",
+            self.index_dir / f"{model_slug}.manifest.json",
+        )
+
+    def _partition_path(self, digest: str) -> Path:
+        """工事区分パーティションの永続化ファイル（内容のダイジェストで命名）"""
+        return self.index_dir / f"{self._model_slug()}.part-{digest}.faiss"
+
+    @staticmethod
+    def _read_store(index_path: Path, mmap: bool):
+        """
+        全体インデックスを読み込む
+
+        mmap=Trueの場合はベクトルをメモリマップし、常駐メモリに載せません
+        （全体インデックスは差分更新とパーティション構築の元データで、検索には使わないため）。
+        """
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) if mmap else 0
+        return faiss.read_index(str(index_path), flags)
+
+    def _load_persisted_store(self):
+        """
+        永続化済みのインデックスとマニフェストを読み込む（インデックスはメモリマップ）
+
+        Returns:
+            (index, entries, partitions) entriesは {FAISS ID: テキストハッシュ}、
+            partitionsは {工事区分: パーティション情報}。存在しない・不整合の場合はNone
+        """
+        if not self.index_dir:
+            return None
+        index_path, manifest_path = self._store_paths()
+        if not index_path.exists() or not manifest_path.exists():
+            return None
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("model_name") != self.model_name or manifest.get("dimension") != self.dimension:
+                logger.info(f"Persisted vector index is for another model, rebuilding: {index_path.name}")
+                return None
+            entries = {int(vector_id): text_hash for vector_id, text_hash in manifest.get("entries", {}).items()}
+            index = self._read_store(index_path, mmap=True)
+            stored_ids = faiss.vector_to_array(index.id_map) if hasattr(index, "id_map") else None
+            if stored_ids is None or set(stored_ids.tolist()) != set(entries):
+                logger.warning(f"Persisted vector index is inconsistent, rebuilding: {index_path.name}")
+                return None
+            return index, entries, manifest.get("partitions", {})
+        except Exception as e:
+            logger.warning(f"Failed to load persisted vector index: {e}")
+            return None
+
+    def _persist_store(self, write_store: bool = True) -> bool:
+        """
+        インデックス・パーティション・マニフェストを保存し、不要になったファイルを削除
+
+        Args:
+            write_store: 全体インデックスも書き込む（Falseはパーティションとマニフェストのみ）
+
+        Returns:
+            保存できた場合True
+        """
+        if not self.index_dir:
+            return False
+        try:
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            index_path, manifest_path = self._store_paths()
+            manifest = {
+                "model_name": self.model_name,
+                "dimension": self.dimension,
+                "kb_hash": self.kb_hash,
+                "entries": {str(vector_id): text_hash for vector_id, text_hash in self._entries.items()},
+                "partitions": self._partition_meta,
+            }
+            # 書き込み途中のファイルを読まないよう一時ファイル経由で置換
+            # （パーティションは内容のダイジェストで命名するため、既存のファイルは書き直さない）
+            for kb_discipline, meta in self._partition_meta.items():
+                partition_path = self._partition_path(meta["digest"])
+                if not partition_path.exists():
+                    tmp_partition = partition_path.with_name(partition_path.name + ".tmp")
+                    faiss.write_index(self._partitions[kb_discipline], str(tmp_partition))
+                    os.replace(tmp_partition, partition_path)
+            if write_store:
+                tmp_index = index_path.with_name(index_path.name + ".tmp")
+                faiss.write_index(self.index, str(tmp_index))
+                os.replace(tmp_index, index_path)
+            tmp_manifest = manifest_path.with_name(manifest_path.name + ".tmp")
+            with open(tmp_manifest, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_manifest, manifest_path)
+
+            # KBハッシュ別に保存していた旧形式（{model}_{hash}.faiss/.npy）と、参照されなくなったパーティションを削除
+            model_slug = index_path.stem
+            legacy_pattern = re.compile(rf'^{re.escape(model_slug)}_[0-9a-f]{{16}}\.(faiss|npy)$')
+            partition_pattern = re.compile(rf'^{re.escape(model_slug)}\.part-([0-9a-f]{{16}})\.faiss$')
+            current_digests = {meta["digest"] for meta in self._partition_meta.values()}
+            for old in self.index_dir.iterdir():
+                partition_match = partition_pattern.match(old.name)
+                if legacy_pattern.match(old.name) or (partition_match and partition_match.group(1) not in current_digests):
+                    old.unlink(missing_ok=True)
+            logger.info(f"Vector index saved: {index_path} ({len(self._partition_meta)} partitions)")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to persist vector index: {e}")
+            return False
+
+    def _encode_passages(self, texts: List[str]) -> "np.ndarray":
+        """パッセージをベクトル化して正規化"""
+        embeddings = self.model.encode(texts, show_progress_bar=False)
+        embeddings = np.array(embeddings).astype('float32')
+        # 正規化（コサイン類似度計算のため）
+        faiss.normalize_L2(embeddings)
+        return embeddings
 
     def build_index(self, kb_items: List[Dict]) -> bool:
         """
         KBアイテムからFAISSインデックスを構築
 
+        項目ごとに安定ID（item_id由来）を振ったIndexIDMap2を使います。
+        既存のインデックス（メモリ上、なければindex_dirの永続化分）があれば
+        差分を取り、追加・変更された項目だけをエンコードして追加、
+        削除・変更された項目を除去してから保存します。
+        工事区分パーティションも変更のあった工事区分だけを更新し、永続化分を再利用します。
+
         Args:
             kb_items: KB項目のリスト
 
@@ -423,42 +750,365 @@ class VectorKBSearch:
         if not self.model or not kb_items:
             return False
 
-        self.kb_items = kb_items
+        texts = self._build_passage_texts(kb_items)
+        vector_ids = self._build_vector_ids(kb_items, texts)
+        text_hashes = [hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] for text in texts]
+        kb_hash = self._hash_passage_texts(texts, self.model_name)
+
+        # 差分の基準となるインデックスと、更新前のパーティション
+        if self.index is not None and self._entries is not None:
+            base = (self.index, self._entries, self._store_mapped)
+            previous = {
+                kb_discipline: (self._partitions[kb_discipline], meta)
+                for kb_discipline, meta in self._partition_meta.items()
+            }
+        else:
+            persisted = self._load_persisted_store()
+            base = (persisted[0], persisted[1], True) if persisted else None
+            previous = {kb_discipline: (None, meta) for kb_discipline, meta in (persisted[2] if persisted else {}).items()}
+        previous_entries = base[1] if base else {}
 
-        # KB項目からテキストを生成（項目名 + 仕様 + 工事区分）
-        texts = []
-        for item in kb_items:
-            desc = item.get("description", "")
-            spec = item.get("features", {}).get("specification", "")
-            discipline = item.get("discipline", "")
-            # E5モデル用のプレフィックス
-            text = f"passage: {desc} {spec} {discipline}"
-            texts.append(text)
+        try:
+            index, changed, mapped = self._apply_changes(base, texts, vector_ids, text_hashes)
+            if index.ntotal != len(texts) and base is not None:
+                logger.warning("Vector index is inconsistent after update, rebuilding from scratch")
+                index, changed, mapped = self._apply_changes(None, texts, vector_ids, text_hashes)
+                previous, previous_entries = {}, {}
+            if index.ntotal != len(texts):
+                raise ValueError(f"index size mismatch: {index.ntotal} != {len(texts)}")
+
+            new_entries = dict(zip(vector_ids, text_hashes))
+            changed_ids = {vector_id for vector_id, text_hash in new_entries.items()
+                           if previous_entries.get(vector_id) != text_hash}
+            changed_ids.update(vector_id for vector_id in previous_entries if vector_id not in new_entries)
+
+            self.index = index
+            self._store_mapped = mapped
+            self._entries = new_entries
+            self._id_to_pos = {vector_id: pos for pos, vector_id in enumerate(vector_ids)}
+            self.kb_items = kb_items
+            self.kb_hash = kb_hash
+            partitions_changed = self._build_partitions(changed_ids, previous)
+
+            if changed or partitions_changed:
+                if changed:
+                    logger.info(f"Vector index built successfully: {self.index.ntotal} vectors")
+                if self._persist_store(write_store=changed) and not self._store_mapped:
+                    # 保存した全体インデックスはメモリマップに切り替え（常駐するのはパーティションのみ）
+                    self.index = self._read_store(self._store_paths()[0], mmap=True)
+                    self._store_mapped = True
+            else:
+                logger.info(f"Vector index loaded from disk: {self.index.ntotal} vectors")
+            return True
 
-        logger.info(f"Building vector index for {len(texts)} KB items...")
+        except Exception as e:
+            logger.error(f"Failed to build vector index: {e}")
+            return False
 
-        try:
-            # ベクトル化
-            embeddings = self.model.encode(texts, show_progress_bar=False)
-            embeddings = np.array(embeddings).astype('float32')
+    def _apply_changes(self, base, texts: List[str], vector_ids: List[int], text_hashes: List[str]):
+        """
+        基準インデックスにKBの差分を反映
 
-            # FAISSインデックス構築（L2距離）
-            self.index = faiss.IndexFlatIP(self.dimension)  # 内積（コサイン類似度用）
+        基準インデックスは変更がある場合だけ複製（メモリマップの場合はファイルから読み込み）してから
+        更新するため、検索中の参照やメモリマップを壊しません。
 
-            # 正規化（コサイン類似度計算のため）
-            faiss.normalize_L2(embeddings)
-            self.index.add(embeddings)
+        Args:
+            base: (index, {FAISS ID: テキストハッシュ}, メモリマップか)、Noneの場合は空から構築
 
-            logger.info(f"Vector index built successfully: {self.index.ntotal} vectors")
-            return True
+        Returns:
+            (index, 変更があったか, indexがメモリマップか)
+        """
+        if base is None:
+            logger.info(f"Building vector index for {len(texts)} KB items...")
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))  # 内積（コサイン類似度用）
+            base_entries: Dict[int, str] = {}
+            mapped = False
+        else:
+            index, base_entries, mapped = base
+
+        new_entries = dict(zip(vector_ids, text_hashes))
+        stale_ids = [vector_id for vector_id, text_hash in base_entries.items()
+                     if new_entries.get(vector_id) != text_hash]
+        add_positions = [pos for pos, vector_id in enumerate(vector_ids)
+                         if base_entries.get(vector_id) != text_hashes[pos]]
+
+        if base is not None and (stale_ids or add_positions):
+            logger.info(
+                f"Updating vector index incrementally: "
+                f"-{len(stale_ids)} / +{len(add_positions)} of {len(texts)} KB items"
+            )
+            # メモリマップは書き換えられない（複製もできない）ためファイルから読み込む
+            index = self._read_store(self._store_paths()[0], mmap=False) if mapped else faiss.clone_index(index)
+            mapped = False
+
+        if stale_ids:
+            index.remove_ids(np.array(stale_ids, dtype='int64'))
+        if add_positions:
+            embeddings = self._encode_passages([texts[pos] for pos in add_positions])
+            index.add_with_ids(embeddings, np.array([vector_ids[pos] for pos in add_positions], dtype='int64'))
+
+        return index, base is None or bool(stale_ids or add_positions), mapped
+
+    def _partition_digest(self, vector_ids: List[int]) -> str:
+        """パーティションの内容（構築設定・項目ID・テキストハッシュ）のダイジェスト"""
+        build_config = {key: self.index_config.get(key) for key in self.BUILD_CONFIG_KEYS}
+        hasher = hashlib.sha256(json.dumps(build_config, sort_keys=True).encode())
+        for vector_id in sorted(vector_ids):
+            hasher.update(f"{vector_id}:{self._entries[vector_id]}\n".encode("utf-8"))
+        return hasher.hexdigest()[:16]
+
+    def _build_partitions(self, changed_ids: set, previous: Dict[str, Tuple[Any, Dict[str, Any]]]) -> bool:
+        """
+        工事区分ごとのサブインデックスを構築
+
+        全体インデックスのベクトルを工事区分（汎用の設備工事を含む）ごとに分け、
+        工事区分フィルタ付き検索で必要なパーティションだけを検索できるようにします。
+        内容の変わらないパーティションは更新前のもの（メモリ上・永続化分）を再利用し、
+        変更のあったパーティションは可能なら差分だけを反映します（IVFは再学習しない）。
+
+        Args:
+            changed_ids: 追加・変更・削除された項目のFAISS ID
+            previous: 更新前の {工事区分: (パーティション（未読み込みはNone）, パーティション情報)}
 
+        Returns:
+            新たに構築・更新したパーティションがある場合True（要保存）
+        """
+        groups: Dict[str, List[int]] = {}
+        for vector_id, pos in self._id_to_pos.items():
+            groups.setdefault(self.kb_items[pos].get("discipline", ""), []).append(vector_id)
+
+        store_rows = None
+        partitions, partition_meta = {}, {}
+        counts = {"reused": 0, "updated": 0, "built": 0}
+        for kb_discipline, vector_ids in groups.items():
+            digest = self._partition_digest(vector_ids)
+            previous_index, previous_meta = previous.get(kb_discipline, (None, None))
+
+            # 内容が同じパーティション（更新前のもの、なければ永続化分）を再利用
+            partition, meta = None, None
+            if previous_meta and previous_meta["digest"] == digest:
+                partition = previous_index
+                if partition is None and self.index_dir:
+                    partition = self._load_partition(digest, len(vector_ids))
+                meta = previous_meta
+            elif self.index_dir:
+                partition = self._load_partition(digest, len(vector_ids))  # 他のプロセスが保存済み
+                meta = {"digest": digest, "kind": self._partition_kind(partition), "rows": len(vector_ids)} \
+                    if partition is not None else None
+            if partition is not None:
+                counts["reused"] += 1
+            else:
+                if store_rows is None:
+                    store_rows = {int(v): row for row, v in enumerate(faiss.vector_to_array(self.index.id_map))}
+                if previous_meta and previous_index is None and self.index_dir:
+                    previous_index = self._load_partition(previous_meta["digest"])
+                updated = None
+                if previous_index is not None:
+                    updated = self._update_partition(previous_index, previous_meta, vector_ids, changed_ids, store_rows)
+                if updated is not None:
+                    # rows は学習時の件数のまま（差分更新を重ねて件数が大きく変わったら作り直す）
+                    partition = updated
+                    meta = dict(previous_meta, digest=digest)
+                    counts["updated"] += 1
+                else:
+                    vectors = self.index.index.reconstruct_batch(
+                        np.array([store_rows[v] for v in vector_ids], dtype='int64')
+                    )
+                    partition = self.create_search_index(vectors, np.array(vector_ids, dtype='int64'), self.index_config)
+                    meta = {"digest": digest, "kind": self._partition_kind(partition), "rows": len(vector_ids)}
+                    counts["built"] += 1
+            partitions[kb_discipline] = partition
+            partition_meta[kb_discipline] = meta
+
+        self._partitions = partitions
+        self._partition_meta = partition_meta
+        self._partition_cache = {}
+        logger.debug(
+            f"Vector index partitions: { {k: p.ntotal for k, p in partitions.items()} } "
+            f"(reused {counts['reused']}, updated {counts['updated']}, built {counts['built']})"
+        )
+        return bool(counts["updated"] or counts["built"]) or set(previous) != set(partitions)
+
+    def _load_partition(self, digest: str, n_rows: Optional[int] = None):
+        """永続化済みのパーティションを読み込み（存在しない・件数が合わない場合はNone）"""
+        path = self._partition_path(digest)
+        if not path.exists():
+            return None
+        try:
+            partition = faiss.read_index(str(path))
         except Exception as e:
-            logger.error(f"Failed to build vector index: {e}")
-            return False
+            logger.warning(f"Failed to load vector index partition {path.name}: {e}")
+            return None
+        if n_rows is not None and partition.ntotal != n_rows:
+            return None
+        self.apply_search_params(partition, self.index_config)
+        return partition
+
+    def _update_partition(self, partition, meta: Dict[str, Any], vector_ids: List[int],
+                          changed_ids: set, store_rows: Dict[int, int]):
+        """
+        既存のパーティションに差分（削除・追加）だけを反映
+
+        インデックスの種類が変わる場合、IVFの学習時から件数が大きく変わった場合、
+        削除のあるHNSW（削除に非対応）の場合は None（作り直す）を返します。
+        """
+        spec = self._partition_spec(len(vector_ids), self.dimension, self.index_config)
+        if meta.get("kind") != self._spec_kind(spec):
+            return None
+        if meta["kind"].startswith("IVF") and not 0.5 <= len(vector_ids) / max(1, meta["rows"]) <= 2:
+            return None
+
+        old_ids = set(self._partition_ids(partition).tolist())
+        new_ids = set(vector_ids)
+        remove_ids = [v for v in old_ids if v not in new_ids or v in changed_ids]
+        add_ids = [v for v in vector_ids if v not in old_ids or v in changed_ids]
+        if remove_ids and meta["kind"].startswith("HNSW"):
+            return None
+
+        updated = faiss.clone_index(partition)
+        if remove_ids:
+            updated.remove_ids(np.array(remove_ids, dtype='int64'))
+        if add_ids:
+            vectors = self.index.index.reconstruct_batch(np.array([store_rows[v] for v in add_ids], dtype='int64'))
+            updated.add_with_ids(vectors, np.array(add_ids, dtype='int64'))
+        self.apply_search_params(updated, self.index_config)
+        return updated
+
+    @staticmethod
+    def _spec_kind(spec: Optional[str]) -> str:
+        """インデックスの種類（IVFのリスト数を除いたindex_factory文字列、総当たりはFlat）"""
+        return "Flat" if spec is None else re.sub(r'IVF\d+', 'IVF', spec)
+
+    @staticmethod
+    def _inner_index(index):
+        return faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+
+    @classmethod
+    def _partition_kind(cls, partition) -> str:
+        """構築済みパーティションの種類（_spec_kind と同じ表記）"""
+        inner = cls._inner_index(partition)
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            pq = faiss.downcast_index(ivf)
+            return f"IVF,PQ{pq.pq.M}" if hasattr(pq, "pq") else "IVF,Flat"
+        if hasattr(inner, "hnsw"):
+            return f"HNSW{inner.hnsw.nb_neighbors(1)}"
+        return "Flat"
+
+    @classmethod
+    def _partition_ids(cls, partition) -> "np.ndarray":
+        """パーティションに含まれるFAISS ID"""
+        if hasattr(partition, "id_map"):
+            return faiss.vector_to_array(partition.id_map)
+        invlists = faiss.try_extract_index_ivf(partition).invlists
+        ids = [
+            faiss.rev_swig_ptr(invlists.get_ids(list_no), invlists.list_size(list_no)).copy()
+            for list_no in range(invlists.nlist) if invlists.list_size(list_no)
+        ]
+        return np.concatenate(ids) if ids else np.array([], dtype='int64')
+
+    @staticmethod
+    def _factory_spec(index_type: str, n_rows: int, dimension: int, config: Dict[str, Any]) -> Optional[str]:
+        """index_type設定をfaiss.index_factoryの文字列に変換（総当たりの場合はNone）"""
+        normalized = index_type.replace(" ", "").upper()
+        if normalized in ("INDEXFLATIP", "FLAT", "FLATIP"):
+            return None
+
+        nlist = int(config.get("ivf_nlist") or 0)
+        if nlist <= 0:
+            nlist = int(4 * np.sqrt(n_rows))
+        # 各クラスタに最低39件の学習データが必要
+        nlist = max(1, min(nlist, n_rows // 39))
+
+        pq_m = int(config.get("pq_m") or 0)
+        if pq_m <= 0 or dimension % pq_m != 0:
+            pq_m = next(m for m in range(max(1, dimension // 8), 0, -1) if dimension % m == 0)
+
+        if normalized == "HNSW":
+            return f"HNSW{int(config.get('hnsw_m', 32))}"
+        if normalized == "IVF":
+            return f"IVF{nlist},Flat"
+        if normalized in ("IVFPQ", "IVF,PQ"):
+            # PQの符号帳（256セントロイド）の学習に必要な件数に満たない場合は圧縮しない
+            if n_rows < 256 * 39:
+                return f"IVF{nlist},Flat"
+            return f"IVF{nlist},PQ{pq_m}"
+        return index_type
+
+    @classmethod
+    def _partition_spec(cls, n_rows: int, dimension: int, config: Dict[str, Any]) -> Optional[str]:
+        """パーティションに使うindex_factory文字列（総当たりの場合はNone）"""
+        spec = cls._factory_spec(str(config.get("index_type") or "IndexFlatIP"), n_rows, dimension, config)
+        if spec is None or n_rows < int(config.get("ann_min_rows", 0)):
+            return None
+        return spec
+
+    @classmethod
+    def apply_search_params(cls, index, config: Dict[str, Any]):
+        """検索時のパラメータ（IVFのnprobe・HNSWのefSearch）を設定（永続化分の読み込み後にも適用）"""
+        inner = cls._inner_index(index)
+        ivf = faiss.try_extract_index_ivf(inner)
+        if ivf is not None:
+            ivf.nprobe = int(config.get("ivf_nprobe", 16))
+        if hasattr(inner, "hnsw"):
+            inner.hnsw.efSearch = int(config.get("hnsw_ef_search", 64))
+
+    @classmethod
+    def create_search_index(cls, vectors: "np.ndarray", vector_ids: "np.ndarray", config: Dict[str, Any]):
+        """
+        正規化済みベクトルから検索用インデックスを作成
+
+        index_typeがHNSW/IVF/IVFPQの場合は近似最近傍インデックス（内積）を、
+        件数がann_min_rows未満またはIndexFlatIPの場合は総当たりインデックスを作成します。
+        IVF系はFAISS IDを直接格納し（削除・追加で差分更新できる）、その他はIndexIDMapで包みます。
+
+        Args:
+            vectors: 正規化済みベクトル（float32, N x 次元）
+            vector_ids: ベクトルごとのFAISS ID（int64）
+            config: vectordb設定
+
+        Returns:
+            ID付きFAISSインデックス
+        """
+        n_rows, dimension = vectors.shape
+        spec = cls._partition_spec(n_rows, dimension, config)
+        if spec is None:
+            inner = faiss.IndexFlatIP(dimension)
+        else:
+            try:
+                inner = faiss.index_factory(dimension, spec, faiss.METRIC_INNER_PRODUCT)
+                if not inner.is_trained:
+                    # 学習はサンプルで十分（セントロイドあたり64件程度）
+                    ivf = faiss.try_extract_index_ivf(inner)
+                    train_rows = max(64 * (ivf.nlist if ivf is not None else 1), 64 * 256)
+                    if n_rows > train_rows:
+                        sample = np.random.default_rng(0).choice(n_rows, train_rows, replace=False)
+                        inner.train(vectors[np.sort(sample)])
+                    else:
+                        inner.train(vectors)
+            except Exception as e:
+                logger.warning(f"Failed to create '{spec}' index, falling back to IndexFlatIP: {e}")
+                inner = faiss.IndexFlatIP(dimension)
+
+        index = inner if faiss.try_extract_index_ivf(inner) is not None else faiss.IndexIDMap(inner)
+        index.add_with_ids(vectors, vector_ids)
+        cls.apply_search_params(index, config)
+        return index
+
+    def _select_partitions(self, discipline: str) -> List[str]:
+        """工事区分フィルタを満たすパーティション（部分一致 + 汎用の設備工事）を選択"""
+        keys = self._partition_cache.get(discipline)
+        if keys is None:
+            keys = [
+                kb_discipline for kb_discipline in self._partitions
+                if discipline in kb_discipline or kb_discipline in discipline or kb_discipline == "設備工事"
+            ]
+            self._partition_cache[discipline] = keys
+        return keys
 
     def _expand_query_with_synonyms(self, query: str) -> str:
         """
-        同義語辞書を使ってクエリを展開
+        同義語辞書を使ってクエリを展開（コンパイル済みマッチャーで1回走査）
 
         Args:
             query: 元のクエリ
@@ -466,24 +1116,7 @@ class VectorKBSearch:
         Returns:
             同義語を含む拡張クエリ
         """
-        expanded_terms = [query]
-
-        # SYNONYM_DICTから同義語を探す
-        for key, synonyms in SYNONYM_DICT.items():
-            # クエリにキーが含まれる場合
-            if key in query:
-                expanded_terms.extend(synonyms[:3])  # 最大3つの同義語を追加
-                break
-            # クエリが同義語に含まれる場合
-            for syn in synonyms:
-                if syn in query:
-                    expanded_terms.append(key)
-                    expanded_terms.extend([s for s in synonyms if s != syn][:2])
-                    break
-
-        # 重複を除去して結合
-        unique_terms = list(dict.fromkeys(expanded_terms))
-        return " ".join(unique_terms[:5])  # 最大5語
+        return SYNONYM_MATCHER.expand_query(query)
 
     def search(self, query: str, discipline: str = None, top_k: int = 5, target_unit: str = None) -> List[Dict]:
         """
@@ -498,64 +1131,159 @@ class VectorKBSearch:
         Returns:
             類似KB項目のリスト（スコア付き）
         """
-        if not self.model or not self.index or self.index.ntotal == 0:
+        return self.search_batch([query], [discipline], top_k=top_k, target_units=[target_unit])[0]
+
+    def search_batch(
+        self,
+        queries: List[str],
+        disciplines: Optional[List[Optional[str]]] = None,
+        top_k: int = 5,
+        target_units: Optional[List[Optional[str]]] = None
+    ) -> List[List[Dict]]:
+        """
+        複数クエリを一括検索（1回のencode + パーティションごとに1回のFAISS検索）
+
+        同義語展開を全クエリに適用してからまとめてベクトル化します。
+        工事区分指定のあるクエリは該当する工事区分パーティションだけを、
+        指定のないクエリは全パーティションをまとめて検索してマージし、
+        単位リランキングは行ごとに適用します。
+
+        Args:
+            queries: 検索クエリのリスト
+            disciplines: クエリごとの工事区分フィルタ（Noneは制限なし）
+            top_k: 各クエリで返す結果数
+            target_units: クエリごとの希望単位
+
+        Returns:
+            クエリと同じ順序の検索結果リスト
+        """
+        if not queries:
             return []
+        empty_results = [[] for _ in queries]
+        if not self.model or not self.index or self.index.ntotal == 0:
+            return empty_results
+
+        disciplines = disciplines or [None] * len(queries)
+        target_units = target_units or [None] * len(queries)
 
         try:
             # 同義語展開
-            expanded_query = self._expand_query_with_synonyms(query)
-            if expanded_query != query:
-                logger.debug(f"Query expanded: '{query}' -> '{expanded_query}'")
-
-            # クエリをベクトル化（E5モデル用プレフィックス）
-            query_text = f"query: {expanded_query}"
-            query_embedding = self.model.encode([query_text], show_progress_bar=False)
-            query_embedding = np.array(query_embedding).astype('float32')
-            faiss.normalize_L2(query_embedding)
-
-            # 検索（多めに取得してフィルタ後に絞る）
-            search_k = top_k * 3 if discipline else top_k
-            distances, indices = self.index.search(query_embedding, min(search_k, len(self.kb_items)))
+            query_texts = []
+            for query in queries:
+                expanded_query = self._expand_query_with_synonyms(query)
+                if expanded_query != query:
+                    logger.debug(f"Query expanded: '{query}' -> '{expanded_query}'")
+                # E5モデル用プレフィックス
+                query_texts.append(f"query: {expanded_query}")
+
+            # クエリをまとめてベクトル化（キャッシュ済みのクエリは再エンコードしない）
+            query_embeddings = self._encode_queries(query_texts)
+
+            # 工事区分フィルタがある行は単位リランキング用に多めの候補を取得
+            row_search_k = [top_k * 3 if discipline else top_k for discipline in disciplines]
+            candidates: List[List] = [[] for _ in queries]
+
+            # 該当パーティション（工事区分指定なしは全パーティション）をまとめて検索してマージ
+            partition_rows: Dict[str, List[int]] = {}
+            for row, discipline in enumerate(disciplines):
+                keys = self._select_partitions(discipline) if discipline else list(self._partitions)
+                for kb_discipline in keys:
+                    partition_rows.setdefault(kb_discipline, []).append(row)
+
+            for kb_discipline, rows in partition_rows.items():
+                partition = self._partitions[kb_discipline]
+                search_k = min(max(row_search_k[row] for row in rows), partition.ntotal)
+                distances, indices = partition.search(query_embeddings[rows], search_k)
+                for i, row in enumerate(rows):
+                    candidates[row].extend(zip(distances[i], indices[i]))
 
             results = []
-            for i, (dist, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx < 0 or idx >= len(self.kb_items):
-                    continue
-
-                kb_item = self.kb_items[idx]
-
-                # 工事区分フィルタ
-                if discipline:
-                    kb_discipline = kb_item.get("discipline", "")
-                    if discipline not in kb_discipline and kb_discipline not in discipline:
-                        if kb_discipline != "設備工事":  # 汎用項目は許可
-                            continue
-
-                # 単位一致ボーナス
-                adjusted_score = float(dist)
-                if target_unit:
-                    kb_unit = kb_item.get("unit", "")
-                    if kb_unit == target_unit or target_unit in kb_unit or kb_unit in target_unit:
-                        adjusted_score += 0.05  # 単位一致で+0.05ボーナス
-
-                results.append({
-                    "kb_item": kb_item,
-                    "score": adjusted_score,
-                    "original_score": float(dist),
-                    "rank": len(results) + 1
-                })
-
-            # 単位リランキング: スコアで再ソート
-            if target_unit and len(results) > 1:
-                results.sort(key=lambda x: x["score"], reverse=True)
-                for i, r in enumerate(results):
-                    r["rank"] = i + 1
-
-            return results[:top_k]
+            for row in range(len(queries)):
+                row_candidates = sorted(candidates[row], key=lambda c: c[0], reverse=True)
+                row_candidates = row_candidates[:row_search_k[row]]
+                results.append(self._collect_results(
+                    [dist for dist, _ in row_candidates],
+                    [vector_id for _, vector_id in row_candidates],
+                    disciplines[row],
+                    top_k,
+                    target_units[row]
+                ))
+            return results
 
         except Exception as e:
             logger.error(f"Vector search error: {e}")
-            return []
+            return empty_results
+
+    def _encode_queries(self, query_texts: List[str]) -> "np.ndarray":
+        """クエリをベクトル化して正規化（LRUキャッシュにないものだけをまとめてエンコード）"""
+        cache = self.query_cache
+        cached = cache.get_many(query_texts) if cache else {}
+
+        missing = list(dict.fromkeys(text for text in query_texts if text not in cached))
+        if missing:
+            embeddings = self.model.encode(missing, show_progress_bar=False)
+            embeddings = np.array(embeddings).astype('float32')
+            faiss.normalize_L2(embeddings)
+            encoded = dict(zip(missing, embeddings))
+            cached.update(encoded)
+            if cache:
+                cache.put_many(encoded)
+                cache.maybe_save()
+
+        return np.stack([cached[text] for text in query_texts]).astype('float32')
+
+    def flush_query_cache(self):
+        """クエリembeddingキャッシュの未保存分をディスクに保存（見積1回分の終了時等）"""
+        if self.query_cache:
+            self.query_cache.flush()
+
+    def search_config(self) -> Dict[str, Any]:
+        """検索候補を決めるインデックス設定（インデックス種別・ANNパラメータ）"""
+        return {key: self.index_config.get(key) for key in self.SEARCH_CONFIG_KEYS}
+
+    def get_query_cache_stats(self) -> Dict[str, float]:
+        """クエリembeddingキャッシュのヒット・ミス件数"""
+        return self.query_cache.stats() if self.query_cache else {}
+
+    def _collect_results(self, distances, indices, discipline: Optional[str], top_k: int,
+                         target_unit: Optional[str]) -> List[Dict]:
+        """1クエリ分の検索結果に工事区分フィルタと単位リランキングを適用"""
+        results = []
+        for dist, vector_id in zip(distances, indices):
+            pos = self._id_to_pos.get(int(vector_id))
+            if pos is None:
+                continue
+
+            kb_item = self.kb_items[pos]
+
+            # 工事区分フィルタ
+            if discipline:
+                kb_discipline = kb_item.get("discipline", "")
+                if discipline not in kb_discipline and kb_discipline not in discipline:
+                    if kb_discipline != "設備工事":  # 汎用項目は許可
+                        continue
+
+            # 単位一致ボーナス
+            adjusted_score = float(dist)
+            if target_unit:
+                kb_unit = kb_item.get("unit", "")
+                if kb_unit == target_unit or target_unit in kb_unit or kb_unit in target_unit:
+                    adjusted_score += 0.05  # 単位一致で+0.05ボーナス
+
+            results.append({
+                "kb_item": kb_item,
+                "score": adjusted_score,
+                "original_score": float(dist),
+                "rank": len(results) + 1
+            })
+
+        # 単位リランキング: スコアで再ソート
+        if target_unit and len(results) > 1:
+            results.sort(key=lambda x: x["score"], reverse=True)
+            for i, r in enumerate(results):
+                r["rank"] = i + 1
+
+        return results[:top_k]
 
     def is_available(self) -> bool:
         """ベクトル検索が利用可能かどうか"""
@@ -568,18 +1296,41 @@ class AIEstimateGenerator:
 
     仕様書から建物情報を抽出し、建築設備の専門知識を使って
     詳細な見積項目（配管サイズ、数量、材料等）を自動生成します。
+
+    共有KBインデックスの参照を保持するため、withブロックで使うか、使い終わったら
+    close() を呼び出してください（例外で中断した場合も参照を返却するため）。
     """
 
     def __init__(self, kb_path: str = "kb/price_kb.json", use_vector_search: bool = True, use_cache: bool = True):
         load_dotenv()
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
         self.kb_path = kb_path
+
+        # 文字列マッチング用の文字n-gram転置インデックス（初回使用時に構築）
+        self._lexical_index: Optional[NgramIndex] = None
+        self._kb_row_by_id: Dict[str, int] = {}
+        self._kb_rows_by_synonym_group: Dict[str, List[int]] = {}
+        self._discipline_masks: Dict[str, "np.ndarray"] = {}
+
+        # KBと照合用特徴量テーブル（KBファイル更新時に再構築）
+        self._kb_mtime: Optional[float] = None
+        self._kb_version: str = ""
+        self._kb_features: List[KBRowFeatures] = []
+        self._kb_scorer: Optional[KBMatchScorer] = None
+
+        # 単価マッチングエンジンの設定（工事区分ごとの閾値）と直近の計測値
+        self._price_matching_config: Optional[Dict[str, Any]] = None
+        self.last_price_match_stats: Dict[str, Any] = {}
+        # 直近の仕様書解析パイプラインのステージごとの処理時間（秒）
+        self.last_stage_timings: Dict[str, float] = {}
+        # マッチング結果キャッシュ（方針キー -> キャッシュ、KB再読み込みで破棄）
+        self._match_caches: Dict[str, MatchResultCache] = {}
         self.price_kb = self._load_price_kb()
 
         # キャッシュ設定
         self.use_cache = use_cache
-        self.cache_dir = Path("cache/estimates")
+        self.cache_dir = Path(ESTIMATE_CACHE_DIR)
         if use_cache:
             self.cache_dir.mkdir(parents=True, exist_ok=True)
 
@@ -590,23 +1341,83 @@ class AIEstimateGenerator:
             self._init_vector_search()
 
     def _load_price_kb(self) -> List[Dict]:
-        """価格KBを読み込み"""
+        """
+        価格KBを読み込み、照合用特徴量テーブルを構築
+
+        KBから派生するインデックス（文字n-gram等）は次回使用時に再構築します。
+        """
+        price_kb = []
+        self._kb_mtime = None
+        self._kb_version = ""
         if os.path.exists(self.kb_path):
-            with open(self.kb_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        logger.warning(f"Price KB not found: {self.kb_path}")
-        return []
+            self._kb_mtime = os.path.getmtime(self.kb_path)
+            with open(self.kb_path, 'rb') as f:
+                kb_bytes = f.read()
+            # KB内容のハッシュ（マッチング結果キャッシュの無効化に使用）
+            self._kb_version = hashlib.sha256(kb_bytes).hexdigest()[:16]
+            price_kb = json.loads(kb_bytes.decode('utf-8'))
+        else:
+            logger.warning(f"Price KB not found: {self.kb_path}")
+
+        self._kb_features = self._build_kb_features(price_kb)
+        self._kb_scorer = None
+        self._lexical_index = None
+        self._match_caches = {}
+        return price_kb
+
+    def _build_kb_features(self, kb_items: List[Dict]) -> List[KBRowFeatures]:
+        """KB各行の正規化テキスト・サイズ・カテゴリ・類義語・単位を計算"""
+        return [
+            self._text_features(
+                kb_item.get("description", ""),
+                kb_item.get("features", {}).get("specification", ""),
+                kb_item.get("unit", "")
+            )
+            for kb_item in kb_items
+        ]
+
+    def _text_features(self, description: str, specification: str, unit: Optional[str]) -> KBRowFeatures:
+        """項目名・仕様・単位から照合用特徴量を計算（KB行・見積項目で共通）"""
+        return KBRowFeatures(
+            desc_norm=self._normalize_text(description),
+            spec_norm=self._normalize_text(specification),
+            full_norm=self._normalize_text(f"{description} {specification}"),
+            size=self._extract_size(specification),
+            category=self._get_category(description),
+            synonyms_norm=frozenset(self._normalize_text(s) for s in self._find_synonyms(description)),
+            unit=unit,
+            unit_norm=self._normalize_text(unit or ""),
+            unit_class=unit_class(unit),
+        )
+
+    def _get_kb_scorer(self) -> KBMatchScorer:
+        """特徴量テーブルから文字列マッチング用スコアラーを構築（初回使用時）"""
+        if self._kb_scorer is None:
+            self._kb_scorer = KBMatchScorer(
+                self._kb_features, [kb_item.get("unit_price") for kb_item in self.price_kb]
+            )
+        return self._kb_scorer
+
+    def _refresh_price_kb_if_changed(self):
+        """KBファイルが更新されていれば再読み込み（特徴量テーブル・ベクトル検索も更新）"""
+        current_mtime = os.path.getmtime(self.kb_path) if os.path.exists(self.kb_path) else None
+        if current_mtime == self._kb_mtime:
+            return
+
+        logger.info(f"Price KB changed on disk, reloading: {self.kb_path}")
+        self.price_kb = self._load_price_kb()
+        if self.vector_search is not None or self.use_vector_search:
+            self.close()
+            if self.use_vector_search and HAS_VECTOR_SEARCH and self.price_kb:
+                self._init_vector_search()
 
     def _get_pdf_hash(self, pdf_path: str) -> str:
         """PDFファイルのハッシュを計算（キャッシュキー用）"""
-        with open(pdf_path, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()[:12]
+        return pdf_cache_hash(pdf_path)
 
     def _get_cache_path(self, pdf_path: str) -> Path:
         """キャッシュファイルのパスを取得"""
-        pdf_hash = self._get_pdf_hash(pdf_path)
-        pdf_name = Path(pdf_path).stem[:30]  # ファイル名の先頭30文字
-        return self.cache_dir / f"{pdf_name}_{pdf_hash}_items.json"
+        return items_cache_path(pdf_path, str(self.cache_dir))
 
     def _load_cached_items(self, pdf_path: str) -> Optional[List[Dict]]:
         """キャッシュから生成済み項目を読み込み"""
@@ -642,19 +1453,37 @@ class AIEstimateGenerator:
             logger.warning(f"Cache write error: {e}")
 
     def _init_vector_search(self):
-        """ベクトル検索インデックスを初期化"""
+        """ベクトル検索インデックスを初期化（プロセス共有レジストリから取得）"""
         logger.info("Initializing vector search for KB...")
-        self.vector_search = VectorKBSearch()
-        if self.vector_search.model:
-            success = self.vector_search.build_index(self.price_kb)
-            if success:
-                logger.info(f"Vector search ready: {len(self.price_kb)} KB items indexed")
-            else:
-                logger.warning("Vector search index build failed - using fallback")
-                self.vector_search = None
-        else:
-            logger.warning("Vector search model not loaded - using fallback")
+        try:
+            handle = acquire_kb_index(self.kb_path, self.price_kb)
+        except Exception as e:
+            logger.warning(f"Vector search model not loaded - using fallback: {e}")
+            handle = None
+
+        if handle is None:
+            logger.warning("Vector search index build failed - using fallback")
             self.vector_search = None
+            return
+
+        self._kb_index_handle = handle
+        self.vector_search = handle.search
+        # ジェネレータ破棄時に共有インデックスの参照を返却
+        self._kb_index_finalizer = weakref.finalize(self, handle.release)
+        logger.info(f"Vector search ready: {len(self.price_kb)} KB items indexed")
+
+    def close(self):
+        """共有インデックスの参照を返却"""
+        finalizer = getattr(self, "_kb_index_finalizer", None)
+        if finalizer is not None:
+            finalizer()
+        self.vector_search = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def _vector_search_match(self, item_name: str, item_spec: str, discipline: str, target_unit: str = None) -> Optional[Dict]:
         """
@@ -669,37 +1498,154 @@ class AIEstimateGenerator:
         Returns:
             最良マッチのKB項目とスコア、またはNone
         """
+        return self._vector_search_match_batch([(item_name, item_spec, discipline, target_unit)])[0]
+
+    def _vector_search_batch(self, requests: List[tuple]) -> List[List[Dict]]:
+        """
+        複数項目のベクトル検索を一括実行（単位リランキング付き、フィルタ前の上位5件）
+
+        Args:
+            requests: (項目名, 仕様, 工事区分, 希望単位) のリスト
+
+        Returns:
+            requestsと同じ順序の検索結果リスト
+        """
+        batch_results: List[List[Dict]] = [[] for _ in requests]
         if not self.vector_search or not self.vector_search.is_available():
-            return None
+            return batch_results
+
+        # クエリ生成（空クエリは検索しない）
+        rows = []
+        queries = []
+        for i, (item_name, item_spec, _, _) in enumerate(requests):
+            query = f"{item_name} {item_spec}".strip()
+            if query:
+                rows.append(i)
+                queries.append(query)
+        if not queries:
+            return batch_results
+
+        results = self.vector_search.search_batch(
+            queries,
+            disciplines=[requests[i][2] for i in rows],
+            top_k=5,
+            target_units=[requests[i][3] for i in rows]
+        )
+        for row, row_results in zip(rows, results):
+            batch_results[row] = row_results
+        return batch_results
 
-        # クエリ生成
-        query = f"{item_name} {item_spec}".strip()
-        if not query:
-            return None
+    def _vector_search_match_batch(self, requests: List[tuple],
+                                   batch_results: Optional[List[List[Dict]]] = None) -> List[Optional[Dict]]:
+        """
+        複数項目のベクトル検索マッチングを一括実行
 
-        # ベクトル検索実行（単位リランキング付き）
-        results = self.vector_search.search(query, discipline=discipline, top_k=5, target_unit=target_unit)
+        Args:
+            requests: (項目名, 仕様, 工事区分, 希望単位) のリスト
+            batch_results: _vector_search_batchの結果（Noneの場合は検索を実行）
 
-        if not results:
-            return None
+        Returns:
+            requestsと同じ順序の最良マッチ（なければNone）
+        """
+        if batch_results is None:
+            batch_results = self._vector_search_batch(requests)
+
+        matches: List[Optional[Dict]] = [None] * len(requests)
+        for row, results in enumerate(batch_results):
+            item_name, item_spec = requests[row][0], requests[row][1]
+            query = f"{item_name} {item_spec}".strip()
+            # 結果をフィルタリング（広すぎるマッチを除外）
+            for result in results:
+                if result["score"] < 0.3:
+                    continue
 
-        # 結果をフィルタリング（広すぎるマッチを除外）
-        for result in results:
-            if result["score"] < 0.3:
-                continue
+                kb_item = result["kb_item"]
+                kb_desc = kb_item.get("description", "")
 
-            kb_item = result["kb_item"]
-            kb_desc = kb_item.get("description", "")
+                # 広すぎるマッチを除外
+                if self._is_too_broad_match(item_name, kb_desc):
+                    logger.debug(f"Skipping too broad match: '{item_name}' → '{kb_desc}'")
+                    continue
 
-            # 広すぎるマッチを除外
-            if self._is_too_broad_match(item_name, kb_desc):
-                logger.debug(f"Skipping too broad match: '{item_name}' → '{kb_desc}'")
-                continue
+                logger.debug(f"Vector match: '{query}' → '{kb_desc}' (score={result['score']:.3f})")
+                matches[row] = result
+                break
+
+        return matches
+
+    def _get_lexical_index(self) -> NgramIndex:
+        """KBの項目名・仕様の文字n-gram転置インデックスを取得（初回のみ構築）"""
+        if self._lexical_index is None:
+            self._lexical_index = NgramIndex([
+                f"{kb_item.get('description', '')} {kb_item.get('features', {}).get('specification', '')}"
+                for kb_item in self.price_kb
+            ])
+            self._kb_row_by_id = {
+                kb_item.get("item_id"): row for row, kb_item in enumerate(self.price_kb)
+            }
+            # 類義語グループ -> そのグループに該当するKB行（類義語一致の候補用）
+            self._kb_rows_by_synonym_group = {}
+            for row, kb_item in enumerate(self.price_kb):
+                for group_key in SYNONYM_MATCHER.match_groups(kb_item.get("description", "")):
+                    self._kb_rows_by_synonym_group.setdefault(group_key, []).append(row)
+            self._discipline_masks = {}
+            logger.info(f"Lexical n-gram index built: {len(self.price_kb)} KB items")
+        return self._lexical_index
+
+    def _fallback_candidates(
+        self,
+        item: EstimateItem,
+        synonyms: List[str],
+        vector_results: List[Dict],
+        discipline: Optional[str] = None
+    ) -> List[int]:
+        """
+        文字列マッチングでスコアリングするKB行を選択
 
-            logger.debug(f"Vector match: '{query}' → '{kb_desc}' (score={result['score']:.3f})")
-            return result
+        項目名・仕様・類義語のBM25（文字n-gram）上位、ベクトル検索上位、
+        類義語グループが共通するKB行を reciprocal rank fusion で統合し、
+        上位FALLBACK_CANDIDATES件に絞ります。
 
-        return None
+        Args:
+            item: 見積項目
+            synonyms: 項目名の類義語（空の場合は類義語グループの候補を使わない）
+            vector_results: ベクトル検索結果（順位順）
+            discipline: 工事区分の互換性で絞り込む場合の工事区分
+
+        Returns:
+            KB行番号のリスト（KBの並び順。同点時に全件走査と同じ項目を選ぶため）
+        """
+        lexical_index = self._get_lexical_index()
+        allowed = self._discipline_mask(discipline) if discipline else None
+
+        query = " ".join([item.name, item.specification or ""] + [s for s in synonyms if s != item.name])
+        lexical_rows = [row for row, _ in lexical_index.search(query, top_k=LEXICAL_CANDIDATES, allowed=allowed)]
+        vector_rows = [
+            self._kb_row_by_id[result["kb_item"].get("item_id")]
+            for result in vector_results
+            if result["kb_item"].get("item_id") in self._kb_row_by_id
+        ]
+
+        synonym_rows = []
+        if synonyms:
+            group_rows = set()
+            for group_key in SYNONYM_MATCHER.match_groups(item.name):
+                group_rows.update(self._kb_rows_by_synonym_group.get(group_key, ()))
+            synonym_rows = [row for row in sorted(group_rows) if allowed is None or allowed[row]]
+
+        fused = reciprocal_rank_fusion([lexical_rows, vector_rows, synonym_rows])
+        return sorted(fused[:FALLBACK_CANDIDATES])
+
+    def _discipline_mask(self, discipline: str) -> "np.ndarray":
+        """工事区分と互換性のあるKB行のマスク（工事区分ごとにキャッシュ）"""
+        allowed = self._discipline_masks.get(discipline)
+        if allowed is None:
+            allowed = np.array([
+                self._is_discipline_compatible(kb_item.get("discipline", ""), discipline)
+                for kb_item in self.price_kb
+            ], dtype=bool)
+            self._discipline_masks[discipline] = allowed
+        return allowed
 
     def _is_too_broad_match(self, item_name: str, kb_name: str) -> bool:
         """
@@ -766,7 +1712,7 @@ class AIEstimateGenerator:
 
     def _find_synonyms(self, item_name: str) -> List[str]:
         """
-        項目名の類義語を取得
+        項目名の類義語を取得（コンパイル済みマッチャーで1回走査）
 
         Args:
             item_name: 見積項目名
@@ -774,29 +1720,7 @@ class AIEstimateGenerator:
         Returns:
             類義語リスト（元の項目名を含む）
         """
-        synonyms = [item_name]
-
-        # 正規化した項目名
-        item_name_norm = self._normalize_text(item_name)
-
-        for key, values in SYNONYM_DICT.items():
-            key_norm = self._normalize_text(key)
-
-            # キーが項目名に含まれる、または項目名がキーに含まれる
-            if key_norm in item_name_norm or item_name_norm in key_norm:
-                synonyms.extend(values)
-                synonyms.append(key)
-                continue
-
-            # 類義語が項目名に含まれる
-            for value in values:
-                value_norm = self._normalize_text(value)
-                if value_norm in item_name_norm or item_name_norm in value_norm:
-                    synonyms.append(key)
-                    synonyms.extend(values)
-                    break
-
-        return list(set(synonyms))
+        return SYNONYM_MATCHER.find_synonyms(item_name)
 
     def _validate_price(self, item_name: str, matched_price: float) -> bool:
         """
@@ -876,48 +1800,18 @@ class AIEstimateGenerator:
         if not item_unit or not kb_unit:
             return True
 
-        # 正規化
-        unit_norm_item = self._normalize_text(item_unit)
-        unit_norm_kb = self._normalize_text(kb_unit)
-
         # 「式」単位の高額単価チェック（重要！）
         # KB側が「式」で50万円以上の場合、建物全体の一式金額の可能性が高い
         # この場合、マッチングを拒否して誤った高額適用を防ぐ
-        if kb_price and "式" in unit_norm_kb and kb_price >= 500000:
+        if is_high_value_lump_sum(kb_unit, kb_price):
             logger.debug(f"Rejecting high-value '式' unit: ¥{kb_price:,.0f}")
             return False
 
-        # 完全一致または包含
-        if unit_norm_item == unit_norm_kb:
-            return True
-        if unit_norm_item in unit_norm_kb or unit_norm_kb in unit_norm_item:
-            return True
-
-        # 互換性のない単位ペア（強化版）
-        # 「式」「基」「面」「台」「組」は他の計量単位と互換性なし
-        lump_sum_units = ["式", "基", "面", "台", "組", "セット", "set", "ユニット"]
-        quantity_units = ["m", "ｍ", "本", "個", "箇所", "ケ所", "ヶ所", "点", "口"]
-
-        # どちらかが一式系で、もう一方が計量系なら互換性なし
-        item_is_lump = any(u in unit_norm_item for u in lump_sum_units)
-        kb_is_lump = any(u in unit_norm_kb for u in lump_sum_units)
-        item_is_qty = any(u in unit_norm_item for u in quantity_units)
-        kb_is_qty = any(u in unit_norm_kb for u in quantity_units)
-
-        if (item_is_lump and kb_is_qty) or (item_is_qty and kb_is_lump):
+        # 単位の種類（一式・長さ・数量・面積・組）の互換性テーブルで判定
+        if not units_compatible(item_unit, kb_unit):
             logger.debug(f"Unit incompatible: '{item_unit}' vs '{kb_unit}'")
             return False
 
-        # 追加の互換性なしペア
-        incompatible_pairs = [
-            ("箇所", "m"), ("個", "m"), ("台", "m"), ("ヶ所", "m"), ("ケ所", "m"),
-            ("点", "m"), ("口", "m"), ("面", "m"), ("基", "m"),
-        ]
-        for u1, u2 in incompatible_pairs:
-            if (u1 in unit_norm_item and u2 in unit_norm_kb) or \
-               (u2 in unit_norm_item and u1 in unit_norm_kb):
-                return False
-
         return True
 
     def _check_price_sanity(self, item_name: str, item_unit: str, unit_price: float, quantity: float) -> bool:
@@ -984,7 +1878,8 @@ class AIEstimateGenerator:
             model=self.model_name,
             max_tokens=max_tokens,
             temperature=0,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            operation=operation
         )
 
         # コスト記録
@@ -998,7 +1893,8 @@ class AIEstimateGenerator:
 
         return response
 
-    def extract_text_from_pdf(self, pdf_path: str, max_pages: int = None) -> str:
+    @staticmethod
+    def extract_text_from_pdf(pdf_path: str, max_pages: int = None) -> str:
         """PDFからテキストを抽出（ページ番号マーカー付き）"""
         logger.info(f"Extracting text from PDF: {pdf_path}")
 
@@ -1019,7 +1915,8 @@ class AIEstimateGenerator:
             logger.error(f"Error extracting text from PDF: {e}")
             return ""
 
-    def extract_text_from_pages(self, pdf_path: str, start_page: int, end_page: int) -> str:
+    @staticmethod
+    def extract_text_from_pages(pdf_path: str, start_page: int, end_page: int) -> str:
         """特定ページ範囲のテキストを抽出"""
         logger.info(f"Extracting text from pages {start_page}-{end_page}: {pdf_path}")
 
@@ -1038,7 +1935,8 @@ class AIEstimateGenerator:
             logger.error(f"Error extracting text from pages: {e}")
             return ""
 
-    def detect_specification_table_pages(self, spec_text: str) -> List[int]:
+    @staticmethod
+    def detect_specification_table_pages(spec_text: str) -> List[int]:
         """諸元表が含まれるページを検出"""
         table_keywords = ["諸元表", "室名", "床面積", "天井高", "空調", "給排水", "ガス栓"]
         pages = []
@@ -1069,6 +1967,7 @@ class AIEstimateGenerator:
                 "rooms": [{"name": "普通教室", "area": 63.0, "gas_outlets": 0, ...}, ...],
                 "equipment_summary": {"total_gas_outlets": 38, "total_area": 2145, ...}
             }
+            応答を解析できなかった場合は "failed": True（ステージキャッシュの保存判定に使用）
         """
         logger.info("Extracting specification tables")
 
@@ -1131,7 +2030,8 @@ class AIEstimateGenerator:
             model=self.model_name,
             max_tokens=16000,
             temperature=0,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            operation="諸元表テキスト抽出"
         )
 
         # コスト記録
@@ -1151,12 +2051,12 @@ class AIEstimateGenerator:
 
         if json_start == -1:
             logger.error("No JSON object found in specification table response")
-            return {"rooms": [], "equipment_summary": {}}
+            return {"rooms": [], "equipment_summary": {}, "failed": True}
 
         # 閉じ括弧がない場合は、truncated JSONとして処理
         if json_end <= json_start:
             logger.warning("Specification table response appears truncated")
-            return {"rooms": [], "equipment_summary": {}}
+            return {"rooms": [], "equipment_summary": {}, "failed": True}
 
         json_str = response_text[json_start:json_end]
 
@@ -1167,19 +2067,81 @@ class AIEstimateGenerator:
             return table_data
         except json.JSONDecodeError as e:
             logger.error(f"JSON parse error in specification tables: {e}")
-            return {"rooms": [], "equipment_summary": {}}
+            return {"rooms": [], "equipment_summary": {}, "failed": True}
 
     # ===== Phase 1: Vision抽出による諸元表データ取得 =====
 
+    def _render_page_base64(self, doc, page_index: int, dpi: int) -> str:
+        """PDFページ（0-indexed）をPNG画像に変換してBase64エンコード"""
+        mat = fitz.Matrix(dpi/72, dpi/72)
+        pix = doc[page_index].get_pixmap(matrix=mat)
+        return base64.b64encode(pix.tobytes("png")).decode('utf-8')
+
+    def _analyze_pages_with_vision(
+        self,
+        doc,
+        page_indexes: List[int],
+        dpi: int,
+        analyze: Callable[[int, str], Optional[Dict[str, Any]]],
+        max_concurrency: Optional[int] = None
+    ) -> List[Tuple[int, Optional[Dict[str, Any]]]]:
+        """
+        PDFページを画像化してVision APIで解析（ページ描画とAPI呼び出しをパイプライン化）
+
+        PyMuPDFのドキュメントはスレッド間で共有できないため描画は呼び出し元スレッドで行い、
+        描画済みページのAPI呼び出しをスレッドプールで実行します（ページN+1の描画とページNの
+        API呼び出しが重なる）。ページごとの失敗は analyze 内で処理し、Noneを返します。
+
+        Args:
+            doc: PyMuPDFのドキュメント
+            page_indexes: 解析するページ（0-indexed）
+            dpi: 描画解像度
+            analyze: (ページ, Base64画像) -> 解析結果 or None
+            max_concurrency: 同時に実行するAPI呼び出し数（Noneは llm.vision_max_concurrency の設定値）
+
+        Returns:
+            [(ページ, 解析結果 or None)]（page_indexesと同じ順序）
+        """
+        if max_concurrency is None:
+            max_concurrency = load_llm_config().get("vision_max_concurrency", 4)
+        max_workers = max(1, int(max_concurrency or 1))
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="vision-page") as executor:
+            for page_index in page_indexes:
+                # 描画済みで送信待ちの画像がたまらないよう、先行して描画するのは1ページまで
+                pending = [future for future in futures if not future.done()]
+                if len(pending) > max_workers:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                image_base64 = self._render_page_base64(doc, page_index, dpi)
+                futures.append(executor.submit(analyze, page_index, image_base64))
+            return [(page_index, future.result()) for page_index, future in zip(page_indexes, futures)]
+
+    @staticmethod
+    def spec_table_vision_page_indexes(page_count: int, target_pages: Optional[List[int]] = None) -> List[int]:
+        """諸元表のVision解析で描画するページ（0-indexed）"""
+        return [page_num - 1 for page_num in (target_pages or SPEC_TABLE_VISION_PAGES) if page_num <= page_count]
+
+    @staticmethod
+    def drawing_page_indexes(
+        page_count: int,
+        start_page: int = DRAWING_PAGE_RANGE[0],
+        end_page: int = DRAWING_PAGE_RANGE[1]
+    ) -> List[int]:
+        """図面のVision解析で描画するページ（0-indexed、API呼び出しを節約するため最大 DRAWING_MAX_PAGES ページ）"""
+        return list(range(start_page - 1, min(end_page, page_count)))[:DRAWING_MAX_PAGES]
+
     def extract_specification_table_with_vision(
         self, pdf_path: str, target_pages: List[int] = None
     ) -> Dict[str, Any]:
         """
         諸元表ページを画像として抽出し、Claude Vision APIで構造化データに変換
 
+        ページの描画とAPI呼び出しは並行して実行し、結果はページ順に集計します。
+
         Args:
             pdf_path: PDFファイルパス
-            target_pages: 諸元表のページ番号リスト（1-indexed）。Noneの場合は39-40を使用
+            target_pages: 諸元表のページ番号リスト（1-indexed）。Noneの場合は SPEC_TABLE_VISION_PAGES
 
         Returns:
             {
@@ -1199,36 +2161,12 @@ class AIEstimateGenerator:
             return {"rooms": [], "totals": {}}
 
         if target_pages is None:
-            target_pages = [39, 40]  # デフォルトは諸元表のページ
+            target_pages = SPEC_TABLE_VISION_PAGES  # デフォルトは諸元表のページ
 
         logger.info(f"Extracting specification tables with Vision from pages {target_pages}")
 
-        try:
-            doc = fitz.open(pdf_path)
-            all_rooms = []
-            totals = {
-                "room_count": 0,
-                "gas_outlet_total": 0,
-                "electrical_outlet_total": 0,
-                "total_area_m2": 0
-            }
-
-            for page_num in target_pages:
-                if page_num > len(doc):
-                    continue
-
-                page = doc[page_num - 1]  # 0-indexed
-
-                # ページを高解像度画像に変換
-                mat = fitz.Matrix(200/72, 200/72)  # 200 DPI
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-
-                # Base64エンコード
-                image_base64 = base64.b64encode(img_data).decode('utf-8')
-
-                # Claude Vision APIで表を解析
-                prompt = """この画像は建物仕様書の諸元表（部屋一覧表）です。
+        # Claude Vision APIで表を解析
+        prompt = """この画像は建物仕様書の諸元表（部屋一覧表）です。
 表形式のデータを正確に読み取り、以下の情報をJSON形式で抽出してください。
 
 【抽出する情報】
@@ -1270,66 +2208,84 @@ class AIEstimateGenerator:
 
 表の全ての行を抽出してください。○マークは「あり」を意味します。"""
 
-                try:
-                    response = self.client.messages.create(
-                        model=self.model_name,
-                        max_tokens=16000,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/png",
-                                        "data": image_base64
-                                    }
-                                },
-                                {"type": "text", "text": prompt}
-                            ]
-                        }]
-                    )
+        def analyze_page(page_index: int, image_base64: str) -> Optional[Dict[str, Any]]:
+            page_num = page_index + 1
+            try:
+                response = self.client.messages.create(
+                    model=self.model_name,
+                    max_tokens=16000,
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/png",
+                                    "data": image_base64
+                                }
+                            },
+                            {"type": "text", "text": prompt}
+                        ]
+                    }],
+                    operation="諸元表Vision抽出"
+                )
 
-                    # コスト記録
-                    record_cost(
-                        operation="諸元表Vision抽出",
-                        model_name=self.model_name,
-                        input_tokens=response.usage.input_tokens,
-                        output_tokens=response.usage.output_tokens,
-                        metadata={"source": "extract_specification_table_with_vision", "page": page_num}
-                    )
+                # コスト記録
+                record_cost(
+                    operation="諸元表Vision抽出",
+                    model_name=self.model_name,
+                    input_tokens=response.usage.input_tokens,
+                    output_tokens=response.usage.output_tokens,
+                    metadata={"source": "extract_specification_table_with_vision", "page": page_num}
+                )
 
-                    content = response.content[0].text
+                content = response.content[0].text
 
-                    # JSONを抽出（マークダウンコードブロックを除去）
-                    content = re.sub(r'```json\s*\n?', '', content)
-                    content = re.sub(r'\n?```\s*$', '', content)
-                    content = re.sub(r'\n?```\s*\n?', '', content)
+                # JSONを抽出（マークダウンコードブロックを除去）
+                content = re.sub(r'```json\s*\n?', '', content)
+                content = re.sub(r'\n?```\s*$', '', content)
+                content = re.sub(r'\n?```\s*\n?', '', content)
 
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
+                json_start = content.find('{')
+                json_end = content.rfind('}') + 1
 
-                    if json_start != -1 and json_end > json_start:
-                        page_data = json.loads(content[json_start:json_end])
-                        rooms = page_data.get("rooms", [])
-                        all_rooms.extend(rooms)
+                if json_start != -1 and json_end > json_start:
+                    return json.loads(content[json_start:json_end])
 
-                        # 集計
-                        page_totals = page_data.get("page_totals", {})
-                        for room in rooms:
-                            count = room.get("count", 1) or 1
-                            totals["room_count"] += count
-                            totals["gas_outlet_total"] += (room.get("gas_outlets", 0) or 0) * count
-                            totals["electrical_outlet_total"] += (room.get("electrical_outlets", 0) or 0) * count
+            except json.JSONDecodeError as e:
+                logger.warning(f"JSON parse error on page {page_num}: {e}")
+            except Exception as e:
+                logger.warning(f"Failed to process page {page_num}: {e}")
+            return None
 
-                        logger.info(f"Page {page_num}: Extracted {len(rooms)} room types")
+        try:
+            doc = fitz.open(pdf_path)
+            all_rooms = []
+            totals = {
+                "room_count": 0,
+                "gas_outlet_total": 0,
+                "electrical_outlet_total": 0,
+                "total_area_m2": 0
+            }
 
-                except json.JSONDecodeError as e:
-                    logger.warning(f"JSON parse error on page {page_num}: {e}")
-                    continue
-                except Exception as e:
-                    logger.warning(f"Failed to process page {page_num}: {e}")
+            page_indexes = self.spec_table_vision_page_indexes(len(doc), target_pages)
+            page_results = self._analyze_pages_with_vision(doc, page_indexes, SPEC_TABLE_VISION_DPI, analyze_page)
+
+            for page_index, page_data in page_results:
+                if page_data is None:
                     continue
+                rooms = page_data.get("rooms", [])
+                all_rooms.extend(rooms)
+
+                # 集計
+                for room in rooms:
+                    count = room.get("count", 1) or 1
+                    totals["room_count"] += count
+                    totals["gas_outlet_total"] += (room.get("gas_outlets", 0) or 0) * count
+                    totals["electrical_outlet_total"] += (room.get("electrical_outlets", 0) or 0) * count
+
+                logger.info(f"Page {page_index + 1}: Extracted {len(rooms)} room types")
 
             doc.close()
 
@@ -1339,17 +2295,26 @@ class AIEstimateGenerator:
 
             return {
                 "rooms": all_rooms,
-                "totals": totals
+                "totals": totals,
+                # 解析に失敗したページ（1-indexed、ステージキャッシュの保存判定に使用）
+                "failed_pages": [page_index + 1 for page_index, page_data in page_results if page_data is None]
             }
 
         except Exception as e:
             logger.error(f"Error in Vision extraction: {e}")
             return {"rooms": [], "totals": {}}
 
-    def extract_drawing_info(self, pdf_path: str, start_page: int = 41, end_page: int = 49) -> Dict[str, Any]:
+    def extract_drawing_info(
+        self,
+        pdf_path: str,
+        start_page: int = DRAWING_PAGE_RANGE[0],
+        end_page: int = DRAWING_PAGE_RANGE[1]
+    ) -> Dict[str, Any]:
         """
         図面ページから設備情報を抽出（Claude Vision API使用）
 
+        ページの描画とAPI呼び出しは並行して実行し、結果はページ順に集計します。
+
         Args:
             pdf_path: PDFファイルパス
             start_page: 図面開始ページ（1-indexed）
@@ -1368,31 +2333,8 @@ class AIEstimateGenerator:
 
         logger.info(f"Extracting drawing information from pages {start_page}-{end_page}")
 
-        try:
-            doc = fitz.open(pdf_path)
-            drawing_info = {
-                "pipe_routes": [],
-                "equipment_locations": [],
-                "estimated_pipe_lengths": {},
-                "drawing_types": []
-            }
-
-            # 図面ページを処理（最大5ページに制限してAPI呼び出しを節約）
-            pages_to_process = list(range(start_page - 1, min(end_page, len(doc))))[:5]
-
-            for page_num in pages_to_process:
-                page = doc[page_num]
-
-                # ページを画像に変換
-                mat = fitz.Matrix(150/72, 150/72)  # 150 DPI
-                pix = page.get_pixmap(matrix=mat)
-                img_data = pix.tobytes("png")
-
-                # Base64エンコード
-                image_base64 = base64.b64encode(img_data).decode('utf-8')
-
-                # Claude Vision APIで図面を分析
-                prompt = """この画像は建物の設備図面です。以下の情報を抽出してJSON形式で出力してください：
+        # Claude Vision APIで図面を分析
+        prompt = """この画像は建物の設備図面です。以下の情報を抽出してJSON形式で出力してください：
 
 1. 図面の種類（配置図、平面図、設備図、配管図など）
 2. 確認できる設備・機器（ガス機器、配管、メーター等）
@@ -1413,58 +2355,79 @@ class AIEstimateGenerator:
 
 図面から読み取れる情報のみを記載してください。"""
 
-                try:
-                    response = self.client.messages.create(
-                        model=self.model_name,
-                        max_tokens=2000,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/png",
-                                        "data": image_base64
-                                    }
-                                },
-                                {"type": "text", "text": prompt}
-                            ]
-                        }]
-                    )
+        def analyze_page(page_num: int, image_base64: str) -> Optional[Dict[str, Any]]:
+            try:
+                response = self.client.messages.create(
+                    model=self.model_name,
+                    max_tokens=2000,
+                    messages=[{
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "image",
+                                "source": {
+                                    "type": "base64",
+                                    "media_type": "image/png",
+                                    "data": image_base64
+                                }
+                            },
+                            {"type": "text", "text": prompt}
+                        ]
+                    }],
+                    operation="図面Vision分析"
+                )
 
-                    # コスト記録
-                    record_cost(
-                        operation="図面Vision分析",
-                        model_name=self.model_name,
-                        input_tokens=response.usage.input_tokens,
-                        output_tokens=response.usage.output_tokens,
-                        metadata={"source": "extract_drawing_info_with_vision", "page": page_num}
-                    )
+                # コスト記録
+                record_cost(
+                    operation="図面Vision分析",
+                    model_name=self.model_name,
+                    input_tokens=response.usage.input_tokens,
+                    output_tokens=response.usage.output_tokens,
+                    metadata={"source": "extract_drawing_info_with_vision", "page": page_num}
+                )
 
-                    content = response.content[0].text
+                content = response.content[0].text
 
-                    # JSONを抽出
-                    json_start = content.find('{')
-                    json_end = content.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        page_data = json.loads(content[json_start:json_end])
-                        drawing_info["drawing_types"].append(page_data.get("drawing_type", f"Page {page_num + 1}"))
+                # JSONを抽出
+                json_start = content.find('{')
+                json_end = content.rfind('}') + 1
+                if json_start != -1 and json_end > json_start:
+                    return json.loads(content[json_start:json_end])
 
-                        if page_data.get("visible_equipment"):
-                            drawing_info["equipment_locations"].extend(page_data["visible_equipment"])
+            except Exception as e:
+                logger.warning(f"Failed to process drawing page {page_num + 1}: {e}")
+            return None
 
-                        pipe_info = page_data.get("pipe_info", {})
-                        if pipe_info.get("routes"):
-                            drawing_info["pipe_routes"].extend(pipe_info["routes"])
-                        if pipe_info.get("estimated_length_m"):
-                            drawing_info["estimated_pipe_lengths"][f"page_{page_num + 1}"] = pipe_info["estimated_length_m"]
+        try:
+            doc = fitz.open(pdf_path)
+            drawing_info = {
+                "pipe_routes": [],
+                "equipment_locations": [],
+                "estimated_pipe_lengths": {},
+                "drawing_types": [],
+                "failed_pages": []  # 解析に失敗したページ（1-indexed）
+            }
 
-                        logger.info(f"Extracted drawing info from page {page_num + 1}: {page_data.get('drawing_type', 'Unknown')}")
+            # 図面ページを処理（最大 DRAWING_MAX_PAGES ページに制限してAPI呼び出しを節約）
+            pages_to_process = self.drawing_page_indexes(len(doc), start_page, end_page)
+            page_results = self._analyze_pages_with_vision(doc, pages_to_process, DRAWING_DPI, analyze_page)
 
-                except Exception as e:
-                    logger.warning(f"Failed to process drawing page {page_num + 1}: {e}")
+            for page_num, page_data in page_results:
+                if page_data is None:
+                    drawing_info["failed_pages"].append(page_num + 1)
                     continue
+                drawing_info["drawing_types"].append(page_data.get("drawing_type", f"Page {page_num + 1}"))
+
+                if page_data.get("visible_equipment"):
+                    drawing_info["equipment_locations"].extend(page_data["visible_equipment"])
+
+                pipe_info = page_data.get("pipe_info", {})
+                if pipe_info.get("routes"):
+                    drawing_info["pipe_routes"].extend(pipe_info["routes"])
+                if pipe_info.get("estimated_length_m"):
+                    drawing_info["estimated_pipe_lengths"][f"page_{page_num + 1}"] = pipe_info["estimated_length_m"]
+
+                logger.info(f"Extracted drawing info from page {page_num + 1}: {page_data.get('drawing_type', 'Unknown')}")
 
             doc.close()
 
@@ -1549,7 +2512,8 @@ class AIEstimateGenerator:
             model=self.model_name,
             max_tokens=16000,
             temperature=0,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            operation="建物情報抽出"
         )
 
         # コスト記録
@@ -1571,35 +2535,152 @@ class AIEstimateGenerator:
             logger.error("No JSON object found in building info response")
             return {}
 
-        # 閉じ括弧がない場合は、truncated JSONとして処理
-        if json_end <= json_start:
-            logger.warning("Building info response appears truncated")
-            return {}
+        # 閉じ括弧がない場合は、truncated JSONとして処理
+        if json_end <= json_start:
+            logger.warning("Building info response appears truncated")
+            return {}
+
+        json_str = response_text[json_start:json_end]
+
+        # コメントを削除（//から行末まで）
+        json_str = re.sub(r'//.*', '', json_str)
+
+        building_info = json.loads(json_str)
+
+        logger.info(f"Extracted building info: {building_info.get('project_name', 'N/A')}")
+        return building_info
+
+    def _shared_spec_context(self, building_info: Dict[str, Any]) -> str:
+        """
+        工事区分ごとの項目生成プロンプトの共通部分（仕様書テキスト・建物情報）
+
+        全工事区分で同一の文字列になるため、プロンプトキャッシュのプレフィックスとして使います。
+        """
+        spec_chars = load_llm_config().get("shared_spec_chars", 30000)
+        spec_text = building_info.get("spec_text_excerpt", "")[:spec_chars]
+        building_summary = json.dumps(
+            {key: value for key, value in building_info.items() if key != "spec_text_excerpt"},
+            ensure_ascii=False, indent=2
+        )
+        return f"""以下は見積対象の仕様書と建物情報です。この後の指示に従って見積項目を作成してください。
+
+【仕様書の内容】
+{spec_text or '仕様書テキストなし'}
+
+【建物情報（参考）】
+{building_summary}"""
+
+    def _shared_context_messages(self, building_info: Dict[str, Any], prompt: str) -> List[Dict[str, Any]]:
+        """
+        共通部分（キャッシュ対象）+ 工事区分ごとの指示 のメッセージを作成
+
+        llm.prompt_cache が有効な場合、共通部分に cache_control を付け、
+        2回目以降の呼び出しではキャッシュから読み込まれます（入力単価の0.1倍）。
+        """
+        context_block = {"type": "text", "text": self._shared_spec_context(building_info)}
+        if load_llm_config().get("prompt_cache", True):
+            context_block["cache_control"] = {"type": "ephemeral"}
+        return [{"role": "user", "content": [context_block, {"type": "text", "text": prompt}]}]
+
+    def _record_response_cost(self, operation: str, response, metadata: Optional[Dict[str, Any]] = None):
+        """APIレスポンスの使用量（プロンプトキャッシュの書き込み・読み込みを含む）を記録"""
+        usage = response.usage
+        record_cost(
+            operation=operation,
+            model_name=self.model_name,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            metadata=metadata,
+            cache_creation_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0
+        )
+
+    def _stream_items(
+        self,
+        building_info: Dict[str, Any],
+        prompt: str,
+        operation: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        項目生成の呼び出しを行い、応答のJSON配列の項目を1件ずつ返す
+
+        llm.stream_items が有効な場合は応答をストリーミングで受信し、
+        IncrementalJSONArrayParser でオブジェクトが閉じた時点で返します
+        （呼び出し側は応答の完了を待たずに項目の変換・単価マッチングを開始できます）。
+        1件も取り出せなかった場合は応答全体を extract_json_array_robust で解析します。
 
-        json_str = response_text[json_start:json_end]
+        Args:
+            building_info: 建物情報（共通プレフィックス用）
+            prompt: 工事区分ごとの指示
+            operation: コスト記録の操作名
+            metadata: コスト記録のメタデータ
+        """
+        request = dict(
+            model=self.model_name,
+            max_tokens=16000,
+            temperature=0,  # 決定的に（毎回同じ結果）
+            messages=self._shared_context_messages(building_info, prompt),
+            operation=operation
+        )
 
-        # コメントを削除（//から行末まで）
-        json_str = re.sub(r'//.*', '', json_str)
+        if not load_llm_config().get("stream_items", True):
+            response = self.client.messages.create(**request)
+            self._record_response_cost(operation, response, metadata)
+            response_text = response.content[0].text
+            logger.debug(f"LLM Response for {operation} (first 500 chars): {response_text[:500]}")
+            yield from extract_json_array_robust(response_text)
+            return
 
-        building_info = json.loads(json_str)
+        parser = IncrementalJSONArrayParser()
+        count = 0
+        with self.client.messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                for item_data in parser.feed(text):
+                    count += 1
+                    yield item_data
+            response = stream.get_final_message()
+        self._record_response_cost(operation, response, metadata)
+        logger.debug(f"LLM Response for {operation} (first 500 chars): {parser.text[:500]}")
+
+        for item_data in parser.close():
+            count += 1
+            yield item_data
+        if count == 0 and "{" in parser.text:
+            yield from extract_json_array_robust(parser.text)
+
+    def _warm_prompt_cache(self, building_info: Dict[str, Any]):
+        """
+        共通部分をプロンプトキャッシュに書き込む（工事区分ごとの並行呼び出しの前に1回）
 
-        logger.info(f"Extracted building info: {building_info.get('project_name', 'N/A')}")
-        return building_info
+        キャッシュは最初の応答が始まるまで利用できないため、並行呼び出しをそのまま送ると
+        全ての呼び出しがキャッシュ書き込みになります。出力1トークンの呼び出しで先に書き込みます。
+        """
+        try:
+            response = self.client.messages.create(
+                model=self.model_name,
+                max_tokens=1,
+                temperature=0,
+                messages=self._shared_context_messages(building_info, "準備ができたら「OK」とだけ返してください。"),
+                operation="プロンプトキャッシュ準備"
+            )
+            self._record_response_cost("プロンプトキャッシュ準備", response, {"source": "warm_prompt_cache"})
+        except Exception as e:
+            logger.warning(f"Prompt cache warm-up failed: {e}")
 
     def generate_detailed_items_for_gas(
         self,
-        building_info: Dict[str, Any]
+        building_info: Dict[str, Any],
+        on_item: Optional[Callable[[EstimateItem], None]] = None
     ) -> List[EstimateItem]:
         """
         ガス設備の詳細見積項目をAI生成
 
         建物情報から、配管サイズ・数量・材料を設計レベルで推定します。
+        on_item を指定すると、ストリーミング応答から項目が完成するたびに呼び出します。
         """
         logger.info("Generating detailed gas equipment items")
 
-        # 建物情報を文字列化
-        building_summary = json.dumps(building_info, ensure_ascii=False, indent=2)
-
         # 諸元表データがあれば追加情報として活用
         spec_table_info = ""
         if "spec_table" in building_info:
@@ -1639,10 +2720,8 @@ class AIEstimateGenerator:
                     for route in pipe_routes[:5]:  # 最大5ルート
                         drawing_info_text += f"- {route}\n"
 
-        # 仕様書テキストを取得
-        spec_text = building_info.get("spec_text_excerpt", "")
-
-        prompt = f"""あなたは熟練のガス設備積算技術者です。以下の仕様書からガス設備工事の見積項目を抽出してください。
+        # 仕様書テキスト・建物情報は共通プレフィックス（_shared_context_messages）で送信
+        prompt = f"""あなたは熟練のガス設備積算技術者です。上記の仕様書からガス設備工事の見積項目を抽出してください。
 
 【重要な制約】
 1. **仕様書に明記されている項目**を中心に抽出してください
@@ -1672,11 +2751,6 @@ class AIEstimateGenerator:
   - 0.6-0.7: 上記ルールで推定
   - 0.5以下: 概算（要確認）
 
-【仕様書の内容】
-{spec_text[:15000] if spec_text else '仕様書テキストなし'}
-
-【建物情報（参考）】
-{building_summary}
 {spec_table_info}
 {drawing_info_text}
 
@@ -1775,30 +2849,12 @@ JSON配列で、階層構造を持った見積項目を出力してください
 - 単価はnullのままで構いません（後でKBから取得します）
 - 仕様書にガス設備の記載がない場合は空配列 [] を返してください"""
 
-        response = self.client.messages.create(
-            model=self.model_name,
-            max_tokens=16000,
-            temperature=0,  # 決定的に（毎回同じ結果）
-            messages=[{"role": "user", "content": prompt}]
-        )
-
-        # コスト記録
-        record_cost(
-            operation="ガス設備見積生成",
-            model_name=self.model_name,
-            input_tokens=response.usage.input_tokens,
-            output_tokens=response.usage.output_tokens,
-            metadata={"source": "generate_detailed_estimate_items", "discipline": "ガス設備工事"}
+        # ストリーミング応答から完成した項目を順にEstimateItemに変換（コスト記録を含む）
+        items_data = self._stream_items(
+            building_info, prompt, "ガス設備見積生成",
+            {"source": "generate_detailed_estimate_items", "discipline": "ガス設備工事"}
         )
 
-        response_text = response.content[0].text
-        logger.debug(f"LLM Response for gas: {response_text[:500]}...")
-
-        # 堅牢なJSON抽出を使用
-        items_data = extract_json_array_robust(response_text)
-        logger.info(f"Gas items extracted: {len(items_data)} items")
-
-        # EstimateItemに変換
         estimate_items = []
         for item_data in items_data:
             # cost_typeの変換
@@ -1828,23 +2884,27 @@ JSON配列で、階層構造を持った見積項目を出力してください
             )
 
             estimate_items.append(estimate_item)
+            if on_item:
+                on_item(estimate_item)
 
+        logger.info(f"Gas items extracted: {len(estimate_items)} items")
         return estimate_items
 
     def generate_detailed_items_for_electrical(
         self,
-        building_info: Dict[str, Any]
+        building_info: Dict[str, Any],
+        on_item: Optional[Callable[[EstimateItem], None]] = None
     ) -> List[EstimateItem]:
         """
         電気設備の詳細見積項目をAI生成（仕様書準拠版）
 
         仕様書に記載された内容のみを抽出し、過剰な項目生成を防ぎます。
+        on_item を指定すると、ストリーミング応答から項目が完成するたびに呼び出します。
         """
         logger.info("Generating detailed electrical equipment items (specification-based)")
 
-        # 仕様書テキストを取得
-        spec_text = building_info.get("spec_text_excerpt", "")
-        if not spec_text:
+        # 仕様書テキスト・建物情報は共通プレフィックス（_shared_context_messages）で送信
+        if not building_info.get("spec_text_excerpt"):
             logger.warning("No specification text available - using minimal generation")
 
         # 建物情報を簡潔に抽出
@@ -1860,7 +2920,7 @@ JSON配列で、階層構造を持った見積項目を出力してください
         total_rooms = equipment_summary.get("total_rooms", 0)
 
         # 仕様書準拠のプロンプト
-        prompt = f"""あなたは熟練の電気設備積算技術者です。以下の仕様書と建物情報から電気設備工事の見積項目を生成してください。
+        prompt = f"""あなたは熟練の電気設備積算技術者です。上記の仕様書と建物情報から電気設備工事の見積項目を生成してください。
 
 【重要な制約】
 1. 仕様書に明記されている項目を優先的に抽出
@@ -1908,9 +2968,6 @@ JSON配列で、階層構造を持った見積項目を出力してください
   - 0.6-0.7: 上記ルールで推定
   - 0.5以下: 概算（要確認）
 
-【仕様書の内容】
-{spec_text[:12000]}
-
 【建物基本情報】
 - 工事名: {building_info.get('project_name', '')}
 - 延床面積: {bldg.get('total_floor_area', 2000)}㎡
@@ -1958,29 +3015,12 @@ JSON配列で、階層構造を持った見積項目を出力してください
         all_items.append(parent_item)
 
         try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=16000,
-                temperature=0,  # 決定的に（毎回同じ結果）
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            record_cost(
-                operation="電気設備生成（仕様書準拠）",
-                model_name=self.model_name,
-                input_tokens=response.usage.input_tokens,
-                output_tokens=response.usage.output_tokens,
-                metadata={"source": "generate_electrical_spec_based"}
+            # ストリーミング応答から完成した項目を順にEstimateItemに変換（コスト記録を含む）
+            items_data = self._stream_items(
+                building_info, prompt, "電気設備生成（仕様書準拠）", {"source": "generate_electrical_spec_based"}
             )
 
-            response_text = response.content[0].text
-            logger.debug(f"LLM Response for electrical (first 500 chars): {response_text[:500]}")
-
-            # 堅牢なJSON抽出を使用
-            items_data = extract_json_array_robust(response_text)
-            logger.info(f"Electrical items extracted: {len(items_data)} items")
-
-            # EstimateItemに変換
+            generated_count = 0
             for item_data in items_data:
                 cost_type = None
                 cost_type_str = item_data.get("cost_type", "")
@@ -2006,8 +3046,11 @@ JSON配列で、階層構造を持った見積項目を出力してください
                     confidence=item_data.get("confidence", 0.7)
                 )
                 all_items.append(estimate_item)
+                generated_count += 1
+                if on_item:
+                    on_item(estimate_item)
 
-            logger.info(f"Generated {len(items_data)} electrical items from specification")
+            logger.info(f"Generated {generated_count} electrical items from specification")
 
         except Exception as e:
             logger.error(f"Failed to generate electrical items: {e}")
@@ -2090,18 +3133,19 @@ JSON配列で、階層構造を持った見積項目を出力してください
 
     def generate_detailed_items_for_mechanical(
         self,
-        building_info: Dict[str, Any]
+        building_info: Dict[str, Any],
+        on_item: Optional[Callable[[EstimateItem], None]] = None
     ) -> List[EstimateItem]:
         """
         機械設備の詳細見積項目をAI生成（仕様書準拠版）
 
         仕様書に記載された内容のみを抽出し、過剰な項目生成を防ぎます。
+        on_item を指定すると、ストリーミング応答から項目が完成するたびに呼び出します。
         """
         logger.info("Generating detailed mechanical equipment items (specification-based)")
 
-        # 仕様書テキストを取得
-        spec_text = building_info.get("spec_text_excerpt", "")
-        if not spec_text:
+        # 仕様書テキスト・建物情報は共通プレフィックス（_shared_context_messages）で送信
+        if not building_info.get("spec_text_excerpt"):
             logger.warning("No specification text available - using minimal generation")
 
         # 建物情報を簡潔に抽出
@@ -2110,7 +3154,7 @@ JSON配列で、階層構造を持った見積項目を出力してください
         legal_standards = building_info.get("legal_standards", [])
 
         # 仕様書準拠のプロンプト
-        prompt = f"""あなたは熟練の機械設備積算技術者です。以下の仕様書から機械設備工事の見積項目を抽出してください。
+        prompt = f"""あなたは熟練の機械設備積算技術者です。上記の仕様書から機械設備工事の見積項目を抽出してください。
 
 【重要な制約】
 1. **仕様書に明記されている項目**を中心に抽出してください
@@ -2148,9 +3192,6 @@ JSON配列で、階層構造を持った見積項目を出力してください
   - 0.6-0.7: 上記ルールで推定
   - 0.5以下: 概算（要確認）
 
-【仕様書の内容】
-{spec_text[:15000]}
-
 【建物基本情報（参考）】
 - 工事名: {building_info.get('project_name', '')}
 - 延床面積: {bldg.get('total_floor_area', '')}㎡
@@ -2192,29 +3233,12 @@ JSON配列で、階層構造を持った見積項目を出力してください
         all_items.append(parent_item)
 
         try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=16000,
-                temperature=0,  # 決定的に（毎回同じ結果）
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            record_cost(
-                operation="機械設備生成（仕様書準拠）",
-                model_name=self.model_name,
-                input_tokens=response.usage.input_tokens,
-                output_tokens=response.usage.output_tokens,
-                metadata={"source": "generate_mechanical_spec_based"}
+            # ストリーミング応答から完成した項目を順にEstimateItemに変換（コスト記録を含む）
+            items_data = self._stream_items(
+                building_info, prompt, "機械設備生成（仕様書準拠）", {"source": "generate_mechanical_spec_based"}
             )
 
-            response_text = response.content[0].text
-            logger.debug(f"LLM Response for mechanical (first 500 chars): {response_text[:500]}")
-
-            # 堅牢なJSON抽出を使用
-            items_data = extract_json_array_robust(response_text)
-            logger.info(f"Mechanical items extracted: {len(items_data)} items")
-
-            # EstimateItemに変換
+            generated_count = 0
             for item_data in items_data:
                 cost_type = None
                 cost_type_str = item_data.get("cost_type", "")
@@ -2240,8 +3264,11 @@ JSON配列で、階層構造を持った見積項目を出力してください
                     confidence=item_data.get("confidence", 0.7)
                 )
                 all_items.append(estimate_item)
+                generated_count += 1
+                if on_item:
+                    on_item(estimate_item)
 
-            logger.info(f"Generated {len(items_data)} mechanical items from specification")
+            logger.info(f"Generated {generated_count} mechanical items from specification")
 
         except Exception as e:
             logger.error(f"Failed to generate mechanical items: {e}")
@@ -2251,42 +3278,7 @@ JSON配列で、階層構造を持った見積項目を出力してください
 
     def _normalize_text(self, text: str) -> str:
         """テキストを正規化（空白・記号を統一、類義語統一）"""
-        if not text:
-            return ""
-        import re
-        # 全角→半角
-        text = text.replace('（', '(').replace('）', ')').replace('　', ' ')
-        # 記号の統一
-        text = text.replace('・', '').replace('/', '').replace('-', '')
-        # 複数空白を1つに
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip().lower()
-
-        # 接尾辞の統一（「工事」「費」「材」等を除去して比較しやすく）
-        suffixes_to_remove = ['工事', '費', '工', '材料', '材']
-        for suffix in suffixes_to_remove:
-            if text.endswith(suffix) and len(text) > len(suffix):
-                text = text[:-len(suffix)]
-
-        # 類義語の統一
-        synonyms = {
-            '穴補修': '穴補修',
-            '穴あけ': '穴補修',
-            '壁穿孔': '穴補修',
-            '貫通': '穴補修',
-            '撤去': '撤去',
-            '解体': '撤去',
-            '取り外し': '撤去',
-            '取外し': '撤去',
-            '取付': '取付',
-            '設置': '取付',
-            '据付': '取付',
-        }
-        for key, value in synonyms.items():
-            if key in text:
-                text = text.replace(key, value)
-
-        return text
+        return normalize_text(text)
 
     def _extract_size(self, text: str) -> str:
         """テキストからサイズ情報を抽出（例: 15A, 20mm）"""
@@ -2319,224 +3311,22 @@ JSON配列で、階層構造を持った見積項目を出力してください
         """
         KBから単価を取得して項目に付与（ベクトル検索 + フォールバック版）
 
+        単価マッチングエンジン（PriceMatcher）の "discipline" プリセットで実行します。
+
         Args:
             estimate_items: 単価未設定の見積項目リスト
 
         Returns:
             単価・金額が設定された見積項目リスト
         """
+        self._refresh_price_kb_if_changed()
         vector_search_available = self.vector_search and self.vector_search.is_available()
         logger.info(f"Enriching {len(estimate_items)} items with prices from KB "
                    f"({len(self.price_kb)} KB items, vector_search={vector_search_available})")
 
-        enriched_items = []
-        vector_match_count = 0
-        string_match_count = 0
-
-        for item in estimate_items:
-            # 親項目（level 0）のみスキップ - 数量nullでも単価マッチングは試行
-            if item.level == 0:
-                enriched_items.append(item)
-                continue
-
-            # テキストを正規化
-            item_name_norm = self._normalize_text(item.name)
-            item_spec_norm = self._normalize_text(item.specification or "")
-            item_size = self._extract_size(item.specification or "")
-            item_category = self._get_category(item.name)
-
-            logger.debug(f"Matching: '{item.name}' {item.specification} | discipline={item.discipline.value}")
-
-            # ===== Phase 3: ベクトル検索を最初に試行 =====
-            matched_item = None
-            match_type = ""
-            best_score = 0.0
-
-            if vector_search_available:
-                vector_result = self._vector_search_match(
-                    item.name,
-                    item.specification or "",
-                    item.discipline.value,
-                    target_unit=item.unit  # 単位リランキング用
-                )
-                if vector_result:
-                    kb_item = vector_result["kb_item"]
-                    kb_price = kb_item.get("unit_price")
-                    # 単位互換性チェック（高額「式」単価を拒否）
-                    if self._check_unit_compatibility(item.unit, kb_item.get("unit", ""), kb_price):
-                        # 単価妥当性チェック
-                        if self._validate_price(item.name, kb_price):
-                            matched_item = kb_item
-                            match_type = "vector"
-                            best_score = vector_result["score"]
-                            vector_match_count += 1
-                            logger.debug(f"✓ Vector match: '{item.name}' → '{kb_item.get('item_id')}' "
-                                       f"(score={best_score:.3f})")
-
-            # ===== フォールバック: 文字列マッチング =====
-            if not matched_item:
-                # KBから類似項目を検索
-                best_match = None
-                category_fallback = None
-                category_fallback_score = 0.0
-                kb_candidates = 0
-
-                # Phase 2: 類義語を取得
-                item_synonyms = self._find_synonyms(item.name)
-                item_synonyms_norm = [self._normalize_text(s) for s in item_synonyms]
-
-                for kb_item in self.price_kb:
-                    # Phase 2: 工事区分の互換性チェック（緩和版）
-                    kb_discipline = kb_item.get("discipline", "")
-                    if not self._is_discipline_compatible(kb_discipline, item.discipline.value):
-                        continue
-
-                    kb_candidates += 1
-
-                    kb_desc = kb_item.get("description", "")
-                    kb_spec = kb_item.get("features", {}).get("specification", "")
-                    kb_full_text = f"{kb_desc} {kb_spec}"
-
-                    # 正規化
-                    kb_desc_norm = self._normalize_text(kb_desc)
-                    kb_spec_norm = self._normalize_text(kb_spec)
-                    kb_full_norm = self._normalize_text(kb_full_text)
-                    kb_size = self._extract_size(kb_spec)
-                    kb_category = self._get_category(kb_desc)
-
-                    # KB側の類義語も取得
-                    kb_synonyms = self._find_synonyms(kb_desc)
-                    kb_synonyms_norm = [self._normalize_text(s) for s in kb_synonyms]
-
-                    # 詳細な類似度計算
-                    score = 0.0
-
-                    # 1. 項目名の一致（正規化後）- 類義語も考慮
-                    if item_name_norm == kb_desc_norm:
-                        score += 2.0  # 完全一致は高スコア
-                    elif item_name_norm in kb_desc_norm or kb_desc_norm in item_name_norm:
-                        score += 1.5
-                    # Phase 2: 類義語でのマッチング
-                    elif any(syn in kb_synonyms_norm for syn in item_synonyms_norm):
-                        score += 1.8  # 類義語一致は高スコア
-                        logger.debug(f"  Synonym match: {item.name} ↔ {kb_desc}")
-                    elif any(word in kb_desc_norm for word in item_name_norm.split() if len(word) > 1):
-                        score += 1.0
-
-                    # 2. カテゴリの一致
-                    if item_category and kb_category and item_category == kb_category:
-                        score += 1.0
-                        # カテゴリが一致する場合はフォールバック候補
-                        if score > category_fallback_score:
-                            category_fallback = kb_item
-                            category_fallback_score = score
-
-                    # 3. 仕様・サイズの一致
-                    if item_spec_norm and kb_spec_norm:
-                        # 完全一致
-                        if item_spec_norm == kb_spec_norm:
-                            score += 1.5
-                        # サイズ一致（例: 15A）
-                        elif item_size and kb_size and item_size == kb_size:
-                            score += 1.2
-                        # 仕様が含まれる
-                        elif item_spec_norm in kb_full_norm or kb_spec_norm in item_spec_norm:
-                            score += 0.8
-
-                    # 4. 単位の一致
-                    unit_match_score = 0.0
-                    unit_compatible = True  # 単位の互換性フラグ
-
-                    if item.unit == kb_item.get("unit"):
-                        unit_match_score = 0.5
-                    elif item.unit and kb_item.get("unit"):
-                        # m と メートル、式 と 式 等
-                        unit_norm_item = self._normalize_text(item.unit)
-                        unit_norm_kb = self._normalize_text(kb_item.get("unit", ""))
-                        if unit_norm_item == unit_norm_kb:
-                            unit_match_score = 0.5
-                        elif unit_norm_item in unit_norm_kb or unit_norm_kb in unit_norm_item:
-                            unit_match_score = 0.3
-                        else:
-                            # 単位が完全に異なる場合は互換性なし（例: 式 vs 箇所）
-                            incompatible_pairs = [
-                                ("式", "箇所"), ("式", "個"), ("式", "m"), ("式", "台"),
-                                ("箇所", "m"), ("個", "m"), ("台", "m"), ("ヶ所", "m")
-                            ]
-                            for u1, u2 in incompatible_pairs:
-                                if (u1 in unit_norm_item and u2 in unit_norm_kb) or \
-                                   (u2 in unit_norm_item and u1 in unit_norm_kb):
-                                    unit_compatible = False
-                                    break
-
-                    # 単位が互換性ありの場合のみスコアに加算
-                    if unit_compatible:
-                        score += unit_match_score
-                    else:
-                        # 単位不整合の場合はマッチング対象外
-                        score = 0
-                        logger.debug(f"  ✗ Unit incompatible: {item.unit} vs {kb_item.get('unit')} - skipping")
-                        continue
-
-                    if score > best_score:
-                        best_score = score
-                        best_match = kb_item
-
-                # マッチング成功（閾値を調整）
-                logger.debug(f"  KB candidates: {kb_candidates}, best_score={best_score:.2f}")
-
-                if best_match and best_score >= 1.0:
-                    # 高品質マッチ（項目名+仕様が一致）
-                    matched_item = best_match
-                    match_type = "exact"
-                    string_match_count += 1
-                    logger.debug(f"✓ Exact match '{item.name}' → '{best_match.get('item_id')}' (score={best_score:.2f})")
-                elif best_match and best_score >= 0.3:  # 閾値緩和: 0.5 → 0.3
-                    # 中品質マッチ（項目名 or カテゴリが一致）
-                    matched_item = best_match
-                    match_type = "partial"
-                    string_match_count += 1
-                    logger.debug(f"≈ Partial match '{item.name}' → '{best_match.get('item_id')}' (score={best_score:.2f})")
-                elif category_fallback and category_fallback_score >= 0.5:  # 閾値緩和: 0.8 → 0.5
-                    # カテゴリフォールバック（カテゴリは一致するが仕様が異なる）
-                    matched_item = category_fallback
-                    match_type = "category"
-                    string_match_count += 1
-                    logger.debug(f"↳ Category fallback '{item.name}' → '{category_fallback.get('item_id')}' (score={category_fallback_score:.2f})")
-
-            # マッチング失敗の場合
-            if not matched_item:
-                logger.warning(f"✗ No match for '{item.name}' {item.specification} (best={best_score:.2f})")
-
-            if matched_item:
-                # 最大スコア5.0として正規化（50%=2.5）
-                normalized_score = min(best_score / 5.0, 1.0)
-                confidence_pct = int(normalized_score * 100)
-
-                # Phase 2: 単価妥当性チェック
-                matched_price = matched_item.get("unit_price")
-                price_valid = self._validate_price(item.name, matched_price)
-
-                # 30%以上のマッチングで単価を適用（閾値緩和: 0.50 → 0.30）
-                if (normalized_score >= 0.30 or best_score >= 0.5) and price_valid:
-                    item.unit_price = matched_price
-                    if item.quantity and item.unit_price:
-                        item.amount = item.quantity * item.unit_price
-                    item.confidence = normalized_score
-                    logger.info(f"✓ Match applied ({confidence_pct}%): {item.name} → ¥{item.unit_price:,.0f}")
-                elif not price_valid:
-                    # 単価が妥当でない場合は適用しない
-                    item.confidence = normalized_score * 0.5  # 信頼度を下げる
-                    logger.warning(f"⚠ Price rejected ({confidence_pct}%): {item.name} - KB has ¥{matched_price:,.0f} but price validation failed")
-                else:
-                    # 75%未満は参考値として記録するが金額は空
-                    item.confidence = normalized_score
-                    logger.info(f"△ Low confidence ({confidence_pct}%): {item.name} - KB has ¥{matched_price:,.0f} but not applied")
-
-                item.price_references = [matched_item.get("item_id")]
-                item.source_reference = f"KB:{matched_item.get('item_id')}[{match_type}]({confidence_pct}%), {item.source_reference}"
-
-            enriched_items.append(item)
+        matcher = self._create_price_matcher("discipline")
+        enriched_items = matcher.run(estimate_items)
+        match_counts = matcher.stats["apply"].counts
 
         # 親項目の金額を子項目の合計で計算
         enriched_items = self._calculate_parent_amounts(enriched_items)
@@ -2548,13 +3338,81 @@ JSON配列で、階層構造を持った見積項目を出力してください
         if len(estimate_items) > 0:
             match_rate = matched_count/len(estimate_items)*100
             logger.info(f"Price matching: {matched_count}/{len(estimate_items)} items ({match_rate:.1f}%)")
-            logger.info(f"  - Vector search matches: {vector_match_count}")
-            logger.info(f"  - String matching matches: {string_match_count}")
+            logger.info(f"  - Vector search matches: {match_counts.get('vector', 0)}")
+            logger.info(f"  - String matching matches: "
+                       f"{sum(match_counts.get(t, 0) for t in ('exact', 'partial', 'category'))}")
         else:
             logger.warning("No items to match prices for")
 
         return enriched_items
 
+    def _create_price_matcher(self, preset: str, workers: Optional[int] = None) -> PriceMatcher:
+        """
+        単価マッチングエンジンを作成
+
+        Args:
+            preset: 方針のプリセット名（"discipline" / "unified"）
+            workers: 文字列マッチングの並列プロセス数（Noneは設定ファイルの値）
+
+        Returns:
+            configs/config.yaml の price_matching（工事区分ごとの上書き・並列数）を適用したPriceMatcher
+        """
+        if self._price_matching_config is None:
+            self._price_matching_config = load_price_matching_config()
+        config = self._price_matching_config
+        policy = PRESETS[preset]
+        matcher = PriceMatcher(
+            self,
+            policy,
+            config.get("disciplines"),
+            workers=config.get("workers", 0) if workers is None else workers,
+            parallel_min_items=config.get("parallel_min_items", 500),
+            chunk_size=config.get("chunk_size", 0),
+            cache=self._get_match_cache(policy, config)
+        )
+        self.last_price_match_stats = matcher.stats
+        return matcher
+
+    def _create_price_prefetcher(self, preset: str) -> Optional[PricePrefetcher]:
+        """
+        生成中の項目の単価マッチングを先行実行する PricePrefetcher を作成
+
+        llm.stream_items・llm.prefetch_prices が無効、またはマッチング結果キャッシュが
+        使えない場合（先行実行の結果を後の単価付与に渡せない）はNone
+        """
+        llm_config = load_llm_config()
+        if not (llm_config.get("stream_items", True) and llm_config.get("prefetch_prices", True)):
+            return None
+        self._refresh_price_kb_if_changed()
+        # バックグラウンドスレッドからはプロセスプールを使わない（workers=1）
+        matcher = self._create_price_matcher(preset, workers=1)
+        if matcher.cache is None:
+            return None
+        return PricePrefetcher(matcher)
+
+    def _get_match_cache(self, policy, config: Dict[str, Any]) -> Optional[MatchResultCache]:
+        """
+        マッチング結果キャッシュを取得（KBバージョン・照合規則・方針・ベクトル検索モデル・インデックス設定ごと）
+
+        use_cache=False、price_matching.cache=false、またはKBが無い場合はNone
+        """
+        if not (self.use_cache and config.get("cache", True) and self._kb_version):
+            return None
+        vector_available = self.vector_search is not None and self.vector_search.is_available()
+        policy_key = policy_cache_key(
+            policy,
+            config.get("disciplines") or {},
+            self.vector_search.model_name if vector_available else None,
+            self.vector_search.search_config() if vector_available else None,
+        )
+        if policy_key not in self._match_caches:
+            # KBファイルごとのディレクトリ（別KBのキャッシュを古いバージョンとして削除しない）
+            cache_dir = Path(config.get("cache_dir", "cache/match_results")) / Path(self.kb_path).stem
+            self._match_caches[policy_key] = MatchResultCache(
+                str(cache_dir), self._kb_version, policy_key, keep_versions=int(config.get("cache_keep_versions", 3))
+            )
+        return self._match_caches[policy_key]
+
     def _calculate_parent_amounts(self, items: List[EstimateItem]) -> List[EstimateItem]:
         """
         親項目の金額を子項目の合計で計算
@@ -2666,60 +3524,44 @@ JSON配列で、階層構造を持った見積項目を出力してください
 
         return items
 
-    def generate_estimate(
+    def _spec_analysis_stages(
         self,
         spec_pdf_path: str,
-        discipline: DisciplineType,
-        legal_standards: list = None
-    ) -> FMTDocument:
+        legal_standards: Optional[list] = None,
+        spec_text_limit: Optional[int] = None
+    ) -> List[Stage]:
         """
-        仕様書からAIで詳細見積を自動生成
+        仕様書解析パイプラインのステージ定義
+
+        建物情報（LLM）と諸元表（テキスト）は仕様書テキストに依存し、
+        Vision・図面解析はPDFのみに依存するため、テキスト抽出と並行して実行されます。
+        building_info ステージで全ての結果を建物情報にマージします。
 
         Args:
             spec_pdf_path: 仕様書PDFのパス
-            discipline: 工事区分
-            legal_standards: 適用法令リスト（例: ["建築基準法", "電気設備技術基準"]）
-
-        Returns:
-            生成されたFMTDocument
+            legal_standards: 適用法令リスト
+            spec_text_limit: building_info に追加する仕様書テキストの最大文字数（Noneは制限なし）
         """
-        if legal_standards is None:
-            legal_standards = []
-        logger.info(f"Starting AI-based estimate generation for {discipline.value}")
-        if legal_standards:
-            logger.info(f"Applicable legal standards: {', '.join(legal_standards)}")
-
-        # 1. 仕様書からテキスト抽出
-        spec_text = self.extract_text_from_pdf(spec_pdf_path)
-
-        # 2. 建物情報を詳細抽出
-        building_info = self.extract_building_info(spec_text)
+        def merge(spec_text, building_info, spec_table_data, vision_table_data, drawing_info):
+            # 仕様書テキストを追加（生成時に参照するため）
+            building_info["spec_text_excerpt"] = spec_text[:spec_text_limit] if spec_text_limit else spec_text
 
-        # 仕様書テキストを追加（生成時に参照するため）
-        # 最初の30000文字のみ（トークン制限のため）
-        building_info["spec_text_excerpt"] = spec_text[:30000]
+            # 法令情報を追加
+            if legal_standards:
+                building_info["legal_standards"] = legal_standards
 
-        # 法令情報を追加
-        if legal_standards:
-            building_info["legal_standards"] = legal_standards
-
-        # 2.5. 諸元表から詳細な部屋・設備情報を抽出（テキストベース）
-        spec_table_data = self.extract_specification_tables(spec_pdf_path, spec_text)
-        if spec_table_data.get("rooms"):
             # 諸元表データを building_info にマージ
-            building_info["spec_table"] = spec_table_data
-            equipment_summary = spec_table_data.get("equipment_summary", {})
-            if equipment_summary.get("total_gas_outlets"):
-                building_info.setdefault("facility_requirements", {}).setdefault("gas", {})["num_connection_points"] = equipment_summary["total_gas_outlets"]
-            if equipment_summary.get("total_rooms"):
-                building_info.setdefault("building_info", {})["num_rooms"] = equipment_summary["total_rooms"]
-            logger.info(f"Merged spec table data: {len(spec_table_data.get('rooms', []))} rooms, {equipment_summary.get('total_gas_outlets', 0)} gas outlets")
-
-        # 2.6. Phase 1: Vision抽出による諸元表データ取得（より正確）
-        if HAS_PYMUPDF:
-            vision_table_data = self.extract_specification_table_with_vision(spec_pdf_path)
+            if spec_table_data.get("rooms"):
+                building_info["spec_table"] = spec_table_data
+                equipment_summary = spec_table_data.get("equipment_summary", {})
+                if equipment_summary.get("total_gas_outlets"):
+                    building_info.setdefault("facility_requirements", {}).setdefault("gas", {})["num_connection_points"] = equipment_summary["total_gas_outlets"]
+                if equipment_summary.get("total_rooms"):
+                    building_info.setdefault("building_info", {})["num_rooms"] = equipment_summary["total_rooms"]
+                logger.info(f"Merged spec table data: {len(spec_table_data.get('rooms', []))} rooms, {equipment_summary.get('total_gas_outlets', 0)} gas outlets")
+
+            # Vision抽出データで上書き・補完（より正確）
             if vision_table_data.get("rooms"):
-                # Vision抽出データで上書き・補完
                 building_info["spec_table_vision"] = vision_table_data
                 totals = vision_table_data.get("totals", {})
 
@@ -2735,13 +3577,96 @@ JSON配列で、階層構造を持った見積項目を出力してください
                            f"{totals.get('gas_outlet_total', 0)} gas outlets, "
                            f"{totals.get('electrical_outlet_total', 0)} electrical outlets")
 
-        # 2.7. 図面から設備情報を抽出（オプション）
-        if HAS_PYMUPDF:
-            drawing_info = self.extract_drawing_info(spec_pdf_path)
+            # 図面の設備情報
             if drawing_info.get("equipment_locations") or drawing_info.get("pipe_routes"):
                 building_info["drawing_info"] = drawing_info
                 logger.info(f"Merged drawing data: {len(drawing_info.get('equipment_locations', []))} equipment items, {len(drawing_info.get('pipe_routes', []))} pipe routes")
 
+            return building_info
+
+        # 空の結果・一部ページの失敗はAPIエラー等の可能性があるためキャッシュしない
+        def all_pages_ok(output):
+            return "failed_pages" in output and not output["failed_pages"]
+
+        # 部屋がない諸元表（空の rooms）も結果としてキャッシュし、応答の解析失敗のみ除く
+        # （APIエラーは例外のためキャッシュされない）
+        def spec_table_ok(output):
+            return not output.get("failed")
+
+        return [
+            # 1. 仕様書からテキスト抽出
+            Stage("spec_text", lambda: self.extract_text_from_pdf(spec_pdf_path),
+                  cache_version=SPEC_STAGE_VERSIONS["spec_text"], cache_if=bool),
+            # 2. 建物情報を詳細抽出
+            Stage("extracted_info", self.extract_building_info, inputs=("spec_text",),
+                  cache_version=SPEC_STAGE_VERSIONS["extracted_info"], cache_if=bool),
+            # 2.5. 諸元表から詳細な部屋・設備情報を抽出（テキストベース）
+            Stage("spec_table", lambda spec_text: self.extract_specification_tables(spec_pdf_path, spec_text),
+                  inputs=("spec_text",),
+                  cache_version=SPEC_STAGE_VERSIONS["spec_table"], cache_if=spec_table_ok),
+            # 2.6. Vision抽出による諸元表データ取得
+            Stage("spec_table_vision",
+                  lambda: self.extract_specification_table_with_vision(spec_pdf_path) if HAS_PYMUPDF else {},
+                  cache_version=SPEC_STAGE_VERSIONS["spec_table_vision"], cache_if=all_pages_ok),
+            # 2.7. 図面から設備情報を抽出（オプション）
+            Stage("drawing_info", lambda: self.extract_drawing_info(spec_pdf_path) if HAS_PYMUPDF else {},
+                  cache_version=SPEC_STAGE_VERSIONS["drawing_info"], cache_if=all_pages_ok),
+            # 建物情報へのマージ（法令・テキスト長の指定に依存するためキャッシュしない）
+            Stage("building_info", merge,
+                  inputs=("spec_text", "extracted_info", "spec_table", "spec_table_vision", "drawing_info")),
+        ]
+
+    def _analyze_spec_document(
+        self,
+        spec_pdf_path: str,
+        legal_standards: Optional[list] = None,
+        spec_text_limit: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        仕様書解析パイプラインをステージDAGで実行し、マージ済みの建物情報を返す
+
+        use_cache=True の場合、各ステージの出力を PDFハッシュ・モデル名・ステージのバージョンを
+        キーとしてキャッシュし、同じ仕様書の再実行ではAPIを呼び出しません。
+        ステージごとの処理時間は self.last_stage_timings に記録します。
+        """
+        cache = spec_stage_cache(spec_pdf_path, self.model_name, str(self.cache_dir)) if self.use_cache else None
+        dag = StageDAG(
+            self._spec_analysis_stages(spec_pdf_path, legal_standards, spec_text_limit),
+            max_workers=load_llm_config().get("stage_max_concurrency", 4),
+            name="spec_analysis",
+            cache=cache
+        )
+        run = dag.run()
+        self.last_stage_timings = run.timings
+        return run.outputs["building_info"]
+
+    def generate_estimate(
+        self,
+        spec_pdf_path: str,
+        discipline: DisciplineType,
+        legal_standards: list = None
+    ) -> FMTDocument:
+        """
+        仕様書からAIで詳細見積を自動生成
+
+        Args:
+            spec_pdf_path: 仕様書PDFのパス
+            discipline: 工事区分
+            legal_standards: 適用法令リスト（例: ["建築基準法", "電気設備技術基準"]）
+
+        Returns:
+            生成されたFMTDocument
+        """
+        if legal_standards is None:
+            legal_standards = []
+        logger.info(f"Starting AI-based estimate generation for {discipline.value}")
+        if legal_standards:
+            logger.info(f"Applicable legal standards: {', '.join(legal_standards)}")
+
+        # 1〜2.7. 仕様書テキスト・建物情報・諸元表・図面を抽出（独立したステージは並行実行）
+        # 仕様書テキストは最初の30000文字のみ（トークン制限のため）
+        building_info = self._analyze_spec_document(spec_pdf_path, legal_standards, spec_text_limit=30000)
+
         # 3. 工事区分別に詳細項目を生成
         logger.info(f"Starting item generation for discipline: {discipline.value}")
         if discipline == DisciplineType.GAS:
@@ -2836,7 +3761,10 @@ JSON配列で、階層構造を持った見積項目を出力してください
         return fmt_doc
 
     def generate_detailed_items_generic(
-        self, building_info: Dict[str, Any], discipline: DisciplineType
+        self,
+        building_info: Dict[str, Any],
+        discipline: DisciplineType,
+        on_item: Optional[Callable[[EstimateItem], None]] = None
     ) -> List[EstimateItem]:
         """
         汎用的な設備項目生成メソッド（空調・衛生・消防等に対応）
@@ -2844,11 +3772,11 @@ JSON配列で、階層構造を持った見積項目を出力してください
         Args:
             building_info: 建物情報
             discipline: 工事区分
+            on_item: ストリーミング応答から項目が完成するたびに呼び出す関数
 
         Returns:
             見積項目リスト
         """
-        spec_text = building_info.get("spec_text_excerpt", "")[:30000]
         discipline_name = discipline.value
 
         # KBから該当カテゴリの項目例を取得
@@ -2858,7 +3786,8 @@ JSON配列で、階層構造を持った見積項目を出力してください
                 kb_examples.append(f"- {kb_item.get('description')} ({kb_item.get('unit')})")
         kb_examples_str = "\n".join(kb_examples[:20]) if kb_examples else "（KB項目なし）"
 
-        prompt = f"""あなたは熟練の建築設備積算技術者です。以下の仕様書から「{discipline_name}」に関する見積項目を抽出してください。
+        # 仕様書テキスト・建物情報は共通プレフィックス（_shared_context_messages）で送信
+        prompt = f"""あなたは熟練の建築設備積算技術者です。上記の仕様書から「{discipline_name}」に関する見積項目を抽出してください。
 
 【重要な制約】
 1. **仕様書に明記されている項目**を中心に抽出してください
@@ -2876,9 +3805,6 @@ JSON配列で、階層構造を持った見積項目を出力してください
 - 階数: {building_info.get('building_info', {}).get('floors', '不明')}
 - 部屋数: {building_info.get('building_info', {}).get('num_rooms', '不明')}
 
-【仕様書（抜粋）】
-{spec_text}
-
 【出力形式】
 JSON配列形式で出力してください：
 ```json
@@ -2900,40 +3826,12 @@ JSON配列形式で出力してください：
 仕様書を確認し、{discipline_name}に該当する項目のみを抽出してください。該当がなければ [] を返してください。"""
 
         try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=16000,
-                temperature=0,  # 決定的に（毎回同じ結果）
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            record_cost(
-                operation=f"{discipline_name}項目生成",
-                model_name=self.model_name,
-                input_tokens=response.usage.input_tokens,
-                output_tokens=response.usage.output_tokens,
-                metadata={"source": "generate_detailed_items_generic", "discipline": discipline_name}
+            # ストリーミング応答から完成した項目を順にEstimateItemに変換（コスト記録を含む）
+            items_data = self._stream_items(
+                building_info, prompt, f"{discipline_name}項目生成",
+                {"source": "generate_detailed_items_generic", "discipline": discipline_name}
             )
 
-            response_text = response.content[0].text
-
-            # JSON抽出
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
-
-            if json_start == -1 or json_end <= json_start:
-                logger.info(f"No items found for {discipline_name}")
-                return []
-
-            json_str = response_text[json_start:json_end]
-
-            try:
-                items_data = json.loads(json_str)
-            except json.JSONDecodeError:
-                json_str = repair_json_array(json_str)
-                items_data = json.loads(json_str)
-
-            # EstimateItemに変換
             estimate_items = []
             for item_data in items_data:
                 estimate_item = EstimateItem(
@@ -2949,13 +3847,81 @@ JSON配列形式で出力してください：
                     estimation_basis=item_data.get("estimation_basis", "仕様書記載")
                 )
                 estimate_items.append(estimate_item)
+                if on_item:
+                    on_item(estimate_item)
 
+            if not estimate_items:
+                logger.info(f"No items found for {discipline_name}")
             return estimate_items
 
         except Exception as e:
             logger.error(f"Error generating {discipline_name} items: {e}")
             return []
 
+    def _generate_items_for_all_disciplines(
+        self,
+        building_info: Dict[str, Any],
+        max_concurrency: Optional[int] = None,
+        price_preset: Optional[str] = None
+    ) -> List[EstimateItem]:
+        """
+        6工事区分の項目生成（LLM呼び出し）をスレッドプールで並行実行
+
+        各工事区分の生成は building_info を読み取るだけで互いに独立しているため、
+        同時に実行して待ち時間を最も長い呼び出し程度に短縮します。
+        結果は工事区分の順序（電気・機械・ガス・空調・衛生・消防）で結合します。
+
+        price_preset を指定すると、ストリーミング応答から完成した項目を PricePrefetcher に渡し、
+        生成と並行して単価マッチングを行います（結果はマッチング結果キャッシュに記録され、
+        後の enrich_with_prices_unified ではキャッシュから適用されます）。
+
+        Args:
+            building_info: 建物情報
+            max_concurrency: 同時に実行するLLM呼び出し数（Noneは llm.max_concurrency の設定値、1 = 逐次）
+            price_preset: 先行マッチングの方針（後で単価付与に使うプリセット名、Noneは先行しない）
+
+        Returns:
+            全工事区分の見積項目リスト
+        """
+        generators = [
+            ("electrical", self.generate_detailed_items_for_electrical),
+            ("mechanical", self.generate_detailed_items_for_mechanical),
+            ("gas", self.generate_detailed_items_for_gas),
+            ("HVAC", lambda info, on_item: self.generate_detailed_items_generic(info, DisciplineType.HVAC, on_item)),
+            ("plumbing", lambda info, on_item: self.generate_detailed_items_generic(info, DisciplineType.PLUMBING, on_item)),
+            ("fire protection", lambda info, on_item: self.generate_detailed_items_generic(
+                info, DisciplineType.FIRE_PROTECTION, on_item)),
+        ]
+        if max_concurrency is None:
+            max_concurrency = load_llm_config().get("max_concurrency", 6)
+        max_workers = max(1, min(int(max_concurrency or 1), len(generators)))
+        if max_workers > 1 and load_llm_config().get("prompt_cache", True):
+            self._warm_prompt_cache(building_info)
+        prefetcher = self._create_price_prefetcher(price_preset) if price_preset else None
+
+        def run(label, generate):
+            logger.info(f"Generating {label} items...")
+            start = time.perf_counter()
+            items = generate(building_info, prefetcher.submit if prefetcher else None)
+            logger.info(f"Generated {len(items)} {label} items ({time.perf_counter() - start:.1f}s)")
+            return items
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="discipline-llm") as executor:
+                futures = [executor.submit(run, label, generate) for label, generate in generators]
+                # 完了順ではなく工事区分の順序で結合（例外は呼び出し元へ送出）
+                estimate_items = []
+                for future in futures:
+                    estimate_items.extend(future.result())
+        finally:
+            if prefetcher:
+                prefetcher.close()
+
+        logger.info(f"Discipline item generation finished in {time.perf_counter() - start:.1f}s "
+                    f"(concurrency={max_workers})")
+        return estimate_items
+
     def generate_estimate_unified(
         self,
         spec_pdf_path: str,
@@ -2978,47 +3944,9 @@ JSON配列形式で出力してください：
             legal_standards = []
         logger.info("Starting unified estimate generation (all disciplines)")
 
-        # 1. 仕様書からテキスト抽出
-        spec_text = self.extract_text_from_pdf(spec_pdf_path)
-
-        # 2. 建物情報を詳細抽出
-        building_info = self.extract_building_info(spec_text)
-
-        # 仕様書テキストを全て追加（制限なし）
-        building_info["spec_text_excerpt"] = spec_text
-
-        # 法令情報を追加
-        if legal_standards:
-            building_info["legal_standards"] = legal_standards
-
-        # 2.5. 諸元表から詳細な部屋・設備情報を抽出
-        spec_table_data = self.extract_specification_tables(spec_pdf_path, spec_text)
-        if spec_table_data.get("rooms"):
-            building_info["spec_table"] = spec_table_data
-            equipment_summary = spec_table_data.get("equipment_summary", {})
-            if equipment_summary.get("total_gas_outlets"):
-                building_info.setdefault("facility_requirements", {}).setdefault("gas", {})["num_connection_points"] = equipment_summary["total_gas_outlets"]
-            if equipment_summary.get("total_rooms"):
-                building_info.setdefault("building_info", {})["num_rooms"] = equipment_summary["total_rooms"]
-
-        # 2.6. Vision抽出による諸元表データ取得
-        if HAS_PYMUPDF:
-            vision_table_data = self.extract_specification_table_with_vision(spec_pdf_path)
-            if vision_table_data.get("rooms"):
-                building_info["spec_table_vision"] = vision_table_data
-                totals = vision_table_data.get("totals", {})
-                if totals.get("room_count"):
-                    building_info.setdefault("building_info", {})["num_rooms"] = totals["room_count"]
-                if totals.get("gas_outlet_total"):
-                    building_info.setdefault("facility_requirements", {}).setdefault("gas", {})["num_connection_points"] = totals["gas_outlet_total"]
-                if totals.get("electrical_outlet_total"):
-                    building_info.setdefault("facility_requirements", {}).setdefault("electrical", {})["outlet_count"] = totals["electrical_outlet_total"]
-
-        # 2.7. 図面から設備情報を抽出
-        if HAS_PYMUPDF:
-            drawing_info = self.extract_drawing_info(spec_pdf_path)
-            if drawing_info.get("equipment_locations") or drawing_info.get("pipe_routes"):
-                building_info["drawing_info"] = drawing_info
+        # 1〜2.7. 仕様書テキスト・建物情報・諸元表・図面を抽出（独立したステージは並行実行）
+        # 仕様書テキストは全て追加（制限なし）
+        building_info = self._analyze_spec_document(spec_pdf_path, legal_standards)
 
         # 3. キャッシュから項目を読み込み、なければ生成
         cached_items = self._load_cached_items(spec_pdf_path)
@@ -3039,45 +3967,9 @@ JSON配列形式で出力してください：
                 except Exception as e:
                     logger.warning(f"Failed to restore cached item: {e}")
         else:
-            # 新規生成
+            # 新規生成（6工事区分のLLM呼び出しを並行実行）
             logger.info("Generating unified estimate items using split LLM calls for all 6 categories")
-            estimate_items = []
-
-            # 3.1 電気設備工事
-            logger.info("Generating electrical items...")
-            electrical_items = self.generate_detailed_items_for_electrical(building_info)
-            logger.info(f"Generated {len(electrical_items)} electrical items")
-            estimate_items.extend(electrical_items)
-
-            # 3.2 機械設備工事
-            logger.info("Generating mechanical items...")
-            mechanical_items = self.generate_detailed_items_for_mechanical(building_info)
-            logger.info(f"Generated {len(mechanical_items)} mechanical items")
-            estimate_items.extend(mechanical_items)
-
-            # 3.3 ガス設備工事
-            logger.info("Generating gas items...")
-            gas_items = self.generate_detailed_items_for_gas(building_info)
-            logger.info(f"Generated {len(gas_items)} gas items")
-            estimate_items.extend(gas_items)
-
-            # 3.4 空調設備工事
-            logger.info("Generating HVAC items...")
-            hvac_items = self.generate_detailed_items_generic(building_info, DisciplineType.HVAC)
-            logger.info(f"Generated {len(hvac_items)} HVAC items")
-            estimate_items.extend(hvac_items)
-
-            # 3.5 衛生設備工事
-            logger.info("Generating plumbing items...")
-            plumbing_items = self.generate_detailed_items_generic(building_info, DisciplineType.PLUMBING)
-            logger.info(f"Generated {len(plumbing_items)} plumbing items")
-            estimate_items.extend(plumbing_items)
-
-            # 3.6 消防設備工事
-            logger.info("Generating fire protection items...")
-            fire_items = self.generate_detailed_items_generic(building_info, DisciplineType.FIRE_PROTECTION)
-            logger.info(f"Generated {len(fire_items)} fire protection items")
-            estimate_items.extend(fire_items)
+            estimate_items = self._generate_items_for_all_disciplines(building_info, price_preset="unified")
 
             logger.info(f"Generated total {len(estimate_items)} unified items across all 6 categories")
 
@@ -3264,7 +4156,8 @@ JSON配列形式で出力してください：
                 model=self.model_name,
                 max_tokens=16000,  # 大量の項目に対応
                 temperature=0,  # 決定的に（毎回同じ結果）
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                operation="統合見積項目生成"
             )
 
             record_cost(
@@ -3329,128 +4222,29 @@ JSON配列形式で出力してください：
             logger.error(f"Error in unified item generation: {e}")
             return []
 
-    def enrich_with_prices_unified(self, estimate_items: List[EstimateItem]) -> List[EstimateItem]:
+    def enrich_with_prices_unified(
+        self,
+        estimate_items: List[EstimateItem],
+        workers: Optional[int] = None
+    ) -> List[EstimateItem]:
         """
         KBから単価を取得（全カテゴリ使用、discipline制限なし）
 
         全てのKB項目を検索対象とし、工事区分による絞り込みを行わない。
+        単価マッチングエンジン（PriceMatcher）の "unified" プリセットで実行します。
+
+        Args:
+            estimate_items: 単価未設定の見積項目リスト
+            workers: 文字列マッチングの並列プロセス数（Noneは price_matching.workers の設定値）
         """
+        self._refresh_price_kb_if_changed()
         vector_search_available = self.vector_search and self.vector_search.is_available()
         logger.info(f"Enriching {len(estimate_items)} items with prices (unified, no discipline filter)")
         logger.info(f"KB items: {len(self.price_kb)}, vector_search={vector_search_available}")
 
-        enriched_items = []
-        match_count = 0
-
-        for item in estimate_items:
-            # 親項目（level 0）のみスキップ - 数量nullでも単価マッチングは試行
-            if item.level == 0:
-                enriched_items.append(item)
-                continue
-
-            # テキストを正規化
-            item_name_norm = self._normalize_text(item.name)
-            item_spec_norm = self._normalize_text(item.specification or "")
-            item_size = self._extract_size(item.specification or "")
-            item_category = self._get_category(item.name)
-
-            # ===== ベクトル検索を試行（discipline制限なし） =====
-            matched_item = None
-            match_type = ""
-            best_score = 0.0
-
-            if vector_search_available:
-                # discipline=Noneで全カテゴリ検索、単位リランキング付き
-                vector_result = self._vector_search_match(
-                    item.name,
-                    item.specification or "",
-                    None,  # discipline制限なし
-                    target_unit=item.unit  # 単位リランキング用
-                )
-                if vector_result:
-                    kb_item = vector_result["kb_item"]
-                    kb_price = kb_item.get("unit_price")
-                    if self._check_unit_compatibility(item.unit, kb_item.get("unit", ""), kb_price):
-                        if self._validate_price(item.name, kb_price):
-                            matched_item = kb_item
-                            match_type = "vector"
-                            best_score = vector_result["score"]
-                            match_count += 1
-
-            # ===== フォールバック: 文字列マッチング（全KB検索） =====
-            if not matched_item:
-                best_match = None
-                best_match_score = 0.0
-
-                for kb_item in self.price_kb:
-                    # discipline制限なし - 全KB項目を検索
-
-                    kb_desc = kb_item.get("description", "")
-                    kb_spec = kb_item.get("features", {}).get("specification", "")
-                    kb_full_text = f"{kb_desc} {kb_spec}"
-
-                    kb_desc_norm = self._normalize_text(kb_desc)
-                    kb_spec_norm = self._normalize_text(kb_spec)
-                    kb_full_norm = self._normalize_text(kb_full_text)
-                    kb_size = self._extract_size(kb_spec)
-                    kb_category = self._get_category(kb_desc)
-
-                    # 類似度計算
-                    score = 0.0
-
-                    # 1. 項目名の一致
-                    if item_name_norm == kb_desc_norm:
-                        score += 2.0
-                    elif item_name_norm in kb_desc_norm or kb_desc_norm in item_name_norm:
-                        score += 1.5
-                    elif any(word in kb_desc_norm for word in item_name_norm.split() if len(word) > 1):
-                        score += 1.0
-
-                    # 2. カテゴリの一致
-                    if item_category and kb_category and item_category == kb_category:
-                        score += 1.0
-
-                    # 3. 仕様・サイズの一致
-                    if item_spec_norm and kb_spec_norm:
-                        if item_spec_norm == kb_spec_norm:
-                            score += 1.5
-                        elif item_size and kb_size and item_size == kb_size:
-                            score += 1.2
-                        elif item_spec_norm in kb_full_norm or kb_spec_norm in item_spec_norm:
-                            score += 0.8
-
-                    # 4. 単位互換性チェック（高額「式」単価を拒否）
-                    kb_price = kb_item.get("unit_price")
-                    if not self._check_unit_compatibility(item.unit, kb_item.get("unit", ""), kb_price):
-                        continue
-
-                    if score >= 2.0 and score > best_match_score:
-                        best_match = kb_item
-                        best_match_score = score
-
-                if best_match:
-                    matched_item = best_match
-                    match_type = "string"
-                    best_score = best_match_score
-                    match_count += 1
-
-            # 単価を設定（妥当性チェック付き）
-            if matched_item:
-                candidate_price = matched_item.get("unit_price")
-                # 金額妥当性チェック
-                if self._check_price_sanity(item.name, item.unit, candidate_price, item.quantity or 0):
-                    item.unit_price = candidate_price
-                    if item.quantity and item.unit_price:
-                        item.amount = item.quantity * item.unit_price
-                    item.source_reference = f"KB:{matched_item.get('item_id')}[{match_type}](score={best_score:.2f})"
-                    item.price_references = [matched_item.get("item_id")]
-                    logger.debug(f"✓ Matched '{item.name}' → {matched_item.get('item_id')} @¥{item.unit_price:,.0f}")
-                else:
-                    # 妥当性チェック失敗 - 単価を適用しない
-                    logger.warning(f"✗ Price rejected for '{item.name}': ¥{candidate_price:,.0f} × {item.quantity} = ¥{candidate_price * (item.quantity or 0):,.0f}")
-                    match_count -= 1  # マッチカウントを減らす
-
-            enriched_items.append(item)
+        matcher = self._create_price_matcher("unified", workers)
+        enriched_items = matcher.run(estimate_items)
+        match_count = matcher.stats["apply"].counts.get("applied", 0)
 
         match_rate = match_count / len([i for i in estimate_items if i.level > 0 and i.quantity]) * 100 if estimate_items else 0
         logger.info(f"Unified price matching: {match_count} items matched ({match_rate:.1f}%)")
@@ -3473,8 +4267,6 @@ if __name__ == "__main__":
     import sys
     sys.path.insert(0, '.')
 
-    generator = AIEstimateGenerator()
-
     spec_path = "test-files/仕様書【都立山崎高等学校仮設校舎等の借入れ】ord202403101060100130187c1e4d0.pdf"
 
     if Path(spec_path).exists():
@@ -3483,10 +4275,11 @@ if __name__ == "__main__":
         print("="*80)
 
         # 見積書を生成
-        fmt_doc = generator.generate_estimate(
-            spec_path,
-            DisciplineType.GAS
-        )
+        with AIEstimateGenerator() as generator:
+            fmt_doc = generator.generate_estimate(
+                spec_path,
+                DisciplineType.GAS
+            )
 
         print(f"\n【生成結果】")
         print(f"  工事名: {fmt_doc.project_info.project_name}")
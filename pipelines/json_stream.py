@@ -0,0 +1,198 @@
+"""
+ストリーミング応答のJSON配列インクリメンタルパーサ
+
+LLMの応答をチャンクごとに受け取り、JSON配列のトップレベルのオブジェクトが
+閉じた時点で1件ずつ返します。応答全体の受信を待たずに後続処理（単価マッチング等）を
+開始できます。
+
+extract_json_array_robust / repair_json_array と同じく、次の崩れた出力に対応します。
+  - マークダウンコードブロック（```json ... ```）・配列前の説明文
+  - オブジェクト間のカンマ欠落（} { / }\\n{）・末尾のカンマ
+  - 波括弧のないオブジェクト（[ "item_no": ..., "name": ... ]）
+    → "item_no" / "name" キーが同じオブジェクト内で2回目に現れた行を次のオブジェクトの開始とみなす
+  - 末尾切れ（閉じていない最後のオブジェクトは破棄）
+
+使用例:
+    parser = IncrementalJSONArrayParser()
+    for chunk in stream.text_stream:
+        for item in parser.feed(chunk):
+            ...
+    for item in parser.close():
+        ...
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from loguru import logger
+
+# 波括弧のないオブジェクトで、新しいオブジェクトの開始とみなすキー
+BARE_OBJECT_START_KEYS = ("item_no", "name")
+
+_KEY_LINE_PATTERN = re.compile(r'\s*"([A-Za-z_][A-Za-z0-9_]*)"\s*:')
+_TRAILING_COMMA_PATTERN = re.compile(r',\s*([}\]])')
+
+
+class IncrementalJSONArrayParser:
+    """
+    JSON配列をチャンク単位で受け取り、完成したオブジェクトを順に返すパーサ
+
+    最初のJSON配列（"[" の直後が "{"・'"'・"]" のもの）だけを対象とし、
+    配列が閉じた後のテキストは無視します。パースできないオブジェクトは
+    警告を出して読み飛ばします（skipped に件数を記録）。
+    """
+
+    def __init__(self):
+        self.text = ""  # 受信したテキスト全体
+        self.items_parsed = 0
+        self.skipped = 0
+        self._pos = 0  # 次に走査する位置
+        self._state = "search"  # search: "[" を探索 / open: "[" の直後 / array: 配列内 / done: 配列終了
+        self._depth = 0  # 配列直下を0とするネストの深さ
+        self._in_string = False
+        self._escape = False
+        self._object_start: Optional[int] = None  # 現在のオブジェクトの開始位置
+        self._bare = False  # 現在のオブジェクトが波括弧なしか
+        self._bare_keys: Set[str] = set()
+        self._line_start = 0
+
+    @property
+    def done(self) -> bool:
+        """配列の終わり（"]"）まで受信したか"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        チャンクを追加し、このチャンクで閉じたオブジェクトを返す
+
+        Args:
+            chunk: 応答テキストの断片
+
+        Returns:
+            完成したオブジェクトのリスト（出現順）
+        """
+        self.text += chunk
+        items: List[Dict[str, Any]] = []
+        text = self.text
+        while self._pos < len(text) and self._state != "done":
+            i = self._pos
+            c = text[i]
+            self._pos += 1
+
+            if self._state == "search":
+                if c == "[":
+                    self._state = "open"
+                continue
+            if self._state == "open":
+                # 説明文中の "[" を配列の開始と誤認しない
+                if c.isspace():
+                    continue
+                if c not in '{"]':
+                    self._state = "search"
+                    continue
+                self._state = "array"
+                self._line_start = i
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+
+            if c == '"':
+                self._in_string = True
+                if self._depth == 0 and self._object_start is None:
+                    # 配列直下のキー = 波括弧のないオブジェクト
+                    self._start_bare_object(i)
+            elif c == "\n":
+                if self._bare and self._depth == 0:
+                    self._check_bare_line(i, items)
+                self._line_start = i + 1
+            elif c == "{":
+                if self._depth == 0:
+                    self._flush_bare_object(i, items)
+                    self._object_start = i
+                self._depth += 1
+            elif c == "[":
+                self._depth += 1
+            elif c == "}":
+                if self._depth == 0:
+                    # 開き括弧のないオブジェクトの閉じ括弧
+                    self._flush_bare_object(i, items)
+                    continue
+                self._depth -= 1
+                if self._depth == 0 and self._object_start is not None:
+                    self._emit(text[self._object_start:i + 1], items)
+                    self._object_start = None
+            elif c == "]":
+                if self._depth == 0:
+                    self._flush_bare_object(i, items)
+                    self._state = "done"
+                else:
+                    self._depth -= 1
+        return items
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        受信終了時に残りを処理
+
+        配列が閉じずに終わった場合、波括弧のないオブジェクトはパースを試み、
+        閉じていない通常のオブジェクトは末尾切れとして破棄します。
+        """
+        items: List[Dict[str, Any]] = []
+        if self._state == "array":
+            if self._bare:
+                self._flush_bare_object(len(self.text), items)
+            elif self._object_start is not None:
+                logger.warning("Streamed JSON array ended inside an object, dropping truncated item")
+                self.skipped += 1
+                self._object_start = None
+            self._state = "done"
+        return items
+
+    def _start_bare_object(self, position: int):
+        self._object_start = self._line_start if self.text[self._line_start:position].strip() == "" else position
+        self._bare = True
+        self._bare_keys = set()
+
+    def _check_bare_line(self, newline: int, items: List[Dict[str, Any]]):
+        """波括弧のないオブジェクトの1行: 開始キーの2回目なら直前までを1オブジェクトとして確定"""
+        line_start = self._line_start
+        match = _KEY_LINE_PATTERN.match(self.text, line_start, newline)
+        if not match:
+            return
+        key = match.group(1)
+        if key in BARE_OBJECT_START_KEYS and key in self._bare_keys and line_start > self._object_start:
+            self._emit("{" + self.text[self._object_start:line_start].strip().rstrip(",") + "}", items)
+            self._object_start = line_start
+            self._bare_keys = set()
+        self._bare_keys.add(key)
+
+    def _flush_bare_object(self, end: int, items: List[Dict[str, Any]]):
+        if not self._bare:
+            return
+        fragment = self.text[self._object_start:end].strip().rstrip(",")
+        if fragment:
+            self._emit("{" + fragment + "}", items)
+        self._object_start = None
+        self._bare = False
+        self._bare_keys = set()
+
+    def _emit(self, fragment: str, items: List[Dict[str, Any]]):
+        """オブジェクト1件をパース（失敗時は末尾カンマを除去して再試行）"""
+        for candidate in (fragment, _TRAILING_COMMA_PATTERN.sub(r"\1", fragment)):
+            try:
+                obj = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(obj, dict):
+                items.append(obj)
+                self.items_parsed += 1
+                return
+            break
+        logger.warning(f"Skipping unparsable streamed JSON object: {fragment[:80]!r}")
+        self.skipped += 1
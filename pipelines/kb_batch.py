@@ -0,0 +1,405 @@
+"""
+見積書PDFからの単価KB一括構築（Message Batches API）
+
+数十件の過去見積書PDFを1件ずつ同期的にLLM/OCR抽出する代わりに、全ファイルの抽出リクエストを
+バッチジョブとして送信し、完了をポーリングして結果を取得します。バッチ料金（通常の50%）で
+処理され、送信後は無人で実行できます。
+
+  - テキストPDF: 1ファイル = 1リクエスト（PriceKBBuilder と同じ単価抽出プロンプト）
+  - スキャンPDF: 1ページ = 1リクエスト（OCRExtractor と同じVisionプロンプト）
+
+ジョブの状態（ファイル・リクエスト custom_id の対応・送信したバッチID・受信した応答）は
+JSONファイル（ジョブマニフェスト）に保存します。中断しても同じマニフェストで run() を
+呼び出すと、送信済みのバッチのポーリングから再開し、取得済みの応答は再送信しません。
+
+使用例:
+    job = KBBatchJob("cache/kb_batches/backfill.json")
+    job.add_files(["estimates/a.pdf", "estimates/b.pdf"])
+    price_refs = job.run(Anthropic())  # 送信 → 完了までポーリング → PriceReference
+
+    # ネットワークなし（ローカル代替サーバ + スタブ）
+    job.run(LocalBatchServer(StubAnthropicClient(responder), "cache/local_batches"))
+"""
+
+import base64
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from pipelines.config_loader import load_config_section
+from pipelines.cost_tracker import record_cost
+from pipelines.schemas import PriceReference
+
+DEFAULT_KB_BATCH_CONFIG = {
+    "job_dir": "cache/kb_batches",  # ジョブマニフェスト・アップロードファイルの保存先
+    "poll_interval": 30,  # バッチ完了のポーリング間隔（秒）
+    "max_requests_per_batch": 10000,  # 1バッチのリクエスト数の上限
+    "max_batch_mb": 200,  # 1バッチのリクエストサイズの上限（MB、API上限256MB）
+    "max_attempts": 3,  # 失敗・期限切れのリクエストを再送信する最大回数
+    "ocr_dpi": 200,  # スキャンPDFのページ画像の解像度
+}
+
+
+def load_kb_batch_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """configs/config.yaml の kb_batch セクションを読み込み"""
+    return load_config_section("kb_batch", DEFAULT_KB_BATCH_CONFIG, config_path)
+
+
+def _file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _render_page_base64(pdf_path: str, page_index: int, dpi: int) -> str:
+    """PDFの1ページをPNG画像（Base64）に変換"""
+    import fitz  # PyMuPDF
+    doc = fitz.open(pdf_path)
+    try:
+        pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+        return base64.b64encode(pix.tobytes("png")).decode('utf-8')
+    finally:
+        doc.close()
+
+
+class KBBatchJob:
+    """
+    単価KB一括構築のバッチジョブ（状態はジョブマニフェストに保存）
+
+    リクエストの状態: pending（未送信）→ submitted（送信済み）→ succeeded / failed
+    failed は max_attempts 回まで次の submit() で再送信します。
+    """
+
+    def __init__(
+        self,
+        job_path: str,
+        model_name: Optional[str] = None,
+        ocr_discipline: str = "ガス設備工事",
+        config: Optional[Dict[str, Any]] = None,
+        builder=None
+    ):
+        """
+        Args:
+            job_path: ジョブマニフェストのパス（存在すれば読み込んで再開）
+            model_name: 抽出に使うモデル（Noneは CLAUDE_MODEL 環境変数、既存ジョブは保存済みの値）
+            ocr_discipline: スキャンPDFのOCRプロンプトに渡す工事区分
+            config: kb_batch 設定（Noneは設定ファイルの値）
+            builder: プロンプト作成・応答の変換に使う PriceKBBuilder（Noneは必要時に作成）
+        """
+        self.path = Path(job_path)
+        self.config = config or load_kb_batch_config()
+        self._builder = builder
+        self._file_text: Dict[int, str] = {}  # ファイル番号 -> 抽出テキスト（送信時のみ使用）
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.manifest = json.load(f)
+            logger.info(f"KB batch job loaded: {self.path.name} {self.progress()}")
+        else:
+            self.manifest = {
+                "job_id": self.path.stem,
+                "created_at": datetime.now().isoformat(),
+                "model": model_name or os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514"),
+                "ocr_discipline": ocr_discipline,
+                "files": [],
+                "requests": {},
+                "batches": [],
+            }
+
+    @property
+    def model_name(self) -> str:
+        return self.manifest["model"]
+
+    @property
+    def files_dir(self) -> Path:
+        """アップロードファイルの保存先（一時ファイルは再開時に残らないため）"""
+        return self.path.parent / f"{self.path.stem}_files"
+
+    @property
+    def builder(self):
+        if self._builder is None:
+            from pipelines.kb_builder import PriceKBBuilder
+            self._builder = PriceKBBuilder()
+        return self._builder
+
+    def save(self):
+        """マニフェストを保存（一時ファイル経由で置き換え）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # ===== リクエストの作成 =====
+    def add_files(self, pdf_paths: List[str], project_names: Optional[List[str]] = None) -> int:
+        """
+        見積書PDFをジョブに追加（同じ内容のファイルは追加しない）
+
+        Args:
+            pdf_paths: PDFファイルのパス
+            project_names: KB項目の source_project（Noneはファイル名）
+
+        Returns:
+            追加したリクエスト数
+        """
+        known = {entry["sha256"] for entry in self.manifest["files"]}
+        added = 0
+        for i, pdf_path in enumerate(pdf_paths):
+            sha256 = _file_sha256(pdf_path)
+            if sha256 in known:
+                logger.info(f"Skipping duplicate file: {pdf_path}")
+                continue
+            known.add(sha256)
+
+            file_index = len(self.manifest["files"])
+            text, total_pages = self.builder.extract_pdf_text(pdf_path)
+            mode = "ocr" if self.builder.needs_ocr(text) else "text"
+            self.manifest["files"].append({
+                "path": str(pdf_path),
+                "sha256": sha256,
+                "project_name": project_names[i] if project_names else Path(pdf_path).stem,
+                "mode": mode,
+                "pages": total_pages,
+            })
+            if mode == "text":
+                self._file_text[file_index] = text
+                pages = [None]
+            else:
+                pages = list(range(total_pages))
+            for page in pages:
+                custom_id = f"f{file_index:04d}-text" if page is None else f"f{file_index:04d}-p{page:04d}"
+                self.manifest["requests"][custom_id] = {
+                    "file": file_index, "page": page, "status": "pending", "attempts": 0,
+                }
+                added += 1
+            logger.info(f"Added {Path(pdf_path).name} to KB batch job ({mode}, {len(pages)} requests)")
+
+        self.save()
+        return added
+
+    def _build_params(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """リクエスト1件分の messages.create パラメータ（送信時に作成し、マニフェストには保存しない）"""
+        file_index = request["file"]
+        pdf_path = self.manifest["files"][file_index]["path"]
+        if request["page"] is None:
+            if file_index not in self._file_text:
+                self._file_text[file_index] = self.builder.extract_pdf_text(pdf_path)[0]
+            return {
+                "model": self.model_name,
+                "max_tokens": 16000,
+                "temperature": 0,
+                "messages": [{"role": "user", "content": self.builder.build_price_extraction_prompt(self._file_text[file_index])}],
+            }
+
+        from pipelines.ocr_extractor import OCRExtractor
+        image_base64 = _render_page_base64(pdf_path, request["page"], self.config.get("ocr_dpi", 200))
+        return {
+            "model": self.model_name,
+            "max_tokens": 16000,
+            "messages": OCRExtractor.build_page_messages(image_base64, self.manifest.get("ocr_discipline", "ガス設備工事")),
+        }
+
+    # ===== 送信・ポーリング =====
+    def submit(self, client) -> List[str]:
+        """
+        未送信・再送信対象のリクエストをバッチとして送信
+
+        Args:
+            client: messages.batches を持つクライアント（Anthropic / LocalBatchServer）
+
+        Returns:
+            作成したバッチIDのリスト
+        """
+        max_attempts = self.config.get("max_attempts", 3)
+        to_send = [
+            custom_id for custom_id, request in self.manifest["requests"].items()
+            if request["status"] == "pending"
+            or (request["status"] == "failed" and request["attempts"] < max_attempts)
+        ]
+        max_requests = max(1, int(self.config.get("max_requests_per_batch", 10000)))
+        max_bytes = int(self.config.get("max_batch_mb", 200) * 1024 * 1024)
+
+        batch_ids = []
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for custom_id in to_send:
+            params = self._build_params(self.manifest["requests"][custom_id])
+            size = len(json.dumps(params, ensure_ascii=False).encode('utf-8'))
+            if batch and (len(batch) >= max_requests or batch_bytes + size > max_bytes):
+                batch_ids.append(self._create_batch(client, batch))
+                batch, batch_bytes = [], 0
+            batch.append({"custom_id": custom_id, "params": params})
+            batch_bytes += size
+        if batch:
+            batch_ids.append(self._create_batch(client, batch))
+        self._file_text.clear()
+        return batch_ids
+
+    def _create_batch(self, client, requests: List[Dict[str, Any]]) -> str:
+        created = client.messages.batches.create(requests=requests)
+        custom_ids = [request["custom_id"] for request in requests]
+        self.manifest["batches"].append({
+            "id": created.id,
+            "custom_ids": custom_ids,
+            "status": "in_progress",
+            "submitted_at": datetime.now().isoformat(),
+        })
+        for custom_id in custom_ids:
+            request = self.manifest["requests"][custom_id]
+            request.update(status="submitted", batch_id=created.id, attempts=request["attempts"] + 1)
+        # 送信直後に保存（中断してもバッチIDから結果を取得できる）
+        self.save()
+        logger.info(f"Submitted KB batch {created.id}: {len(requests)} requests")
+        return created.id
+
+    def poll(self, client) -> bool:
+        """
+        送信済みバッチの状況を確認し、終了したバッチの結果を取り込む
+
+        Returns:
+            全てのリクエストが完了（成功、または再送信回数の上限で失敗）したか
+        """
+        for batch in self.manifest["batches"]:
+            if batch["status"] != "in_progress":
+                continue
+            status = client.messages.batches.retrieve(batch["id"])
+            if status.processing_status != "ended":
+                counts = status.request_counts
+                logger.info(f"KB batch {batch['id']}: {counts.processing} processing, "
+                            f"{counts.succeeded} succeeded, {counts.errored} errored")
+                continue
+            self._collect_batch(client, batch)
+        return self.is_complete()
+
+    def _collect_batch(self, client, batch: Dict[str, Any]):
+        received = set()
+        for entry in client.messages.batches.results(batch["id"]):
+            request = self.manifest["requests"].get(entry.custom_id)
+            if request is None or request.get("batch_id") != batch["id"]:
+                continue
+            received.add(entry.custom_id)
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                request.update(status="succeeded", response=message.content[0].text)
+                request.pop("error", None)
+                self._record_cost(request, message.usage, batch["id"], getattr(client, "batch_pricing", True))
+            else:
+                error = getattr(entry.result, "error", None)
+                request.update(status="failed", error=f"{entry.result.type}: {getattr(error, 'message', '')}")
+                logger.warning(f"KB batch request {entry.custom_id} {entry.result.type}")
+        for custom_id in batch["custom_ids"]:
+            if custom_id not in received and self.manifest["requests"][custom_id]["status"] == "submitted":
+                self.manifest["requests"][custom_id].update(status="failed", error="missing result")
+        batch["status"] = "ended"
+        batch["ended_at"] = datetime.now().isoformat()
+        self.save()
+        logger.info(f"KB batch {batch['id']} ended: {self.progress()}")
+
+    def _record_cost(self, request: Dict[str, Any], usage, batch_id: str, batch_pricing: bool):
+        file_entry = self.manifest["files"][request["file"]]
+        metadata = {"file": Path(file_entry["path"]).name, "batch_id": batch_id}
+        if request["page"] is not None:
+            metadata["page"] = request["page"] + 1
+        record_cost(
+            operation="KB抽出（単価）" if request["page"] is None else "OCR見積抽出",
+            model_name=self.model_name,
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            metadata=metadata,
+            cache_creation_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+            batch=batch_pricing
+        )
+
+    def progress(self) -> Dict[str, int]:
+        """リクエストの状態ごとの件数"""
+        counts = {"pending": 0, "submitted": 0, "succeeded": 0, "failed": 0}
+        for request in self.manifest["requests"].values():
+            counts[request["status"]] += 1
+        return counts
+
+    def is_complete(self) -> bool:
+        max_attempts = self.config.get("max_attempts", 3)
+        return all(
+            request["status"] == "succeeded"
+            or (request["status"] == "failed" and request["attempts"] >= max_attempts)
+            for request in self.manifest["requests"].values()
+        )
+
+    def run(
+        self,
+        client,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[Dict[str, int]], None]] = None
+    ) -> List[PriceReference]:
+        """
+        送信 → 完了までポーリング → PriceReferenceに変換（中断後の再開にも使用）
+
+        Args:
+            client: messages.batches を持つクライアント
+            poll_interval: ポーリング間隔（秒、Noneは kb_batch.poll_interval）
+            timeout: 待機の上限（秒、超えた場合は TimeoutError。ジョブは後で再開可能）
+            on_progress: ポーリングごとに状態ごとの件数を受け取る関数
+
+        Returns:
+            完了したリクエストから抽出したPriceReference
+        """
+        if poll_interval is None:
+            poll_interval = self.config.get("poll_interval", 30)
+        start = time.monotonic()
+        while True:
+            # 未完了のバッチを先に取り込み、失敗したリクエストを再送信
+            if self.poll(client):
+                break
+            self.submit(client)
+            if on_progress:
+                on_progress(self.progress())
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise TimeoutError(f"KB batch job {self.manifest['job_id']} not finished: {self.progress()}")
+            time.sleep(poll_interval)
+        if on_progress:
+            on_progress(self.progress())
+        return self.collect()
+
+    # ===== 結果の変換 =====
+    def collect(self) -> List[PriceReference]:
+        """成功したリクエストの応答をファイルごとにPriceReferenceに変換"""
+        from pipelines.ocr_extractor import OCRExtractor
+
+        requests_by_file: Dict[int, List[Dict[str, Any]]] = {}
+        for request in self.manifest["requests"].values():
+            requests_by_file.setdefault(request["file"], []).append(request)
+
+        price_refs: List[PriceReference] = []
+        for file_index, file_entry in enumerate(self.manifest["files"]):
+            requests = requests_by_file.get(file_index, [])
+            succeeded = [request for request in requests if request["status"] == "succeeded"]
+            if len(succeeded) < len(requests):
+                logger.warning(f"{Path(file_entry['path']).name}: {len(requests) - len(succeeded)} requests failed")
+            try:
+                if file_entry["mode"] == "text":
+                    refs = self.builder.parse_price_response(succeeded[0]["response"], file_entry["project_name"]) \
+                        if succeeded else []
+                else:
+                    items_data = []
+                    for request in sorted(succeeded, key=lambda r: r["page"]):
+                        try:
+                            items_data.extend(OCRExtractor.parse_page_response(request["response"]))
+                        except Exception as e:
+                            logger.error(f"Failed to parse page {request['page'] + 1} of {file_entry['path']}: {e}")
+                    refs = self.builder.items_to_price_refs(items_data, file_entry["project_name"])
+            except Exception as e:
+                logger.error(f"Failed to parse batch results for {file_entry['path']}: {e}")
+                refs = []
+            logger.info(f"{Path(file_entry['path']).name}: {len(refs)} KB items")
+            price_refs.extend(refs)
+        return price_refs
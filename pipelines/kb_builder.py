@@ -4,12 +4,11 @@ import os
 import json
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime, date
 from collections import defaultdict
 import statistics
 from dotenv import load_dotenv
-from anthropic import Anthropic
 from loguru import logger
 import PyPDF2
 import openpyxl
@@ -19,6 +18,7 @@ from pipelines.schemas import (
     Requirement, LegalReference
 )
 from pipelines.cost_tracker import record_cost
+from pipelines.llm_client import create_llm_client
 
 
 class PriceKBBuilder:
@@ -32,9 +32,13 @@ class PriceKBBuilder:
     - 既存KBとのマージ
     """
 
+    # テキスト抽出がこの文字数未満のPDFはスキャンPDFとみなしてOCRを使用
+    # 閾値を緩和: 100 → 500文字（スキャンPDFの検出精度向上）
+    OCR_TEXT_THRESHOLD = 500
+
     def __init__(self, kb_path: str = "kb/price_kb.json"):
         load_dotenv()
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
         self.kb_path = kb_path
         self.kb_items: List[Dict[str, Any]] = []
@@ -59,87 +63,69 @@ class PriceKBBuilder:
         """見積書PDFから価格情報を抽出してKB化（OCR対応）"""
         logger.info(f"Building price KB from: {pdf_path}")
 
-        # PDFからテキストを抽出（全ページ対応）
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            total_pages = len(pdf_reader.pages)
-            # 全ページを処理（制限なし）
-            for page_num in range(total_pages):
-                text += pdf_reader.pages[page_num].extract_text() + "\n"
-
+        text, total_pages = self.extract_pdf_text(pdf_path)
         logger.info(f"Extracted {len(text)} characters from PDF ({total_pages} pages)")
 
         # テキストがほとんど抽出できない場合はOCRを使用
-        # 閾値を緩和: 100 → 500文字（スキャンPDFの検出精度向上）
-        if len(text.strip()) < 500:
+        if self.needs_ocr(text):
             logger.warning("Text extraction failed, using OCR...")
             from pipelines.ocr_extractor import OCRExtractor
             ocr = OCRExtractor()
             items_data = ocr.extract_from_pdf(pdf_path)
 
-            # KB形式に変換
-            price_refs = []
-            project_name = Path(pdf_path).stem
-
-            for i, item in enumerate(items_data):
-                if item.get("unit_price") and item.get("unit_price") > 0:
-                    # 工事区分のマッピング
-                    discipline_map = {
-                        "電気": DisciplineType.ELECTRICAL,
-                        "機械": DisciplineType.MECHANICAL,
-                        "空調": DisciplineType.HVAC,
-                        "衛生": DisciplineType.PLUMBING,
-                        "ガス": DisciplineType.GAS,
-                        "消防": DisciplineType.FIRE_PROTECTION
-                    }
-
-                    # OCR結果の工事区分を使用、なければキーワードベースで推定
-                    ocr_discipline = item.get("discipline", "").replace("設備工事", "")
-                    if ocr_discipline in discipline_map:
-                        discipline = discipline_map[ocr_discipline]
-                    else:
-                        # キーワードベースで自動推定（ファイル名もヒント）
-                        discipline = self._infer_discipline(
-                            item.get("name", ""),
-                            item.get("specification", ""),
-                            project_name
-                        )
-
-                    # コンテキストタグの生成
-                    context_tags = []
-                    if "学校" in project_name or "高校" in project_name:
-                        context_tags.append("学校")
-                    if "改修" in project_name:
-                        context_tags.append("改修")
-                    if "仮設" in project_name:
-                        context_tags.append("仮設")
-
-                    price_ref = PriceReference(
-                        item_id=f"{project_name}_{i+1:03d}",
-                        description=item.get("name", ""),
-                        discipline=discipline,
-                        unit=item.get("unit", "式"),
-                        unit_price=float(item.get("unit_price", 0)),
-                        vendor=None,
-                        valid_from=date.today(),
-                        valid_to=None,
-                        source_project=project_name,
-                        context_tags=context_tags,
-                        features={
-                            "specification": item.get("specification", ""),
-                            "quantity": item.get("quantity"),
-                        },
-                        similarity_score=0.0
-                    )
-                    price_refs.append(price_ref)
-
+            price_refs = self.items_to_price_refs(items_data, Path(pdf_path).stem)
             logger.info(f"Extracted {len(price_refs)} items using OCR")
             return price_refs
 
         # LLMで構造化データに変換
+        prompt = self.build_price_extraction_prompt(text)
+
+        try:
+            response = self.client.messages.create(
+                model=self.model_name,
+                max_tokens=16000,  # 詳細な抽出のため増加
+                temperature=0,
+                messages=[{"role": "user", "content": prompt}],
+                operation="KB抽出（単価）"
+            )
+
+            # コスト記録
+            record_cost(
+                operation="KB抽出（単価）",
+                model_name=self.model_name,
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens,
+                metadata={"file": Path(pdf_path).name}
+            )
+
+            return self.parse_price_response(response.content[0].text, Path(pdf_path).stem)
+
+        except Exception as e:
+            logger.error(f"Error extracting prices: {e}")
+            return []
+
+    @staticmethod
+    def extract_pdf_text(pdf_path: str) -> Tuple[str, int]:
+        """PDFの全ページのテキストを抽出（テキスト, ページ数）"""
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            text = ""
+            total_pages = len(pdf_reader.pages)
+            # 全ページを処理（制限なし）
+            for page_num in range(total_pages):
+                text += pdf_reader.pages[page_num].extract_text() + "\n"
+        return text, total_pages
+
+    @classmethod
+    def needs_ocr(cls, text: str) -> bool:
+        """テキスト抽出結果が少なく、OCRが必要か"""
+        return len(text.strip()) < cls.OCR_TEXT_THRESHOLD
+
+    @staticmethod
+    def build_price_extraction_prompt(text: str) -> str:
+        """見積書テキストから単価情報を抽出するプロンプト"""
         # テキスト制限を緩和: 最大60000文字（大規模PDF対応）
-        prompt = f"""以下の見積書PDFから、単価情報を抽出して単価データベース（KB）を構築します。
+        return f"""以下の見積書PDFから、単価情報を抽出して単価データベース（KB）を構築します。
 
 見積書テキスト:
 {text[:60000]}
@@ -202,99 +188,78 @@ JSON配列で出力してください：
 ]
 ```"""
 
-        try:
-            response = self.client.messages.create(
-                model=self.model_name,
-                max_tokens=16000,  # 詳細な抽出のため増加
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
-            )
+    def parse_price_response(self, response_text: str, project_name: str) -> List[PriceReference]:
+        """単価抽出プロンプトの応答（JSON配列）をPriceReferenceに変換"""
+        # JSONを抽出
+        json_start = response_text.find('[')
+        json_end = response_text.rfind(']') + 1
 
-            # コスト記録
-            record_cost(
-                operation="KB抽出（単価）",
-                model_name=self.model_name,
-                input_tokens=response.usage.input_tokens,
-                output_tokens=response.usage.output_tokens,
-                metadata={"file": Path(pdf_path).name}
-            )
+        if json_start == -1 or json_end == 0:
+            logger.error("No JSON found in response")
+            return []
 
-            response_text = response.content[0].text
+        json_str = response_text[json_start:json_end]
+        items_data = json.loads(json_str)
 
-            # JSONを抽出
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
-
-            if json_start == -1 or json_end == 0:
-                logger.error("No JSON found in response")
-                return []
+        logger.info(f"Extracted {len(items_data)} price items")
+        return self.items_to_price_refs(items_data, project_name)
 
-            json_str = response_text[json_start:json_end]
-            items_data = json.loads(json_str)
+    def items_to_price_refs(self, items_data: List[Dict[str, Any]], project_name: str) -> List[PriceReference]:
+        """抽出した見積項目（LLM/OCR）のうち単価のあるものをPriceReferenceに変換"""
+        # 工事区分のマッピング
+        discipline_map = {
+            "電気": DisciplineType.ELECTRICAL,
+            "機械": DisciplineType.MECHANICAL,
+            "空調": DisciplineType.HVAC,
+            "衛生": DisciplineType.PLUMBING,
+            "ガス": DisciplineType.GAS,
+            "消防": DisciplineType.FIRE_PROTECTION
+        }
 
-            logger.info(f"Extracted {len(items_data)} price items")
-
-            # PriceReferenceオブジェクトに変換
-            price_refs = []
-            project_name = Path(pdf_path).stem
-
-            for i, item in enumerate(items_data):
-                if item.get("unit_price") and item.get("unit_price") > 0:
-                    # 工事区分のマッピング
-                    discipline_map = {
-                        "電気": DisciplineType.ELECTRICAL,
-                        "機械": DisciplineType.MECHANICAL,
-                        "空調": DisciplineType.HVAC,
-                        "衛生": DisciplineType.PLUMBING,
-                        "ガス": DisciplineType.GAS,
-                        "消防": DisciplineType.FIRE_PROTECTION
-                    }
-
-                    # LLMの結果を使用、なければキーワードベースで推定
-                    llm_discipline = item.get("discipline", "")
-                    if llm_discipline in discipline_map:
-                        discipline = discipline_map[llm_discipline]
-                    else:
-                        # キーワードベースで自動推定（ファイル名もヒント）
-                        discipline = self._infer_discipline(
-                            item.get("name", ""),
-                            item.get("specification", ""),
-                            project_name
-                        )
-
-                    # コンテキストタグの生成
-                    context_tags = []
-                    if "学校" in project_name or "高校" in project_name:
-                        context_tags.append("学校")
-                    if "改修" in project_name:
-                        context_tags.append("改修")
-                    if "仮設" in project_name:
-                        context_tags.append("仮設")
-
-                    price_ref = PriceReference(
-                        item_id=f"{project_name}_{i+1:03d}",
-                        description=item.get("name", ""),
-                        discipline=discipline,
-                        unit=item.get("unit", "式"),
-                        unit_price=float(item.get("unit_price", 0)),
-                        vendor=None,
-                        valid_from=date.today(),
-                        valid_to=None,
-                        source_project=project_name,
-                        context_tags=context_tags,
-                        features={
-                            "specification": item.get("specification", ""),
-                            "quantity": item.get("quantity"),
-                        },
-                        similarity_score=0.0
+        price_refs = []
+        for i, item in enumerate(items_data):
+            if item.get("unit_price") and item.get("unit_price") > 0:
+                # LLM/OCRの結果を使用（「〜設備工事」表記も可）、なければキーワードベースで推定
+                llm_discipline = (item.get("discipline") or "").replace("設備工事", "")
+                if llm_discipline in discipline_map:
+                    discipline = discipline_map[llm_discipline]
+                else:
+                    # キーワードベースで自動推定（ファイル名もヒント）
+                    discipline = self._infer_discipline(
+                        item.get("name", ""),
+                        item.get("specification", ""),
+                        project_name
                     )
-                    price_refs.append(price_ref)
 
-            return price_refs
+                # コンテキストタグの生成
+                context_tags = []
+                if "学校" in project_name or "高校" in project_name:
+                    context_tags.append("学校")
+                if "改修" in project_name:
+                    context_tags.append("改修")
+                if "仮設" in project_name:
+                    context_tags.append("仮設")
+
+                price_ref = PriceReference(
+                    item_id=f"{project_name}_{i+1:03d}",
+                    description=item.get("name", ""),
+                    discipline=discipline,
+                    unit=item.get("unit", "式"),
+                    unit_price=float(item.get("unit_price", 0)),
+                    vendor=None,
+                    valid_from=date.today(),
+                    valid_to=None,
+                    source_project=project_name,
+                    context_tags=context_tags,
+                    features={
+                        "specification": item.get("specification", ""),
+                        "quantity": item.get("quantity"),
+                    },
+                    similarity_score=0.0
+                )
+                price_refs.append(price_ref)
 
-        except Exception as e:
-            logger.error(f"Error extracting prices: {e}")
-            return []
+        return price_refs
 
     def save_kb_to_json(self, price_refs: List[PriceReference], output_path: str):
         """KBをJSONファイルに保存"""
@@ -877,7 +842,7 @@ class EnhancedEstimateExtractor:
 
     def __init__(self, price_kb: List[PriceReference]):
         load_dotenv()
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
         self.price_kb = price_kb
         logger.info(f"Initialized with {len(price_kb)} price references")
@@ -959,7 +924,8 @@ JSON配列形式で出力してください：
                 model=self.model_name,
                 max_tokens=16000,
                 temperature=0,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                operation="見積抽出（信頼度付き）"
             )
 
             # コスト記録
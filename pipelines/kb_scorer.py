@@ -0,0 +1,304 @@
+"""
+KB文字列マッチングのベクトル化スコアラー
+
+enrich_with_prices の文字列マッチング（項目名の完全一致・包含・類義語・単語一致、
+カテゴリ一致、仕様・サイズ一致、単位の一致・互換性）を、KB1行ずつのPythonループではなく
+見積項目 × KB のスコア行列としてNumPyで一括計算します。
+
+- 完全一致・カテゴリ・サイズは整数IDの比較
+- 包含関係は np.char.find による配列演算
+- 類義語はKB行 × 類義語語彙のブール行列
+- 単位はKBの単位表記（数十種類）ごとのルックアップ表、互換性は単位の種類の行列
+
+最良マッチ・カテゴリフォールバックは行ごとの argmax で選びます
+（同点はKBの並び順で先の行。従来のループの「score > best_score」と同じ）。
+"""
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+import numpy as np
+
+from pipelines.unit_classes import (
+    UnitClass, UNIT_CLASS_INDEX, UNIT_COMPATIBILITY, high_value_lump_sum_mask, unit_class
+)
+
+# 単位が完全に異なる場合に互換性なしとする組み合わせ（例: 式 vs 箇所）
+INCOMPATIBLE_UNIT_PAIRS = [
+    ("式", "箇所"), ("式", "個"), ("式", "m"), ("式", "台"),
+    ("箇所", "m"), ("個", "m"), ("台", "m"), ("ヶ所", "m")
+]
+
+
+@dataclass(frozen=True)
+class KBRowFeatures:
+    """KB1行（または見積項目）の照合用特徴量（KB読み込み時に1度だけ計算）"""
+    desc_norm: str  # 正規化した項目名
+    spec_norm: str  # 正規化した仕様
+    full_norm: str  # 正規化した「項目名 仕様」
+    size: str  # 仕様から抽出したサイズ（例: 15A）
+    category: str  # 項目名のカテゴリ（例: 白ガス管）
+    synonyms_norm: FrozenSet[str]  # 項目名の類義語（正規化済み）
+    unit: Optional[str]  # 単位（表記そのまま）
+    unit_norm: str  # 正規化した単位
+    unit_class: UnitClass  # 単位の種類
+
+
+@dataclass
+class KBMatch:
+    """見積項目1件分のスコアリング結果"""
+    best_row: Optional[int]  # 最高スコアのKB行（スコア0以下ならNone）
+    best_score: float
+    category_row: Optional[int]  # カテゴリが一致するKB行のうち項目名+カテゴリのスコアが最高の行
+    category_score: float
+
+
+def unit_match_score(item_unit: Optional[str], item_unit_norm: str,
+                     kb_unit: Optional[str], kb_unit_norm: str) -> Optional[float]:
+    """
+    単位の一致スコア
+
+    Returns:
+        0.5（一致）/ 0.3（包含）/ 0.0（判定不能）、互換性がなければNone
+    """
+    if item_unit == kb_unit:
+        return 0.5
+    if not (item_unit and kb_unit):
+        return 0.0
+    # m と メートル、式 と 式 等
+    if item_unit_norm == kb_unit_norm:
+        return 0.5
+    if item_unit_norm in kb_unit_norm or kb_unit_norm in item_unit_norm:
+        return 0.3
+    for u1, u2 in INCOMPATIBLE_UNIT_PAIRS:
+        if (u1 in item_unit_norm and u2 in kb_unit_norm) or \
+           (u2 in item_unit_norm and u1 in kb_unit_norm):
+            return None
+    return 0.0
+
+
+def _contains(haystack, needle) -> np.ndarray:
+    """needle in haystack を配列で評価（どちらか一方はスカラー）"""
+    return np.char.find(np.asarray(haystack), needle) >= 0
+
+
+class KBMatchScorer:
+    """
+    KB特徴量テーブルを配列化し、見積項目 × KB のスコア行列を計算するスコアラー
+    """
+
+    def __init__(self, kb_features: Sequence[KBRowFeatures], kb_prices: Optional[Sequence[Optional[float]]] = None):
+        """
+        Args:
+            kb_features: KB各行の特徴量（KBの並び順）
+            kb_prices: KB各行の単価（高額「式」単価の除外用）
+        """
+        self.n_rows = len(kb_features)
+
+        self._desc = np.array([f.desc_norm for f in kb_features], dtype=str)
+        self._spec = np.array([f.spec_norm for f in kb_features], dtype=str)
+        self._full = np.array([f.full_norm for f in kb_features], dtype=str)
+
+        # 文字列 -> 整数ID（完全一致の比較用）
+        self._ids: Dict[str, Dict[str, int]] = {}
+        self._desc_ids = self._encode("desc", [f.desc_norm for f in kb_features])
+        self._spec_ids = self._encode("spec", [f.spec_norm for f in kb_features])
+        self._size_ids = self._encode("size", [f.size for f in kb_features])
+        self._category_ids = self._encode("category", [f.category for f in kb_features])
+        self._has_spec = np.array([bool(f.spec_norm) for f in kb_features], dtype=bool)
+        self._has_size = np.array([bool(f.size) for f in kb_features], dtype=bool)
+        self._has_category = np.array([bool(f.category) for f in kb_features], dtype=bool)
+
+        # 類義語: KB行 × 語彙 のブール行列
+        synonym_ids: Dict[str, int] = {}
+        for f in kb_features:
+            for synonym in f.synonyms_norm:
+                synonym_ids.setdefault(synonym, len(synonym_ids))
+        self._synonym_ids = synonym_ids
+        self._synonym_matrix = np.zeros((self.n_rows, len(synonym_ids)), dtype=bool)
+        for row, f in enumerate(kb_features):
+            self._synonym_matrix[row, [synonym_ids[s] for s in f.synonyms_norm]] = True
+
+        # 単位: 表記ごとにID化し、見積項目の単位ごとにルックアップ表を作る
+        self._units: List[tuple] = []
+        unit_ids: Dict[Optional[str], int] = {}
+        kb_unit_ids = []
+        for f in kb_features:
+            if f.unit not in unit_ids:
+                unit_ids[f.unit] = len(self._units)
+                self._units.append((f.unit, f.unit_norm))
+            kb_unit_ids.append(unit_ids[f.unit])
+        self._kb_unit_ids = np.array(kb_unit_ids, dtype='int64')
+        self._unit_tables: Dict[Optional[str], np.ndarray] = {}
+
+        # 単位の種類による互換性（高額「式」単価の行は常に互換性なし）
+        self._unit_class_ids = np.array([UNIT_CLASS_INDEX[f.unit_class] for f in kb_features], dtype='int64')
+        self._has_unit = np.array([bool(f.unit) for f in kb_features], dtype=bool)
+        self._high_value_lump_sum = high_value_lump_sum_mask(self._unit_class_ids, kb_prices or [None] * self.n_rows)
+        self._unit_compatibility: Dict[UnitClass, np.ndarray] = {}
+
+    def _encode(self, field: str, values: List[str]) -> np.ndarray:
+        ids = self._ids.setdefault(field, {})
+        return np.array([ids.setdefault(value, len(ids)) for value in values], dtype='int64')
+
+    def _lookup(self, field: str, value: str) -> int:
+        """KBに存在しない値は -1（どの行とも一致しない）"""
+        return self._ids[field].get(value, -1)
+
+    def _unit_table(self, unit: Optional[str], unit_norm: str) -> np.ndarray:
+        """見積項目の単位 -> KBの単位表記ごとのスコア（互換性なしはNaN）"""
+        table = self._unit_tables.get(unit)
+        if table is None:
+            scores = [unit_match_score(unit, unit_norm, kb_unit, kb_unit_norm) for kb_unit, kb_unit_norm in self._units]
+            table = np.array([np.nan if score is None else score for score in scores], dtype='float64')
+            self._unit_tables[unit] = table
+        return table
+
+    def unit_compatibility(self, unit: Optional[str]) -> np.ndarray:
+        """
+        見積項目の単位と互換性のあるKB行のマスク
+
+        単位が空の場合はすべて互換性あり。それ以外は単位の種類の互換性行列を引き、
+        高額な「式」単価の行を除外します。
+        """
+        if not unit:
+            return np.ones(self.n_rows, dtype=bool)
+        item_class = unit_class(unit)
+        mask = self._unit_compatibility.get(item_class)
+        if mask is None:
+            compatible = UNIT_COMPATIBILITY[UNIT_CLASS_INDEX[item_class]][self._unit_class_ids]
+            mask = (compatible | ~self._has_unit) & ~self._high_value_lump_sum
+            self._unit_compatibility[item_class] = mask
+        return mask
+
+    def exact_rows(self, desc_norm: str) -> np.ndarray:
+        """正規化した項目名が完全一致するKB行"""
+        return np.flatnonzero(self._desc_ids == self._lookup("desc", desc_norm))
+
+    def score_matrix(
+        self,
+        items: Sequence[KBRowFeatures],
+        use_synonyms: bool = True,
+        unit_scoring: bool = True,
+        candidates: Optional[np.ndarray] = None
+    ):
+        """
+        見積項目 × KB のスコア行列を計算
+
+        Args:
+            items: 見積項目の特徴量（desc_normは項目名）
+            use_synonyms: 類義語一致を加点する
+            unit_scoring: 単位の一致を加点し、互換性のない単位をNaNにする
+                （Falseの場合は単位をスコアに含めない。unit_compatibility()で候補を絞る）
+            candidates: 計算するセルのマスク（見積項目 × KB）。Noneは全セル、対象外のセルはNaN
+
+        Returns:
+            (scores, category_scores)
+            - scores: 合計スコア。単位の互換性がない組み合わせはNaN
+            - category_scores: カテゴリ一致時の項目名+カテゴリのスコア（不一致はNaN）
+        """
+        n_items = len(items)
+        name_scores = np.zeros((n_items, self.n_rows), dtype='float64')
+        category_match = np.zeros((n_items, self.n_rows), dtype=bool)
+        spec_scores = np.zeros((n_items, self.n_rows), dtype='float64')
+        unit_scores = np.zeros((n_items, self.n_rows), dtype='float64')
+        all_rows = np.arange(self.n_rows)
+
+        for i, item in enumerate(items):
+            rows = all_rows if candidates is None else np.flatnonzero(candidates[i])
+            if not len(rows):
+                continue
+            desc = self._desc[rows]
+            no_match = np.zeros(len(rows), dtype=bool)
+
+            # 1. 項目名の一致（完全一致 > 包含 > 類義語 > 単語）
+            name = item.desc_norm
+            exact = self._desc_ids[rows] == self._lookup("desc", name)
+            contains = _contains(desc, name) | _contains(name, desc)
+            synonym = no_match
+            if use_synonyms:
+                synonym_cols = [self._synonym_ids[s] for s in item.synonyms_norm if s in self._synonym_ids]
+                synonym = self._synonym_matrix[np.ix_(rows, synonym_cols)].any(axis=1)
+            word = no_match.copy()
+            for token in name.split():
+                if len(token) > 1:
+                    word |= _contains(desc, token)
+            name_scores[i, rows] = np.select([exact, contains, synonym, word], [2.0, 1.5, 1.8, 1.0], 0.0)
+
+            # 2. カテゴリの一致
+            if item.category:
+                category_match[i, rows] = self._has_category[rows] & \
+                    (self._category_ids[rows] == self._lookup("category", item.category))
+
+            # 3. 仕様・サイズの一致（完全一致 > サイズ一致 > 包含）
+            if item.spec_norm:
+                spec_exact = self._spec_ids[rows] == self._lookup("spec", item.spec_norm)
+                size_match = self._has_size[rows] & (self._size_ids[rows] == self._lookup("size", item.size)) \
+                    if item.size else no_match
+                spec_contains = _contains(self._full[rows], item.spec_norm) | _contains(item.spec_norm, self._spec[rows])
+                spec_scores[i, rows] = np.where(
+                    self._has_spec[rows],
+                    np.select([spec_exact, size_match, spec_contains], [1.5, 1.2, 0.8], 0.0),
+                    0.0
+                )
+
+            # 4. 単位の一致・互換性
+            if unit_scoring:
+                unit_scores[i, rows] = self._unit_table(item.unit, item.unit_norm)[self._kb_unit_ids[rows]]
+
+        # 従来のループと同じ順序で加算（浮動小数点の結果を一致させる）
+        partial = name_scores + np.where(category_match, 1.0, 0.0)
+        category_scores = np.where(category_match, partial, np.nan)
+        scores = partial + spec_scores + unit_scores
+        if candidates is not None:
+            scores[~candidates] = np.nan
+            category_scores[~candidates] = np.nan
+        return scores, category_scores
+
+    def best_matches(
+        self,
+        items: Sequence[KBRowFeatures],
+        candidates: np.ndarray,
+        min_score=0.0,
+        use_synonyms: bool = True,
+        unit_scoring: bool = True
+    ) -> List[KBMatch]:
+        """
+        各見積項目の最良マッチとカテゴリフォールバックを選択
+
+        Args:
+            items: 見積項目の特徴量
+            candidates: スコアリング対象のKB行（見積項目 × KB のブール行列）
+            min_score: 最良マッチとして採用する最低スコア（見積項目ごとの配列も可）
+            use_synonyms, unit_scoring: score_matrix() のスコアリング規則
+
+        Returns:
+            見積項目ごとの KBMatch
+        """
+        if not len(items):
+            return []
+        scores, category_scores = self.score_matrix(
+            items, use_synonyms=use_synonyms, unit_scoring=unit_scoring, candidates=candidates
+        )
+
+        # 対象外・単位不整合・スコア0以下・最低スコア未満は選ばない
+        min_score = np.asarray(min_score, dtype='float64').reshape(-1, 1)
+        eligible = candidates & (scores > 0) & (scores >= min_score)
+        masked = np.where(eligible, scores, -np.inf)
+        best_rows = np.argmax(masked, axis=1)
+
+        category_eligible = candidates & ~np.isnan(category_scores)
+        category_masked = np.where(category_eligible, category_scores, -np.inf)
+        category_rows = np.argmax(category_masked, axis=1)
+
+        results = []
+        for i in range(len(items)):
+            best_row = int(best_rows[i]) if eligible[i, best_rows[i]] else None
+            category_row = int(category_rows[i]) if category_eligible[i, category_rows[i]] else None
+            results.append(KBMatch(
+                best_row=best_row,
+                best_score=float(scores[i, best_row]) if best_row is not None else 0.0,
+                category_row=category_row,
+                category_score=float(category_scores[i, category_row]) if category_row is not None else 0.0,
+            ))
+        return results
@@ -8,13 +8,13 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from dotenv import load_dotenv
-from anthropic import Anthropic
 from loguru import logger
 
 from pipelines.schemas import (
     DisciplineType, LegalReference, Requirement, EstimateItem
 )
 from pipelines.cost_tracker import record_cost
+from pipelines.llm_client import create_llm_client
 
 
 class LegalRequirementExtractor:
@@ -70,7 +70,7 @@ class LegalRequirementExtractor:
 
     def __init__(self):
         load_dotenv()
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
 
     def extract_legal_requirements(
@@ -183,7 +183,8 @@ class LegalRequirementExtractor:
                 model=self.model_name,
                 max_tokens=16000,
                 temperature=0,
-                messages=[{"role": "user", "content": prompt}]
+                messages=[{"role": "user", "content": prompt}],
+                operation="法令要件抽出"
             )
 
             # コスト記録
@@ -0,0 +1,136 @@
+"""
+文字n-gram転置インデックス（BM25）
+
+日本語の項目名は単語分割なしでも文字2-gram/3-gramで十分に照合できるため、
+KBの項目名・仕様を文字n-gramで索引化し、BM25でスコアリングします。
+検索コストはクエリのn-gramのポスティング長に比例し、KB全件の走査を行いません。
+
+ベクトル検索（FAISS）の結果とは reciprocal_rank_fusion() で統合します。
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pipelines.synonym_matcher import normalize_text
+
+
+def char_ngrams(text: str, ngram_sizes: Sequence[int] = (2, 3)) -> List[str]:
+    """
+    正規化したテキストを空白で区切り、各語から文字n-gramを生成
+
+    最小のnより短い語はそのまま1語として扱います（例: "a", "管"）。
+    """
+    grams = []
+    min_size = min(ngram_sizes)
+    for token in normalize_text(text).split():
+        if len(token) < min_size:
+            grams.append(token)
+            continue
+        for size in ngram_sizes:
+            grams.extend(token[i:i + size] for i in range(len(token) - size + 1))
+    return grams
+
+
+class NgramIndex:
+    """
+    文字n-gramの転置インデックス + BM25スコアラー
+    """
+
+    def __init__(self, documents: List[str], ngram_sizes: Sequence[int] = (2, 3),
+                 k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            documents: 索引化する文書（KB行ごとのテキスト）
+            ngram_sizes: 使用するn-gramの長さ
+            k1, b: BM25パラメータ
+        """
+        self.ngram_sizes = tuple(ngram_sizes)
+        self.n_docs = len(documents)
+
+        term_freqs: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(self.n_docs, dtype='float32')
+        for doc_id, text in enumerate(documents):
+            grams = char_ngrams(text, self.ngram_sizes)
+            doc_lengths[doc_id] = len(grams)
+            for gram in grams:
+                postings = term_freqs.setdefault(gram, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        avg_length = float(doc_lengths.mean()) if self.n_docs and doc_lengths.mean() > 0 else 1.0
+        length_norm = k1 * (1 - b + b * doc_lengths / avg_length)
+
+        # ポスティング: n-gram -> (文書ID配列, BM25の文書側重み配列)、idf
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[str, float] = {}
+        for gram, postings in term_freqs.items():
+            doc_ids = np.fromiter(postings.keys(), dtype='int64', count=len(postings))
+            tf = np.fromiter(postings.values(), dtype='float32', count=len(postings))
+            self._postings[gram] = (doc_ids, tf * (k1 + 1) / (tf + length_norm[doc_ids]))
+            df = len(postings)
+            self._idf[gram] = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 100,
+               allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        BM25で上位文書を検索
+
+        Args:
+            query: 検索クエリ
+            top_k: 返す件数
+            allowed: 対象とする文書のマスク（bool配列、Noneは全件）
+
+        Returns:
+            (文書ID, スコア) のスコア降順リスト
+        """
+        doc_id_parts = []
+        weight_parts = []
+        for gram in set(char_ngrams(query, self.ngram_sizes)):
+            posting = self._postings.get(gram)
+            if posting is None:
+                continue
+            doc_id_parts.append(posting[0])
+            weight_parts.append(posting[1] * self._idf[gram])
+        if not doc_id_parts:
+            return []
+
+        doc_ids = np.concatenate(doc_id_parts)
+        weights = np.concatenate(weight_parts)
+        order = np.argsort(doc_ids, kind='stable')
+        doc_ids = doc_ids[order]
+        unique_ids, starts = np.unique(doc_ids, return_index=True)
+        scores = np.add.reduceat(weights[order], starts)
+
+        if allowed is not None:
+            keep = allowed[unique_ids]
+            unique_ids = unique_ids[keep]
+            scores = scores[keep]
+        if len(unique_ids) == 0:
+            return []
+
+        if len(unique_ids) > top_k:
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(unique_ids))
+        # スコア降順（同点は文書ID順）
+        top = top[np.lexsort((unique_ids[top], -scores[top]))]
+        return [(int(unique_ids[i]), float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[int]:
+    """
+    複数の順位リストをReciprocal Rank Fusionで統合
+
+    Args:
+        rankings: 文書IDの順位リスト（先頭が1位）のリスト
+        k: RRF定数（大きいほど下位の寄与が相対的に大きくなる）
+
+    Returns:
+        統合スコア降順の文書IDリスト（同点は最初に現れた順）
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=lambda doc_id: -fused[doc_id])
@@ -0,0 +1,394 @@
+"""
+LLM API 共通クライアント（タイムアウト・リトライ・ヘッジ・サーキットブレーカー）
+
+各モジュールは Anthropic クライアントを直接作らず create_llm_client() を使います。
+client.messages.create(...) / client.messages.stream(...) は Anthropic と同じ呼び出し形式で、
+追加の operation 引数（record_cost の操作種別と同じ名前）で操作ごとの設定を選びます。
+
+  - タイムアウト: operation_timeouts（操作ごと）/ timeout（その他）
+  - リトライ: 429・5xx・タイムアウト・接続エラーをジッター付き指数バックオフで再試行
+    （retry-after ヘッダがあればその時間以上待つ）
+  - ヘッジ: hedge_delays に指定した操作は、応答がその秒数内に返らなければ同じリクエストを
+    もう1本送り、先に返った応答を使う（create のみ。使わなかった応答のコストも記録）
+  - サーキットブレーカー: 再試行対象のエラーが連続したら一定時間呼び出しを即座に失敗させる
+    （全クライアントで共有。400等の4xxはAPIが応答しているため失敗に数えない）
+
+各呼び出しのレイテンシ・試行回数・ヘッジの有無は、呼び出し元が続けて record_cost する
+コスト記録に含まれます（set_call_metrics）。最終的に失敗した呼び出しもトークン0件で記録します。
+
+使用例:
+    self.client = create_llm_client()
+    response = self.client.messages.create(model=..., max_tokens=..., messages=..., operation="法令要件抽出")
+
+    # オフライン（スタブに同じポリシーを適用）
+    client = LLMClient(StubAnthropicClient(responder))
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Dict, Optional
+
+import anthropic
+from loguru import logger
+
+from pipelines.config_loader import load_config_section
+from pipelines.cost_tracker import record_cost, set_call_metrics
+
+DEFAULT_LLM_CLIENT_CONFIG = {
+    "timeout": 600,  # 1回の呼び出しのタイムアウト（秒、operation_timeouts にない操作）
+    "operation_timeouts": {},  # 操作ごとのタイムアウト（秒）
+    "max_retries": 4,  # 再試行の最大回数
+    "backoff_base": 1.0,  # バックオフの基準時間（秒、再試行ごとに2倍）
+    "backoff_max": 30.0,  # バックオフの上限（秒）
+    "hedge_delays": {},  # ヘッジする操作と、2本目を送るまでの待ち時間（秒）
+    "circuit_failure_threshold": 5,  # サーキットを開く連続エラー数
+    "circuit_reset_seconds": 60,  # サーキットを開いてから試行を再開するまでの時間（秒）
+}
+
+# 再試行するHTTPステータス（タイムアウト・競合・レート制限・サーバーエラー・過負荷）
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+DEFAULT_OPERATION = "LLM呼び出し"
+
+
+def load_llm_client_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """configs/config.yaml の llm_client セクションを読み込み"""
+    return load_config_section("llm_client", DEFAULT_LLM_CLIENT_CONFIG, config_path)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """再試行で回復する可能性のあるエラーか（429・5xx・タイムアウト・接続エラー）"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return isinstance(error, (anthropic.APIConnectionError, TimeoutError, ConnectionError))
+
+
+def is_client_error(error: BaseException) -> bool:
+    """再試行しない4xxエラーか（リクエスト側の問題で、APIは応答している）"""
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and 400 <= status_code < 500 and status_code not in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """エラー応答の retry-after ヘッダ（秒）"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitOpenError(RuntimeError):
+    """サーキットが開いているため呼び出しを行わなかった"""
+
+
+class CircuitBreaker:
+    """
+    連続エラーで呼び出しを遮断するサーキットブレーカー
+
+    closed: 通常 / open: reset_seconds の間は即座に CircuitOpenError /
+    half_open: 1件だけ試行し、成功すれば closed、失敗すれば再び open
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 60.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """呼び出し前の確認（遮断中は CircuitOpenError）"""
+        with self._lock:
+            if self.state == "open":
+                remaining = self._opened_at + self.reset_seconds - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(f"LLM API circuit is open (retry in {remaining:.0f}s)")
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open":
+                if self._trial_in_flight:
+                    raise CircuitOpenError("LLM API circuit is half-open (trial request in flight)")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("LLM API circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(
+                        f"LLM API circuit opened after {self.failures} consecutive failures "
+                        f"(pausing calls for {self.reset_seconds}s)"
+                    )
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """成功・失敗を判定しない終了（呼び出し側の例外等）。半開状態の試行を解放する"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_outcome(self, error: Optional[BaseException] = None):
+        """呼び出しの結果を記録（4xxはAPIが応答しているため成功として扱う）"""
+        if error is None or is_client_error(error):
+            self.record_success()
+        elif isinstance(error, Exception) and is_retryable_error(error):
+            self.record_failure()
+        else:
+            self.release()
+
+
+_shared_circuit_breaker: Optional[CircuitBreaker] = None
+_shared_circuit_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """全クライアントで共有するサーキットブレーカー"""
+    global _shared_circuit_breaker
+    with _shared_circuit_lock:
+        if _shared_circuit_breaker is None:
+            config = load_llm_client_config()
+            _shared_circuit_breaker = CircuitBreaker(
+                failure_threshold=config.get("circuit_failure_threshold", 5),
+                reset_seconds=config.get("circuit_reset_seconds", 60)
+            )
+        return _shared_circuit_breaker
+
+
+def _submit(fn: Callable[[], Any]) -> Future:
+    """fn をデーモンスレッドで実行（ヘッジで使わなかった呼び出しが終了を妨げないように）"""
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="llm-hedge", daemon=True).start()
+    return future
+
+
+class _Messages:
+    def __init__(self, client: "LLMClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client._create(kwargs)
+
+    def stream(self, **kwargs):
+        return _ResilientStream(self._client, kwargs)
+
+    def __getattr__(self, name: str):
+        # batches / count_tokens 等はそのまま backend に渡す
+        return getattr(self._client.backend.messages, name)
+
+
+class _ResilientStream:
+    """
+    messages.stream(...) のコンテキストマネージャ
+
+    ストリームの開始（最初の応答まで）はリトライします。受信の途中で失敗した場合は、
+    呼び出し側が受け取った部分と重複するため再試行せずにエラーを返します。
+    """
+
+    def __init__(self, client: "LLMClient", params: Dict[str, Any]):
+        self._client = client
+        self._params = params
+        self._manager = None
+        self._call = None
+
+    def __enter__(self):
+        self._call = self._client._prepare(self._params)
+
+        def open_stream(params, timeout):
+            manager = self._client.backend.messages.stream(**params, timeout=timeout)
+            stream = manager.__enter__()
+            self._manager = manager
+            return stream
+
+        return self._client._with_retries(self._call, open_stream)
+
+    def __exit__(self, exc_type, exc, tb):
+        # 受信中・呼び出し側の例外でも必ずサーキットの試行を解放する
+        error = exc
+        try:
+            return self._manager.__exit__(exc_type, exc, tb)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._client.circuit.record_outcome(error)
+            if error is None:
+                set_call_metrics(self._client._metrics(self._call))
+            else:
+                self._client._record_failure(self._call, error)
+
+
+class LLMClient:
+    """
+    Anthropic クライアント（または同じ呼び出し形式のスタブ）に共通の呼び出しポリシーを適用
+
+    messages.create / messages.stream 以外（messages.batches 等）は backend をそのまま使います。
+    """
+
+    def __init__(
+        self,
+        backend,
+        config: Optional[Dict[str, Any]] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            backend: Anthropic クライアント（自身のリトライは max_retries=0 で無効にする）
+            config: llm_client 設定（Noneは configs/config.yaml）
+            circuit_breaker: サーキットブレーカー（Noneは全クライアントで共有）
+        """
+        self.backend = backend
+        self.config = config if config is not None else load_llm_client_config()
+        self.circuit = circuit_breaker or get_circuit_breaker()
+        self.messages = _Messages(self)
+
+    def timeout_for(self, operation: Optional[str]) -> float:
+        return float((self.config.get("operation_timeouts") or {}).get(operation, self.config.get("timeout", 600)))
+
+    def hedge_delay_for(self, operation: Optional[str]) -> Optional[float]:
+        delay = (self.config.get("hedge_delays") or {}).get(operation)
+        return float(delay) if delay else None
+
+    def _prepare(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """呼び出し1件の状態（パラメータ・操作名・タイムアウト・計測値）"""
+        params = dict(kwargs)
+        operation = params.pop("operation", None)
+        timeout = params.pop("timeout", None) or self.timeout_for(operation)
+        return {
+            "params": params,
+            "operation": operation or DEFAULT_OPERATION,
+            "timeout": timeout,
+            "hedge_delay": self.hedge_delay_for(operation),
+            "started": time.monotonic(),
+            "attempts": 0,
+            "hedged": False,
+        }
+
+    def _metrics(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "latency_ms": int((time.monotonic() - call["started"]) * 1000),
+            "attempts": call["attempts"],
+            "hedged": call["hedged"],
+        }
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """ジッター付き指数バックオフ（full jitter）の待ち時間"""
+        ceiling = min(self.config.get("backoff_max", 30.0), self.config.get("backoff_base", 1.0) * 2 ** (attempt - 1))
+        delay = random.uniform(0, ceiling)
+        retry_after = _retry_after(error)
+        return max(delay, retry_after) if retry_after else delay
+
+    def _with_retries(self, call: Dict[str, Any], send: Callable[[Dict[str, Any], float], Any]):
+        """send(params, timeout) を再試行ポリシーに従って実行"""
+        max_retries = self.config.get("max_retries", 4)
+        while True:
+            call["attempts"] += 1
+            try:
+                self.circuit.before_call()
+            except CircuitOpenError as e:
+                self._record_failure(call, e)
+                raise
+            try:
+                return send(call["params"], call["timeout"])
+            except Exception as e:
+                if not is_retryable_error(e) or call["attempts"] > max_retries:
+                    self.circuit.record_outcome(e)
+                    self._record_failure(call, e)
+                    raise
+                self.circuit.record_failure()
+                delay = self._backoff(call["attempts"], e)
+                logger.warning(
+                    f"{call['operation']}: {type(e).__name__} on attempt {call['attempts']}, "
+                    f"retrying in {delay:.1f}s ({e})"
+                )
+                time.sleep(delay)
+            except BaseException:
+                self.circuit.release()
+                raise
+
+    def _create(self, kwargs: Dict[str, Any]):
+        call = self._prepare(kwargs)
+        response = self._with_retries(call, lambda params, timeout: self._send_hedged(call, params, timeout))
+        self.circuit.record_success()
+        set_call_metrics(self._metrics(call))
+        return response
+
+    def _send_hedged(self, call: Dict[str, Any], params: Dict[str, Any], timeout: float):
+        """hedge_delay 秒以内に応答がなければ2本目を送り、先に成功した応答を返す"""
+        send = lambda: self.backend.messages.create(**params, timeout=timeout)
+        if not call["hedge_delay"]:
+            return send()
+
+        primary = _submit(send)
+        done, _ = wait([primary], timeout=call["hedge_delay"])
+        if done:
+            return primary.result()
+
+        call["hedged"] = True
+        logger.info(f"{call['operation']}: no response in {call['hedge_delay']}s, sending hedged request")
+        pending = {primary, _submit(send)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(lambda f: self._record_discarded(call, f))
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def _record_discarded(self, call: Dict[str, Any], future: Future):
+        """ヘッジで使わなかった応答のコストを記録（課金はされるため）"""
+        if future.exception() is not None:
+            return
+        usage = future.result().usage
+        record_cost(
+            operation=call["operation"],
+            model_name=call["params"].get("model", ""),
+            input_tokens=usage.input_tokens,
+            output_tokens=usage.output_tokens,
+            metadata={"hedge": "discarded"},
+            cache_creation_tokens=getattr(usage, "cache_creation_input_tokens", 0) or 0,
+            cache_read_tokens=getattr(usage, "cache_read_input_tokens", 0) or 0,
+            call_metrics=dict(self._metrics(call), hedged=True)
+        )
+
+    def _record_failure(self, call: Dict[str, Any], error: BaseException):
+        """最終的に失敗した呼び出しを記録（レイテンシ・試行回数の集計用、トークン0件）"""
+        record_cost(
+            operation=call["operation"],
+            model_name=call["params"].get("model", ""),
+            input_tokens=0,
+            output_tokens=0,
+            metadata={"error": type(error).__name__, "message": str(error)[:200]},
+            call_metrics=dict(self._metrics(call), failed=True)
+        )
+
+
+def create_llm_client(api_key: Optional[str] = None, config: Optional[Dict[str, Any]] = None) -> LLMClient:
+    """Anthropic API の共通クライアントを作成（SDK自身のリトライは無効にしてポリシーを一本化）"""
+    backend = anthropic.Anthropic(api_key=api_key or os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
+    return LLMClient(backend, config)
@@ -0,0 +1,338 @@
+"""
+オフライン用の Anthropic クライアントスタブ
+
+client.messages.create(...) / client.messages.stream(...) と同じ呼び出し形式で、
+APIを呼ばずに応答を返します（stream は応答テキストを一定文字数ずつ返します）。
+プロンプトキャッシュ（cache_control）の挙動を模擬し、usage に
+cache_creation_input_tokens / cache_read_input_tokens を設定するため、
+プロンプトの構成・コスト記録をネットワークなしでテストできます。
+
+LocalBatchServer は Message Batches API（client.messages.batches）のローカル代替です。
+
+使用例:
+    generator.client = StubAnthropicClient(responder=lambda request: "[]")
+    ...
+    generator.client.calls  # 送信されたリクエスト（キーワード引数）の一覧
+
+    batch_client = LocalBatchServer(StubAnthropicClient(responder), "cache/local_batches")
+    batch = batch_client.messages.batches.create(requests=[{"custom_id": "r1", "params": {...}}])
+"""
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+# プロンプトキャッシュの最小トークン数（Sonnet/Opus）とTTL（秒）
+MIN_CACHEABLE_TOKENS = 1024
+CACHE_TTL_SECONDS = 300
+
+
+def count_tokens(text: str) -> int:
+    """トークン数の概算（日本語を含むため2文字=1トークンとして計算）"""
+    return max(1, len(text) // 2) if text else 0
+
+
+def _blocks(content) -> List[Dict[str, Any]]:
+    """メッセージの content を content block のリストに正規化"""
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content)
+
+
+def _block_text(block: Dict[str, Any]) -> str:
+    if block.get("type") == "text":
+        return block.get("text", "")
+    # 画像等はデータ長から概算
+    return json.dumps(block.get("source", {}), ensure_ascii=False)
+
+
+class _StubMessages:
+    def __init__(self, client: "StubAnthropicClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client._create(kwargs)
+
+    def stream(self, **kwargs):
+        return _StubStream(self._client, kwargs)
+
+
+class _StubStream:
+    """messages.stream(...) のコンテキストマネージャ（text_stream / get_final_message）"""
+
+    def __init__(self, client: "StubAnthropicClient", request: Dict[str, Any]):
+        self._client = client
+        self._request = request
+        self._message = None
+
+    def __enter__(self):
+        self._message = self._client._create(self._request)
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def text_stream(self):
+        text = self._message.content[0].text
+        size = max(1, self._client.stream_chunk_chars)
+        for start in range(0, len(text), size):
+            if self._client.chunk_latency:
+                time.sleep(self._client.chunk_latency)
+            yield text[start:start + size]
+
+    def get_final_message(self):
+        return self._message
+
+
+class StubAnthropicClient:
+    """
+    プロンプトキャッシュを模擬する Anthropic クライアントのスタブ
+
+    cache_control のついたブロックまでの内容（model・system・messagesの順）が
+    TTL内に同じであればキャッシュ読み込み、初回はキャッシュ書き込みとして usage を返します。
+    """
+
+    def __init__(
+        self,
+        responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+        latency: Union[float, Callable[[Dict[str, Any]], float]] = 0.0,
+        min_cacheable_tokens: int = MIN_CACHEABLE_TOKENS,
+        ttl: float = CACHE_TTL_SECONDS,
+        stream_chunk_chars: int = 20,
+        chunk_latency: float = 0.0
+    ):
+        """
+        Args:
+            responder: リクエスト（create のキーワード引数）-> 応答テキスト（Noneは "[]"）
+            latency: 1回の呼び出しにかかる時間（秒、またはリクエスト -> 秒）。
+                リクエストの timeout を超える場合は timeout 秒後に TimeoutError
+            min_cacheable_tokens: キャッシュされるプレフィックスの最小トークン数
+            ttl: キャッシュの有効期間（秒、読み込みごとに延長）
+            stream_chunk_chars: stream で1回に返す文字数
+            chunk_latency: stream で1チャンクごとにかかる時間（秒）
+        """
+        self.responder = responder or (lambda request: "[]")
+        self.latency = latency
+        self.min_cacheable_tokens = min_cacheable_tokens
+        self.ttl = ttl
+        self.stream_chunk_chars = stream_chunk_chars
+        self.chunk_latency = chunk_latency
+        self.messages = _StubMessages(self)
+        self.calls: List[Dict[str, Any]] = []
+        self._cache: Dict[str, float] = {}  # プレフィックスのハッシュ -> 有効期限
+        self._lock = threading.Lock()
+
+    def _segments(self, request: Dict[str, Any]) -> List[tuple]:
+        """リクエストを (テキスト, cache_controlの有無) の列に分解"""
+        segments = [(request.get("model", ""), False)]
+        system = request.get("system")
+        if system:
+            segments.extend((_block_text(block), "cache_control" in block) for block in _blocks(system))
+        for message in request.get("messages", []):
+            segments.append((message.get("role", ""), False))
+            segments.extend((_block_text(block), "cache_control" in block) for block in _blocks(message.get("content", "")))
+        return segments
+
+    def _create(self, request: Dict[str, Any]):
+        segments = self._segments(request)
+        breakpoint_index = max((i for i, (_, cached) in enumerate(segments) if cached), default=-1)
+        prefix_tokens = sum(count_tokens(text) for text, _ in segments[1:breakpoint_index + 1])
+        total_tokens = sum(count_tokens(text) for text, _ in segments[1:])
+
+        cache_creation = cache_read = 0
+        if breakpoint_index >= 0 and prefix_tokens >= self.min_cacheable_tokens:
+            digest = hashlib.sha256(
+                json.dumps([text for text, _ in segments[:breakpoint_index + 1]], ensure_ascii=False).encode("utf-8")
+            ).hexdigest()
+            now = time.monotonic()
+            with self._lock:
+                if self._cache.get(digest, 0) > now:
+                    cache_read = prefix_tokens
+                else:
+                    cache_creation = prefix_tokens
+                self._cache[digest] = now + self.ttl
+
+        with self._lock:
+            self.calls.append(request)
+        latency = self.latency(request) if callable(self.latency) else self.latency
+        timeout = request.get("timeout")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Request timed out after {timeout}s")
+        if latency:
+            time.sleep(latency)
+
+        text = self.responder(request)
+        output_tokens = min(count_tokens(text), request.get("max_tokens", 4096))
+        return SimpleNamespace(
+            id=f"msg_stub_{len(self.calls)}",
+            model=request.get("model", ""),
+            role="assistant",
+            stop_reason="end_turn",
+            content=[SimpleNamespace(type="text", text=text)],
+            usage=SimpleNamespace(
+                input_tokens=total_tokens - cache_creation - cache_read,
+                output_tokens=output_tokens,
+                cache_creation_input_tokens=cache_creation,
+                cache_read_input_tokens=cache_read,
+            ),
+        )
+
+
+class _LocalBatches:
+    def __init__(self, server: "LocalBatchServer"):
+        self._server = server
+
+    def create(self, requests: List[Dict[str, Any]], **kwargs):
+        return self._server._create(requests)
+
+    def retrieve(self, batch_id: str):
+        return self._server._retrieve(batch_id)
+
+    def results(self, batch_id: str):
+        return self._server._results(batch_id)
+
+
+class LocalBatchServer:
+    """
+    Message Batches API のローカル代替サーバ
+
+    client.messages.batches.create / retrieve / results と同じ形式で、各リクエストを
+    backend（messages.create を持つクライアント。オフラインでは StubAnthropicClient）で
+    バックグラウンド処理します。
+
+    バッチのリクエスト・結果は root_dir/{batch_id}/ に保存するため、プロセスを再起動しても
+    同じ batch_id で状況確認・結果取得ができます（未処理のリクエストは retrieve 時に再開）。
+    各リクエストは backend の通常の呼び出しのため、バッチ料金は適用されません（batch_pricing=False）。
+    """
+
+    batch_pricing = False
+
+    def __init__(self, backend, root_dir: str, max_concurrency: int = 4):
+        """
+        Args:
+            backend: messages.create(**params) を持つクライアント
+            root_dir: バッチの保存先ディレクトリ
+            max_concurrency: 同時に処理するリクエスト数
+        """
+        self.backend = backend
+        self.root_dir = Path(root_dir)
+        self.max_concurrency = max(1, max_concurrency)
+        self.messages = SimpleNamespace(batches=_LocalBatches(self))
+        self._workers: Dict[str, threading.Thread] = {}
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """処理中のリクエストの完了後、バックグラウンド処理を停止（中断の模擬）"""
+        self._stopped.set()
+        for worker in list(self._workers.values()):
+            worker.join()
+
+    def _create(self, requests: List[Dict[str, Any]]):
+        batch_id = f"msgbatch_local_{uuid.uuid4().hex[:16]}"
+        batch_dir = self.root_dir / batch_id
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        with open(batch_dir / "requests.jsonl", 'w', encoding='utf-8') as f:
+            for request in requests:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        with open(batch_dir / "batch.json", 'w', encoding='utf-8') as f:
+            json.dump({"id": batch_id, "created_at": datetime.now().isoformat(), "total": len(requests)}, f)
+        return self._retrieve(batch_id)
+
+    def _read_results(self, batch_id: str) -> List[Dict[str, Any]]:
+        path = self.root_dir / batch_id / "results.jsonl"
+        if not path.exists():
+            return []
+        with self._lock, open(path, 'r', encoding='utf-8') as f:
+            # 書き込み途中の最終行は読み飛ばす
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def _retrieve(self, batch_id: str):
+        batch_path = self.root_dir / batch_id / "batch.json"
+        if not batch_path.exists():
+            raise KeyError(f"Batch not found: {batch_id}")
+        with open(batch_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        results = self._read_results(batch_id)
+        ended = len(results) >= meta["total"]
+        if not ended:
+            self._ensure_worker(batch_id)
+        counts = {"succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        for entry in results:
+            counts[entry["result"]["type"]] += 1
+        return SimpleNamespace(
+            id=batch_id,
+            type="message_batch",
+            processing_status="ended" if ended else "in_progress",
+            request_counts=SimpleNamespace(processing=meta["total"] - len(results), **counts),
+            created_at=meta["created_at"],
+        )
+
+    def _results(self, batch_id: str) -> Iterator[SimpleNamespace]:
+        if self._retrieve(batch_id).processing_status != "ended":
+            raise RuntimeError(f"Batch {batch_id} has not ended yet")
+        for entry in self._read_results(batch_id):
+            result = entry["result"]
+            if result["type"] == "succeeded":
+                message = result["message"]
+                result_ns = SimpleNamespace(type="succeeded", message=SimpleNamespace(
+                    id=message["id"],
+                    model=message["model"],
+                    stop_reason=message["stop_reason"],
+                    content=[SimpleNamespace(**block) for block in message["content"]],
+                    usage=SimpleNamespace(**message["usage"]),
+                ))
+            else:
+                result_ns = SimpleNamespace(type=result["type"], error=SimpleNamespace(**result.get("error", {})))
+            yield SimpleNamespace(custom_id=entry["custom_id"], result=result_ns)
+
+    def _ensure_worker(self, batch_id: str):
+        with self._lock:
+            worker = self._workers.get(batch_id)
+            if self._stopped.is_set() or (worker is not None and worker.is_alive()):
+                return
+            worker = threading.Thread(target=self._process, args=(batch_id,), name=f"local-batch-{batch_id[-6:]}", daemon=True)
+            self._workers[batch_id] = worker
+            worker.start()
+
+    def _process(self, batch_id: str):
+        batch_dir = self.root_dir / batch_id
+        done = {entry["custom_id"] for entry in self._read_results(batch_id)}
+        with open(batch_dir / "requests.jsonl", 'r', encoding='utf-8') as f:
+            pending = [request for request in map(json.loads, f) if request["custom_id"] not in done]
+
+        def run(request):
+            if self._stopped.is_set():
+                return
+            try:
+                message = self.backend.messages.create(**request["params"])
+                usage = message.usage
+                result = {"type": "succeeded", "message": {
+                    "id": message.id,
+                    "model": message.model,
+                    "stop_reason": message.stop_reason,
+                    "content": [{"type": "text", "text": block.text} for block in message.content],
+                    "usage": {
+                        "input_tokens": usage.input_tokens,
+                        "output_tokens": usage.output_tokens,
+                        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+                        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0,
+                    },
+                }}
+            except Exception as e:
+                result = {"type": "errored", "error": {"type": type(e).__name__, "message": str(e)}}
+            line = json.dumps({"custom_id": request["custom_id"], "result": result}, ensure_ascii=False)
+            with self._lock, open(batch_dir / "results.jsonl", 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="local-batch") as executor:
+            list(executor.map(run, pending))
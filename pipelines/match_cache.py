@@ -0,0 +1,178 @@
+"""
+単価マッチング結果の永続キャッシュ
+
+同じ（項目名・仕様・単位・工事区分）の項目は見積のたびに同じKB項目にマッチするため、
+項目シグネチャ -> 選ばれたKB項目（item_id・行番号）・スコア・マッチ種別 を保存し、
+次回はベクトル検索・文字列マッチングを行わずに結果を再利用します。
+
+キャッシュファイルは {KBバージョン}_{方針キー}.json で、KBの内容が変わると
+KBバージョンが変わるため自動的に無効化されます。旧バージョンのKBで実行中のセッションが
+あるため、古いバージョンのファイルは直近 keep_versions 世代を残して削除します。
+方針キーには MATCH_RULES_VERSION（照合・スコアリング処理のバージョン）を含むため、
+KBが同じでもマッチングの規則を変更すると別ファイルになります。
+
+同じファイルを複数のセッション・プロセスで共有できるよう、保存時はディスク上の
+エントリを読み直してマージしてから置き換えます（同じシグネチャは自分の結果を優先）。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+DEFAULT_MATCH_CACHE_DIR = "cache/match_results"
+
+# 照合・スコアリング処理のバージョン（同じKB・方針でも選ばれるKB項目が変わる変更をしたら更新）
+# 対象: kb_scorer（スコア計算）、unit_classes（単位の種類・互換性）、
+#       price_matcher（マッチング段階・閾値）、lexical_index・候補の絞り込み件数
+MATCH_RULES_VERSION = "1"
+
+
+def item_signature(name: str, specification: Optional[str], unit: Optional[str], discipline: Optional[str]) -> str:
+    """見積項目のシグネチャ（マッチング結果を決める 工事区分・項目名・仕様・単位）"""
+    parts = [discipline or "", name or "", specification or "", unit or ""]
+    return "\x1f".join(parts)
+
+
+class MatchResultCache:
+    """
+    項目シグネチャ -> マッチング結果 の永続キャッシュ（JSONファイル）
+
+    値は {"row": KB行番号 or None, "item_id": KB項目ID, "match_type": 種別, "score": スコア}。
+    マッチしなかった結果（row=None）も保存し、次回の検索を省略します。
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        kb_version: str,
+        policy_key: str,
+        max_entries: int = 100000,
+        keep_versions: int = 3
+    ):
+        """
+        Args:
+            cache_dir: キャッシュディレクトリ
+            kb_version: KB内容のハッシュ（変わると別ファイル = 無効化）
+            policy_key: マッチング方針・検索構成のハッシュ
+            max_entries: 保存する最大件数（超過分は古いものから削除）
+            keep_versions: 残すKBバージョン数（現在のバージョンを含む、更新日時の新しい順）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.kb_version = kb_version
+        self.path = self.cache_dir / f"{kb_version}_{policy_key}.json"
+        self.max_entries = max_entries
+        self.keep_versions = max(1, keep_versions)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._remove_old_versions()
+
+        self._entries = self._read_entries()
+        if self._entries:
+            logger.info(f"Match cache loaded: {len(self._entries)} entries ({self.path.name})")
+
+    def _remove_old_versions(self):
+        """直近 keep_versions 世代（現在のバージョンを含む）より古いKBバージョンのキャッシュを削除"""
+        files_by_version: Dict[str, List[Path]] = {}
+        last_used: Dict[str, float] = {}
+        for path in self.cache_dir.glob("*.json"):
+            version = path.stem.rsplit("_", 1)[0]
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            files_by_version.setdefault(version, []).append(path)
+            last_used[version] = max(last_used.get(version, 0.0), mtime)
+
+        older = sorted((v for v in files_by_version if v != self.kb_version), key=last_used.get, reverse=True)
+        for version in older[self.keep_versions - 1:]:
+            for stale in files_by_version[version]:
+                try:
+                    stale.unlink()
+                    logger.info(f"Removed stale match cache: {stale.name}")
+                except OSError as e:
+                    logger.warning(f"Failed to remove stale match cache {stale.name}: {e}")
+
+    def get(self, signature: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, signature: str, row: Optional[int], item_id: Optional[str], match_type: str, score: float):
+        with self._lock:
+            # 挿入順を新しさの順とするため、既存キーは一度削除
+            self._entries.pop(signature, None)
+            self._entries[signature] = {
+                "row": row,
+                "item_id": item_id,
+                "match_type": match_type,
+                "score": float(score),
+            }
+            self._dirty = True
+
+    def _read_entries(self) -> Dict[str, Dict[str, Any]]:
+        """ディスク上のエントリを読み込み（ファイルが無い・壊れている場合は空）"""
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("entries", {})
+        except Exception as e:
+            logger.warning(f"Match cache read error: {e}")
+            return {}
+
+    def save(self):
+        """
+        変更があればファイルに保存（一時ファイル経由で置き換え）
+
+        他のセッション・プロセスが保存したエントリを失わないよう、置き換える直前に
+        ディスク上のエントリを読み直してマージします。読み直しから置き換えまでの間に
+        他のプロセスが保存した分は失われますが、次回のマッチングで再計算されます。
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            on_disk = self._read_entries()
+            if on_disk:
+                # ディスク上のみのエントリを古い側に置き、自分のエントリを新しい側に残す
+                merged = {signature: entry for signature, entry in on_disk.items() if signature not in self._entries}
+                merged.update(self._entries)
+                self._entries = merged
+            if len(self._entries) > self.max_entries:
+                for signature in list(self._entries)[:len(self._entries) - self.max_entries]:
+                    del self._entries[signature]
+            data = {"kb_version": self.kb_version, "entries": self._entries}
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception as e:
+                logger.warning(f"Match cache write error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def policy_cache_key(*parts: Any) -> str:
+    """マッチング方針・工事区分ごとの上書き・検索構成（と MATCH_RULES_VERSION）からキャッシュの方針キーを計算"""
+    text = json.dumps([MATCH_RULES_VERSION] + [repr(part) for part in parts], ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
@@ -0,0 +1,299 @@
+"""
+埋め込みモデル・KBインデックスのプロセス共有レジストリ
+
+Streamlitの複数セッション・複数ファイル処理で同じSentenceTransformerや
+FAISSインデックスを重複ロードしないよう、プロセス内で1度だけ遅延ロードして共有します。
+
+- get_embedding_model(): モデル名・バックエンド（PyTorch/ONNX）ごとに1インスタンスを共有（スレッドセーフ）
+- acquire_kb_index(): KBごとの読み取り専用インデックスを参照カウント付きで貸し出し、
+  KBの内容（バージョン）が変わった場合は新しいインデックスに差し替え
+"""
+
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from pipelines.config_loader import load_config_section
+
+DEFAULT_KB_MODEL = "intfloat/multilingual-e5-small"
+
+# 埋め込みバックエンド設定（configs/config.yaml の embedding セクション）
+DEFAULT_EMBEDDING_CONFIG = {
+    "backend": "torch",        # torch（SentenceTransformer）| onnx（ONNX Runtime, CPU）
+    "onnx_dir": "kb/onnx",     # エクスポート済みONNXモデルの保存先
+    "onnx_quantized": True,    # int8動的量子化モデルを使用
+    "onnx_threads": 0,         # ONNX Runtimeの演算内スレッド数（0は既定値）
+}
+
+_registry_lock = threading.Lock()
+
+# (モデル名, バックエンド) -> ロード済みモデル
+_models: Dict[Tuple[str, str], Any] = {}
+_model_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+# (KBパス, モデル名) -> 現行インデックス
+_indexes: Dict[Tuple[str, str], "_IndexEntry"] = {}
+_index_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+
+def _lock_for(locks: Dict, key) -> threading.Lock:
+    """キーごとのロックを取得（異なるモデルのロードは並行可能）"""
+    with _registry_lock:
+        if key not in locks:
+            locks[key] = threading.Lock()
+        return locks[key]
+
+
+def get_embedding_model(model_name: str, backend: Optional[str] = None):
+    """
+    埋め込みモデルを取得（プロセス内で1度だけロード）
+
+    Args:
+        model_name: sentence-transformersのモデル名
+        backend: "torch" または "onnx"（Noneの場合はconfigs/config.yamlのembedding.backend）
+
+    Returns:
+        共有モデルインスタンス（ロード失敗時は例外を送出）
+    """
+    config = load_config_section("embedding", DEFAULT_EMBEDDING_CONFIG)
+    backend = (backend or config.get("backend") or "torch").lower()
+    key = (model_name, backend)
+
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _lock_for(_model_locks, key):
+        # 他スレッドがロード済みの場合はそれを使う
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        if backend == "onnx":
+            model = _load_onnx_model(model_name, config)
+            if model is None:
+                # ONNXが使えない場合はPyTorchモデルを共有
+                model = get_embedding_model(model_name, backend="torch")
+        else:
+            from sentence_transformers import SentenceTransformer
+
+            logger.info(f"Loading shared embedding model: {model_name}")
+            model = SentenceTransformer(model_name)
+
+        _models[key] = model
+        return model
+
+
+def _load_onnx_model(model_name: str, config: Dict[str, Any]):
+    """ONNX Runtimeバックエンドのモデルをロード（失敗時はNone）"""
+    from pipelines.onnx_embedding import OnnxEmbeddingModel, HAS_ONNXRUNTIME
+
+    if not HAS_ONNXRUNTIME:
+        logger.warning("onnxruntime not installed - falling back to PyTorch embedding backend")
+        return None
+
+    model_slug = re.sub(r'[^0-9A-Za-z._-]', '_', model_name)
+    try:
+        logger.info(f"Loading shared ONNX embedding model: {model_name}")
+        return OnnxEmbeddingModel(
+            model_name,
+            model_dir=str(Path(config.get("onnx_dir") or "kb/onnx") / model_slug),
+            quantized=bool(config.get("onnx_quantized", True)),
+            intra_op_threads=int(config.get("onnx_threads") or 0)
+        )
+    except Exception as e:
+        logger.warning(f"Failed to load ONNX embedding model, falling back to PyTorch: {e}")
+        return None
+
+
+class _IndexEntry:
+    """レジストリが保持するインデックス1世代分"""
+
+    def __init__(self, key: Tuple[str, str], version: str, vector_search):
+        self.key = key
+        self.version = version
+        self.vector_search = vector_search
+        self.refcount = 0
+        self.retired = False
+
+
+class KBIndexHandle:
+    """
+    共有KBインデックスへの読み取り専用ハンドル
+
+    release()（またはwithブロック終了）で参照を返却します。
+    KB更新で差し替えられた旧インデックスは、全ハンドルが返却された時点で解放されます。
+    """
+
+    def __init__(self, entry: _IndexEntry):
+        self._entry = entry
+        self._released = False
+
+    @property
+    def search(self):
+        """共有VectorKBSearch（検索専用、build_index等の変更操作は行わないこと）"""
+        return self._entry.vector_search
+
+    @property
+    def version(self) -> str:
+        return self._entry.version
+
+    def release(self):
+        """参照を返却（最後の参照の返却時にクエリembeddingキャッシュを保存）"""
+        idle_search = None
+        with _registry_lock:
+            if self._released:
+                return
+            self._released = True
+            entry = self._entry
+            entry.refcount -= 1
+            if entry.refcount <= 0:
+                idle_search = entry.vector_search
+            if entry.retired and entry.refcount <= 0:
+                logger.info(f"Releasing retired KB index: {entry.key[0]} (version={entry.version})")
+                entry.vector_search = None
+        if idle_search is not None:
+            idle_search.flush_query_cache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def _load_kb_items(kb_path: str) -> List[Dict]:
+    """KBファイルを読み込み"""
+    path = Path(kb_path)
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return json.loads(content) if content.strip() else []
+
+
+def acquire_kb_index(
+    kb_path: str,
+    kb_items: Optional[List[Dict]] = None,
+    model_name: str = DEFAULT_KB_MODEL
+) -> Optional[KBIndexHandle]:
+    """
+    KBのベクトルインデックスを共有ハンドルとして取得
+
+    同じKB内容（バージョン）のインデックスがロード済みであれば共有し、
+    KBが変わっていれば新しいインデックスを構築（ディスク永続化があれば読み込み）して差し替えます。
+
+    Args:
+        kb_path: 価格KBのパス（インデックス永続化先の基準）
+        kb_items: 読み込み済みKB項目（Noneの場合はkb_pathから読み込み）
+        model_name: 埋め込みモデル名
+
+    Returns:
+        KBIndexHandle、ベクトル検索が利用できない場合はNone
+    """
+    from pipelines.estimate_generator_ai import VectorKBSearch, HAS_VECTOR_SEARCH
+
+    if not HAS_VECTOR_SEARCH:
+        return None
+
+    if kb_items is None:
+        kb_items = _load_kb_items(kb_path)
+    if not kb_items:
+        return None
+
+    key = (str(Path(kb_path).resolve()), model_name)
+    version = VectorKBSearch.compute_kb_version(kb_items, model_name)
+
+    with _lock_for(_index_locks, key):
+        with _registry_lock:
+            entry = _indexes.get(key)
+            if entry and entry.version == version and entry.vector_search is not None:
+                entry.refcount += 1
+                return KBIndexHandle(entry)
+
+        # 新しいバージョンを構築（同一KBの構築はキーごとのロックで直列化）
+        index_dir = Path(kb_path).parent / "vector_index"
+        vector_search = VectorKBSearch(model_name=model_name, index_dir=str(index_dir))
+        if not vector_search.model or not vector_search.build_index(kb_items):
+            logger.warning(f"Shared KB index unavailable: {kb_path}")
+            return None
+
+        new_entry = _IndexEntry(key, version, vector_search)
+        with _registry_lock:
+            old_entry = _indexes.get(key)
+            _indexes[key] = new_entry
+            new_entry.refcount += 1
+            if old_entry is not None:
+                old_entry.retired = True
+                if old_entry.refcount <= 0:
+                    old_entry.vector_search = None
+                logger.info(f"KB index swapped: {kb_path} ({old_entry.version} -> {version})")
+            else:
+                logger.info(f"KB index registered: {kb_path} (version={version})")
+
+        return KBIndexHandle(new_entry)
+
+
+def refresh_kb_index(
+    kb_path: str,
+    kb_items: Optional[List[Dict]] = None,
+    model_name: str = DEFAULT_KB_MODEL
+) -> bool:
+    """
+    KB保存直後にベクトルインデックスを差分更新
+
+    変更された項目だけをエンコードして永続化インデックスに反映し、
+    共有インデックスも新しいバージョンに差し替えます。KBが空の場合は
+    共有インデックスを破棄します（永続化分は次回の差分の基準として残します）。
+
+    Args:
+        kb_path: 価格KBのパス
+        kb_items: 保存したKB項目（Noneの場合はkb_pathから読み込み）
+        model_name: 埋め込みモデル名
+
+    Returns:
+        インデックスを更新できた場合True
+    """
+    if kb_items is None:
+        kb_items = _load_kb_items(kb_path)
+
+    if not kb_items:
+        key = (str(Path(kb_path).resolve()), model_name)
+        with _registry_lock:
+            entry = _indexes.pop(key, None)
+            if entry is not None:
+                entry.retired = True
+                if entry.refcount <= 0:
+                    entry.vector_search = None
+        return False
+
+    try:
+        handle = acquire_kb_index(kb_path, kb_items, model_name)
+    except Exception as e:
+        logger.warning(f"Failed to refresh KB index: {e}")
+        return False
+    if handle is None:
+        return False
+    handle.release()
+    return True
+
+
+def get_registry_stats() -> Dict[str, Any]:
+    """レジストリの状態（ロード済みモデル・インデックス）を取得"""
+    with _registry_lock:
+        return {
+            "models": [f"{model_name} ({backend})" for model_name, backend in _models],
+            "indexes": [
+                {
+                    "kb_path": key[0],
+                    "model": key[1],
+                    "version": entry.version,
+                    "refcount": entry.refcount,
+                    "query_cache": entry.vector_search.get_query_cache_stats() if entry.vector_search else {},
+                }
+                for key, entry in _indexes.items()
+            ]
+        }
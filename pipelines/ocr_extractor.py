@@ -1,17 +1,17 @@
 """
 OCR処理を使って画像ベースPDFから見積データを抽出
 """
-import os
 import base64
 import io
+import json
 from typing import List, Dict, Any
 from pathlib import Path
 import fitz  # PyMuPDF
 from PIL import Image
-from anthropic import Anthropic
 from loguru import logger
 from dotenv import load_dotenv
 from pipelines.cost_tracker import record_cost
+from pipelines.llm_client import create_llm_client
 
 # 環境変数をロード
 load_dotenv()
@@ -21,10 +21,11 @@ class OCRExtractor:
     """画像ベースPDFからOCRで見積データを抽出"""
 
     def __init__(self):
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = create_llm_client()
         self.model_name = "claude-sonnet-4-20250514"
 
-    def pdf_to_images(self, pdf_path: str, dpi: int = 200) -> List[Image.Image]:
+    @staticmethod
+    def pdf_to_images(pdf_path: str, dpi: int = 200) -> List[Image.Image]:
         """
         PDFを画像に変換
 
@@ -58,7 +59,8 @@ class OCRExtractor:
         logger.info(f"Converted {len(images)} pages to images")
         return images
 
-    def image_to_base64(self, image: Image.Image) -> str:
+    @staticmethod
+    def image_to_base64(image: Image.Image) -> str:
         """PIL ImageをBase64エンコード"""
         buffered = io.BytesIO()
         image.save(buffered, format="PNG")
@@ -90,7 +92,39 @@ class OCRExtractor:
             image_base64 = self.image_to_base64(image)
 
             # Claude Vision APIで画像から見積項目を抽出
-            prompt = f"""
+            try:
+                response = self.client.messages.create(
+                    model=self.model_name,
+                    max_tokens=16000,
+                    messages=self.build_page_messages(image_base64, discipline),
+                    operation="OCR見積抽出"
+                )
+
+                # コスト記録
+                record_cost(
+                    operation="OCR見積抽出",
+                    model_name=self.model_name,
+                    input_tokens=response.usage.input_tokens,
+                    output_tokens=response.usage.output_tokens,
+                    metadata={"source": "extract_estimate_from_images", "page": i, "discipline": discipline}
+                )
+
+                items = self.parse_page_response(response.content[0].text)
+
+                logger.debug(f"Extracted {len(items)} items from page {i}")
+                all_items.extend(items)
+
+            except Exception as e:
+                logger.error(f"Failed to extract from page {i}: {e}")
+                continue
+
+        logger.info(f"Total extracted items: {len(all_items)}")
+        return all_items
+
+    @staticmethod
+    def build_page_messages(image_base64: str, discipline: str = "ガス設備工事") -> List[Dict[str, Any]]:
+        """見積書1ページ分の画像から見積項目を抽出するメッセージ"""
+        prompt = f"""
 この画像は「{discipline}」の見積書の一部です。
 
 以下の情報を **すべて** 抽出してJSON配列で出力してください：
@@ -126,60 +160,35 @@ JSON形式（配列）：
 
 画像内のすべての項目を抽出してください。"""
 
-            try:
-                response = self.client.messages.create(
-                    model=self.model_name,
-                    max_tokens=16000,
-                    messages=[{
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": image_base64
-                                }
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }]
-                )
-
-                # コスト記録
-                record_cost(
-                    operation="OCR見積抽出",
-                    model_name=self.model_name,
-                    input_tokens=response.usage.input_tokens,
-                    output_tokens=response.usage.output_tokens,
-                    metadata={"source": "extract_estimate_from_images", "page": i, "discipline": discipline}
-                )
-
-                # レスポンスからJSONを抽出
-                content = response.content[0].text
-
-                # ```json ... ``` のマーカーを除去
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0]
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0]
-
-                # JSONパース
-                import json
-                items = json.loads(content.strip())
-
-                logger.debug(f"Extracted {len(items)} items from page {i}")
-                all_items.extend(items)
-
-            except Exception as e:
-                logger.error(f"Failed to extract from page {i}: {e}")
-                continue
-
-        logger.info(f"Total extracted items: {len(all_items)}")
-        return all_items
+        return [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": "image/png",
+                        "data": image_base64
+                    }
+                },
+                {
+                    "type": "text",
+                    "text": prompt
+                }
+            ]
+        }]
+
+    @staticmethod
+    def parse_page_response(content: str) -> List[Dict[str, Any]]:
+        """1ページ分の応答テキストから見積項目のJSON配列を取り出す"""
+        # ```json ... ``` のマーカーを除去
+        if "```json" in content:
+            content = content.split("```json")[1].split("```")[0]
+        elif "```" in content:
+            content = content.split("```")[1].split("```")[0]
+
+        # JSONパース
+        return json.loads(content.strip())
 
     def extract_from_pdf(
         self,
@@ -0,0 +1,220 @@
+"""
+ONNX Runtime（CPU）による埋め込みモデル
+
+GPUのないサーバーでSentenceTransformer（PyTorch）の推論がKBインデックス構築・
+単価マッチングのボトルネックになるため、E5等のモデルをONNXにエクスポートし、
+int8動的量子化したモデルをONNX Runtimeで実行します。
+
+SentenceTransformerと同じ encode() / get_sentence_embedding_dimension() を提供するため、
+VectorKBSearch・PriceRAGからはそのまま差し替えて使えます（model_registry経由で選択）。
+"""
+
+import json
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from loguru import logger
+
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    HAS_ONNXRUNTIME = False
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+EXPORT_CONFIG_FILE = "onnx_config.json"
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True) -> Path:
+    """
+    SentenceTransformerモデルをONNXにエクスポート（任意でint8動的量子化）
+
+    トークナイザとプーリング設定（mean/cls、正規化の有無）も保存し、
+    OnnxEmbeddingModelがSentenceTransformerと同じ出力を再現できるようにします。
+
+    Args:
+        model_name: sentence-transformersのモデル名（またはローカルパス）
+        output_dir: 出力ディレクトリ
+        quantize: int8量子化モデルも作成する場合True
+
+    Returns:
+        出力ディレクトリ
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+
+    logger.info(f"Exporting embedding model to ONNX: {model_name}")
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+
+    # プーリング・正規化設定をSentenceTransformerのモジュール構成から取得
+    pooling_mode = "mean"
+    normalize = False
+    for module in st_model:
+        if hasattr(module, "pooling_mode_cls_token") and module.pooling_mode_cls_token:
+            pooling_mode = "cls"
+        if type(module).__name__ == "Normalize":
+            normalize = True
+
+    sample = tokenizer(["passage: サンプル"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    class _Encoder(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    model_file = output_path / MODEL_FILE
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(auto_model),
+            tuple(sample[name] for name in input_names),
+            str(model_file),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+            dynamo=False,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(str(model_file), str(output_path / QUANTIZED_MODEL_FILE), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(str(output_path))
+    with open(output_path / EXPORT_CONFIG_FILE, 'w', encoding='utf-8') as f:
+        json.dump({
+            "model_name": model_name,
+            "pooling_mode": pooling_mode,
+            "normalize": normalize,
+            "max_seq_length": st_model.max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+        }, f, ensure_ascii=False, indent=2)
+
+    logger.info(f"ONNX model exported: {output_path} (pooling={pooling_mode}, quantized={quantize})")
+    return output_path
+
+
+class OnnxEmbeddingModel:
+    """
+    ONNX Runtimeで推論するSentenceTransformer互換の埋め込みモデル
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        model_dir: str,
+        quantized: bool = True,
+        intra_op_threads: int = 0,
+        export_if_missing: bool = True
+    ):
+        """
+        Args:
+            model_name: 元のsentence-transformersモデル名
+            model_dir: エクスポート済みONNXモデルのディレクトリ
+            quantized: int8量子化モデルを使う場合True
+            intra_op_threads: ONNX Runtimeの演算内スレッド数（0はONNX Runtimeの既定値）
+            export_if_missing: モデルがなければエクスポートする
+        """
+        if not HAS_ONNXRUNTIME:
+            raise ImportError("onnxruntime is not installed")
+
+        self.model_name = model_name
+        self.model_dir = Path(model_dir)
+        model_file = self.model_dir / (QUANTIZED_MODEL_FILE if quantized else MODEL_FILE)
+
+        if not model_file.exists() or not (self.model_dir / EXPORT_CONFIG_FILE).exists():
+            if not export_if_missing:
+                raise FileNotFoundError(f"ONNX model not found: {model_file}")
+            export_onnx_model(model_name, str(self.model_dir), quantize=quantized)
+
+        with open(self.model_dir / EXPORT_CONFIG_FILE, 'r', encoding='utf-8') as f:
+            export_config = json.load(f)
+        self.pooling_mode = export_config.get("pooling_mode", "mean")
+        self.normalize = export_config.get("normalize", False)
+        self.max_seq_length = export_config.get("max_seq_length") or 512
+        self.dimension = export_config["dimension"]
+
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+        options = ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_file), sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        logger.info(
+            f"ONNX embedding model loaded: {model_file.name} "
+            f"(threads={intra_op_threads or 'default'}, pooling={self.pooling_mode})"
+        )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        テキストをベクトル化（SentenceTransformer.encode互換）
+
+        Args:
+            sentences: テキストまたはテキストのリスト
+            batch_size: 推論バッチサイズ
+
+        Returns:
+            embedding行列（float32）。単一テキストの場合は1次元
+        """
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype='float32')
+
+        # 長さ順に並べてパディングを減らし、最後に元の順序へ戻す
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.zeros((len(texts), self.dimension), dtype='float32')
+
+        for start in range(0, len(texts), batch_size):
+            batch_rows = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [texts[row] for row in batch_rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype('int64') for name in self.input_names if name in encoded}
+            hidden = self.session.run(None, feeds)[0]
+            embeddings[batch_rows] = self._pool(hidden, encoded["attention_mask"])
+
+        if self.normalize or normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.clip(norms, 1e-12, None)
+
+        return embeddings[0] if single else embeddings
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """トークン出力を文ベクトルに集約（mean: マスク付き平均、cls: 先頭トークン）"""
+        if self.pooling_mode == "cls":
+            return hidden[:, 0]
+        mask = attention_mask[..., np.newaxis].astype('float32')
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
@@ -0,0 +1,539 @@
+"""
+見積生成前のプリフライト見積（トークン数・API料金・処理時間の予測）
+
+仕様書PDFをローカルで解析し（テキスト抽出・トークン数の概算・Vision APIに送るページ数）、
+統合見積（AIEstimateGenerator.generate_estimate_unified）の各ステージの入力・出力トークン数を
+予測して、API料金と処理時間を見積もります。APIは呼び出しません。
+
+  - 入力トークン: 各ステージのプロンプトに入る仕様書テキスト・ページ画像のトークン数 + 定型部分
+  - 出力トークン: コストログの操作ごとの 出力/入力トークン比 の中央値（履歴が少ない操作は既定値）
+  - 処理時間: コストログの操作ごとの 出力1トークンあたりの応答時間 の中央値（同上）と、
+    llm セクションの並行数（ステージ・Vision・工事区分）から求めたAPI待ち時間
+  - 仕様書解析ステージ・生成項目のキャッシュがあるステージはAPIを呼び出さない（0件）
+
+テキスト抽出・単価マッチング等のローカル処理の時間は含みません。
+PDFの読み込みは1回の走査で、結果はファイルハッシュでキャッシュします（extract_pdf_pages）。
+
+使用例:
+    estimate = preflight_spec("仕様書.pdf")
+    print(estimate.total_cost_jpy, estimate.wall_seconds)
+
+    # 予算内に収まる仕様書を先頭から選ぶ（バッチ実行の計画）
+    selected, deferred, estimates = plan_within_budget(pdf_paths, budget_jpy=3000)
+"""
+
+import math
+import os
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import PyPDF2
+from loguru import logger
+
+from pipelines.config_loader import load_config_section
+from pipelines.cost_tracker import get_tracker
+from pipelines.estimate_generator_ai import (
+    AIEstimateGenerator, DRAWING_DPI, ESTIMATE_CACHE_DIR, HAS_PYMUPDF, SPEC_STAGE_VERSIONS,
+    SPEC_TABLE_VISION_DPI, items_cache_path, load_llm_config, pdf_cache_hash, spec_stage_cache
+)
+from pipelines.schemas import DisciplineType
+from pipelines.stage_dag import Stage
+
+if HAS_PYMUPDF:
+    import fitz
+
+DEFAULT_PREFLIGHT_CONFIG = {
+    "history_days": 90,  # 比率の算出に使うコストログの期間（日）
+    "min_history": 3,  # 操作ごとの比率に履歴を使う最小件数（未満は既定値）
+    "cjk_tokens_per_char": 0.9,  # 日本語等（非ASCII）1文字あたりのトークン数
+    "ascii_chars_per_token": 4.0,  # ASCII 何文字で1トークンか
+    "output_tokens_per_second": 40,  # 履歴がない場合の出力速度（トークン/秒）
+    "request_overhead_seconds": 3.0,  # 履歴がない場合の1回あたりの応答開始までの時間（秒）
+}
+
+# 各操作のプロンプトの定型部分のトークン数（概算）・max_tokens・履歴がない場合の出力トークン数
+OPERATION_PROFILES = {
+    "建物情報抽出": {"prompt_tokens": 500, "max_tokens": 16000, "output_tokens": 2000},
+    "諸元表テキスト抽出": {"prompt_tokens": 300, "max_tokens": 16000, "output_tokens": 3000},
+    "諸元表Vision抽出": {"prompt_tokens": 400, "max_tokens": 16000, "output_tokens": 2500},
+    "図面Vision分析": {"prompt_tokens": 200, "max_tokens": 2000, "output_tokens": 400},
+    "プロンプトキャッシュ準備": {"prompt_tokens": 30, "max_tokens": 1, "output_tokens": 1},
+    "電気設備生成（仕様書準拠）": {"prompt_tokens": 1100, "max_tokens": 16000, "output_tokens": 6000},
+    "機械設備生成（仕様書準拠）": {"prompt_tokens": 900, "max_tokens": 16000, "output_tokens": 6000},
+    "ガス設備見積生成": {"prompt_tokens": 1300, "max_tokens": 16000, "output_tokens": 5000},
+    **{
+        f"{discipline.value}項目生成": {"prompt_tokens": 500, "max_tokens": 16000, "output_tokens": 3000}
+        for discipline in (DisciplineType.HVAC, DisciplineType.PLUMBING, DisciplineType.FIRE_PROTECTION)
+    },
+}
+
+# 工事区分ごとの項目生成（_generate_items_for_all_disciplines と同じ順序）
+ITEM_GENERATION_OPERATIONS = [
+    "電気設備生成（仕様書準拠）",
+    "機械設備生成（仕様書準拠）",
+    "ガス設備見積生成",
+    f"{DisciplineType.HVAC.value}項目生成",
+    f"{DisciplineType.PLUMBING.value}項目生成",
+    f"{DisciplineType.FIRE_PROTECTION.value}項目生成",
+]
+
+# 項目生成の共通プレフィックスに含まれる建物情報（JSON）のトークン数（概算）
+BUILDING_SUMMARY_TOKENS = 2000
+
+# Vision APIの画像（長辺1568px・約1600トークンに縮小される）
+IMAGE_MAX_EDGE_PX = 1568
+IMAGE_MAX_TOKENS = 1600
+IMAGE_PIXELS_PER_TOKEN = 750
+
+
+def load_preflight_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """configs/config.yaml の preflight セクションを読み込み"""
+    return load_config_section("preflight", DEFAULT_PREFLIGHT_CONFIG, config_path)
+
+
+def count_tokens(text: str, config: Optional[Dict[str, Any]] = None) -> int:
+    """テキストのトークン数の概算（ASCIIと日本語等で文字あたりのトークン数を分ける）"""
+    if not text:
+        return 0
+    config = config or DEFAULT_PREFLIGHT_CONFIG
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return math.ceil(
+        ascii_chars / config.get("ascii_chars_per_token", 4.0)
+        + (len(text) - ascii_chars) * config.get("cjk_tokens_per_char", 0.9)
+    )
+
+
+def image_tokens(width_pt: float, height_pt: float, dpi: int) -> int:
+    """PDFページ（ポイント単位）を dpi で描画した画像のトークン数"""
+    width, height = width_pt / 72 * dpi, height_pt / 72 * dpi
+    scale = min(1.0, IMAGE_MAX_EDGE_PX / max(width, height, 1))
+    tokens = (width * scale) * (height * scale) / IMAGE_PIXELS_PER_TOKEN
+    return math.ceil(min(tokens, IMAGE_MAX_TOKENS))
+
+
+def makespan(durations: List[float], workers: int) -> float:
+    """durations を workers 並行で実行したときの所要時間（概算）"""
+    if not durations:
+        return 0.0
+    return max(max(durations), sum(durations) / max(1, workers))
+
+
+@dataclass
+class OperationHistory:
+    """コストログから求めた操作ごとの比率"""
+    records: int = 0
+    output_ratio: Optional[float] = None  # 出力トークン / 入力トークン（キャッシュを含む）の中央値
+    seconds_per_output_token: Optional[float] = None  # 応答時間 / 出力トークン の中央値
+
+
+def load_operation_history(
+    records: Optional[List[Dict[str, Any]]] = None,
+    days: Optional[int] = None,
+    min_history: int = 3
+) -> Dict[str, OperationHistory]:
+    """
+    コストログから操作ごとの 出力/入力トークン比・出力1トークンあたりの応答時間 を集計
+
+    失敗した呼び出し・ヘッジで使わなかった応答・バッチ料金の呼び出しは除きます。
+    件数が min_history 未満の比率は None（既定値を使用）です。
+
+    Args:
+        records: コスト記録（Noneは logs/api_costs.json）
+        days: 過去N日間の記録のみ使用（Noneは全期間）
+        min_history: 比率を求める最小件数
+    """
+    if records is None:
+        records = get_tracker().records
+    cutoff = datetime.now() - timedelta(days=days) if days else None
+
+    ratios: Dict[str, List[float]] = {}
+    speeds: Dict[str, List[float]] = {}
+    for r in records:
+        metadata = r.get("metadata") or {}
+        input_total = (r.get("input_tokens") or 0) + (r.get("cache_creation_tokens") or 0) + (r.get("cache_read_tokens") or 0)
+        output_tokens = r.get("output_tokens") or 0
+        if (r.get("operation") not in OPERATION_PROFILES or not input_total or not output_tokens
+                or r.get("batch") or r.get("failed") or metadata.get("error") or metadata.get("hedge")):
+            continue
+        if cutoff:
+            try:
+                if datetime.fromisoformat(r["timestamp"]) < cutoff:
+                    continue
+            except (KeyError, ValueError):
+                continue
+        ratios.setdefault(r["operation"], []).append(output_tokens / input_total)
+        if r.get("latency_ms"):
+            speeds.setdefault(r["operation"], []).append(r["latency_ms"] / 1000 / output_tokens)
+
+    history = {}
+    for operation, values in ratios.items():
+        operation_speeds = speeds.get(operation, [])
+        history[operation] = OperationHistory(
+            records=len(values),
+            output_ratio=statistics.median(values) if len(values) >= min_history else None,
+            seconds_per_output_token=statistics.median(operation_speeds) if len(operation_speeds) >= min_history else None,
+        )
+    return history
+
+
+@dataclass
+class StageEstimate:
+    """ステージ（コスト記録の操作）ごとの予測"""
+    stage: str  # 仕様書解析のステージ名、または "items"（工事区分ごとの項目生成）
+    operation: str  # コスト記録の操作名
+    calls: int = 0
+    input_tokens: int = 0  # キャッシュ対象外の入力
+    cache_creation_tokens: int = 0
+    cache_read_tokens: int = 0
+    output_tokens: int = 0
+    cost_jpy: float = 0.0
+    cost_usd: float = 0.0
+    seconds: float = 0.0  # このステージのAPI待ち時間（ステージ内の並行実行を考慮）
+    cached: bool = False  # 出力キャッシュから復元される（APIを呼び出さない）
+    history_records: int = 0  # 比率に使ったコストログの件数（0は既定値）
+
+
+@dataclass
+class PreflightEstimate:
+    """仕様書1件のプリフライト見積"""
+    pdf_path: str
+    model: str
+    pages: int = 0
+    text_chars: int = 0
+    spec_tokens: int = 0  # 仕様書テキスト全体のトークン数（概算）
+    vision_pages: int = 0  # Vision APIに送るページ数
+    stages: List[StageEstimate] = field(default_factory=list)
+    wall_seconds: float = 0.0  # 見積生成のAPI待ち時間（並行実行を考慮）
+    analysis_seconds: float = 0.0  # プリフライト自体の処理時間
+
+    @property
+    def api_calls(self) -> int:
+        return sum(stage.calls for stage in self.stages)
+
+    @property
+    def total_cost_jpy(self) -> float:
+        return sum(stage.cost_jpy for stage in self.stages)
+
+    @property
+    def total_cost_usd(self) -> float:
+        return sum(stage.cost_usd for stage in self.stages)
+
+    @property
+    def total_input_tokens(self) -> int:
+        return sum(s.input_tokens + s.cache_creation_tokens + s.cache_read_tokens for s in self.stages)
+
+    @property
+    def total_output_tokens(self) -> int:
+        return sum(stage.output_tokens for stage in self.stages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(
+            asdict(self),
+            api_calls=self.api_calls,
+            total_cost_jpy=self.total_cost_jpy,
+            total_cost_usd=self.total_cost_usd,
+            total_input_tokens=self.total_input_tokens,
+            total_output_tokens=self.total_output_tokens,
+        )
+
+
+class _StagePredictor:
+    """操作ごとの履歴・既定値から出力トークン数・応答時間・料金を予測"""
+
+    def __init__(self, model_name: str, history: Dict[str, OperationHistory], config: Dict[str, Any]):
+        self.model_name = model_name
+        self.history = history
+        self.config = config
+        self.tracker = get_tracker()
+
+    def predict(
+        self,
+        stage: str,
+        operation: str,
+        calls: List[Tuple[int, int, int]],
+        workers: int = 1,
+        cached: bool = False
+    ) -> StageEstimate:
+        """
+        Args:
+            calls: 呼び出しごとの (入力, キャッシュ書き込み, キャッシュ読み込み) トークン数
+            workers: ステージ内の同時呼び出し数
+            cached: 出力キャッシュから復元される
+        """
+        history = self.history.get(operation, OperationHistory())
+        estimate = StageEstimate(
+            stage=stage, operation=operation, cached=cached,
+            history_records=history.records if history.output_ratio is not None else 0
+        )
+        if cached:
+            return estimate
+
+        profile = OPERATION_PROFILES[operation]
+        durations = []
+        for input_tokens, cache_creation, cache_read in calls:
+            if history.output_ratio is not None:
+                output_tokens = history.output_ratio * (input_tokens + cache_creation + cache_read)
+            else:
+                output_tokens = profile["output_tokens"]
+            output_tokens = int(min(max(output_tokens, 1), profile["max_tokens"]))
+
+            if history.seconds_per_output_token is not None:
+                seconds = history.seconds_per_output_token * output_tokens
+            else:
+                seconds = (self.config.get("request_overhead_seconds", 3.0)
+                           + output_tokens / self.config.get("output_tokens_per_second", 40))
+            durations.append(seconds)
+
+            cost = self.tracker.calculate_cost(self.model_name, input_tokens, output_tokens, cache_creation, cache_read)
+            estimate.calls += 1
+            estimate.input_tokens += input_tokens
+            estimate.cache_creation_tokens += cache_creation
+            estimate.cache_read_tokens += cache_read
+            estimate.output_tokens += output_tokens
+            estimate.cost_jpy += cost["total_cost_jpy"]
+            estimate.cost_usd += cost["total_cost_usd"]
+
+        estimate.seconds = makespan(durations, workers)
+        return estimate
+
+
+@dataclass
+class PDFPages:
+    """仕様書PDFのページごとのテキストとサイズ（ポイント）"""
+    texts: List[str]
+    sizes: List[Tuple[float, float]]
+
+    def spec_text(self) -> str:
+        """AIEstimateGenerator.extract_text_from_pdf と同じ形式（ページ番号マーカー付き）の全文"""
+        total = len(self.texts)
+        return "".join(f"\n[PAGE {i + 1}/{total}]\n{text}\n" for i, text in enumerate(self.texts))
+
+    def page_range_text(self, start_page: int, end_page: int) -> str:
+        """AIEstimateGenerator.extract_text_from_pages と同じ形式のページ範囲のテキスト"""
+        return "".join(
+            f"\n[PAGE {i + 1}]\n{self.texts[i]}\n" for i in range(start_page - 1, min(end_page, len(self.texts)))
+        )
+
+
+# ファイルハッシュ -> PDFPages（同じ仕様書の再プリフライト・複数セッションでPDFを読み直さない）
+_PAGES_CACHE_SIZE = 32
+_pages_cache: "OrderedDict[str, PDFPages]" = OrderedDict()
+_pages_cache_lock = threading.Lock()
+
+
+def extract_pdf_pages(pdf_path: str) -> PDFPages:
+    """
+    ページごとのテキストとサイズを1回の走査で取得（ファイルハッシュでキャッシュ）
+
+    PyMuPDFがあればそれを使います（PyPDF2の十数倍速く、文字数の差は数%でトークン数の概算には十分）。
+    """
+    file_hash = pdf_cache_hash(pdf_path)
+    with _pages_cache_lock:
+        pages = _pages_cache.get(file_hash)
+        if pages is not None:
+            _pages_cache.move_to_end(file_hash)
+            return pages
+
+    if HAS_PYMUPDF:
+        with fitz.open(pdf_path) as doc:
+            pages = PDFPages(
+                texts=[page.get_text() for page in doc],
+                sizes=[(float(page.rect.width), float(page.rect.height)) for page in doc],
+            )
+    else:
+        with open(pdf_path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            pages = PDFPages(
+                texts=[page.extract_text() or "" for page in reader.pages],
+                sizes=[(float(page.mediabox.width), float(page.mediabox.height)) for page in reader.pages],
+            )
+
+    with _pages_cache_lock:
+        _pages_cache[file_hash] = pages
+        while len(_pages_cache) > _PAGES_CACHE_SIZE:
+            _pages_cache.popitem(last=False)
+    return pages
+
+
+def _cached_stages(pdf_path: str, model_name: str, cache_dir: str) -> List[str]:
+    """出力キャッシュがある仕様書解析ステージ（生成項目のキャッシュは "items"）"""
+    cache = spec_stage_cache(pdf_path, model_name, cache_dir)
+    cached = [
+        name for name, version in SPEC_STAGE_VERSIONS.items()
+        if cache.path(Stage(name, lambda: None, cache_version=version)).exists()
+    ]
+    if items_cache_path(pdf_path, cache_dir).exists():
+        cached.append("items")
+    return cached
+
+
+def preflight_spec(
+    spec_pdf_path: str,
+    records: Optional[List[Dict[str, Any]]] = None,
+    use_cache: bool = True,
+    model_name: Optional[str] = None,
+    config: Optional[Dict[str, Any]] = None,
+    cache_dir: str = ESTIMATE_CACHE_DIR
+) -> PreflightEstimate:
+    """
+    仕様書PDFの統合見積生成にかかるトークン数・API料金・処理時間を予測（APIは呼び出さない）
+
+    Args:
+        spec_pdf_path: 仕様書PDFのパス
+        records: 比率の算出に使うコスト記録（Noneは logs/api_costs.json）
+        use_cache: 生成時にキャッシュを使う（AIEstimateGenerator の use_cache と同じ）
+        model_name: 生成に使うモデル（Noneは CLAUDE_MODEL 環境変数・既定モデル）
+        config: preflight 設定（Noneは configs/config.yaml）
+        cache_dir: 見積生成のキャッシュディレクトリ
+
+    Returns:
+        PreflightEstimate
+    """
+    started = time.perf_counter()
+    config = config or load_preflight_config()
+    llm_config = load_llm_config()
+    model_name = model_name or os.getenv("CLAUDE_MODEL", "claude-sonnet-4-20250514")
+    history = load_operation_history(records, config.get("history_days"), config.get("min_history", 3))
+    predictor = _StagePredictor(model_name, history, config)
+    tokens = lambda text: count_tokens(text, config)
+
+    # ローカル解析: ページごとのテキスト・サイズ（1回の走査）
+    pdf_pages = extract_pdf_pages(spec_pdf_path)
+    spec_text = pdf_pages.spec_text()
+    page_sizes = pdf_pages.sizes
+    cached = _cached_stages(spec_pdf_path, model_name, cache_dir) if use_cache else []
+
+    estimate = PreflightEstimate(
+        pdf_path=spec_pdf_path,
+        model=model_name,
+        pages=len(page_sizes),
+        text_chars=len(spec_text),
+        spec_tokens=tokens(spec_text),
+    )
+
+    # 仕様書解析: 建物情報・諸元表（テキスト）
+    building = predictor.predict("extracted_info", "建物情報抽出", [
+        (OPERATION_PROFILES["建物情報抽出"]["prompt_tokens"] + tokens(spec_text[:60000]), 0, 0)
+    ], cached="extracted_info" in cached)
+
+    table_pages = AIEstimateGenerator.detect_specification_table_pages(spec_text) or list(range(35, 46))
+    table_text = pdf_pages.page_range_text(min(table_pages), max(table_pages))
+    table_calls = [
+        (OPERATION_PROFILES["諸元表テキスト抽出"]["prompt_tokens"] + tokens(table_text[:15000]), 0, 0)
+    ] if len(table_text) >= 100 else []
+    table = predictor.predict("spec_table", "諸元表テキスト抽出", table_calls, cached="spec_table" in cached)
+
+    # 仕様書解析: Vision（諸元表・図面のページ画像）
+    vision_workers = llm_config.get("vision_max_concurrency", 4)
+    vision_stages = []
+    for stage, operation, page_indexes, dpi in [
+        ("spec_table_vision", "諸元表Vision抽出",
+         AIEstimateGenerator.spec_table_vision_page_indexes(len(page_sizes)), SPEC_TABLE_VISION_DPI),
+        ("drawing_info", "図面Vision分析",
+         AIEstimateGenerator.drawing_page_indexes(len(page_sizes)), DRAWING_DPI),
+    ]:
+        if not HAS_PYMUPDF:
+            page_indexes = []
+        calls = [
+            (OPERATION_PROFILES[operation]["prompt_tokens"] + image_tokens(*page_sizes[i], dpi), 0, 0)
+            for i in page_indexes
+        ]
+        vision_stages.append(predictor.predict(stage, operation, calls, vision_workers, cached=stage in cached))
+        if stage not in cached:
+            estimate.vision_pages += len(page_indexes)
+
+    spec_analysis_seconds = makespan(
+        [building.seconds, table.seconds] + [s.seconds for s in vision_stages],
+        llm_config.get("stage_max_concurrency", 4)
+    )
+
+    # 項目生成: 共通プレフィックス（仕様書テキスト・建物情報）+ 工事区分ごとの指示
+    items_cached = "items" in cached
+    shared_tokens = tokens(spec_text[:llm_config.get("shared_spec_chars", 30000)]) + BUILDING_SUMMARY_TOKENS
+    item_workers = max(1, min(int(llm_config.get("max_concurrency", 6) or 1), len(ITEM_GENERATION_OPERATIONS)))
+    prompt_cache = llm_config.get("prompt_cache", True)
+
+    generation_stages = []
+    if prompt_cache and item_workers > 1:
+        generation_stages.append(predictor.predict("items", "プロンプトキャッシュ準備", [
+            (OPERATION_PROFILES["プロンプトキャッシュ準備"]["prompt_tokens"], shared_tokens, 0)
+        ], cached=items_cached))
+    for i, operation in enumerate(ITEM_GENERATION_OPERATIONS):
+        prompt_tokens = OPERATION_PROFILES[operation]["prompt_tokens"]
+        if not prompt_cache:
+            call = (prompt_tokens + shared_tokens, 0, 0)
+        elif item_workers == 1 and i == 0:
+            call = (prompt_tokens, shared_tokens, 0)  # 逐次実行では最初の呼び出しがキャッシュに書き込む
+        else:
+            call = (prompt_tokens, 0, shared_tokens)
+        generation_stages.append(predictor.predict("items", operation, [call], cached=items_cached))
+
+    warm_seconds = sum(s.seconds for s in generation_stages if s.operation == "プロンプトキャッシュ準備")
+    generation_seconds = warm_seconds + makespan(
+        [s.seconds for s in generation_stages if s.operation != "プロンプトキャッシュ準備"], item_workers
+    )
+
+    estimate.stages = [building, table] + vision_stages + generation_stages
+    estimate.wall_seconds = spec_analysis_seconds + generation_seconds
+    estimate.analysis_seconds = time.perf_counter() - started
+    logger.info(
+        f"Preflight {Path(spec_pdf_path).name}: {estimate.pages} pages, {estimate.spec_tokens:,} spec tokens, "
+        f"{estimate.vision_pages} vision pages, {estimate.api_calls} API calls, "
+        f"¥{estimate.total_cost_jpy:,.0f}, ~{estimate.wall_seconds:.0f}s "
+        f"(analyzed in {estimate.analysis_seconds:.2f}s)"
+    )
+    return estimate
+
+
+def plan_within_budget(
+    spec_pdf_paths: List[str],
+    budget_jpy: float,
+    max_wall_seconds: Optional[float] = None,
+    **preflight_kwargs
+) -> Tuple[List[str], List[str], Dict[str, PreflightEstimate]]:
+    """
+    予算（API料金の合計・逐次実行の処理時間の合計）に収まる仕様書を先頭から選ぶ
+
+    Args:
+        spec_pdf_paths: 仕様書PDFのパス（優先順）
+        budget_jpy: API料金の予算（円）
+        max_wall_seconds: 処理時間の上限（秒、Noneは制限なし）
+        **preflight_kwargs: preflight_spec の引数
+
+    Returns:
+        (実行する仕様書, 予算超過で見送る仕様書, {パス: PreflightEstimate})
+    """
+    selected, deferred, estimates = [], [], {}
+    spent_jpy = spent_seconds = 0.0
+    for pdf_path in spec_pdf_paths:
+        estimate = preflight_spec(pdf_path, **preflight_kwargs)
+        estimates[pdf_path] = estimate
+        within_time = max_wall_seconds is None or spent_seconds + estimate.wall_seconds <= max_wall_seconds
+        if spent_jpy + estimate.total_cost_jpy <= budget_jpy and within_time:
+            selected.append(pdf_path)
+            spent_jpy += estimate.total_cost_jpy
+            spent_seconds += estimate.wall_seconds
+        else:
+            deferred.append(pdf_path)
+    return selected, deferred, estimates
+
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m pipelines.preflight 仕様書.pdf ...
+    for path in sys.argv[1:] or [str(p) for p in Path("test-files").glob("仕様書*.pdf")]:
+        result = preflight_spec(path)
+        print(f"\n=== {path} ===")
+        print(f"{result.pages}ページ / 仕様書 {result.spec_tokens:,}トークン / Vision {result.vision_pages}ページ")
+        for s in result.stages:
+            status = "キャッシュ" if s.cached else f"{s.calls}回"
+            print(f"  {s.operation:<20} {status:>6} 入力{s.input_tokens + s.cache_creation_tokens + s.cache_read_tokens:>8,} "
+                  f"出力{s.output_tokens:>7,} ¥{s.cost_jpy:>7,.1f} {s.seconds:>6.0f}秒")
+        print(f"合計: {result.api_calls}回 / ¥{result.total_cost_jpy:,.0f} / 約{result.wall_seconds / 60:.1f}分")
@@ -0,0 +1,646 @@
+"""
+単価マッチングエンジン
+
+enrich_with_prices（工事区分ごと）と enrich_with_prices_unified（全カテゴリ）の処理を、
+共通のステージと方針（MatchPolicy）の組み合わせとして実装します。
+
+ステージ:
+  0. cache            マッチング結果キャッシュの参照（ヒットした項目は 1〜4 を省略）
+  1. vector           ベクトル検索（全項目分を一括）
+  2. validate_vector  ベクトル検索結果の単位互換性・単価妥当性チェック
+  3. candidates       文字列マッチングの候補生成（完全一致・文字n-gram・ベクトル・類義語）
+  4. score            見積項目 × KB のスコア行列から最良マッチを選択
+  5. apply            マッチ種別の判定、単価のチェックと項目への適用
+
+各ステージの処理時間・件数は PriceMatcher.stats に記録され、実行後にログ出力されます。
+工事区分ごとの閾値は configs/config.yaml の price_matching.disciplines で上書きできます。
+
+見積項目が多い場合（price_matching.workers > 1）、3〜4 のステージは項目をチャンクに分けて
+forkしたプロセスプールで並列実行します。KB特徴量テーブル・文字n-gramインデックス等は
+fork前に構築し、各ワーカーはコピーオンライトで読み取り専用に共有します。
+チャンクは入力順に結合するため、結果は逐次実行と同一です。
+forkは呼び出したスレッドしか複製しないため、並列実行は他のスレッドがないプロセス
+（CLI・バッチ実行）で、CPUが2つ以上使える場合に限ります。Streamlitのページ（スクリプト実行
+スレッド・PricePrefetcher が動作中）では常に逐次実行です。
+
+マッチング結果キャッシュ（MatchResultCache）を渡すと、項目シグネチャ（工事区分・項目名・
+仕様・単位）ごとに選ばれたKB項目・スコア・マッチ種別を保存し、次回は検索を行わずに再利用します。
+PricePrefetcher は LLM が生成中の項目を1件ずつ受け取り、バックグラウンドでステージ0〜4を
+先行実行してキャッシュに記録します（生成完了後の run() はキャッシュから適用するだけになります）。
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from pipelines.config_loader import load_config_section
+from pipelines.match_cache import DEFAULT_MATCH_CACHE_DIR, MatchResultCache, item_signature
+from pipelines.schemas import EstimateItem
+
+# 工事区分ごとに上書きできる項目（候補生成・スコアリング規則は方針単位で共通）
+DISCIPLINE_OVERRIDE_KEYS = {
+    "min_string_score", "match_tiers", "category_fallback_score",
+    "apply_confidence", "apply_min_score", "max_score",
+}
+
+DEFAULT_PRICE_MATCHING_CONFIG = {
+    "disciplines": {},  # 工事区分 -> {上書きする項目: 値}
+    "workers": 0,  # 文字列マッチングの並列プロセス数（0/1 = 逐次、-1 = CPU数）
+    "parallel_min_items": 500,  # これ未満の項目数では並列化しない
+    "chunk_size": 0,  # 1タスクあたりの項目数（0 = 自動）
+    "cache": True,  # マッチング結果キャッシュを使う（ジェネレータの use_cache も必要）
+    "cache_dir": DEFAULT_MATCH_CACHE_DIR,  # マッチング結果キャッシュの保存先
+    "cache_keep_versions": 3,  # 残すKBバージョン数（旧KBで実行中のセッションのキャッシュを消さない）
+}
+
+
+def _usable_cpus() -> int:
+    """このプロセスが使えるCPU数"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# fork したワーカーが参照する (PriceMatcher, 項目リスト, ベクトル検索候補)
+# プール作成前に設定し、ワーカーはコピーオンライトで読み取るだけ
+_FORK_STATE: Optional[tuple] = None
+
+
+@dataclass(frozen=True)
+class MatchPolicy:
+    """単価マッチングの方針"""
+    name: str
+    filter_by_discipline: bool = True  # 工事区分で候補を絞る（Falseは全カテゴリ検索）
+    use_synonyms: bool = True  # 類義語を候補生成・スコアリングに使う
+    unit_scoring: bool = True  # 単位一致を加点（Falseは単位の種類で候補を除外するのみ）
+    min_string_score: float = 0.0  # 文字列マッチングの最良マッチとして採用する最低スコア
+    match_tiers: Tuple[Tuple[float, str], ...] = ((1.0, "exact"), (0.3, "partial"))  # (最低スコア, マッチ種別)
+    category_fallback_score: Optional[float] = 0.5  # カテゴリフォールバックの最低スコア（Noneで無効）
+    apply_mode: str = "confidence"  # confidence: 信頼度で適用判断 / sanity: 単価・金額の上限チェック
+    apply_confidence: float = 0.30  # confidence: 単価を適用する正規化スコアの下限
+    apply_min_score: float = 0.5  # confidence: 単価を適用するスコアの下限（いずれかを満たせば適用）
+    max_score: float = 5.0  # confidence: スコア正規化の分母
+
+    def for_discipline(self, overrides: Dict[str, Any]) -> "MatchPolicy":
+        """工事区分ごとの上書きを適用した方針"""
+        values = {key: value for key, value in overrides.items() if key in DISCIPLINE_OVERRIDE_KEYS}
+        if "match_tiers" in values:
+            values["match_tiers"] = tuple((float(threshold), str(match_type)) for threshold, match_type in values["match_tiers"])
+        return replace(self, **values) if values else self
+
+
+PRESETS = {
+    # 工事区分ごと（ベクトル検索 + 類義語・単位加点つき文字列マッチング、信頼度で適用判断）
+    "discipline": MatchPolicy(name="discipline"),
+    # 全カテゴリ（discipline制限なし、スコア2.0以上のみ採用、単価・金額の上限チェック）
+    "unified": MatchPolicy(
+        name="unified",
+        filter_by_discipline=False,
+        use_synonyms=False,
+        unit_scoring=False,
+        min_string_score=2.0,
+        match_tiers=((2.0, "string"),),
+        category_fallback_score=None,
+        apply_mode="sanity",
+    ),
+}
+
+
+def load_price_matching_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """configs/config.yaml の price_matching セクションを読み込み"""
+    return load_config_section("price_matching", DEFAULT_PRICE_MATCHING_CONFIG, config_path)
+
+
+@dataclass
+class StageStats:
+    """ステージごとの計測値"""
+    calls: int = 0
+    seconds: float = 0.0
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, key: str, value: int = 1):
+        self.counts[key] = self.counts.get(key, 0) + value
+
+
+@dataclass
+class MatchOutcome:
+    """見積項目1件のマッチング結果"""
+    kb_item: Optional[Dict] = None
+    match_type: str = ""
+    score: float = 0.0
+
+
+class PriceMatcher:
+    """
+    ステージ構成の単価マッチングエンジン
+
+    KB・検索インデックス・チェック関数は AIEstimateGenerator のものを使います。
+    """
+
+    STAGES = ("cache", "vector", "validate_vector", "candidates", "score", "parallel", "apply")
+
+    def __init__(
+        self,
+        generator,
+        policy: MatchPolicy,
+        discipline_overrides: Optional[Dict[str, Dict]] = None,
+        workers: int = 0,
+        parallel_min_items: int = 500,
+        chunk_size: int = 0,
+        cache: Optional[MatchResultCache] = None
+    ):
+        """
+        Args:
+            generator: KBと検索・チェック関数を持つ AIEstimateGenerator
+            policy: マッチング方針（PRESETSのいずれか）
+            discipline_overrides: 工事区分 -> 方針の上書き
+            workers: 文字列マッチングの並列プロセス数（0/1 = 逐次、-1 = CPU数）
+            parallel_min_items: これ未満の項目数では並列化しない
+            chunk_size: 1タスクあたりの項目数（0 = 自動）
+            cache: マッチング結果キャッシュ（KBバージョン・方針ごと、Noneは無効）
+        """
+        self.generator = generator
+        self.policy = policy
+        self.workers = (os.cpu_count() or 1) if workers < 0 else workers
+        self.parallel_min_items = parallel_min_items
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self._kb_rows: Optional[Dict[str, int]] = None  # item_id -> KB行番号（キャッシュ記録用）
+        self._discipline_policies = {
+            discipline: policy.for_discipline(overrides or {})
+            for discipline, overrides in (discipline_overrides or {}).items()
+        }
+        self.stats: Dict[str, StageStats] = {stage: StageStats() for stage in self.STAGES}
+
+    def policy_for(self, item: EstimateItem) -> MatchPolicy:
+        """見積項目の工事区分に適用する方針"""
+        return self._discipline_policies.get(item.discipline.value, self.policy)
+
+    @contextmanager
+    def _stage(self, name: str):
+        stats = self.stats[name]
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.calls += 1
+            stats.seconds += time.perf_counter() - start
+
+    def run(self, estimate_items: List[EstimateItem]) -> List[EstimateItem]:
+        """
+        見積項目に単価を付与（親項目の集計・ナンバリングは呼び出し側で行う）
+
+        Returns:
+            見積項目リスト（入力と同じ順序・同じオブジェクト）
+        """
+        # 親項目（level 0）のみスキップ - 数量nullでも単価マッチングは試行
+        leaf_items = [item for item in estimate_items if item.level != 0]
+
+        cached, accepted, string_matches = self._search(leaf_items)
+        self._apply_stage(leaf_items, accepted, string_matches, cached)
+
+        if self.cache is not None:
+            self.cache.save()
+        self.log_stats()
+        return list(estimate_items)
+
+    def prefetch(self, estimate_items: List[EstimateItem]) -> int:
+        """
+        マッチング（ステージ0〜4）だけを実行して結果をキャッシュに記録（項目は変更しない）
+
+        生成途中の項目を先にマッチングしておき、後の run() ではキャッシュから適用します。
+
+        Returns:
+            新たにキャッシュに記録した項目数
+        """
+        if self.cache is None:
+            return 0
+        leaf_items = [item for item in estimate_items if item.level != 0]
+        cached, accepted, string_matches = self._search(leaf_items)
+        stored = 0
+        for item in leaf_items:
+            if id(item) not in cached:
+                self._store(item, self._resolve(item, accepted.get(id(item)), string_matches.get(id(item))))
+                stored += 1
+        return stored
+
+    def _search(self, leaf_items: List[EstimateItem]) -> Tuple[Dict[int, MatchOutcome], Dict[int, Dict], Dict[int, Any]]:
+        """ステージ0〜4: (キャッシュ済みの結果, 採用したベクトル検索結果, 文字列マッチング結果)"""
+        cached = self._cache_stage(leaf_items)
+        search_items = [item for item in leaf_items if id(item) not in cached]
+        vector_matches, vector_candidates = self._vector_stage(search_items)
+        accepted = self._validate_vector_stage(search_items, vector_matches)
+        fallback_items = [item for item in search_items if id(item) not in accepted]
+        if self._use_parallel(len(fallback_items)):
+            matches = self._match_strings_parallel(fallback_items, vector_candidates)
+        else:
+            matches = self._match_strings(fallback_items, vector_candidates)
+        string_matches = {id(item): match for item, match in zip(fallback_items, matches)}
+        return cached, accepted, string_matches
+
+    # ===== 0. マッチング結果キャッシュ =====
+    def _cache_stage(self, items: List[EstimateItem]) -> Dict[int, MatchOutcome]:
+        """キャッシュ済みの項目のマッチング結果（KB行のitem_idが一致するもののみ）"""
+        cached = {}
+        if self.cache is None:
+            return cached
+        price_kb = self.generator.price_kb
+        with self._stage("cache") as stats:
+            for item in items:
+                entry = self.cache.get(self._signature(item))
+                if entry is None:
+                    stats.add("misses")
+                    continue
+                row = entry.get("row")
+                if row is None:
+                    cached[id(item)] = MatchOutcome(score=entry.get("score", 0.0))
+                elif row < len(price_kb) and price_kb[row].get("item_id") == entry.get("item_id"):
+                    cached[id(item)] = MatchOutcome(price_kb[row], entry.get("match_type", ""), entry.get("score", 0.0))
+                else:
+                    stats.add("misses")
+                    continue
+                stats.add("hits")
+        return cached
+
+    def _signature(self, item: EstimateItem) -> str:
+        return item_signature(item.name, item.specification, item.unit, item.discipline.value)
+
+    def _store(self, item: EstimateItem, outcome: MatchOutcome):
+        """マッチング結果をキャッシュに記録（KB項目はitem_idと行番号で参照）"""
+        row = None
+        if outcome.kb_item is not None:
+            # ベクトル検索結果のKB項目はインデックス側のコピーのため、item_idで行番号を引く
+            if self._kb_rows is None:
+                self._kb_rows = {kb_item.get("item_id"): row for row, kb_item in enumerate(self.generator.price_kb)}
+            row = self._kb_rows.get(outcome.kb_item.get("item_id"))
+            if row is None:
+                return
+        self.cache.put(
+            self._signature(item), row,
+            outcome.kb_item.get("item_id") if outcome.kb_item is not None else None,
+            outcome.match_type, outcome.score
+        )
+
+    # ===== 1. ベクトル検索 =====
+    def _vector_stage(self, items: List[EstimateItem]):
+        """全項目分のベクトル検索（1回のencode + 1回の検索）"""
+        with self._stage("vector") as stats:
+            vector_search = self.generator.vector_search
+            if not items or not (vector_search and vector_search.is_available()):
+                return {}, {}
+            requests = [
+                (
+                    item.name,
+                    item.specification or "",
+                    item.discipline.value if self.policy.filter_by_discipline else None,
+                    item.unit
+                )
+                for item in items
+            ]
+            batch_results = self.generator._vector_search_batch(requests)
+            batch_matches = self.generator._vector_search_match_batch(requests, batch_results)
+            stats.add("queries", len(requests))
+            stats.add("matches", sum(1 for match in batch_matches if match))
+            return (
+                {id(item): match for item, match in zip(items, batch_matches)},
+                {id(item): results for item, results in zip(items, batch_results)}
+            )
+
+    # ===== 2. ベクトル検索結果の検証 =====
+    def _validate_vector_stage(self, items: List[EstimateItem], vector_matches: Dict[int, Dict]) -> Dict[int, Dict]:
+        """単位互換性（高額「式」単価を拒否）と単価妥当性をチェック"""
+        accepted = {}
+        with self._stage("validate_vector") as stats:
+            for item in items:
+                vector_result = vector_matches.get(id(item))
+                if not vector_result:
+                    continue
+                kb_item = vector_result["kb_item"]
+                kb_price = kb_item.get("unit_price")
+                if not self.generator._check_unit_compatibility(item.unit, kb_item.get("unit", ""), kb_price):
+                    stats.add("unit_rejected")
+                elif not self.generator._validate_price(item.name, kb_price):
+                    stats.add("price_rejected")
+                else:
+                    accepted[id(item)] = vector_result
+                    stats.add("accepted")
+        return accepted
+
+    # ===== 3. 文字列マッチングの候補生成 =====
+    def _candidate_stage(self, items: List[EstimateItem], vector_candidates: Dict[int, List[Dict]]) -> np.ndarray:
+        """
+        見積項目 × KB の候補マスク
+
+        文字n-gram（BM25）・ベクトル検索・類義語グループの上位候補（_fallback_candidates）に
+        項目名が完全一致するKB行を加え、工事区分・単位の互換性で絞り込みます。
+        """
+        generator = self.generator
+        with self._stage("candidates") as stats:
+            candidates = np.zeros((len(items), len(generator.price_kb)), dtype=bool)
+            if not items or not generator.price_kb:
+                return candidates
+
+            scorer = generator._get_kb_scorer()
+            for i, item in enumerate(items):
+                discipline = item.discipline.value if self.policy.filter_by_discipline else None
+                synonyms = generator._find_synonyms(item.name) if self.policy.use_synonyms else []
+                rows = generator._fallback_candidates(item, synonyms, vector_candidates.get(id(item), []), discipline)
+                candidates[i, rows] = True
+                exact_rows = scorer.exact_rows(generator._normalize_text(item.name))
+                candidates[i, exact_rows] = True
+                stats.add("exact", len(exact_rows))
+
+                if discipline:
+                    candidates[i] &= generator._discipline_mask(discipline)
+                if not self.policy.unit_scoring:
+                    candidates[i] &= scorer.unit_compatibility(item.unit)
+
+            stats.add("items", len(items))
+            stats.add("rows", int(candidates.sum()))
+        return candidates
+
+    # ===== 4. スコアリング =====
+    def _score_stage(self, items: List[EstimateItem], candidates: np.ndarray) -> List[Any]:
+        """見積項目 × KB のスコア行列から最良マッチ・カテゴリフォールバックを選択（itemsと同じ順序）"""
+        generator = self.generator
+        with self._stage("score") as stats:
+            if not items or not generator.price_kb:
+                return [None] * len(items)
+            item_features = [
+                generator._text_features(item.name, item.specification or "", item.unit)
+                for item in items
+            ]
+            matches = generator._get_kb_scorer().best_matches(
+                item_features,
+                candidates,
+                min_score=[self.policy_for(item).min_string_score for item in items],
+                use_synonyms=self.policy.use_synonyms,
+                unit_scoring=self.policy.unit_scoring
+            )
+            stats.add("best", sum(1 for match in matches if match.best_row is not None))
+            return matches
+
+    def _match_strings(self, items: List[EstimateItem], vector_candidates: Dict[int, List[Dict]]) -> List[Any]:
+        """文字列マッチング（候補生成 + スコアリング）を逐次実行"""
+        candidates = self._candidate_stage(items, vector_candidates)
+        return self._score_stage(items, candidates)
+
+    # ===== 3〜4 の並列実行 =====
+    def _use_parallel(self, n_items: int) -> bool:
+        if not (
+            self.workers > 1
+            and n_items >= max(self.parallel_min_items, 2)
+            and bool(self.generator.price_kb)
+            and "fork" in multiprocessing.get_all_start_methods()
+        ):
+            return False
+        if threading.active_count() > 1:
+            # 他のスレッドが保持中のロック（loguru・モデル・KB読み込み等）は子プロセスで解放されず、
+            # ワーカーがデッドロックしうる
+            logger.debug(f"Price matching runs sequentially: {threading.active_count()} threads alive (fork is unsafe)")
+            return False
+        return _usable_cpus() > 1
+
+    def _match_strings_parallel(self, items: List[EstimateItem], vector_candidates: Dict[int, List[Dict]]) -> List[Any]:
+        """
+        項目をチャンクに分け、forkしたプロセスプールで文字列マッチング
+
+        KB由来の読み取り専用データ（特徴量テーブル・スコアラー・文字n-gramインデックス・
+        工事区分/単位のマスク）はfork前に構築し、ワーカー間で共有します。
+        ワーカーでの処理時間・件数は candidates / score に合算されます（CPU時間の合計）。
+        """
+        global _FORK_STATE
+        generator = self.generator
+        workers = min(self.workers, _usable_cpus())
+        chunk_size = self.chunk_size or max(1, -(-len(items) // (workers * 4)))
+        chunks = [(start, min(start + chunk_size, len(items))) for start in range(0, len(items), chunk_size)]
+
+        with self._stage("parallel") as stats:
+            # fork前に共有データを構築（各ワーカーで再構築しない）
+            generator._get_lexical_index()
+            scorer = generator._get_kb_scorer()
+            for item in items:
+                if self.policy.filter_by_discipline:
+                    generator._discipline_mask(item.discipline.value)
+                if not self.policy.unit_scoring:
+                    scorer.unit_compatibility(item.unit)
+
+            _FORK_STATE = (self, items, vector_candidates)
+            try:
+                context = multiprocessing.get_context("fork")
+                with context.Pool(min(workers, len(chunks))) as pool:
+                    results = pool.map(_match_chunk, chunks)
+            except Exception as e:
+                logger.warning(f"Parallel price matching failed, falling back to sequential: {e}")
+                return self._match_strings(items, vector_candidates)
+            finally:
+                _FORK_STATE = None
+
+            matches = []
+            for chunk_matches, worker_stats in results:
+                matches.extend(chunk_matches)
+                for stage, (seconds, counts) in worker_stats.items():
+                    self.stats[stage].calls += 1
+                    self.stats[stage].seconds += seconds
+                    for key, value in counts.items():
+                        self.stats[stage].add(key, value)
+            stats.add("workers", min(workers, len(chunks)))
+            stats.add("chunks", len(chunks))
+        return matches
+
+    # ===== 5. 適用 =====
+    def _apply_stage(
+        self,
+        items: List[EstimateItem],
+        accepted: Dict[int, Dict],
+        string_matches: Dict[int, Any],
+        cached: Optional[Dict[int, MatchOutcome]] = None
+    ):
+        cached = cached or {}
+        with self._stage("apply") as stats:
+            for item in items:
+                outcome = cached.get(id(item))
+                if outcome is None:
+                    outcome = self._resolve(item, accepted.get(id(item)), string_matches.get(id(item)))
+                    if self.cache is not None:
+                        self._store(item, outcome)
+                stats.add(outcome.match_type or "unmatched")
+                if self.policy.apply_mode == "sanity":
+                    self._apply_with_sanity_check(item, outcome, stats)
+                else:
+                    self._apply_with_confidence(item, outcome, stats)
+
+    def _resolve(self, item: EstimateItem, vector_result: Optional[Dict], string_match) -> MatchOutcome:
+        """ベクトル検索 → 文字列マッチング（スコア段階）→ カテゴリフォールバックの順にマッチを決定"""
+        if vector_result:
+            logger.debug(f"✓ Vector match: '{item.name}' → '{vector_result['kb_item'].get('item_id')}' "
+                         f"(score={vector_result['score']:.3f})")
+            return MatchOutcome(vector_result["kb_item"], "vector", vector_result["score"])
+        if not string_match:
+            return MatchOutcome()
+
+        policy = self.policy_for(item)
+        price_kb = self.generator.price_kb
+        if string_match.best_row is not None:
+            for threshold, match_type in policy.match_tiers:
+                if string_match.best_score >= threshold:
+                    kb_item = price_kb[string_match.best_row]
+                    logger.debug(f"✓ {match_type} match '{item.name}' → '{kb_item.get('item_id')}' "
+                                 f"(score={string_match.best_score:.2f})")
+                    return MatchOutcome(kb_item, match_type, string_match.best_score)
+
+        if policy.category_fallback_score is not None and string_match.category_row is not None \
+                and string_match.category_score >= policy.category_fallback_score:
+            # カテゴリフォールバック（カテゴリは一致するが仕様が異なる）
+            kb_item = price_kb[string_match.category_row]
+            logger.debug(f"↳ Category fallback '{item.name}' → '{kb_item.get('item_id')}' "
+                         f"(score={string_match.category_score:.2f})")
+            return MatchOutcome(kb_item, "category", string_match.best_score)
+
+        return MatchOutcome(score=string_match.best_score)
+
+    def _apply_with_confidence(self, item: EstimateItem, outcome: MatchOutcome, stats: StageStats):
+        """正規化スコア（信頼度）と単価妥当性で適用を判断（参考値は単価なしで記録）"""
+        if not outcome.kb_item:
+            logger.warning(f"✗ No match for '{item.name}' {item.specification} (best={outcome.score:.2f})")
+            return
+
+        policy = self.policy_for(item)
+        normalized_score = min(outcome.score / policy.max_score, 1.0)
+        confidence_pct = int(normalized_score * 100)
+        matched_item = outcome.kb_item
+        matched_price = matched_item.get("unit_price")
+        price_valid = self.generator._validate_price(item.name, matched_price)
+
+        if (normalized_score >= policy.apply_confidence or outcome.score >= policy.apply_min_score) and price_valid:
+            item.unit_price = matched_price
+            if item.quantity and item.unit_price:
+                item.amount = item.quantity * item.unit_price
+            item.confidence = normalized_score
+            stats.add("applied")
+            logger.info(f"✓ Match applied ({confidence_pct}%): {item.name} → ¥{item.unit_price:,.0f}")
+        elif not price_valid:
+            # 単価が妥当でない場合は適用しない
+            item.confidence = normalized_score * 0.5  # 信頼度を下げる
+            stats.add("price_rejected")
+            logger.warning(f"⚠ Price rejected ({confidence_pct}%): {item.name} - KB has ¥{matched_price:,.0f} but price validation failed")
+        else:
+            # 閾値未満は参考値として記録するが金額は空
+            item.confidence = normalized_score
+            stats.add("low_confidence")
+            logger.info(f"△ Low confidence ({confidence_pct}%): {item.name} - KB has ¥{matched_price:,.0f} but not applied")
+
+        item.price_references = [matched_item.get("item_id")]
+        item.source_reference = f"KB:{matched_item.get('item_id')}[{outcome.match_type}]({confidence_pct}%), {item.source_reference}"
+
+    def _apply_with_sanity_check(self, item: EstimateItem, outcome: MatchOutcome, stats: StageStats):
+        """単価・金額の上限チェックを通過した場合のみ適用"""
+        if not outcome.kb_item:
+            return
+
+        matched_item = outcome.kb_item
+        candidate_price = matched_item.get("unit_price")
+        if self.generator._check_price_sanity(item.name, item.unit, candidate_price, item.quantity or 0):
+            item.unit_price = candidate_price
+            if item.quantity and item.unit_price:
+                item.amount = item.quantity * item.unit_price
+            item.source_reference = f"KB:{matched_item.get('item_id')}[{outcome.match_type}](score={outcome.score:.2f})"
+            item.price_references = [matched_item.get("item_id")]
+            stats.add("applied")
+            logger.debug(f"✓ Matched '{item.name}' → {matched_item.get('item_id')} @¥{candidate_price or 0:,.0f}")
+        else:
+            # 妥当性チェック失敗 - 単価を適用しない
+            stats.add("price_rejected")
+            logger.warning(f"✗ Price rejected for '{item.name}': ¥{candidate_price:,.0f} × {item.quantity} = ¥{candidate_price * (item.quantity or 0):,.0f}")
+
+    def log_stats(self):
+        """ステージごとの処理時間・件数をログ出力"""
+        parts = []
+        for stage in self.STAGES:
+            stats = self.stats[stage]
+            if not stats.calls:
+                continue
+            counts = ", ".join(f"{key}={value}" for key, value in stats.counts.items())
+            parts.append(f"{stage} {stats.seconds * 1000:.1f}ms" + (f" ({counts})" if counts else ""))
+        logger.info(f"Price matching [{self.policy.name}]: " + " | ".join(parts))
+
+
+class PricePrefetcher:
+    """
+    生成中の見積項目の単価マッチングをバックグラウンドスレッドで先行実行
+
+    submit() で受け取った項目を、待ち行列にたまった分ずつ PriceMatcher.prefetch() に渡します。
+    close() で残りを処理してスレッドを終了し、キャッシュを保存します。
+    submit() は複数スレッド（工事区分ごとの生成スレッド）から呼び出せます。
+    """
+
+    def __init__(self, matcher: PriceMatcher):
+        """
+        Args:
+            matcher: マッチング結果キャッシュを持つ PriceMatcher（workers は0/1 = 逐次）
+        """
+        self.matcher = matcher
+        self.submitted = 0
+        self.prefetched = 0
+        self._queue: "queue.Queue[Optional[EstimateItem]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="price-prefetch", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: EstimateItem):
+        self.submitted += 1
+        self._queue.put(item)
+
+    def close(self):
+        """残りの項目を処理してスレッドを終了"""
+        self._queue.put(None)
+        self._thread.join()
+        if self.matcher.cache is not None:
+            self.matcher.cache.save()
+        logger.info(f"Price prefetch: {self.submitted} items submitted, "
+                    f"{self.prefetched} matched and cached during generation")
+
+    def _worker(self):
+        finished = False
+        while not finished:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            finished = None in batch
+            batch = [item for item in batch if item is not None]
+            if not batch:
+                continue
+            try:
+                self.prefetched += self.matcher.prefetch(batch)
+            except Exception as e:
+                # 先行実行は最適化のみ（失敗しても run() で通常どおりマッチング）
+                logger.warning(f"Price prefetch failed: {e}")
+
+
+def _match_chunk(bounds: Tuple[int, int]):
+    """
+    ワーカープロセス: 1チャンク分の文字列マッチング
+
+    Returns:
+        (KBMatchのリスト, {ステージ: (処理時間, 件数)})
+    """
+    matcher, items, vector_candidates = _FORK_STATE
+    matcher.stats = {stage: StageStats() for stage in PriceMatcher.STAGES}
+    start, end = bounds
+    matches = matcher._match_strings(items[start:end], vector_candidates)
+    worker_stats = {
+        stage: (matcher.stats[stage].seconds, matcher.stats[stage].counts)
+        for stage in ("candidates", "score")
+    }
+    return matches, worker_stats
@@ -13,6 +13,7 @@ except ImportError:
     logger.warning("FAISS or sentence-transformers not installed")
 
 from pipelines.schemas import PriceReference, DisciplineType
+from pipelines.model_registry import get_embedding_model
 
 
 class PriceRAG:
@@ -35,7 +36,7 @@ class PriceRAG:
         logger.info(f"Initializing PriceRAG with model: {self.model_name}")
 
         try:
-            self.model = SentenceTransformer(self.model_name)
+            self.model = get_embedding_model(self.model_name)
             logger.info("Embedding model loaded successfully")
         except Exception as e:
             logger.error(f"Failed to load embedding model: {e}")
@@ -0,0 +1,225 @@
+"""
+見積パイプラインのステージDAGスケジューラ
+
+各ステージは名前・入力（他ステージの出力名）・処理関数で宣言し、
+依存関係が満たされたステージから順にスレッドプールで実行します。
+互いに依存しないステージ（例: 建物情報のLLM抽出と、PDFだけを使うVision・図面解析）は
+同時に実行され、所要時間は最も長い依存の連鎖程度になります。
+
+ステージを追加する場合は Stage を1つ追加するだけで、実行順序の指定は不要です。
+
+cache_version を指定したステージの出力は StageCache（JSONファイル）に保存され、
+同じ入力（例: 同じPDF・同じモデル）で再実行すると処理関数を呼ばずに再利用されます。
+プロンプト等を変更した場合は cache_version を更新してください。
+
+使用例:
+    dag = StageDAG([
+        Stage("spec_text", lambda: extract_text(pdf_path)),
+        Stage("building_info", extract_building_info, inputs=("spec_text",)),
+        Stage("drawing_info", lambda: extract_drawing_info(pdf_path)),
+    ])
+    run = dag.run()
+    run.outputs["building_info"], run.timings["drawing_info"]
+"""
+
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class Stage:
+    """パイプラインの1ステージ"""
+    name: str  # 出力名（他ステージの入力として参照される）
+    func: Callable[..., Any]  # inputs の出力を位置引数の順に受け取る
+    inputs: Tuple[str, ...] = ()  # 依存するステージ名（または run() に渡す初期値の名前）
+    cache_version: Optional[str] = None  # 出力キャッシュのバージョン（Noneはキャッシュしない）
+    cache_if: Optional[Callable[[Any], bool]] = None  # 出力を保存する条件（Noneは常に保存）
+
+
+@dataclass
+class StageRun:
+    """DAG実行結果"""
+    outputs: Dict[str, Any] = field(default_factory=dict)  # ステージ名 -> 出力
+    timings: Dict[str, float] = field(default_factory=dict)  # ステージ名 -> 処理時間（秒）
+    total_seconds: float = 0.0  # DAG全体の経過時間
+    cache_hits: List[str] = field(default_factory=list)  # キャッシュから復元したステージ名
+
+
+class StageCache:
+    """
+    ステージ出力のJSONファイルキャッシュ
+
+    キーは 共通コンテキスト（例: PDFハッシュ・モデル名）+ ステージ名 + cache_version です。
+    出力はJSONに変換できる値に限ります。
+    """
+
+    def __init__(self, cache_dir: str, prefix: str, context: Dict[str, Any]):
+        """
+        Args:
+            cache_dir: キャッシュディレクトリ
+            prefix: ファイル名の接頭辞（例: "{PDF名}_{PDFハッシュ}"）
+            context: キーに含める共通の値（例: {"pdf_hash": ..., "model": ...}）
+        """
+        self.cache_dir = Path(cache_dir)
+        self.prefix = prefix
+        self.context = context
+
+    def path(self, stage: Stage) -> Path:
+        key = json.dumps([self.context, stage.name, stage.cache_version], ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / f"{self.prefix}_stage_{stage.name}_{digest}.json"
+
+    def get(self, stage: Stage) -> Tuple[bool, Any]:
+        """(ヒットしたか, 出力)"""
+        path = self.path(stage)
+        if not path.exists():
+            return False, None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return True, json.load(f)["output"]
+        except Exception as e:
+            logger.warning(f"Stage cache read error ({path.name}): {e}")
+            return False, None
+
+    def put(self, stage: Stage, output: Any):
+        path = self.path(stage)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"stage": stage.name, "version": stage.cache_version, "output": output},
+                          f, ensure_ascii=False, indent=2)
+            tmp_path.replace(path)
+        except Exception as e:
+            logger.warning(f"Stage cache write error ({path.name}): {e}")
+
+
+class StageDAG:
+    """
+    ステージの依存関係グラフと並行スケジューラ
+
+    構築時にステージ名の重複・未定義の入力・循環依存を検出します（ValueError）。
+    いずれかのステージで例外が発生した場合、未開始のステージは実行せずに例外を送出します。
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        max_workers: int = 4,
+        name: str = "pipeline",
+        cache: Optional[StageCache] = None
+    ):
+        """
+        Args:
+            stages: ステージのリスト（順序は任意、タイミングのログはこの順序で出力）
+            max_workers: 同時に実行するステージ数
+            name: ログ出力用の名前
+            cache: ステージ出力のキャッシュ（Noneは無効）
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        if len(self.stages) != len(stages):
+            names = [stage.name for stage in stages]
+            raise ValueError(f"Duplicate stage names: {sorted({n for n in names if names.count(n) > 1})}")
+        self.max_workers = max(1, max_workers)
+        self.name = name
+        self.cache = cache
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        """依存関係順のステージ名（循環があればValueError）"""
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 0: 未訪問 / 1: 訪問中 / 2: 完了
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+            state[name] = 1
+            for dependency in self.stages[name].inputs:
+                if dependency in self.stages:
+                    visit(dependency, path + (name,))
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    def run(self, initial: Optional[Dict[str, Any]] = None) -> StageRun:
+        """
+        全ステージを依存関係順に実行
+
+        Args:
+            initial: ステージ以外から与える入力（名前 -> 値）
+
+        Returns:
+            各ステージの出力と処理時間
+        """
+        result = StageRun(outputs=dict(initial or {}))
+        missing = {
+            f"{name}: {dependency}"
+            for name, stage in self.stages.items()
+            for dependency in stage.inputs
+            if dependency not in self.stages and dependency not in result.outputs
+        }
+        if missing:
+            raise ValueError(f"Undefined stage inputs: {sorted(missing)}")
+
+        def execute(stage: Stage):
+            start = time.perf_counter()
+            use_cache = self.cache is not None and stage.cache_version is not None
+            if use_cache:
+                hit, output = self.cache.get(stage)
+                if hit:
+                    result.cache_hits.append(stage.name)
+                    return output, time.perf_counter() - start
+            output = stage.func(*(result.outputs[dependency] for dependency in stage.inputs))
+            if use_cache and (stage.cache_if is None or stage.cache_if(output)):
+                self.cache.put(stage, output)
+            return output, time.perf_counter() - start
+
+        start = time.perf_counter()
+        remaining = list(self.order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-stage") as executor:
+            while remaining or running:
+                # 入力が揃ったステージを依存関係順に投入
+                for name in list(remaining):
+                    if len(running) >= self.max_workers:
+                        break
+                    if all(dependency in result.outputs for dependency in self.stages[name].inputs):
+                        running[executor.submit(execute, self.stages[name])] = name
+                        remaining.remove(name)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        output, seconds = future.result()
+                    except Exception:
+                        logger.error(f"Stage '{name}' failed in {self.name}")
+                        for pending in running:
+                            pending.cancel()
+                        raise
+                    result.outputs[name] = output
+                    result.timings[name] = seconds
+
+        result.total_seconds = time.perf_counter() - start
+        self.log_timings(result)
+        return result
+
+    def log_timings(self, result: StageRun):
+        """ステージごとの処理時間をログ出力"""
+        parts = [
+            f"{name} {result.timings[name]:.1f}s" + (" (cached)" if name in result.cache_hits else "")
+            for name in self.stages if name in result.timings
+        ]
+        logger.info(f"Stage timings [{self.name}] total {result.total_seconds:.1f}s: " + " | ".join(parts))
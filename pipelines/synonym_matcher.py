@@ -0,0 +1,231 @@
+"""
+類義語辞書のマルチパターンマッチャー
+
+SYNONYM_DICTの全キー・全類義語を1つのAho-Corasickオートマトンにコンパイルし、
+クエリを1回走査するだけで該当する類義語グループをすべて取得します。
+辞書全体を毎回 in 演算子でループする処理（O(辞書サイズ)）を O(クエリ長) に置き換えます。
+"""
+
+import re
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+# normalize_text で統一する作業表現（上から順に置換）
+NORMALIZE_SYNONYMS = {
+    '穴補修': '穴補修',
+    '穴あけ': '穴補修',
+    '壁穿孔': '穴補修',
+    '貫通': '穴補修',
+    '撤去': '撤去',
+    '解体': '撤去',
+    '取り外し': '撤去',
+    '取外し': '撤去',
+    '取付': '取付',
+    '設置': '取付',
+    '据付': '取付',
+}
+
+# 比較しやすくするため除去する接尾辞
+NORMALIZE_SUFFIXES = ['工事', '費', '工', '材料', '材']
+
+
+def normalize_text(text: str) -> str:
+    """テキストを正規化（空白・記号を統一、類義語統一）"""
+    if not text:
+        return ""
+    # 全角→半角
+    text = text.replace('（', '(').replace('）', ')').replace('　', ' ')
+    # 記号の統一
+    text = text.replace('・', '').replace('/', '').replace('-', '')
+    # 複数空白を1つに
+    text = re.sub(r'\s+', ' ', text)
+    text = text.strip().lower()
+
+    # 接尾辞の統一（「工事」「費」「材」等を除去して比較しやすく）
+    for suffix in NORMALIZE_SUFFIXES:
+        if text.endswith(suffix) and len(text) > len(suffix):
+            text = text[:-len(suffix)]
+
+    # 類義語の統一
+    for key, value in NORMALIZE_SYNONYMS.items():
+        if key in text:
+            text = text.replace(key, value)
+
+    return text
+
+
+class AhoCorasickAutomaton:
+    """
+    複数パターンの部分文字列検索（Aho-Corasick法）
+
+    構築後、find() はテキスト長に比例する時間で出現したパターンを返します。
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        """
+        Args:
+            patterns: 検索パターン（空文字列は無視）
+        """
+        self.patterns = list(patterns)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][ch] = child
+                node = child
+            self._output[node].append(pattern_id)
+
+        # 失敗リンクを幅優先で構築
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> Set[int]:
+        """テキストに含まれるパターンのIDを返す"""
+        found: Set[int] = set()
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            if self._output[node]:
+                found.update(self._output[node])
+        return found
+
+
+class SynonymMatcher:
+    """
+    類義語辞書（キー -> 類義語リスト）をコンパイルしたマッチャー
+
+    - expand_query(): 生のクエリ文字列で検索（ベクトル検索のクエリ展開用）
+    - find_synonyms(): 正規化した項目名で検索し、辞書語が項目名を含む場合（逆方向の包含）も
+      部分文字列インデックスで判定
+    """
+
+    def __init__(self, synonym_dict: Dict[str, List[str]],
+                 normalizer: Callable[[str], str] = normalize_text):
+        """
+        Args:
+            synonym_dict: キー（代表語） -> 類義語リスト
+            normalizer: find_synonyms用の正規化関数
+        """
+        self.normalizer = normalizer
+        self.groups: List[Tuple[str, List[str]]] = [(key, list(values)) for key, values in synonym_dict.items()]
+
+        # 生の語 -> [(グループ番号, 類義語リスト内の位置（キーは-1）)]
+        raw_terms: Dict[str, List[Tuple[int, int]]] = {}
+        # 正規化した語 -> グループ番号の集合
+        norm_terms: Dict[str, Set[int]] = {}
+        for group, (key, values) in enumerate(self.groups):
+            raw_terms.setdefault(key, []).append((group, -1))
+            norm_terms.setdefault(normalizer(key), set()).add(group)
+            for position, value in enumerate(values):
+                raw_terms.setdefault(value, []).append((group, position))
+                norm_terms.setdefault(normalizer(value), set()).add(group)
+
+        self._raw_terms = list(raw_terms.items())
+        self._raw_automaton = AhoCorasickAutomaton(term for term, _ in self._raw_terms)
+
+        # 正規化後に空になる語はどの項目名にも含まれる扱い
+        self._always_groups = norm_terms.pop("", set())
+        self._norm_terms = list(norm_terms.items())
+        self._norm_automaton = AhoCorasickAutomaton(term for term, _ in self._norm_terms)
+
+        # 項目名が辞書語に含まれる場合の判定用: 辞書語の全部分文字列 -> グループ番号
+        self._substring_groups: Dict[str, Set[int]] = {}
+        for term, groups in self._norm_terms:
+            for start in range(len(term)):
+                for end in range(start + 1, len(term) + 1):
+                    self._substring_groups.setdefault(term[start:end], set()).update(groups)
+
+    def match_groups(self, text: str) -> List[str]:
+        """正規化したテキストに該当する類義語グループの代表語（辞書順）"""
+        return [self.groups[group][0] for group in sorted(self._normalized_groups(text))]
+
+    def _normalized_groups(self, text: str) -> Set[int]:
+        """正規化テキストと辞書語の双方向の包含で該当するグループ"""
+        text_norm = self.normalizer(text)
+        if not text_norm:
+            # 空文字列はすべての辞書語に含まれる
+            return set(range(len(self.groups)))
+
+        groups = set(self._always_groups)
+        for term_id in self._norm_automaton.find(text_norm):
+            groups.update(self._norm_terms[term_id][1])
+        groups.update(self._substring_groups.get(text_norm, ()))
+        return groups
+
+    def find_synonyms(self, item_name: str) -> List[str]:
+        """
+        項目名の類義語を取得
+
+        Args:
+            item_name: 見積項目名
+
+        Returns:
+            類義語リスト（元の項目名を含む）
+        """
+        synonyms = [item_name]
+        for group in self._normalized_groups(item_name):
+            key, values = self.groups[group]
+            synonyms.extend(values)
+            synonyms.append(key)
+        return list(set(synonyms))
+
+    def expand_query(self, query: str, max_terms: int = 5) -> str:
+        """
+        同義語辞書を使ってクエリを展開
+
+        辞書順に見て、キーを含むグループが見つかればその類義語（最大3つ）を加えて終了、
+        それより前のグループで類義語を含むものはキーと他の類義語（最大2つ）を加えます。
+
+        Args:
+            query: 元のクエリ
+            max_terms: 展開後の最大語数
+
+        Returns:
+            同義語を含む拡張クエリ
+        """
+        # グループ番号 -> [キーを含むか, 含まれる類義語の最小位置]
+        hits: Dict[int, List] = {}
+        for term_id in self._raw_automaton.find(query):
+            for group, position in self._raw_terms[term_id][1]:
+                hit = hits.setdefault(group, [False, None])
+                if position < 0:
+                    hit[0] = True
+                elif hit[1] is None or position < hit[1]:
+                    hit[1] = position
+
+        expanded_terms = [query]
+        for group in sorted(hits):
+            key, synonyms = self.groups[group]
+            key_hit, synonym_position = hits[group]
+            if key_hit:
+                expanded_terms.extend(synonyms[:3])  # 最大3つの同義語を追加
+                break
+            syn = synonyms[synonym_position]
+            expanded_terms.append(key)
+            expanded_terms.extend([s for s in synonyms if s != syn][:2])
+
+        # 重複を除去して結合
+        unique_terms = list(dict.fromkeys(expanded_terms))
+        return " ".join(unique_terms[:max_terms])
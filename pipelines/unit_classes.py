@@ -0,0 +1,117 @@
+"""
+単位の種類と互換性テーブル
+
+見積項目・KBの単位表記（ｍ/m、ヶ所/箇所/ケ所 等の表記揺れ）を少数の単位の種類に正規化し、
+単位の互換性を種類×種類のブール行列で判定します。
+部分文字列の走査（any(u in unit ...)）を候補ごとに繰り返す代わりに、
+表記ごとの分類は1度だけ行い、以降は行列の参照だけで判定します。
+"""
+
+import re
+import unicodedata
+from enum import Enum
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import numpy as np
+
+
+class UnitClass(str, Enum):
+    """単位の種類"""
+    LUMP_SUM = "一式"  # 式
+    LENGTH = "長さ"  # m
+    COUNT = "数量"  # 個・本・箇所 等
+    AREA = "面積"  # ㎡
+    SET = "組"  # 組・セット・台・基・面（機器・盤の単位）
+    UNKNOWN = "不明"  # 分類できない単位（〃、日 等）はどの単位とも互換性あり
+
+
+# 単位の表記（NFKC正規化・小文字化後） -> 単位の種類
+UNIT_ALIASES = {
+    "式": UnitClass.LUMP_SUM,
+    "一式": UnitClass.LUMP_SUM,
+    "m": UnitClass.LENGTH,
+    "メートル": UnitClass.LENGTH,
+    "延m": UnitClass.LENGTH,
+    "m2": UnitClass.AREA,
+    "平米": UnitClass.AREA,
+    "平方メートル": UnitClass.AREA,
+    "個": UnitClass.COUNT,
+    "本": UnitClass.COUNT,
+    "箇所": UnitClass.COUNT,
+    "個所": UnitClass.COUNT,
+    "ヶ所": UnitClass.COUNT,
+    "ケ所": UnitClass.COUNT,
+    "カ所": UnitClass.COUNT,
+    "ヵ所": UnitClass.COUNT,
+    "か所": UnitClass.COUNT,
+    "点": UnitClass.COUNT,
+    "口": UnitClass.COUNT,
+    "灯": UnitClass.COUNT,
+    "枚": UnitClass.COUNT,
+    "件": UnitClass.COUNT,
+    "組": UnitClass.SET,
+    "セット": UnitClass.SET,
+    "set": UnitClass.SET,
+    "ユニット": UnitClass.SET,
+    "台": UnitClass.SET,
+    "基": UnitClass.SET,
+    "面": UnitClass.SET,
+}
+
+# 行列の添字順
+UNIT_CLASSES = list(UnitClass)
+UNIT_CLASS_INDEX = {unit_class: index for index, unit_class in enumerate(UNIT_CLASSES)}
+
+# 互換性のある種類の組（同じ種類同士・UNKNOWNとの組み合わせは常に互換性あり）
+# 「式」と機器単位（台・基・面・組）は一式金額として比較できるため互換性ありとする
+COMPATIBLE_UNIT_CLASSES = [
+    {UnitClass.LUMP_SUM, UnitClass.SET},
+]
+
+UNIT_COMPATIBILITY = np.array([
+    [
+        a == b or UnitClass.UNKNOWN in (a, b) or any(a in group and b in group for group in COMPATIBLE_UNIT_CLASSES)
+        for b in UNIT_CLASSES
+    ]
+    for a in UNIT_CLASSES
+], dtype=bool)
+
+# KB側が「式」でこの単価以上の場合、建物全体の一式金額の可能性が高いためマッチングを拒否
+HIGH_VALUE_LUMP_SUM_PRICE = 500000
+
+
+@lru_cache(maxsize=1024)
+def unit_class(unit: Optional[str]) -> UnitClass:
+    """単位表記を単位の種類に分類（例: "ｹ所" -> COUNT、"㎡" -> AREA）"""
+    if not unit:
+        return UnitClass.UNKNOWN
+    text = unicodedata.normalize("NFKC", unit).strip().lower()
+    # 数量や注記を除去（例: "1式"、"m(延長)"）
+    text = re.sub(r"[(\[].*?[)\]]", "", text)
+    text = re.sub(r"^[\d.]+", "", text).strip()
+    return UNIT_ALIASES.get(text, UnitClass.UNKNOWN)
+
+
+def units_compatible(item_unit: Optional[str], kb_unit: Optional[str]) -> bool:
+    """2つの単位表記に互換性があるか（どちらかが空なら互換性あり）"""
+    if not item_unit or not kb_unit:
+        return True
+    return bool(UNIT_COMPATIBILITY[UNIT_CLASS_INDEX[unit_class(item_unit)], UNIT_CLASS_INDEX[unit_class(kb_unit)]])
+
+
+def is_high_value_lump_sum(kb_unit: Optional[str], kb_price: Optional[float]) -> bool:
+    """KB単価が高額な「式」単価か"""
+    return bool(kb_price) and unit_class(kb_unit) == UnitClass.LUMP_SUM and kb_price >= HIGH_VALUE_LUMP_SUM_PRICE
+
+
+def high_value_lump_sum_mask(unit_class_ids: np.ndarray, kb_prices: Sequence[Optional[float]]) -> np.ndarray:
+    """
+    高額な「式」単価のKB行のマスク
+
+    Args:
+        unit_class_ids: KB各行の単位の種類（UNIT_CLASS_INDEXの添字）
+        kb_prices: KB各行の単価（Noneは0扱い）
+    """
+    prices = np.array([price or 0 for price in kb_prices], dtype='float64')
+    return (unit_class_ids == UNIT_CLASS_INDEX[UnitClass.LUMP_SUM]) & (prices >= HIGH_VALUE_LUMP_SUM_PRICE)
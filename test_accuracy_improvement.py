@@ -26,32 +26,32 @@ def test_accuracy_improvements():
         print(f"❌ ファイルが見つかりません: {spec_path}")
         return
 
-    generator = AIEstimateGenerator()
-
-    print("\n【Phase 1: Vision抽出テスト】")
-    print("-" * 40)
-
-    # Vision抽出テスト
-    vision_data = generator.extract_specification_table_with_vision(spec_path, target_pages=[39, 40])
-
-    print(f"  部屋タイプ数: {len(vision_data.get('rooms', []))}")
-    print(f"  総部屋数: {vision_data.get('totals', {}).get('room_count', 0)}")
-    print(f"  ガス栓総数: {vision_data.get('totals', {}).get('gas_outlet_total', 0)}")
-    print(f"  コンセント総数: {vision_data.get('totals', {}).get('electrical_outlet_total', 0)}")
-
-    if vision_data.get("rooms"):
-        print("\n  【抽出された部屋データ（最初の5件）】")
-        for room in vision_data["rooms"][:5]:
-            gas = room.get("gas_outlets", 0)
-            elec = room.get("electrical_outlets", 0)
-            count = room.get("count", 1)
-            print(f"    - {room.get('room_name', '不明')}: {count}室, ガス栓={gas}, コンセント={elec}")
-
-    print("\n【Phase 2: KBマッチングテスト（電気設備）】")
-    print("-" * 40)
-
-    # 電気設備見積生成
-    fmt_doc = generator.generate_estimate(spec_path, DisciplineType.ELECTRICAL)
+    # withブロックを抜けると共有KBインデックスの参照を返却
+    with AIEstimateGenerator() as generator:
+        print("\n【Phase 1: Vision抽出テスト】")
+        print("-" * 40)
+
+        # Vision抽出テスト
+        vision_data = generator.extract_specification_table_with_vision(spec_path, target_pages=[39, 40])
+
+        print(f"  部屋タイプ数: {len(vision_data.get('rooms', []))}")
+        print(f"  総部屋数: {vision_data.get('totals', {}).get('room_count', 0)}")
+        print(f"  ガス栓総数: {vision_data.get('totals', {}).get('gas_outlet_total', 0)}")
+        print(f"  コンセント総数: {vision_data.get('totals', {}).get('electrical_outlet_total', 0)}")
+
+        if vision_data.get("rooms"):
+            print("\n  【抽出された部屋データ（最初の5件）】")
+            for room in vision_data["rooms"][:5]:
+                gas = room.get("gas_outlets", 0)
+                elec = room.get("electrical_outlets", 0)
+                count = room.get("count", 1)
+                print(f"    - {room.get('room_name', '不明')}: {count}室, ガス栓={gas}, コンセント={elec}")
+
+        print("\n【Phase 2: KBマッチングテスト（電気設備）】")
+        print("-" * 40)
+
+        # 電気設備見積生成
+        fmt_doc = generator.generate_estimate(spec_path, DisciplineType.ELECTRICAL)
 
     print(f"  生成項目数: {len(fmt_doc.estimate_items)}")
 
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+単価KB一括構築（バッチジョブ）テスト（オフライン）
+
+LocalBatchServer（Message Batches API のローカル代替）と StubAnthropicClient で、
+テキストPDF（1リクエスト）とスキャンPDF（ページごとのOCRリクエスト）のKB抽出を実行し、
+以下を確認します。
+
+  - 処理の途中で中断しても、同じジョブマニフェストで再開すると送信済みのバッチから続行し、
+    同じリクエストを二重に処理しない
+  - エラーになったリクエストは次のバッチで再送信される
+  - テキストPDFの抽出結果が同期処理（PriceKBBuilder.extract_estimate_from_pdf）と一致する
+
+使い方:
+    python test_kb_batch.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pipelines.cost_tracker as cost_tracker
+from pipelines.kb_batch import KBBatchJob, load_kb_batch_config
+from pipelines.kb_builder import PriceKBBuilder
+from pipelines.llm_stub import LocalBatchServer, StubAnthropicClient
+
+TEXT_PDF = "test-files/メール本文.pdf"
+SCANNED_PDF = "test-files/250918_送付状　見積書（都市ｶﾞｽ).pdf"
+
+
+class Responder:
+    """テキスト抽出には単価項目2件、ページ画像には画像ごとの項目1件を返す（最初の画像は1回エラー）"""
+
+    def __init__(self):
+        self.failed_once = False
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        content = request["messages"][0]["content"]
+        if isinstance(content, str):
+            return json.dumps([
+                {"name": "白ガス管", "specification": "20A", "quantity": 10, "unit": "m", "unit_price": 8990, "discipline": "ガス"},
+                {"name": "分電盤", "specification": "主幹100A", "quantity": 2, "unit": "面", "unit_price": 185000, "discipline": "電気"},
+            ], ensure_ascii=False)
+        with self.lock:
+            if not self.failed_once:
+                self.failed_once = True
+                raise RuntimeError("overloaded")
+        digest = hashlib.sha256(content[0]["source"]["data"].encode()).hexdigest()[:8]
+        return "```json\n" + json.dumps([
+            {"item_no": "1", "name": f"PE管{digest}", "specification": "25A", "quantity": 8, "unit": "m",
+             "unit_price": 9420, "amount": 75360, "level": 2, "discipline": "ガス設備工事"},
+        ], ensure_ascii=False) + "\n```"
+
+
+def main():
+    print("=" * 80)
+    print("単価KB一括構築（バッチジョブ）テスト")
+    print("=" * 80)
+    failures = []
+    work_dir = Path(tempfile.mkdtemp())
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=str(work_dir / "costs.json"))
+    config = dict(load_kb_batch_config(), ocr_dpi=50)
+    job_path = work_dir / "job.json"
+    responder = Responder()
+
+    # 1. 送信して処理の途中で中断
+    backend = StubAnthropicClient(responder=responder, latency=0.05)
+    server = LocalBatchServer(backend, str(work_dir / "batches"), max_concurrency=1)
+    job = KBBatchJob(str(job_path), config=config)
+    n_requests = job.add_files([TEXT_PDF, SCANNED_PDF])
+    job.add_files([TEXT_PDF])  # 同じファイルは追加しない
+    job.submit(server)
+    while len(backend.calls) < 3:
+        time.sleep(0.01)
+    server.stop()
+    interrupted = len(backend.calls)
+    print(f"リクエスト: {n_requests}件（テキスト1 + スキャン{n_requests - 1}ページ） / 中断までに処理: {interrupted}件")
+    if len(job.manifest["requests"]) != n_requests:
+        failures.append("同じファイルが二重に追加された")
+    if not 0 < interrupted < n_requests:
+        failures.append(f"中断の模擬に失敗（処理済み {interrupted}件）")
+
+    # 2. 別のジョブオブジェクト・サーバで同じマニフェストから再開
+    resumed_backend = StubAnthropicClient(responder=responder)
+    resumed_server = LocalBatchServer(resumed_backend, str(work_dir / "batches"))
+    resumed_job = KBBatchJob(str(job_path), config=config)
+    price_refs = resumed_job.run(resumed_server, poll_interval=0.05, timeout=60)
+    progress = resumed_job.progress()
+    processed = interrupted + len(resumed_backend.calls)
+    retried = [cid for cid, r in resumed_job.manifest["requests"].items() if r["attempts"] > 1]
+    print(f"再開後: {progress} / バッチ数: {len(resumed_job.manifest['batches'])} / 再送信: {retried}")
+    print(f"API処理の合計: {processed}件（リクエスト{n_requests} + エラー再送信{len(retried)}） / KB項目: {len(price_refs)}件")
+
+    if progress["succeeded"] != n_requests:
+        failures.append(f"全てのリクエストが成功していない: {progress}")
+    if processed != n_requests + len(retried):
+        failures.append(f"同じリクエストが二重に処理された: {processed}件")
+    if len(retried) != 1:
+        failures.append(f"エラーのリクエストが再送信されていない: {retried}")
+    if len(price_refs) != 2 + (n_requests - 1):
+        failures.append(f"KB項目数が想定と異なる: {len(price_refs)}")
+
+    # 3. テキストPDFは同期処理と同じ結果
+    builder = PriceKBBuilder(kb_path=str(work_dir / "kb.json"))
+    builder.client = StubAnthropicClient(responder=responder)
+    sync_refs = builder.extract_estimate_from_pdf(TEXT_PDF)
+    batch_refs = [ref for ref in price_refs if ref.source_project == Path(TEXT_PDF).stem]
+    if [r.model_dump() for r in sync_refs] != [r.model_dump() for r in batch_refs]:
+        failures.append("テキストPDFの抽出結果が同期処理と異なる")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 中断したバッチジョブを再開し、全ファイルのKB抽出を重複なく完了")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
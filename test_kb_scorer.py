@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+KB文字列マッチング スコアラー パリティテスト
+
+KBMatchScorer（NumPyのスコア行列）が、enrich_with_prices の従来の1行ずつのスコアリング
+（下の reference_score）と全組み合わせで同じスコアになることを確認します。
+
+見積項目として、既存KBの各行（項目名・仕様・単位）と、単位・仕様を入れ替えた派生項目を使います。
+
+使い方:
+    python test_kb_scorer.py
+    python test_kb_scorer.py --kb kb/price_kb.json --limit 400
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from pipelines.estimate_generator_ai import AIEstimateGenerator
+
+
+def reference_score(generator, item_name, item_spec, item_unit, kb_item):
+    """
+    従来のループと同じ規則で1組をスコアリング
+
+    Returns:
+        (score, category_score) - 単位不整合はscore=None、カテゴリ不一致はcategory_score=None
+    """
+    item_name_norm = generator._normalize_text(item_name)
+    item_spec_norm = generator._normalize_text(item_spec)
+    item_size = generator._extract_size(item_spec)
+    item_category = generator._get_category(item_name)
+    item_synonyms_norm = [generator._normalize_text(s) for s in generator._find_synonyms(item_name)]
+
+    kb_desc = kb_item.get("description", "")
+    kb_spec = kb_item.get("features", {}).get("specification", "")
+    kb_desc_norm = generator._normalize_text(kb_desc)
+    kb_spec_norm = generator._normalize_text(kb_spec)
+    kb_full_norm = generator._normalize_text(f"{kb_desc} {kb_spec}")
+    kb_size = generator._extract_size(kb_spec)
+    kb_category = generator._get_category(kb_desc)
+    kb_synonyms_norm = [generator._normalize_text(s) for s in generator._find_synonyms(kb_desc)]
+
+    score = 0.0
+    category_score = None
+
+    if item_name_norm == kb_desc_norm:
+        score += 2.0
+    elif item_name_norm in kb_desc_norm or kb_desc_norm in item_name_norm:
+        score += 1.5
+    elif any(syn in kb_synonyms_norm for syn in item_synonyms_norm):
+        score += 1.8
+    elif any(word in kb_desc_norm for word in item_name_norm.split() if len(word) > 1):
+        score += 1.0
+
+    if item_category and kb_category and item_category == kb_category:
+        score += 1.0
+        category_score = score
+
+    if item_spec_norm and kb_spec_norm:
+        if item_spec_norm == kb_spec_norm:
+            score += 1.5
+        elif item_size and kb_size and item_size == kb_size:
+            score += 1.2
+        elif item_spec_norm in kb_full_norm or kb_spec_norm in item_spec_norm:
+            score += 0.8
+
+    unit_match_score = 0.0
+    if item_unit == kb_item.get("unit"):
+        unit_match_score = 0.5
+    elif item_unit and kb_item.get("unit"):
+        unit_norm_item = generator._normalize_text(item_unit)
+        unit_norm_kb = generator._normalize_text(kb_item.get("unit", ""))
+        if unit_norm_item == unit_norm_kb:
+            unit_match_score = 0.5
+        elif unit_norm_item in unit_norm_kb or unit_norm_kb in unit_norm_item:
+            unit_match_score = 0.3
+        else:
+            incompatible_pairs = [
+                ("式", "箇所"), ("式", "個"), ("式", "m"), ("式", "台"),
+                ("箇所", "m"), ("個", "m"), ("台", "m"), ("ヶ所", "m")
+            ]
+            for u1, u2 in incompatible_pairs:
+                if (u1 in unit_norm_item and u2 in unit_norm_kb) or \
+                   (u2 in unit_norm_item and u1 in unit_norm_kb):
+                    return None, category_score
+
+    return score + unit_match_score, category_score
+
+
+def make_queries(kb_items, limit, seed=0):
+    """KB行そのものと、単位・仕様を入れ替えた派生項目"""
+    rng = random.Random(seed)
+    rows = rng.sample(range(len(kb_items)), min(limit, len(kb_items)))
+    units = sorted({kb_item.get("unit", "") for kb_item in kb_items}) + [None, "メートル", "箇所"]
+    queries = []
+    for row in rows:
+        kb_item = kb_items[row]
+        name = kb_item.get("description", "")
+        spec = kb_item.get("features", {}).get("specification", "")
+        queries.append((name, spec, kb_item.get("unit", "")))
+        other = kb_items[rng.randrange(len(kb_items))]
+        queries.append((name, other.get("features", {}).get("specification", ""), rng.choice(units)))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KB文字列マッチング スコアラー パリティテスト")
+    parser.add_argument("--kb", default="kb/price_kb.json")
+    parser.add_argument("--limit", type=int, default=100, help="見積項目として使うKB行数")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("KB文字列マッチング スコアラー パリティテスト")
+    print("=" * 80)
+
+    generator = AIEstimateGenerator(kb_path=args.kb, use_vector_search=False)
+    kb_items = generator.price_kb
+    queries = make_queries(kb_items, args.limit)
+    print(f"KB: {len(kb_items)}件 / 見積項目: {len(queries)}件")
+
+    start = time.perf_counter()
+    expected = np.full((len(queries), len(kb_items)), np.nan)
+    expected_category = np.full((len(queries), len(kb_items)), np.nan)
+    for i, (name, spec, unit) in enumerate(queries):
+        for row, kb_item in enumerate(kb_items):
+            score, category_score = reference_score(generator, name, spec, unit, kb_item)
+            if score is not None:
+                expected[i, row] = score
+            if category_score is not None:
+                expected_category[i, row] = category_score
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    item_features = [generator._text_features(name, spec, unit) for name, spec, unit in queries]
+    scorer = generator._get_kb_scorer()
+    scores, category_scores = scorer.score_matrix(item_features)
+    matches = scorer.best_matches(item_features, np.ones_like(scores, dtype=bool))
+    scorer_time = time.perf_counter() - start
+
+    score_ok = np.array_equal(scores, expected, equal_nan=True)
+    category_ok = np.array_equal(category_scores, expected_category, equal_nan=True)
+
+    # 最良マッチ: 従来のループと同じく「score > best_score」で最初の行を選ぶ
+    best_ok = True
+    for i, match in enumerate(matches):
+        best_row, best_score = None, 0.0
+        category_row, category_best = None, 0.0
+        for row in range(len(kb_items)):
+            if not np.isnan(expected_category[i, row]) and expected_category[i, row] > category_best:
+                category_row, category_best = row, expected_category[i, row]
+            if not np.isnan(expected[i, row]) and expected[i, row] > best_score:
+                best_row, best_score = row, expected[i, row]
+        if (match.best_row, match.category_row) != (best_row, category_row):
+            best_ok = False
+            print(f"  ❌ {queries[i]}: best {match.best_row} != {best_row} / category {match.category_row} != {category_row}")
+
+    print(f"\n  スコア行列一致:       {'✅' if score_ok else '❌'}")
+    print(f"  カテゴリスコア一致:   {'✅' if category_ok else '❌'}")
+    print(f"  最良マッチ選択一致:   {'✅' if best_ok else '❌'}")
+    print(f"\n  従来ループ: {reference_time:.2f}s / NumPyスコアラー: {scorer_time:.3f}s")
+
+    ok = score_ok and category_ok and best_ok
+    print("\n" + ("✅ パリティテスト合格" if ok else "❌ パリティテスト不合格"))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
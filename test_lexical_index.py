@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+文字n-gram（BM25）インデックス・候補の絞り込み テスト（オフライン）
+
+以下を確認します。
+
+  1. NgramIndex: 項目名・仕様が一致する文書が1位、工事区分マスク・ヒットなしの扱い
+  2. reciprocal_rank_fusion: 複数の順位リストでの上位と同点時の順序
+  3. KB項目の項目名・仕様で照合すると、上位候補への絞り込み（BM25 + RRF）でも
+     全件走査と同じKB行が選ばれる（discipline / unified の両プリセット）
+  4. 項目名・仕様がどのKB行とも共通しない項目は、全件走査では単位だけの一致（0.5点）や
+     項目名が空のKB行（空文字列の包含で項目名一致扱い）にマッチするが、絞り込み後は
+     マッチしない（全件走査との差分として意図した動作）
+
+使い方:
+    python test_lexical_index.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import numpy as np
+
+from pipelines.estimate_generator_ai import AIEstimateGenerator
+from pipelines.lexical_index import NgramIndex, reciprocal_rank_fusion
+from pipelines.schemas import DisciplineType, EstimateItem
+
+DOCUMENTS = [
+    "白ガス管（ネジ接合） 20A",
+    "白ガス管（ネジ接合） 25A",
+    "硬質塩化ビニル管 VP50",
+    "ケーブルラック W300",
+    "",
+    "警報用ケーブル",
+]
+
+# KBのどの項目名・仕様とも文字n-gramが共通しない項目名
+UNRELATED_NAME = "ＸＹＺ特殊部材"
+
+
+def check_ngram_index(failures):
+    """BM25の順位・マスク・ヒットなし"""
+    index = NgramIndex(DOCUMENTS)
+    by_name = [doc_id for doc_id, _ in index.search("ケーブルラック")]
+    by_spec = [doc_id for doc_id, _ in index.search("白ガス管 25A")]
+    masked = [doc_id for doc_id, _ in index.search("白ガス管 25A", allowed=np.array([d != 1 for d in range(len(DOCUMENTS))]))]
+    print(f"  項目名: {by_name[:3]} / 仕様: {by_spec[:3]} / マスク: {masked[:3]}")
+
+    if by_name[:1] != [3]:
+        failures.append(f"項目名が一致する文書が1位ではない: {by_name}")
+    if by_spec[:2] != [1, 0]:
+        failures.append(f"仕様が一致する文書が1位ではない: {by_spec}")
+    if 1 in masked or masked[:1] != [0]:
+        failures.append(f"マスクで除いた文書が返された: {masked}")
+    if index.search(UNRELATED_NAME):
+        failures.append("共通するn-gramがないクエリで文書が返された")
+    if any(doc_id == 4 for doc_id, _ in index.search("白ガス管 ケーブル 塩化ビニル")):
+        failures.append("空の文書が返された")
+    if len(index.search("白ガス管 塩化ビニル管 ケーブル", top_k=2)) != 2:
+        failures.append("top_k件に絞られていない")
+
+
+def check_rank_fusion(failures):
+    """RRFの統合順位"""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]])
+    tied = reciprocal_rank_fusion([[5], [6]])
+    print(f"  統合: {fused} / 同点: {tied}")
+    if fused != [1, 3, 2]:
+        failures.append(f"両方の上位にある文書が優先されていない: {fused}")
+    if tied != [5, 6]:
+        failures.append(f"同点が最初に現れた順になっていない: {tied}")
+
+
+def full_scan_candidates(generator, matcher, items):
+    """全件走査の候補（工事区分・単位の互換性のみで絞り込み）"""
+    scorer = generator._get_kb_scorer()
+    candidates = np.ones((len(items), len(generator.price_kb)), dtype=bool)
+    for i, item in enumerate(items):
+        if matcher.policy.filter_by_discipline:
+            candidates[i] &= generator._discipline_mask(item.discipline.value)
+        if not matcher.policy.unit_scoring:
+            candidates[i] &= scorer.unit_compatibility(item.unit)
+    return candidates
+
+
+def compare(generator, preset, items):
+    """(絞り込み, 全件走査) の KBMatch リスト"""
+    matcher = generator._create_price_matcher(preset, workers=1)
+    pruned = matcher._score_stage(items, matcher._candidate_stage(items, {}))
+    full = matcher._score_stage(items, full_scan_candidates(generator, matcher, items))
+    return pruned, full
+
+
+def kb_items_as_estimate_items(generator, step: int = 7):
+    """KB項目の項目名・仕様・単位を持つ見積項目（項目名が空・工事区分が不明なKB行は除く）"""
+    disciplines = {d.value for d in DisciplineType}
+    items = []
+    for row in range(0, len(generator.price_kb), step):
+        kb_item = generator.price_kb[row]
+        if not kb_item.get("description") or kb_item.get("discipline") not in disciplines:
+            continue
+        items.append(EstimateItem(
+            item_no=str(row),
+            name=kb_item["description"],
+            specification=kb_item.get("features", {}).get("specification") or None,
+            unit=kb_item.get("unit"),
+            discipline=DisciplineType(kb_item["discipline"]),
+        ))
+    return items
+
+
+def check_exact_scan_parity(generator, failures):
+    """KB項目名・仕様での照合は全件走査と同じKB行を選ぶ"""
+    items = kb_items_as_estimate_items(generator)
+    for preset in ("discipline", "unified"):
+        pruned, full = compare(generator, preset, items)
+        differing = [
+            item.name for item, p, f in zip(items, pruned, full)
+            if (p.best_row, p.best_score) != (f.best_row, f.best_score)
+        ]
+        print(f"  {preset:<10} {len(items) - len(differing)}/{len(items)}件 が全件走査と一致")
+        if differing:
+            failures.append(f"{preset}: 全件走査と異なるKB行を選んだ項目がある: {differing[:5]}")
+
+
+def check_unrelated_items(generator, failures):
+    """項目名・仕様が共通しない項目は、単位だけ・空の項目名のKB行にマッチしない"""
+    price_kb = generator.price_kb
+    for discipline in ("ガス設備工事", "衛生設備工事", "電気設備工事"):
+        item = EstimateItem(item_no="1", name=UNRELATED_NAME, unit="m", discipline=DisciplineType(discipline))
+        (pruned,), (full,) = compare(generator, "discipline", [item])
+        full_desc = price_kb[full.best_row].get("description", "") if full.best_row is not None else None
+        print(f"  {discipline:<8} 全件走査: {full.best_score:.1f}点 「{full_desc}」 / 絞り込み: "
+              f"{'マッチなし' if pruned.best_row is None else pruned.best_row}")
+
+        # 全件走査は単位一致（0.5点）または空の項目名（包含扱い1.5点 + 単位0.5点）でマッチする
+        if full.best_row is None or full.best_score not in (0.5, 2.0) or (full.best_score == 2.0 and full_desc):
+            failures.append(f"{discipline}: 全件走査の結果が想定（単位のみ・空の項目名）と異なる")
+        if pruned.best_row is not None:
+            failures.append(f"{discipline}: 共通する文字のない項目がKB行にマッチした")
+
+        enriched = generator.enrich_with_prices([item.model_copy()])[0]
+        if enriched.unit_price is not None:
+            failures.append(f"{discipline}: 共通する文字のない項目に単価が付与された: {enriched.unit_price}")
+
+
+def main():
+    print("=" * 80)
+    print("文字n-gram（BM25）インデックス・候補の絞り込み テスト")
+    print("=" * 80)
+    failures = []
+
+    print("\n[1] NgramIndex")
+    check_ngram_index(failures)
+    print("\n[2] reciprocal_rank_fusion")
+    check_rank_fusion(failures)
+
+    generator = AIEstimateGenerator(kb_path="kb/price_kb.json", use_vector_search=False, use_cache=False)
+    print("\n[3] KB項目名・仕様での照合（絞り込み vs 全件走査）")
+    check_exact_scan_parity(generator, failures)
+    print("\n[4] 項目名・仕様が共通しない項目")
+    check_unrelated_items(generator, failures)
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 上位候補への絞り込みは項目名・仕様の一致で全件走査と同じKB行を選び、単位だけの一致は除外")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
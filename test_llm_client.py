@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+LLM API 共通クライアント テスト（オフライン）
+
+StubAnthropicClient に一時的なエラー・遅延を起こさせ、LLMClient の呼び出しポリシーを確認します。
+
+  1. 429・5xx はバックオフして再試行し、400 等は再試行しない
+  2. 操作ごとのタイムアウトを超えた呼び出しは打ち切って再試行する
+  3. ヘッジ: 応答が遅い呼び出しは2本目の応答を使い、使わなかった応答のコストも記録する
+  4. サーキットブレーカー: エラーが続くと呼び出しを止め、一定時間後の試行で復帰する
+     （試行が400・呼び出し側の例外で終わっても遮断されたままにならない）
+  5. ストリーミングの開始時のエラーを再試行する
+  6. 呼び出し元の record_cost にレイテンシ・試行回数が含まれる（PriceKBBuilder）
+
+使い方:
+    python test_llm_client.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import tempfile
+import threading
+import time
+
+import pipelines.cost_tracker as cost_tracker
+from pipelines.cost_tracker import record_cost
+from pipelines.kb_builder import PriceKBBuilder
+from pipelines.llm_client import CircuitBreaker, CircuitOpenError, LLMClient, load_llm_client_config
+from pipelines.llm_stub import StubAnthropicClient
+
+TEXT_PDF = "test-files/メール本文.pdf"
+REQUEST = dict(model="claude-sonnet-4-20250514", max_tokens=100, messages=[{"role": "user", "content": "見積項目"}])
+
+
+class StubAPIError(Exception):
+    """HTTPエラー応答（status_code を持つ anthropic.APIStatusError の代わり）"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def failing_responder(status_codes):
+    """status_codes の順にエラーを返し、その後は成功する"""
+    errors = list(status_codes)
+    lock = threading.Lock()
+
+    def responder(request):
+        with lock:
+            if errors:
+                raise StubAPIError(errors.pop(0))
+        return json.dumps([{"name": "白ガス管", "unit_price": 8990}], ensure_ascii=False)
+    return responder
+
+
+def make_client(backend, **overrides):
+    config = dict(load_llm_client_config(), backoff_base=0.01, backoff_max=0.05, **overrides)
+    breaker = CircuitBreaker(config["circuit_failure_threshold"], config["circuit_reset_seconds"])
+    return LLMClient(backend, config=config, circuit_breaker=breaker)
+
+
+def call(client, operation="テスト呼び出し"):
+    """呼び出し側と同じく create の直後に record_cost し、記録を返す"""
+    response = client.messages.create(**REQUEST, operation=operation)
+    return record_cost(operation, REQUEST["model"], response.usage.input_tokens, response.usage.output_tokens)
+
+
+def check_retries(failures):
+    print("\n[1] 429・5xx の再試行")
+    backend = StubAnthropicClient(responder=failing_responder([429, 529, 503]))
+    record = call(make_client(backend))
+    print(f"  試行回数: {record['attempts']} / レイテンシ: {record['latency_ms']}ms")
+    if record["attempts"] != 4 or len(backend.calls) != 4:
+        failures.append(f"429・5xx が再試行されていない: {record['attempts']}回")
+
+    backend = StubAnthropicClient(responder=failing_responder([400]))
+    try:
+        call(make_client(backend))
+        failures.append("400 のエラーが返されていない")
+    except StubAPIError:
+        pass
+    if len(backend.calls) != 1:
+        failures.append(f"400 が再試行された: {len(backend.calls)}回")
+
+
+def check_timeout(failures):
+    print("\n[2] 操作ごとのタイムアウト")
+    latencies = [2.0, 0.0]
+    backend = StubAnthropicClient(latency=lambda request: latencies.pop(0))
+    client = make_client(backend, operation_timeouts={"図面Vision分析": 0.1})
+    start = time.monotonic()
+    record = call(client, operation="図面Vision分析")
+    elapsed = time.monotonic() - start
+    print(f"  {elapsed:.2f}秒で応答（1回目はタイムアウト {backend.calls[0]['timeout']}秒で打ち切り）")
+    if elapsed > 1.0 or record["attempts"] != 2:
+        failures.append(f"タイムアウトで打ち切られていない: {elapsed:.2f}秒 / {record['attempts']}回")
+    if make_client(backend).timeout_for("建物情報抽出") != load_llm_client_config()["timeout"]:
+        failures.append("操作ごとの設定がない操作に既定のタイムアウトが使われていない")
+
+
+def check_hedging(failures):
+    print("\n[3] ヘッジ")
+    latencies = [0.5, 0.01]
+    backend = StubAnthropicClient(latency=lambda request: latencies.pop(0))
+    client = make_client(backend, hedge_delays={"OCR見積抽出": 0.05})
+    start = time.monotonic()
+    record = call(client, operation="OCR見積抽出")
+    elapsed = time.monotonic() - start
+    time.sleep(0.6)  # 使わなかった応答の完了を待つ
+    records = cost_tracker.get_tracker().records
+    discarded = [r for r in records if r["metadata"].get("hedge") == "discarded"]
+    print(f"  {elapsed:.2f}秒で応答（ヘッジ: {record['hedged']}） / 使わなかった応答の記録: {len(discarded)}件")
+    if elapsed > 0.3 or not record["hedged"]:
+        failures.append(f"ヘッジした応答が使われていない: {elapsed:.2f}秒")
+    if len(discarded) != 1 or not discarded[0]["input_tokens"]:
+        failures.append("使わなかった応答のコストが記録されていない")
+
+
+def check_circuit_breaker(failures):
+    print("\n[4] サーキットブレーカー")
+    backend = StubAnthropicClient(responder=failing_responder([503] * 3))
+    client = make_client(backend, max_retries=1, circuit_failure_threshold=3, circuit_reset_seconds=0.2)
+    errors = []
+    for _ in range(3):
+        try:
+            call(client)
+        except Exception as e:
+            errors.append(type(e).__name__)
+    calls_while_open = len(backend.calls)
+    print(f"  エラー: {errors} / API呼び出し: {calls_while_open}回 / 状態: {client.circuit.state}")
+    if errors != ["StubAPIError", "CircuitOpenError", "CircuitOpenError"] or calls_while_open != 3:
+        failures.append(f"連続エラーで呼び出しが止まっていない: {errors} / {calls_while_open}回")
+
+    time.sleep(0.25)
+    try:
+        call(client)
+    except CircuitOpenError:
+        failures.append("一定時間後に試行が再開されていない")
+    print(f"  一定時間後の試行後の状態: {client.circuit.state}")
+    if client.circuit.state != "closed":
+        failures.append(f"試行の成功後にサーキットが閉じていない: {client.circuit.state}")
+
+    # 半開状態の試行が400・呼び出し側の例外で終わっても、次の呼び出しは遮断されない
+    for label, fail in [("400", lambda c: call(c)), ("ストリーム受信中の例外", consume_stream_and_raise)]:
+        backend = StubAnthropicClient(responder=failing_responder([503, 400]))
+        client = make_client(backend, max_retries=0, circuit_failure_threshold=1, circuit_reset_seconds=0.05)
+        try:
+            call(client)
+        except StubAPIError:
+            pass
+        time.sleep(0.1)
+        try:
+            fail(client)
+        except (StubAPIError, ValueError):
+            pass
+        try:
+            call(client)
+        except CircuitOpenError:
+            failures.append(f"半開状態の試行が{label}で終わった後、呼び出しが遮断されたまま")
+        print(f"  半開状態の試行が{label}で終了 → 次の呼び出し後の状態: {client.circuit.state}")
+
+
+def consume_stream_and_raise(client):
+    """ストリームの受信中に呼び出し側で例外を起こす"""
+    with client.messages.stream(**REQUEST, operation="テスト呼び出し") as stream:
+        next(iter(stream.text_stream))
+        raise ValueError("呼び出し側のエラー")
+
+
+def check_stream(failures):
+    print("\n[5] ストリーミング")
+    backend = StubAnthropicClient(responder=failing_responder([429]))
+    client = make_client(backend)
+    with client.messages.stream(**REQUEST, operation="ガス設備項目生成") as stream:
+        text = "".join(stream.text_stream)
+        response = stream.get_final_message()
+    record = record_cost("ガス設備項目生成", REQUEST["model"], response.usage.input_tokens, response.usage.output_tokens)
+    print(f"  受信: {len(text)}文字 / 試行回数: {record['attempts']}")
+    if record["attempts"] != 2 or not text:
+        failures.append("ストリーミングの開始時のエラーが再試行されていない")
+
+
+def check_call_site(failures):
+    print("\n[6] 呼び出し元のコスト記録")
+    builder = PriceKBBuilder(kb_path=tempfile.mktemp(suffix=".json"))
+    builder.client = make_client(StubAnthropicClient(responder=failing_responder([529])))
+    price_refs = builder.extract_estimate_from_pdf(TEXT_PDF)
+    record = cost_tracker.get_tracker().records[-1]
+    print(f"  抽出: {len(price_refs)}項目 / 記録: {record['operation']} 試行{record['attempts']}回 {record['latency_ms']}ms")
+    if not price_refs or record["operation"] != "KB抽出（単価）" or record["attempts"] != 2:
+        failures.append("呼び出し元のコスト記録に試行回数が含まれていない")
+
+
+def main():
+    print("=" * 80)
+    print("LLM API 共通クライアント テスト")
+    print("=" * 80)
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=tempfile.mktemp(suffix=".json"))
+    failures = []
+    check_retries(failures)
+    check_timeout(failures)
+    check_hedging(failures)
+    check_circuit_breaker(failures)
+    check_stream(failures)
+    check_call_site(failures)
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ タイムアウト・再試行・ヘッジ・サーキットブレーカーを共通クライアントで適用")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
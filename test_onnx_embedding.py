@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+ONNX埋め込みバックエンド テスト
+
+1. パリティ: PyTorch（SentenceTransformer）とONNX（fp32 / int8）のコサイン類似度を比較
+2. スループット: 各バックエンドのsentences/secを計測
+
+パリティの閾値（fp32 >= 0.999 / int8 >= 0.95）は、E5の重みをダウンロードできない環境で
+小さなローカルBERTモデルでのみ確認したもので、本番の intfloat/multilingual-e5-small では
+未検証です。embedding.backend を onnx にする前に、本番モデルで実行してください。
+
+使い方:
+    python test_onnx_embedding.py
+    python test_onnx_embedding.py --model intfloat/multilingual-e5-small --threads 4
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from pipelines.model_registry import DEFAULT_KB_MODEL
+from pipelines.onnx_embedding import OnnxEmbeddingModel, export_onnx_model, HAS_ONNXRUNTIME
+
+
+def load_kb_texts(kb_path: str, limit: int):
+    """価格KBから項目名・仕様のテキストを取得（VectorKBSearchと同じ形式）"""
+    with open(kb_path, 'r', encoding='utf-8') as f:
+        kb_items = json.load(f)
+    passages = [
+        f"passage: {item.get('description', '')} {item.get('features', {}).get('specification', '')} {item.get('discipline', '')}"
+        for item in kb_items[:limit]
+    ]
+    queries = [f"query: {item.get('description', '')}" for item in kb_items[:limit]]
+    return passages, queries
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def check_parity(torch_model, onnx_models, passages, queries, top_k: int = 5):
+    """コサイン類似度とtop-k検索結果の一致を確認"""
+    print("\n【パリティテスト】")
+    print("-" * 40)
+
+    torch_passages = normalize(torch_model.encode(passages, convert_to_numpy=True))
+    torch_queries = normalize(torch_model.encode(queries, convert_to_numpy=True))
+    torch_scores = torch_queries @ torch_passages.T
+    torch_top = np.argsort(-torch_scores, axis=1)[:, :top_k]
+
+    ok = True
+    for label, model, min_cosine in onnx_models:
+        onnx_passages = normalize(model.encode(passages))
+        onnx_queries = normalize(model.encode(queries))
+
+        # 同じテキストのembedding同士のコサイン類似度
+        cosine = np.sum(torch_passages * onnx_passages, axis=1)
+        # クエリ×パッセージのスコア差
+        score_diff = np.abs(onnx_queries @ onnx_passages.T - torch_scores)
+        onnx_top = np.argsort(-(onnx_queries @ onnx_passages.T), axis=1)[:, :top_k]
+        overlap = np.mean([len(set(a) & set(b)) / top_k for a, b in zip(torch_top, onnx_top)])
+
+        passed = cosine.min() >= min_cosine
+        ok = ok and passed
+        print(f"  {label:<10} cosine min={cosine.min():.4f} mean={cosine.mean():.4f} "
+              f"| score diff max={score_diff.max():.4f} | top{top_k} overlap={overlap:.3f} "
+              f"{'✅' if passed else '❌'} (>= {min_cosine})")
+
+    return ok
+
+
+def measure_throughput(models, texts, batch_size: int, repeat: int = 3):
+    """sentences/secを計測（最良値）"""
+    print("\n【スループット】")
+    print("-" * 40)
+    for label, model in models:
+        model.encode(texts[:batch_size], batch_size=batch_size)  # ウォームアップ
+        best = 0.0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            model.encode(texts, batch_size=batch_size)
+            best = max(best, len(texts) / (time.perf_counter() - start))
+        print(f"  {label:<10} {best:>10.1f} sentences/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX埋め込みバックエンド テスト")
+    parser.add_argument("--model", default=DEFAULT_KB_MODEL)
+    parser.add_argument("--kb", default="kb/price_kb.json")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtimeの演算内スレッド数")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--onnx-dir", default=None, help="エクスポート先（省略時は一時ディレクトリ）")
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("ONNX埋め込みバックエンド テスト")
+    print("=" * 80)
+
+    if not HAS_ONNXRUNTIME:
+        print("❌ onnxruntime がインストールされていません（pip install onnxruntime onnx）")
+        return 1
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    passages, queries = load_kb_texts(args.kb, args.limit)
+    print(f"モデル: {args.model} / テキスト: {len(passages)}件 / threads={args.threads or 'default'}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_dir = Path(args.onnx_dir or tmp_dir)
+        export_onnx_model(args.model, str(onnx_dir), quantize=True)
+
+        torch_model = SentenceTransformer(args.model, device="cpu")
+        onnx_fp32 = OnnxEmbeddingModel(args.model, str(onnx_dir), quantized=False, intra_op_threads=args.threads)
+        onnx_int8 = OnnxEmbeddingModel(args.model, str(onnx_dir), quantized=True, intra_op_threads=args.threads)
+
+        parity_ok = check_parity(
+            torch_model,
+            [("onnx-fp32", onnx_fp32, 0.999), ("onnx-int8", onnx_int8, 0.95)],
+            passages,
+            queries
+        )
+        measure_throughput(
+            [("torch", torch_model), ("onnx-fp32", onnx_fp32), ("onnx-int8", onnx_int8)],
+            passages,
+            args.batch_size
+        )
+
+    print("\n" + ("✅ パリティテスト合格" if parity_ok else "❌ パリティテスト不合格"))
+    if args.model != DEFAULT_KB_MODEL:
+        print(f"⚠️ 本番モデル（{DEFAULT_KB_MODEL}）ではなく {args.model} で確認したため、本番モデルのパリティは未検証")
+    return 0 if parity_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+見積生成前のプリフライト見積 テスト（オフライン）
+
+仕様書PDFを合成したコスト履歴でプリフライトし、以下を確認します。
+
+  1. ローカル解析のみ（APIを呼び出さない）で、仕様書のトークン数・Vision送信ページ数・API呼び出し数を予測
+     （PDFは1回の走査で読み込み、ファイルハッシュでキャッシュ）
+  2. コスト履歴の 出力/入力トークン比・応答時間 が予測に反映され、履歴が少ない操作は既定値を使う
+  3. 出力キャッシュがあるステージはAPI呼び出し0件として予測
+  4. 予算内に収まる仕様書を先頭から選ぶ（plan_within_budget）
+
+使い方:
+    python test_preflight.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pipelines.cost_tracker as cost_tracker
+from pipelines.estimate_generator_ai import SPEC_STAGE_VERSIONS, items_cache_path, spec_stage_cache
+from pipelines.preflight import (
+    DEFAULT_PREFLIGHT_CONFIG, OPERATION_PROFILES, extract_pdf_pages, load_operation_history, plan_within_budget,
+    preflight_spec
+)
+from pipelines.stage_dag import Stage
+
+SPEC_PDF = next(str(p) for p in Path("test-files").glob("仕様書*.pdf"))
+MODEL = "claude-sonnet-4-20250514"
+
+
+def history_records(operation, count, output_ratio, seconds_per_output_token):
+    """操作ごとの合成コスト記録"""
+    return [
+        {
+            "timestamp": datetime.now().isoformat(),
+            "operation": operation,
+            "model": MODEL,
+            "input_tokens": 10000,
+            "output_tokens": int(10000 * output_ratio),
+            "latency_ms": int(10000 * output_ratio * seconds_per_output_token * 1000),
+            "metadata": {},
+        }
+        for _ in range(count)
+    ]
+
+
+def main():
+    print("=" * 80)
+    print("プリフライト見積 テスト")
+    print("=" * 80)
+    failures = []
+    cache_dir = tempfile.mkdtemp()
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=tempfile.mktemp(suffix=".json"))
+    config = dict(DEFAULT_PREFLIGHT_CONFIG)
+
+    # 1. 履歴なし（既定値）
+    baseline = preflight_spec(SPEC_PDF, records=[], model_name=MODEL, config=config, cache_dir=cache_dir)
+    print(f"\n[1] {baseline.pages}ページ / 仕様書 {baseline.spec_tokens:,}トークン / Vision {baseline.vision_pages}ページ")
+    print(f"    {baseline.api_calls}回 / ¥{baseline.total_cost_jpy:,.1f} / 約{baseline.wall_seconds:.0f}秒 "
+          f"（解析 {baseline.analysis_seconds:.2f}秒）")
+    if not baseline.spec_tokens or not baseline.vision_pages:
+        failures.append("仕様書のトークン数・Vision送信ページ数が求められていない")
+    if baseline.api_calls != 2 + baseline.vision_pages + 7:
+        failures.append(f"API呼び出し数が想定と異なる: {baseline.api_calls}")
+    if any(s.history_records for s in baseline.stages):
+        failures.append("履歴がないのに履歴の比率が使われた")
+    if extract_pdf_pages(SPEC_PDF) is not extract_pdf_pages(SPEC_PDF):
+        failures.append("同じ仕様書のページテキストがキャッシュされていない")
+
+    # 2. 履歴の比率（建物情報抽出は出力比0.2、諸元表テキスト抽出は件数不足で既定値）
+    records = (
+        history_records("建物情報抽出", 5, 0.2, 0.01)
+        + history_records("諸元表テキスト抽出", 2, 0.5, 0.01)
+        + [dict(r, metadata={"hedge": "discarded"}) for r in history_records("建物情報抽出", 5, 0.9, 1.0)]
+    )
+    history = load_operation_history(records, min_history=3)
+    with_history = preflight_spec(SPEC_PDF, records=records, model_name=MODEL, config=config, cache_dir=cache_dir)
+    stages = {s.operation: s for s in with_history.stages}
+    building = stages["建物情報抽出"]
+    print(f"\n[2] 建物情報抽出: 入力{building.input_tokens:,} 出力{building.output_tokens:,} "
+          f"{building.seconds:.0f}秒（履歴{building.history_records}件）")
+    if history["建物情報抽出"].records != 5:
+        failures.append("ヘッジで使わなかった応答が履歴から除かれていない")
+    if abs(building.output_tokens - building.input_tokens * 0.2) > 1 or abs(building.seconds - building.output_tokens * 0.01) > 0.1:
+        failures.append("履歴の出力トークン比・応答時間が予測に反映されていない")
+    if stages["諸元表テキスト抽出"].output_tokens != OPERATION_PROFILES["諸元表テキスト抽出"]["output_tokens"]:
+        failures.append("履歴が少ない操作に既定値が使われていない")
+
+    # 3. 出力キャッシュのあるステージはAPIを呼び出さない
+    cache = spec_stage_cache(SPEC_PDF, MODEL, cache_dir)
+    for name in ("spec_table_vision", "drawing_info"):
+        path = cache.path(Stage(name, lambda: None, cache_version=SPEC_STAGE_VERSIONS[name]))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("{}")
+    vision_cached = preflight_spec(SPEC_PDF, records=[], model_name=MODEL, config=config, cache_dir=cache_dir)
+    items_cache_path(SPEC_PDF, cache_dir).write_text("[]")
+    items_cached = preflight_spec(SPEC_PDF, records=[], model_name=MODEL, config=config, cache_dir=cache_dir)
+    print(f"\n[3] Visionキャッシュあり: {vision_cached.api_calls}回 ¥{vision_cached.total_cost_jpy:,.1f} / "
+          f"生成項目キャッシュあり: {items_cached.api_calls}回 ¥{items_cached.total_cost_jpy:,.1f}")
+    if vision_cached.vision_pages or vision_cached.api_calls != baseline.api_calls - baseline.vision_pages:
+        failures.append("Visionのキャッシュがあるステージが呼び出しとして予測された")
+    if items_cached.api_calls != 2 or items_cached.wall_seconds >= vision_cached.wall_seconds:
+        failures.append("生成項目のキャッシュがあるのに項目生成が予測された")
+
+    # 4. 予算内の仕様書を選ぶ
+    budget = baseline.total_cost_jpy * 1.5
+    selected, deferred, estimates = plan_within_budget(
+        [SPEC_PDF, SPEC_PDF], budget, records=[], model_name=MODEL, config=config, cache_dir=tempfile.mkdtemp()
+    )
+    print(f"\n[4] 予算 ¥{budget:,.0f}: 実行{len(selected)}件 / 見送り{len(deferred)}件")
+    if len(selected) != 1 or len(deferred) != 1:
+        failures.append("予算を超える仕様書が見送られていない")
+
+    if cost_tracker.get_tracker().records:
+        failures.append("プリフライトでAPIが呼び出された")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ APIを呼び出さずに仕様書ごとのトークン数・API料金・処理時間を予測")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
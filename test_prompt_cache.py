@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+工事区分ごとの項目生成 プロンプトキャッシュ テスト（オフライン）
+
+StubAnthropicClient（プロンプトキャッシュを模擬するスタブ）で6工事区分の項目生成を実行し、
+以下を確認します。
+
+  - 全ての呼び出しの先頭ブロック（仕様書・建物情報）が同一で、cache_control が付いている
+  - 事前書き込み（1回）の後、6工事区分の呼び出しは全てキャッシュ読み込みになる
+  - CostTracker にキャッシュ書き込み・読み込みトークン数が記録される
+  - キャッシュなし（llm.prompt_cache=false）より入力コストが下がる
+
+使い方:
+    python test_prompt_cache.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import tempfile
+
+import pipelines.cost_tracker as cost_tracker
+import pipelines.estimate_generator_ai as estimate_generator_ai
+from pipelines.estimate_generator_ai import AIEstimateGenerator, load_llm_config
+from pipelines.llm_stub import StubAnthropicClient
+
+ITEMS_RESPONSE = json.dumps([
+    {"item_no": "1", "level": 1, "name": "配管工事", "specification": "", "quantity": 1, "unit": "式"},
+    {"item_no": "2", "level": 2, "name": "白ガス管", "specification": "20A", "quantity": 30, "unit": "m"},
+], ensure_ascii=False)
+
+
+def make_building_info():
+    """数万文字の仕様書テキストを含む建物情報"""
+    spec_text = "\n".join(
+        f"第{i}条 {['電気', '機械', 'ガス', '空調', '衛生', '消防'][i % 6]}設備工事は設計図書に基づき施工すること。"
+        f"配管・配線の仕様は特記仕様書第{i}項による。"
+        for i in range(1, 600)
+    )
+    return {
+        "project_name": "テスト校舎新築工事",
+        "building_info": {"total_floor_area": 2145, "floors": 3, "num_rooms": 30},
+        "facility_requirements": {"gas": {"num_connection_points": 9}},
+        "spec_text_excerpt": spec_text,
+    }
+
+
+def run_generation(prompt_cache: bool):
+    """スタブクライアントで6工事区分を生成し、(クライアント, コスト記録) を返す"""
+    config = dict(load_llm_config(), prompt_cache=prompt_cache)
+    estimate_generator_ai.load_llm_config = lambda config_path=None: config
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=tempfile.mktemp(suffix=".json"))
+
+    generator = AIEstimateGenerator(kb_path="kb/price_kb.json", use_vector_search=False, use_cache=False)
+    generator.client = StubAnthropicClient(responder=lambda request: ITEMS_RESPONSE)
+    items = generator._generate_items_for_all_disciplines(make_building_info(), max_concurrency=6)
+    return generator.client, cost_tracker._tracker_instance.records, items
+
+
+def main():
+    print("=" * 80)
+    print("工事区分ごとの項目生成 プロンプトキャッシュ テスト")
+    print("=" * 80)
+    failures = []
+
+    client, records, items = run_generation(prompt_cache=True)
+    prefixes = {json.dumps(call["messages"][0]["content"][0], ensure_ascii=False) for call in client.calls}
+    discipline_records = [r for r in records if r["operation"] != "プロンプトキャッシュ準備"]
+    warm_records = [r for r in records if r["operation"] == "プロンプトキャッシュ準備"]
+
+    print(f"API呼び出し: {len(client.calls)}回 / 生成項目: {len(items)}件")
+    for r in records:
+        print(f"  {r['operation']:<24} in={r['input_tokens']:>6} cache_write={r['cache_creation_tokens']:>6} "
+              f"cache_read={r['cache_read_tokens']:>6} ¥{r['cost_jpy']:.2f}")
+
+    if len(client.calls) != 7:
+        failures.append(f"API呼び出しが7回（事前書き込み1 + 6工事区分）ではない: {len(client.calls)}")
+    if len(prefixes) != 1:
+        failures.append(f"共通プレフィックスが呼び出しごとに異なる: {len(prefixes)}種類")
+    if not all("cache_control" in call["messages"][0]["content"][0] for call in client.calls):
+        failures.append("cache_control のない呼び出しがある")
+    if len(warm_records) != 1 or not warm_records[0]["cache_creation_tokens"]:
+        failures.append("事前書き込みでキャッシュが作成されていない")
+    if len(discipline_records) != 6 or not all(
+        r["cache_read_tokens"] and not r["cache_creation_tokens"] for r in discipline_records
+    ):
+        failures.append("工事区分の呼び出しがキャッシュ読み込みになっていない")
+    cached_cost = sum(r["cost_usd"] for r in records)
+
+    _, uncached_records, uncached_items = run_generation(prompt_cache=False)
+    uncached_cost = sum(r["cost_usd"] for r in uncached_records)
+    print(f"\nコスト: キャッシュあり ${cached_cost:.4f} / キャッシュなし ${uncached_cost:.4f} "
+          f"（{(1 - cached_cost / uncached_cost) * 100:.0f}%削減）")
+    if any(r["cache_creation_tokens"] or r["cache_read_tokens"] for r in uncached_records):
+        failures.append("prompt_cache=false でキャッシュが使われている")
+    if not cached_cost < uncached_cost:
+        failures.append("キャッシュありの方がコストが高い")
+    if [(i.name, i.discipline) for i in items] != [(i.name, i.discipline) for i in uncached_items]:
+        failures.append("キャッシュの有無で生成項目が異なる")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 全工事区分の呼び出しが共通プレフィックスをキャッシュから読み込み")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
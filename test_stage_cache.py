@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+仕様書解析ステージキャッシュ テスト（オフライン）
+
+StubAnthropicClient で仕様書解析パイプライン（StageDAG）を2回実行し、以下を確認します。
+
+  1. 諸元表に部屋がない仕様書（rooms が空）でも、2回目はAPIを呼び出さない
+  2. 諸元表の応答を解析できなかった場合はキャッシュせず、2回目に諸元表ステージだけ再実行する
+
+使い方:
+    python test_stage_cache.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import tempfile
+from pathlib import Path
+
+import pipelines.cost_tracker as cost_tracker
+from pipelines.estimate_generator_ai import AIEstimateGenerator
+from pipelines.llm_stub import StubAnthropicClient
+
+SPEC_PDF = next(str(p) for p in Path("test-files").glob("仕様書*.pdf"))
+
+BUILDING_RESPONSE = json.dumps({
+    "project_name": "テスト校舎新築工事",
+    "building_info": {"total_floor_area": 2145, "floors": 3},
+}, ensure_ascii=False)
+NO_ROOMS_RESPONSE = json.dumps({"rooms": [], "equipment_summary": {}})
+VISION_RESPONSE = json.dumps({"rooms": [], "equipment_locations": [], "pipe_routes": []})
+
+
+def make_responder(spec_table_response: str):
+    """操作ごとの応答（諸元表テキスト抽出のみ差し替え）"""
+    def responder(request):
+        operation = request.get("operation", "")
+        if operation == "建物情報抽出":
+            return BUILDING_RESPONSE
+        if operation == "諸元表テキスト抽出":
+            return spec_table_response
+        return VISION_RESPONSE
+    return responder
+
+
+def analyze(cache_dir: str, spec_table_response: str):
+    """スタブクライアントで仕様書を解析し、(API呼び出しの操作名一覧, 建物情報) を返す"""
+    generator = AIEstimateGenerator(kb_path="kb/price_kb.json", use_vector_search=False, use_cache=True)
+    generator.cache_dir = Path(cache_dir)
+    generator.client = StubAnthropicClient(responder=make_responder(spec_table_response))
+    building_info = generator._analyze_spec_document(SPEC_PDF)
+    return [call.get("operation", "") for call in generator.client.calls], building_info
+
+
+def main():
+    print("=" * 80)
+    print("仕様書解析ステージキャッシュ テスト")
+    print("=" * 80)
+    failures = []
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=tempfile.mktemp(suffix=".json"))
+
+    # 1. 部屋のない諸元表
+    cache_dir = tempfile.mkdtemp()
+    cold_calls, cold_info = analyze(cache_dir, NO_ROOMS_RESPONSE)
+    warm_calls, warm_info = analyze(cache_dir, NO_ROOMS_RESPONSE)
+    print(f"\n[1] 部屋なし: 1回目 {len(cold_calls)}回 / 2回目 {len(warm_calls)}回")
+    if "諸元表テキスト抽出" not in cold_calls:
+        failures.append("1回目に諸元表テキスト抽出が呼び出されていない")
+    if warm_calls:
+        failures.append(f"部屋のない諸元表で2回目にAPIが呼び出された: {sorted(set(warm_calls))}")
+    if warm_info != cold_info:
+        failures.append("キャッシュから解析した建物情報が1回目と異なる")
+
+    # 2. 応答の解析失敗はキャッシュしない
+    cache_dir = tempfile.mkdtemp()
+    analyze(cache_dir, "諸元表を読み取れませんでした")
+    retry_calls, _ = analyze(cache_dir, NO_ROOMS_RESPONSE)
+    print(f"[2] 解析失敗後の2回目: {retry_calls}")
+    if retry_calls != ["諸元表テキスト抽出"]:
+        failures.append(f"解析に失敗した諸元表ステージだけが再実行されていない: {retry_calls}")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ 部屋のない仕様書でも2回目はAPIを呼び出さない")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+項目生成のストリーミング受信・インクリメンタルJSONパース テスト（オフライン）
+
+  1. IncrementalJSONArrayParser が、チャンクの区切り方によらず
+     extract_json_array_robust / repair_json_array が対応する崩れたJSON配列から同じ項目を取り出す
+  2. StubAnthropicClient（ストリーミング応答を模擬するスタブ）で6工事区分を生成し、
+     生成中の単価マッチング先行実行（PricePrefetcher）の有無で単価付与の結果が同一で、
+     先行実行時は単価付与が全てマッチング結果キャッシュから適用される
+
+使い方:
+    python test_streaming_items.py
+"""
+
+import sys
+sys.path.insert(0, '.')
+
+import json
+import random
+import tempfile
+
+import pipelines.cost_tracker as cost_tracker
+import pipelines.estimate_generator_ai as estimate_generator_ai
+from pipelines.estimate_generator_ai import AIEstimateGenerator, extract_json_array_robust, load_llm_config
+from pipelines.json_stream import IncrementalJSONArrayParser
+from pipelines.llm_stub import StubAnthropicClient
+from pipelines.price_matcher import load_price_matching_config
+
+ITEMS = [
+    {"item_no": str(i), "name": f"白ガス管{i}", "specification": "20A [埋設]", "quantity": i * 10,
+     "unit": "m", "confidence": 0.9, "estimation_basis": "図面 \"配管図\" {参照}"}
+    for i in range(1, 6)
+]
+
+MALFORMED_CASES = {
+    "コードブロック": "以下が項目です。\n```json\n" + json.dumps(ITEMS, ensure_ascii=False, indent=2) + "\n```",
+    "末尾切れ": json.dumps(ITEMS, ensure_ascii=False, indent=2)[:-60],
+    "波括弧なし": """[
+  "item_no": "1",
+  "name": "白ガス管",
+  "quantity": 30,
+  "confidence": 0.9
+  "item_no": "2",
+  "name": "PE管",
+  "quantity": 12,
+  "estimation_basis": "図面"
+]""",
+}
+
+
+def parse_streamed(text: str, chunk_chars: int):
+    parser = IncrementalJSONArrayParser()
+    items = []
+    for start in range(0, len(text), chunk_chars):
+        items.extend(parser.feed(text[start:start + chunk_chars]))
+    items.extend(parser.close())
+    return items
+
+
+def check_parser(failures):
+    print("\n[1] インクリメンタルパーサ")
+    for name, text in MALFORMED_CASES.items():
+        expected = extract_json_array_robust(text)
+        for chunk_chars in (1, 7, len(text)):
+            items = parse_streamed(text, chunk_chars)
+            if items != expected:
+                failures.append(f"{name}（{chunk_chars}文字ずつ）: {len(items)}件 != {len(expected)}件")
+        print(f"  {name:<10} {len(expected)}件")
+
+    # extract_json_array_robust が対応しないカンマ欠落・末尾カンマも取り出せる
+    no_commas = "[\n" + "\n".join(json.dumps(item, ensure_ascii=False) for item in ITEMS) + ",\n]"
+    if parse_streamed(no_commas, 5) != ITEMS:
+        failures.append("カンマ欠落・末尾カンマの配列を取り出せない")
+
+
+def make_responder(kb_items):
+    """工事区分ごとにKB項目名から40件を返す（一部は項目名を崩す）"""
+    def responder(request):
+        prompt = request["messages"][0]["content"][-1]["text"]
+        rng = random.Random(len(prompt))
+        items = []
+        for i in range(40):
+            kb_item = rng.choice(kb_items)
+            name = kb_item.get("description", "")
+            items.append({
+                "item_no": str(i + 1), "level": 2, "name": name[:-1] if i % 3 == 0 else name,
+                "specification": str(kb_item.get("features", {}).get("specification", "") or ""),
+                "quantity": rng.choice([1, 5, 20]), "unit": kb_item.get("unit", ""),
+                "confidence": 0.8, "estimation_basis": "仕様書",
+            })
+        return "```json\n" + json.dumps(items, ensure_ascii=False, indent=2) + "\n```"
+    return responder
+
+
+def run_estimate(stream_items: bool):
+    """スタブクライアントで6工事区分を生成して単価付与し、(結果, キャッシュ統計) を返す"""
+    config = dict(load_llm_config(), stream_items=stream_items)
+    estimate_generator_ai.load_llm_config = lambda config_path=None: config
+    cost_tracker._tracker_instance = cost_tracker.CostTracker(log_path=tempfile.mktemp(suffix=".json"))
+
+    generator = AIEstimateGenerator(kb_path="kb/price_kb.json", use_vector_search=False, use_cache=True)
+    generator._price_matching_config = dict(load_price_matching_config(), cache_dir=tempfile.mkdtemp())
+    generator.client = StubAnthropicClient(responder=make_responder(generator.price_kb))
+    building_info = {"project_name": "テスト校舎", "spec_text_excerpt": "ガス設備工事。" * 500,
+                     "building_info": {"total_floor_area": 2145}}
+
+    items = generator._generate_items_for_all_disciplines(building_info, max_concurrency=6, price_preset="unified")
+    cache = generator._get_match_cache(estimate_generator_ai.PRESETS["unified"], generator._price_matching_config)
+    prefetch_stats = cache.stats()
+    items = generator.enrich_with_prices_unified(items)
+    enrich_hits = cache.stats()["hits"] - prefetch_stats["hits"]
+    results = [(item.name, item.quantity, item.unit_price, item.amount, item.source_reference) for item in items]
+    return results, prefetch_stats, enrich_hits
+
+
+def check_prefetch(failures):
+    print("\n[2] ストリーミング生成 + 単価マッチング先行実行")
+    expected, _, _ = run_estimate(stream_items=False)
+    results, prefetch_stats, enrich_hits = run_estimate(stream_items=True)
+    print(f"  生成項目: {len(results)}件 / 先行マッチング: {prefetch_stats['entries']}件 / "
+          f"単価付与時のキャッシュヒット: {enrich_hits}件")
+
+    if results != expected:
+        failures.append("先行実行の有無で単価付与の結果が異なる")
+    if not prefetch_stats["entries"]:
+        failures.append("生成中に単価マッチングが先行実行されていない")
+    if enrich_hits < prefetch_stats["entries"]:
+        failures.append(f"単価付与でキャッシュにヒットしない項目がある: {enrich_hits}/{prefetch_stats['entries']}")
+
+
+def main():
+    print("=" * 80)
+    print("項目生成のストリーミング受信・インクリメンタルJSONパース テスト")
+    print("=" * 80)
+    failures = []
+    check_parser(failures)
+    check_prefetch(failures)
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ ストリーミング受信で項目を順に取り出し、単価マッチングを生成と並行して実行")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
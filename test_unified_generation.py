@@ -114,6 +114,9 @@ def run_simulation():
         print(f"❌ 見積生成エラー: {e}")
         traceback.print_exc()
         return False
+    finally:
+        # 共有KBインデックスの参照を返却
+        generator.close()
 
     # ステップ3: PDF生成テスト
     print("=" * 40)